@@ -8,19 +8,70 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import threading
 from collections import defaultdict
 
 from alarm_backends.core.cache.base import CacheManager
 from alarm_backends.core.cache.cmdb.business import BusinessManager
 from alarm_backends.core.cache.cmdb.dynamic_group import DynamicGroupManager
+from bkmonitor.action.alert_assign import AssignRuleMatch
 from bkmonitor.models.fta.assign import AlertAssignGroup, AlertAssignRule
 from bkmonitor.utils import extended_json
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.local import local
 from bkmonitor.utils.tenant import bk_biz_id_to_bk_tenant_id
 from constants.action import GLOBAL_BIZ_ID
 
 setattr(local, "assign_cache", {})
 
+# 进程级别的编译后分派规则缓存，按业务存储，仅在缓存版本变化时重新编译
+_compiled_rulesets = {}
+_compiled_rulesets_lock = threading.Lock()
+
+
+class CompiledAssignRule:
+    """
+    预编译的分派规则，条件只在加载时解析一次
+    """
+
+    __slots__ = ("rule", "rule_id", "dimension_check")
+
+    def __init__(self, rule: dict):
+        self.rule = rule
+        self.rule_id = rule.get("id")
+        # 复用分派规则适配的条件解析，保持与逐条解析一致
+        self.dimension_check = AssignRuleMatch(rule).dimension_check
+
+
+class CompiledAssignRuleSet:
+    """
+    单个业务编译后的分派规则集合，优先级已按从高到低排好序
+    """
+
+    def __init__(self, bk_biz_id, version, priority_rules: list):
+        """
+        :param bk_biz_id: 业务ID
+        :param version: 编译时的分派缓存版本
+        :param priority_rules: [(priority, [CompiledAssignRule, ...]), ...]
+        """
+        self.bk_biz_id = bk_biz_id
+        self.version = version
+        self.priority_rules = priority_rules
+
+    @classmethod
+    def build(cls, bk_biz_id, version):
+        priority_rules = []
+        for priority in AssignCacheManager.get_assign_priority_by_biz_id(bk_biz_id):
+            rules = []
+            for group_id in sorted(AssignCacheManager.get_assign_groups_by_priority(bk_biz_id, priority)):
+                rules.extend(
+                    CompiledAssignRule(rule)
+                    for rule in AssignCacheManager.get_assign_rules_by_group(bk_biz_id, group_id)
+                )
+            if rules:
+                priority_rules.append((priority, rules))
+        return cls(bk_biz_id, version, priority_rules)
+
 
 class AssignCacheManager(CacheManager):
     """
@@ -31,11 +82,42 @@ class AssignCacheManager(CacheManager):
     BIZ_CACHE_KEY_TEMPLATE = CacheManager.CACHE_KEY_PREFIX + ".assign.biz_{bk_biz_id}"
     PRIORITY_CACHE_KEY_TEMPLATE = CacheManager.CACHE_KEY_PREFIX + ".assign.biz_priority_{bk_biz_id}_{priority}"
     GROUP_CACHE_KEY_TEMPLATE = CacheManager.CACHE_KEY_PREFIX + ".assign.biz_group_{bk_biz_id}_{group_id}"
+    # 分派缓存版本，内容发生变化时才会改变
+    VERSION_CACHE_KEY = CacheManager.CACHE_KEY_PREFIX + ".assign.version"
 
     @classmethod
     def clear(cls):
         return local.assign_cache.clear()
 
+    @classmethod
+    def get_version(cls):
+        """
+        获取当前分派缓存版本，同一批次内只读取一次
+        """
+        if cls.VERSION_CACHE_KEY not in local.assign_cache:
+            local.assign_cache[cls.VERSION_CACHE_KEY] = cls.cache.get(cls.VERSION_CACHE_KEY)
+        return local.assign_cache[cls.VERSION_CACHE_KEY]
+
+    @classmethod
+    def get_compiled_ruleset(cls, bk_biz_id) -> CompiledAssignRuleSet:
+        """
+        获取业务编译后的分派规则集合
+        进程内按版本缓存，版本未变化时直接复用，不再重复读取redis和解析条件
+        """
+        cache_key = f"compiled_{bk_biz_id}"
+        if cache_key in local.assign_cache:
+            return local.assign_cache[cache_key]
+
+        version = cls.get_version()
+        ruleset = _compiled_rulesets.get(bk_biz_id)
+        if ruleset is None or version is None or ruleset.version != version:
+            ruleset = CompiledAssignRuleSet.build(bk_biz_id, version)
+            if version is not None:
+                with _compiled_rulesets_lock:
+                    _compiled_rulesets[bk_biz_id] = ruleset
+        local.assign_cache[cache_key] = ruleset
+        return ruleset
+
     @classmethod
     def get_assign_priority_by_biz_id(cls, bk_biz_id):
         """
@@ -43,7 +125,7 @@ class AssignCacheManager(CacheManager):
         :param bk_biz_id: 业务ID
         """
         cache_key = cls.BIZ_CACHE_KEY_TEMPLATE.format(bk_biz_id=bk_biz_id)
-        if 1 or cache_key not in local.assign_cache:
+        if cache_key not in local.assign_cache:
             default_priority = cls.get_global_config(cls.BIZ_CACHE_KEY_TEMPLATE) or []
             priority = cls.cache.get(cache_key)
             if priority:
@@ -159,6 +241,15 @@ class AssignCacheManager(CacheManager):
 
             group_rules[rule["assign_group_id"]].append(rule)
 
+        version = count_md5(
+            {
+                "biz_priority": {key: sorted(value) for key, value in biz_priority.items()},
+                "biz_priority_groups": {key: sorted(value) for key, value in biz_priority_groups.items()},
+                "group_rules": {str(group_id): group_rule for group_id, group_rule in group_rules.items()},
+            },
+            list_sort=False,
+        )
+
         pipeline = cls.cache.pipeline()
         for bk_biz_id in biz_id_list:
             biz_key = f"biz_{bk_biz_id}"
@@ -202,6 +293,7 @@ class AssignCacheManager(CacheManager):
         deleted_groups = AlertAssignGroup.origin_objects.filter(is_deleted=True)
         for group in deleted_groups:
             pipeline.delete(cls.GROUP_CACHE_KEY_TEMPLATE.format(bk_biz_id=group.bk_biz_id, group_id=group.id))
+        pipeline.set(cls.VERSION_CACHE_KEY, version, cls.CACHE_TIMEOUT)
         pipeline.execute()
 
 
@@ -205,6 +205,27 @@ class HostManager(CMDBCacheManager):
         result: list[str | None] = cast(list[str | None], cls.cache.hmget(cache_key, host_keys))
         return {host_key: Host(**json.loads(r)) for host_key, r in zip(host_keys, result) if r}
 
+    @classmethod
+    def mget_by_ids(cls, *, bk_tenant_id: str, bk_host_ids: list[int | str]) -> dict[str, Host]:
+        """
+        根据主机ID批量获取主机信息
+        :return: {str(bk_host_id): Host}
+        """
+        host_ids: list[str] = list({str(bk_host_id) for bk_host_id in bk_host_ids if bk_host_id})
+        if not host_ids:
+            return {}
+
+        cache_key = cls.get_cache_key(bk_tenant_id)
+        result: list[str | None] = cast(list[str | None], cls.cache.hmget(cache_key, host_ids))
+        hosts: dict[str, Host] = {}
+        for bk_host_id, host_str in zip(host_ids, result):
+            if not host_str:
+                continue
+            host_dict: dict = json.loads(host_str)
+            host_dict["bk_tenant_id"] = bk_tenant_id
+            hosts[bk_host_id] = Host(**host_dict)
+        return hosts
+
     @classmethod
     def get_by_agent_id(cls, *, bk_tenant_id: str, bk_agent_id: str) -> Host | None:
         if not bk_agent_id:
@@ -504,6 +504,17 @@ SERVICE_LOCK_PREPARATION = register_key_with_config(
     }
 )
 
+PREPARATION_DEPEND_CHECKPOINT_KEY = register_key_with_config(
+    {
+        "label": "[preparation]历史依赖数据准备进度",
+        "key_type": "hash",
+        "key_tpl": "preparation.depend.checkpoint.{strategy_id}",
+        "field_tpl": "{algorithm_type}",
+        "ttl": CONST_ONE_DAY,
+        "backend": "service",
+    }
+)
+
 ACCESS_END_TIME_KEY = register_key_with_config(
     {
         "label": "[access]数据拉取的结束时间",
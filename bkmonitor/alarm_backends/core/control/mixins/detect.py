@@ -16,9 +16,11 @@ from django.utils.module_loading import import_string
 from django.utils.translation import gettext as _
 
 from alarm_backends.constants import LATEST_POINT_WITH_ALL_KEY
-from alarm_backends.core.cache.key import LAST_CHECKPOINTS_CACHE_KEY
-from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
-from bkmonitor.utils.common_utils import chunks
+from alarm_backends.core.detect_result import (
+    ANOMALY_LABEL,
+    CheckResult,
+    LastCheckpointWriter,
+)
 from bkmonitor.utils.text import camel_to_underscore
 from constants.data_source import DataTypeLabel
 
@@ -100,12 +102,17 @@ class DetectMixin:
             else:
                 # 组合策略
                 anomaly_records = []
-                for data_point in data_points:
+                # 批量检测已排除的数据点，视为该算法未命中
+                candidates_list = [d.get_batch_candidates(data_points) for d in detector_list]
+                for index, data_point in enumerate(data_points):
                     ap = None
                     prefix = suffix = ""
-                    for d in detector_list:
+                    for d, candidates in zip(detector_list, candidates_list):
                         try:
-                            single_ret = d.detect(data_point)
+                            if candidates is not None and not candidates[index]:
+                                single_ret = None
+                            else:
+                                single_ret = d.detect(data_point)
 
                             # != "or" 兼容connector未配置或配错的情况，默认都使用and
                             if not single_ret:
@@ -211,15 +218,8 @@ class DetectMixin:
             last_checkpoints[LATEST_POINT_WITH_ALL_KEY] = latest_point_with_all
 
         # 更新last_checkpoint
-        last_checkpoint_cache_key = LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=self.strategy.id, item_id=self.id)
-
-        for chunked_points in chunks(list(last_checkpoints.items()), 5000):
-            set_mapping = {}
-            for _dimensions_md5, point_timestamp in chunked_points:
-                last_checkpoint_cache_field = LAST_CHECKPOINTS_CACHE_KEY.get_field(
-                    dimensions_md5=_dimensions_md5,
-                    level=level,
-                )
-                set_mapping[last_checkpoint_cache_field] = point_timestamp
-            LAST_CHECKPOINTS_CACHE_KEY.client.hmset(last_checkpoint_cache_key, set_mapping)
-        CheckResult.expire_last_checkpoint_cache(strategy_id=self.strategy.id, item_id=self.id)
+        checkpoint_writer = LastCheckpointWriter()
+        checkpoint_writer.touch(self.strategy.id, self.id)
+        for _dimensions_md5, point_timestamp in last_checkpoints.items():
+            checkpoint_writer.add(self.strategy.id, self.id, _dimensions_md5, point_timestamp, level)
+        checkpoint_writer.flush()
@@ -23,7 +23,11 @@ from alarm_backends.constants import (
 )
 from alarm_backends.core.cache import key
 from alarm_backends.core.cache.cmdb.host import HostManager
-from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
+from alarm_backends.core.detect_result import (
+    ANOMALY_LABEL,
+    CheckResult,
+    LastCheckpointWriter,
+)
 from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.tenant import bk_biz_id_to_bk_tenant_id
 
@@ -327,23 +331,18 @@ class CheckMixin:
             redis_pipeline.execute()
 
         # 更新last_checkpoint，计算无数据
+        checkpoint_writer = LastCheckpointWriter()
         for _dimensions_md5, point_timestamp in list(dimensions_md5_timestamp.items()):
-            try:
-                CheckResult.update_last_checkpoint_by_d_md5(
-                    self.strategy.id,
-                    self.id,
-                    _dimensions_md5,
-                    point_timestamp,
-                    self.no_data_level,
-                )
-            except Exception as e:
-                msg = f"set nodata check result cache last_check_point error:{e}"
-                logger.exception(msg)
+            checkpoint_writer.add(self.strategy.id, self.id, _dimensions_md5, point_timestamp, self.no_data_level)
         # 记录每个策略监控项的最后无数据检测时间，避免同一时刻的数据被多次检测，否则会导致除了第一次能取到数据，其他检测都报无数据
-        CheckResult.update_last_checkpoint_by_d_md5(
+        checkpoint_writer.add(
             self.strategy.id, self.id, LATEST_NO_DATA_CHECK_POINT, check_timestamp, self.no_data_level
         )
-        CheckResult.expire_last_checkpoint_cache(strategy_id=self.strategy.id, item_id=self.id)
+        try:
+            checkpoint_writer.flush()
+        except Exception as e:
+            msg = f"set nodata check result cache last_check_point error:{e}"
+            logger.exception(msg)
 
     def recover(self, dimensions_md5):
         key.NO_DATA_LAST_ANOMALY_CHECKPOINTS_CACHE_KEY.client.hdel(
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 
 
 import json
+from collections import defaultdict
 
 from alarm_backends.constants import (
     LATEST_NO_DATA_CHECK_POINT,
@@ -19,6 +20,7 @@ from alarm_backends.constants import (
 from alarm_backends.core.cache import key
 
 CONST_MAX_LEN_CHECK_RESULT = 30  # 检测结果缓存，默认只保留30条数据
+CONST_CHECKPOINT_CHUNK_SIZE = 5000  # 单条hmset命令最多写入的字段数
 
 ANOMALY_LABEL = "ANOMALY"  # 异常标识
 
@@ -167,3 +169,47 @@ class CheckResult(Result):
         # nodata 逻辑
         cache_key = cls.get_md5_to_dimension_key(service_type, strategy_id, item_id)
         return key.MD5_TO_DIMENSION_CACHE_KEY.client.hkeys(cache_key)
+
+
+class LastCheckpointWriter:
+    """
+    最后检测点批量写入
+    按 (strategy_id, item_id) 聚合字段，同一个 key 只发送 hmset + expire，
+    所有 key 通过 pipeline 按策略所在的 redis 节点分组，一次性提交
+
+    >>> writer = LastCheckpointWriter()
+    >>> writer.add(strategy_id=1, item_id=1, dimensions_md5="md5_str", check_point=1600000000, level=1)
+    >>> writer.flush()
+    """
+
+    def __init__(self, chunk_size=CONST_CHECKPOINT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        # {(strategy_id, item_id): {field: check_point}}
+        self.checkpoints = defaultdict(dict)
+
+    def __len__(self):
+        return sum(len(fields) for fields in self.checkpoints.values())
+
+    def add(self, strategy_id, item_id, dimensions_md5, check_point, level):
+        field = key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5=dimensions_md5, level=level)
+        self.checkpoints[(strategy_id, item_id)][field] = check_point
+
+    def touch(self, strategy_id, item_id):
+        """
+        仅刷新过期时间，不写入检测点
+        """
+        self.checkpoints.setdefault((strategy_id, item_id), {})
+
+    def flush(self):
+        if not self.checkpoints:
+            return
+
+        pipeline = key.LAST_CHECKPOINTS_CACHE_KEY.client.pipeline(transaction=False)
+        for (strategy_id, item_id), fields in self.checkpoints.items():
+            cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=strategy_id, item_id=item_id)
+            items = list(fields.items())
+            for index in range(0, len(items), self.chunk_size):
+                pipeline.hmset(cache_key, dict(items[index : index + self.chunk_size]))
+            pipeline.expire(cache_key, key.LAST_CHECKPOINTS_CACHE_KEY.ttl)
+        pipeline.execute()
+        self.checkpoints.clear()
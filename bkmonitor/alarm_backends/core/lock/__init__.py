@@ -10,6 +10,8 @@ specific language governing permissions and limitations under the License.
 
 import time
 
+from redis.exceptions import ResponseError
+
 from alarm_backends.constants import CONST_MINUTES
 from alarm_backends.core.storage.redis import Cache
 from bkmonitor.utils.common_utils import uniqid4
@@ -66,14 +68,40 @@ class RedisLock(BaseLock):
 class MultiRedisLock:
     """
     Redis 批量锁
+    通过 lua 脚本一次往返完成所有key的加锁/解锁，并返回每个key的加锁结果
     """
 
+    # 逐个key执行 SET NX，返回与 KEYS 顺序一致的加锁结果列表
+    ACQUIRE_SCRIPT = """
+local results = {}
+for i, key in ipairs(KEYS) do
+    if redis.call("SET", key, ARGV[1], "EX", ARGV[2], "NX") then
+        results[i] = 1
+    else
+        results[i] = 0
+    end
+end
+return results
+"""
+
+    # 只删除 token 与当前实例一致的key，返回删除的key数量
+    RELEASE_SCRIPT = """
+local count = 0
+for _, key in ipairs(KEYS) do
+    if redis.call("GET", key) == ARGV[1] then
+        count = count + redis.call("DEL", key)
+    end
+end
+return count
+"""
+
     def __init__(self, keys: list[str], ttl: int = None):
         self.keys = keys
         self.ttl = ttl or CONST_MINUTES
         self.client = Cache("service-lock")
         self._token = uniqid4()
         self._lock_success_keys = set()
+        self.results: dict[str, bool] = {}
 
     def acquire(self):
         if not self.keys:
@@ -81,13 +109,17 @@ class MultiRedisLock:
 
         keys = list(set(self.keys))
 
-        pipeline = self.client.pipeline(transaction=False)
-        for key in keys:
-            pipeline.set(key, self._token, ex=self.ttl, nx=True)
-
-        results = pipeline.execute()
+        try:
+            results = self.client.eval(self.ACQUIRE_SCRIPT, len(keys), *keys, self._token, self.ttl)
+        except ResponseError:
+            # 后端不支持 lua 脚本时，退化为 pipeline 逐个加锁
+            pipeline = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipeline.set(key, self._token, ex=self.ttl, nx=True)
+            results = pipeline.execute()
 
         for index, locked in enumerate(results):
+            self.results[keys[index]] = bool(locked)
             if locked:
                 self._lock_success_keys.add(keys[index])
 
@@ -98,6 +130,10 @@ class MultiRedisLock:
             return
 
         lock_success_keys = list(self._lock_success_keys)
+        try:
+            return self.client.eval(self.RELEASE_SCRIPT, len(lock_success_keys), *lock_success_keys, self._token)
+        except ResponseError:
+            pass
 
         results = self.client.mget(lock_success_keys)
 
@@ -110,10 +146,17 @@ class MultiRedisLock:
 
         if keys_to_delete:
             self.client.delete(*keys_to_delete)
-        return keys_to_delete
+        return len(keys_to_delete)
 
     def is_locked(self, key: str):
         """
         查询某个key是否已经获得锁
         """
         return key in self._lock_success_keys
+
+    @property
+    def fail_keys(self):
+        """
+        加锁失败的key
+        """
+        return [key for key, locked in self.results.items() if not locked]
@@ -8,12 +8,14 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+
 import json
 from abc import ABCMeta
 
 import six
 
 from alarm_backends.core.cache import key
+from core.prometheus import metrics
 
 
 class BaseAbnormalPushProcessor(six.with_metaclass(ABCMeta, object)):
@@ -29,8 +31,10 @@ class BaseAbnormalPushProcessor(six.with_metaclass(ABCMeta, object)):
         anomaly_signal_list = anomaly_signal_list or []
         pipeline = key.ANOMALY_LIST_KEY.client.pipeline(transaction=False)
 
+        outputs_list = []
         for item_id, outputs in six.iteritems(outputs):
             if outputs:
+                outputs_list.append(outputs)
                 outputs_data = [json.dumps(i) for i in outputs]
                 anomaly_count += len(outputs_data)
                 anomaly_signal_list.append("{strategy_id}.{item_id}".format(strategy_id=strategy_id, item_id=item_id))
@@ -43,6 +47,8 @@ class BaseAbnormalPushProcessor(six.with_metaclass(ABCMeta, object)):
             return anomaly_count
         # 先推送anomaly list的数据
         pipeline.execute()
+        for item_outputs in outputs_list:
+            metrics.observe_stage_latency("detect", item_outputs, lambda o: o["data"]["time"])
 
         # 再进行一次信号的推送，保证数据ready了之后再推送信号
         signal_pipeline = key.ANOMALY_SIGNAL_KEY.client.pipeline(transaction=False)
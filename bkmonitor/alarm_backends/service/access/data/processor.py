@@ -227,6 +227,9 @@ class BaseAccessDataProcess(base.BaseAccessProcess):
         pipeline.expire(output_key, max([data_list_key.ttl, agg_interval * 5]))
         pipeline.execute()
         metrics.ACCESS_PROCESS_PUSH_DATA_COUNT.labels(strategy_id=metrics.TOTAL_TAG, type="data").inc(len(record_list))
+        metrics.observe_stage_latency(
+            "nodata" if data_list_key is key.NO_DATA_LIST_KEY else "access", record_list, lambda r: r.data["time"]
+        )
 
         # 非批量任务，记录日志
         if not self.sub_task_id:
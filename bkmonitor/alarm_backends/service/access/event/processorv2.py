@@ -19,7 +19,11 @@ from alarm_backends.core.cache.key import ACCESS_EVENT_LOCKS
 from alarm_backends.core.cache.strategy import StrategyCacheManager
 from alarm_backends.core.cluster import get_cluster
 from alarm_backends.core.control.strategy import Strategy
-from alarm_backends.core.detect_result import ANOMALY_LABEL, CheckResult
+from alarm_backends.core.detect_result import (
+    ANOMALY_LABEL,
+    CheckResult,
+    LastCheckpointWriter,
+)
 from alarm_backends.core.lock.service_lock import service_lock
 from alarm_backends.core.storage.kafka_v2 import KafkaQueueV2 as KafkaQueue
 from alarm_backends.service.access.base import BaseAccessProcess
@@ -113,15 +117,16 @@ class BaseAccessEventProcess(BaseAccessProcess, QoSMixin):
             # check_result.expire_key_to_dimension()
             redis_pipeline.execute()
 
-        # 更新last_checkpoint
+        # 更新last_checkpoint，按策略节点分组批量写入
+        checkpoint_writer = LastCheckpointWriter()
         for md5_dimension_last_point_key, point_timestamp in list(last_checkpoints.items()):
-            try:
-                md5_dimension, strategy_id, item_id, level = md5_dimension_last_point_key
-                CheckResult.update_last_checkpoint_by_d_md5(strategy_id, item_id, md5_dimension, point_timestamp, level)
-            except Exception as e:
-                msg = f"set check result cache last_check_point error:{e}"
-                logger.exception(msg)
-            CheckResult.expire_last_checkpoint_cache(strategy_id=strategy_id, item_id=item_id)
+            md5_dimension, strategy_id, item_id, level = md5_dimension_last_point_key
+            checkpoint_writer.add(strategy_id, item_id, md5_dimension, point_timestamp, level)
+        try:
+            checkpoint_writer.flush()
+        except Exception as e:
+            msg = f"set check result cache last_check_point error:{e}"
+            logger.exception(msg)
 
     def push(self, output_client=None):
         """
@@ -30,6 +30,10 @@ from constants.action import AssignMode
 from constants.alert import EventStatus
 from core.prometheus import metrics
 
+# 告警更新锁冲突时，进程内重试的次数及基础退避间隔(秒)
+ALERT_LOCK_RETRY_TIMES = 2
+ALERT_LOCK_RETRY_INTERVAL = 0.5
+
 
 class AlertBuilder(BaseAlertProcessor):
     def __init__(self):
@@ -76,6 +80,43 @@ class AlertBuilder(BaseAlertProcessor):
     def dedupe_events_to_alerts(self, events: list[Event]):
         """
         将事件进行去重，生成告警并保存
+        加锁失败的事件先放入进程内重试缓冲区，在当前 worker 内短暂退避后重试，
+        重试次数用尽仍未加锁成功的，再投递到 celery 延后处理
+        """
+        alerts, retry_events = self._dedupe_events_to_alerts(events)
+        for retry_times in range(1, ALERT_LOCK_RETRY_TIMES + 1):
+            if not retry_events:
+                break
+            time.sleep(ALERT_LOCK_RETRY_INTERVAL * retry_times)
+            self.logger.info(
+                "[alert.builder locked] retry(%s) %s locked events in process", retry_times, len(retry_events)
+            )
+            retried_alerts, retry_events = self._dedupe_events_to_alerts(retry_events)
+            alerts.extend(retried_alerts)
+
+        if retry_events:
+            from alarm_backends.service.alert.builder.tasks import (
+                dedupe_events_to_alerts,
+            )
+
+            # 对多次加锁失败的告警，丢到队列中，延后5s操作
+            dedupe_events_to_alerts.apply_async(
+                kwargs={
+                    "events": retry_events,
+                },
+                countdown=5,
+            )
+            self.logger.info(
+                "[alert.builder locked] %s alerts is locked, retry in 5s: %s",
+                len(retry_events),
+                ",".join([event.dedupe_md5 for event in retry_events]),
+            )
+        return alerts
+
+    def _dedupe_events_to_alerts(self, events: list[Event]) -> tuple[list[Alert], list[Event]]:
+        """
+        对加锁成功的事件进行去重，生成告警并保存
+        :return: (告警列表, 加锁失败的事件列表)
         """
 
         def _report_latency(report_events):
@@ -108,7 +149,7 @@ class AlertBuilder(BaseAlertProcessor):
 
         events = self.get_unexpired_events(events)
         if not events:
-            return []
+            return [], []
         lock_keys = [ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5) for event in events]
 
         with multi_service_lock(ALERT_UPDATE_LOCK, lock_keys) as lock:
@@ -134,24 +175,6 @@ class AlertBuilder(BaseAlertProcessor):
             snapshot_count = self.update_alert_snapshot(alerts)
             self.logger.info("[alert.builder update alert snapshot]: %s", snapshot_count)
 
-            if fail_locked_events:
-                from alarm_backends.service.alert.builder.tasks import (
-                    dedupe_events_to_alerts,
-                )
-
-                # 对加锁失败的告警，丢到队列中，延后5s操作
-                dedupe_events_to_alerts.apply_async(
-                    kwargs={
-                        "events": fail_locked_events,
-                    },
-                    countdown=5,
-                )
-                self.logger.info(
-                    "[alert.builder locked] %s alerts is locked, retry in 5s: %s",
-                    len(fail_locked_events),
-                    ",".join([event.dedupe_md5 for event in fail_locked_events]),
-                )
-
             alerts = self.save_alerts(alerts, action=BulkActionType.UPSERT, force_save=True)
 
         # TODO: 这里需要清理保存失败的告警的 Redis 缓存，否则会导致DB和 Redis 不一致
@@ -169,7 +192,7 @@ class AlertBuilder(BaseAlertProcessor):
                 is_saved="1" if alert.should_refresh_db() else "0",
             ).inc()
 
-        return alerts
+        return alerts, fail_locked_events
 
     def handle(self, events: list[Event]):
         """
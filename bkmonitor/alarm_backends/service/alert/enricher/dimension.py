@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 
 import logging
 import os
+from collections import defaultdict
 
 from django.utils.translation import gettext as _
 
@@ -26,6 +27,7 @@ from alarm_backends.service.alert.enricher import (
     Event,
 )
 from alarm_backends.service.alert.enricher.translator import TranslatorFactory
+from api.cmdb.define import Host, ServiceInstance, TopoNode
 from constants.alert import EventTargetType
 
 logger = logging.getLogger("alert.enricher")
@@ -142,6 +144,76 @@ class StandardTranslateEnricher(BaseAlertEnricher):
     标准字段翻译
     """
 
+    def __init__(self, alerts: list[Alert]):
+        # 缓存准备，按租户批量查询主机、服务实例及拓扑节点，避免逐条告警请求redis
+        super().__init__(alerts)
+        self.hosts_cache: dict[str, dict[str, Host]] = {}
+        self.service_instances_cache: dict[str, dict[str, ServiceInstance]] = {}
+        self.topo_nodes_cache: dict[str, dict[tuple[str, int], TopoNode]] = {}
+        try:
+            self.prefetch()
+        except Exception as e:  # noqa
+            # 预取失败时回退为逐条查询
+            logger.exception("[StandardTranslateEnricher][prefetch] alerts(%s) error but skip: %s", len(alerts), e)
+
+    def prefetch(self):
+        tenant_host_ids: dict[str, set[str]] = defaultdict(set)
+        tenant_service_instance_ids: dict[str, set[str]] = defaultdict(set)
+        tenant_topo_nodes: dict[str, set[tuple[str, int]]] = defaultdict(set)
+
+        for alert in self.alerts:
+            if not alert.is_new():
+                continue
+
+            target_type = alert.top_event.get("target_type")
+            bk_tenant_id = alert.bk_tenant_id
+            if target_type == EventTargetType.HOST:
+                bk_host_id = alert.top_event.get("bk_host_id")
+                if bk_host_id:
+                    tenant_host_ids[bk_tenant_id].add(str(bk_host_id))
+            elif target_type == EventTargetType.SERVICE:
+                tenant_service_instance_ids[bk_tenant_id].add(str(alert.top_event["target"]))
+            elif target_type == EventTargetType.TOPO:
+                topo_node = self.parse_topo_node(alert.top_event.get("target"))
+                if topo_node:
+                    tenant_topo_nodes[bk_tenant_id].add(topo_node)
+
+        for bk_tenant_id, bk_host_ids in tenant_host_ids.items():
+            self.hosts_cache[bk_tenant_id] = HostManager.mget_by_ids(
+                bk_tenant_id=bk_tenant_id, bk_host_ids=list(bk_host_ids)
+            )
+        for bk_tenant_id, service_instance_ids in tenant_service_instance_ids.items():
+            self.service_instances_cache[bk_tenant_id] = ServiceInstanceManager.mget(
+                bk_tenant_id=bk_tenant_id, service_instance_ids=list(service_instance_ids)
+            )
+        for bk_tenant_id, topo_nodes in tenant_topo_nodes.items():
+            self.topo_nodes_cache[bk_tenant_id] = TopoManager.mget(
+                bk_tenant_id=bk_tenant_id, topo_nodes=list(topo_nodes)
+            )
+
+    @staticmethod
+    def parse_topo_node(target) -> tuple[str, int] | None:
+        try:
+            bk_obj_id, bk_inst_id = target.split("|")
+            return bk_obj_id, int(bk_inst_id)
+        except (AttributeError, ValueError):
+            return None
+
+    def get_host(self, bk_tenant_id: str, bk_host_id) -> Host | None:
+        if bk_tenant_id in self.hosts_cache:
+            return self.hosts_cache[bk_tenant_id].get(str(bk_host_id))
+        return HostManager.get_by_id(bk_tenant_id=bk_tenant_id, bk_host_id=bk_host_id)
+
+    def get_service_instance(self, bk_tenant_id: str, service_instance_id) -> ServiceInstance | None:
+        if bk_tenant_id in self.service_instances_cache:
+            return self.service_instances_cache[bk_tenant_id].get(str(service_instance_id))
+        return ServiceInstanceManager.get(bk_tenant_id=bk_tenant_id, service_instance_id=service_instance_id)
+
+    def get_topo_node(self, bk_tenant_id: str, bk_obj_id: str, bk_inst_id: int) -> TopoNode | None:
+        if bk_tenant_id in self.topo_nodes_cache:
+            return self.topo_nodes_cache[bk_tenant_id].get((bk_obj_id, bk_inst_id))
+        return TopoManager.get(bk_tenant_id=bk_tenant_id, bk_obj_id=bk_obj_id, bk_inst_id=bk_inst_id)
+
     def enrich_alert(self, alert: Alert) -> Alert:
         target_type = alert.top_event.get("target_type")
 
@@ -180,7 +252,7 @@ class StandardTranslateEnricher(BaseAlertEnricher):
 
         if alert.top_event.get("bk_host_id") and "bk_host_id" in dimension_fields:
             bk_host_id = alert.top_event["bk_host_id"]
-            host = HostManager.get_by_id(bk_tenant_id=alert.bk_tenant_id, bk_host_id=bk_host_id)
+            host = self.get_host(alert.bk_tenant_id, bk_host_id)
             if host:
                 display_name = _("主机")
                 display_value = host.display_name
@@ -203,9 +275,7 @@ class StandardTranslateEnricher(BaseAlertEnricher):
 
     def enrich_service(self, alert: Alert):
         bk_service_instance_id = alert.top_event["target"]
-        instance = ServiceInstanceManager.get(
-            bk_tenant_id=alert.bk_tenant_id, service_instance_id=bk_service_instance_id
-        )
+        instance = self.get_service_instance(alert.bk_tenant_id, bk_service_instance_id)
         if not instance:
             alert.add_dimension(key="bk_service_instance_id", value=bk_service_instance_id, display_key=_("服务实例ID"))
         else:
@@ -219,7 +289,7 @@ class StandardTranslateEnricher(BaseAlertEnricher):
 
     def enrich_topo(self, alert: Alert):
         bk_obj_id, bk_inst_id = alert.top_event["target"].split("|")
-        node_info = TopoManager.get(bk_tenant_id=alert.bk_tenant_id, bk_obj_id=bk_obj_id, bk_inst_id=int(bk_inst_id))
+        node_info = self.get_topo_node(alert.bk_tenant_id, bk_obj_id, int(bk_inst_id))
         if not node_info:
             alert.add_dimension(key="bk_topo_node", value=alert.top_event["target"], display_key=_("拓扑节点"))
         else:
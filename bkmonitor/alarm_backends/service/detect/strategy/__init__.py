@@ -37,6 +37,9 @@ from core.unit import load_unit
 
 logger = logging.getLogger("detect")
 
+# 批量获取历史值时，缺失的历史数据点
+HISTORY_POINT_MISSING = object()
+
 
 class DetectContext(dict):
     def __getattr__(self, item):
@@ -49,6 +52,8 @@ class Algorithms:
     """
 
     desc_tpl = ""
+    # 数据点数量不低于该值时，先批量筛选候选数据点，再逐点检测
+    batch_detect_min_points = 10
 
     def __init__(self):
         self.expr = self.gen_expr()
@@ -125,6 +130,26 @@ class Algorithms:
         context = Context(self.get_context(data_point))
         return Template(self.desc_tpl).render(context)
 
+    def batch_detect(self, data_points):
+        """
+        To be implemented
+        作用：批量检测，返回与 data_points 一一对应的候选标记，标记为 False 的数据点逐点检测必然不会产生异常
+        返回 None 表示不支持批量检测
+        """
+        return None
+
+    def get_batch_candidates(self, data_points):
+        """
+        获取候选数据点标记，数据点较少或批量检测失败时返回 None，全部逐点检测
+        """
+        try:
+            if len(data_points) < self.batch_detect_min_points:
+                return None
+            return self.batch_detect(data_points)
+        except Exception as e:
+            logger.warning(f"[detect] batch detect failed, fallback to detect one by one: {e}")
+            return None
+
     def detect_records(self, data_points, level):
         """
         detect service entry
@@ -132,7 +157,11 @@ class Algorithms:
         if isinstance(data_points, DataPoint):
             data_points = [data_points]
         anomaly_points = []
-        for data_point in data_points:
+        candidates = self.get_batch_candidates(data_points)
+        for index, data_point in enumerate(data_points):
+            # 批量检测已排除的数据点无需逐点检测
+            if candidates is not None and not candidates[index]:
+                continue
             try:
                 check_result = self.detect(data_point)
             except Exception as e:
@@ -396,6 +425,47 @@ class HistoryPointFetcher:
 
         return DataPoint(json.loads(raw_data), item)
 
+    def fetch_history_values(self, item, data_points, offsets):
+        """
+        批量获取数据点在各偏移时刻的历史值，与 fetch_history_point 共用本地缓存
+        :return: list(list) -> 与 data_points、offsets 对齐的历史值，缺失时为 HISTORY_POINT_MISSING
+        """
+        if not getattr(self, "_local_history_storage", None):
+            self._local_history_storage = {}
+
+        history_keys = {}
+        for point in data_points:
+            for offset in offsets:
+                history_timestamp = point.timestamp - offset
+                if history_timestamp not in history_keys:
+                    history_keys[history_timestamp] = key.HISTORY_DATA_KEY.get_key(
+                        strategy_id=item.strategy.id, item_id=item.id, timestamp=history_timestamp
+                    )
+
+        # 未缓存的历史时刻通过 pipeline 一次拉取
+        missing_keys = list({k for k in history_keys.values() if k not in self._local_history_storage})
+        if missing_keys:
+            pipeline = key.HISTORY_DATA_KEY.client.pipeline(transaction=False)
+            for history_key in missing_keys:
+                pipeline.hgetall(history_key)
+            self._local_history_storage.update(zip(missing_keys, pipeline.execute()))
+
+        default = getattr(self, "_default", None)
+        history_values = []
+        for point in data_points:
+            dimensions_md5 = point.record_id.split(".")[0]
+            values = []
+            for offset in offsets:
+                raw_data = self._local_history_storage[history_keys[point.timestamp - offset]].get(dimensions_md5)
+                if raw_data:
+                    values.append(json.loads(raw_data)["value"])
+                elif default is not None:
+                    values.append(default)
+                else:
+                    values.append(HISTORY_POINT_MISSING)
+            history_values.append(values)
+        return history_values
+
     def get_history_offsets(self, item):
         """
         获取历史数据的偏移时间，所有同比环比类算法必须实现该方法。
@@ -421,6 +491,8 @@ class RangeRatioAlgorithmsCollection(BasicAlgorithmsCollection, HistoryPointFetc
 
     floor_desc_tpl = ""
     ceil_desc_tpl = ""
+    # 是否支持批量检测，重写了 floor/ceil 表达式的算法需同时重写 _batch_detect_point 才能开启
+    batch_detect_enabled = False
 
     def gen_expr(self):
         if self.validated_config["floor"]:
@@ -470,6 +542,78 @@ class RangeRatioAlgorithmsCollection(BasicAlgorithmsCollection, HistoryPointFetc
             return list(g)
         return next(g)
 
+    def batch_detect(self, data_points):
+        """
+        基于对齐的历史值批量计算 floor/ceil 表达式，仅对命中的数据点逐点检测生成异常描述
+        """
+        if not self.batch_detect_enabled:
+            return None
+
+        item = data_points[0].item
+        history_values = self.fetch_history_values(item, data_points, self.get_batch_history_offsets(item))
+        return [self._batch_detect_point(data_point, values) for data_point, values in zip(data_points, history_values)]
+
+    def get_batch_history_offsets(self, item):
+        """
+        展开 get_history_offsets 中的区间偏移
+        """
+        agg_interval = item.query_configs[0]["agg_interval"]
+        offsets = []
+        for offset in self.get_history_offsets(item):
+            if isinstance(offset, tuple):
+                offsets.extend(range(offset[0], offset[1] + 1, agg_interval))
+            else:
+                offsets.append(offset)
+        return offsets
+
+    def get_batch_history_baselines(self, history_values):
+        """
+        基于对齐的历史值计算 floor/ceil 的比较基准，与 extra_context 保持一致
+        :return: {"floor": value, "ceil": value}，无法计算的基准不返回
+        """
+        if history_values[0] is HISTORY_POINT_MISSING:
+            return {}
+        return {"floor": history_values[0], "ceil": history_values[0]}
+
+    def _batch_detect_point(self, data_point, history_values):
+        # debug 数据点需要逐点输出检测上下文
+        if "__debug__" in data_point.as_dict():
+            return True
+
+        try:
+            baselines = self.get_batch_history_baselines(history_values)
+            unit = data_point.unit
+            value = unit_convert_min(data_point.value, unit)
+            matched_count = 0
+            for kind in ["floor", "ceil"]:
+                if not self.validated_config[kind]:
+                    continue
+                # 逐点检测时表达式变量缺失会抛出异常，该数据点被跳过
+                if kind not in baselines:
+                    return False
+
+                # 计算顺序与表达式保持一致，避免浮点误差导致结果不同
+                history_value = unit_convert_min(baselines[kind], unit)
+                if kind == "floor":
+                    matched = (value or history_value) and (
+                        value <= history_value * (100 - self.validated_config[kind]) * 0.01
+                    )
+                else:
+                    matched = (value or history_value) and (
+                        value >= history_value * (100 + self.validated_config[kind]) * 0.01
+                    )
+
+                if matched:
+                    if self.expr_op == "or":
+                        return True
+                    matched_count += 1
+                elif self.expr_op == "and":
+                    return False
+            return matched_count > 0
+        except Exception:
+            # 无法批量计算的数据点交由逐点检测处理
+            return True
+
 
 class SDKPreDetectMixin:
     GROUP_PREDICT_FUNC = None
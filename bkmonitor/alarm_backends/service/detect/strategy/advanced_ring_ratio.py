@@ -76,6 +76,11 @@ class AdvancedRingRatio(AdvancedYearRound):
         env.update(self.validated_config)
         return env
 
+    def aggregate_history_values(self, values):
+        if self.validated_config["fetch_type"] == "avg":
+            return round(sum([v for v in values]) * 1.0 / len(values), settings.POINT_PRECISION)
+        return values[-1]
+
     def get_history_offsets(self, item):
         agg_interval = item.query_configs[0]["agg_interval"]
         max_interval = max(
@@ -19,7 +19,10 @@ from django.utils.translation import gettext_lazy as _
 from six.moves import range
 
 from alarm_backends.constants import CONST_ONE_DAY
-from alarm_backends.service.detect.strategy import RangeRatioAlgorithmsCollection
+from alarm_backends.service.detect.strategy import (
+    HISTORY_POINT_MISSING,
+    RangeRatioAlgorithmsCollection,
+)
 from bkmonitor.strategy.serializers import AdvancedYearRoundSerializer
 from bkmonitor.utils.common_utils import safe_int
 from core.errors.alarm_backends.detect import InvalidDataPoint
@@ -30,6 +33,7 @@ logger = logging.getLogger("detect")
 class AdvancedYearRound(RangeRatioAlgorithmsCollection):
     config_serializer = AdvancedYearRoundSerializer
     expr_op = "or"
+    batch_detect_enabled = True
 
     floor_desc_tpl = _(
         "{% load unit %}较前{{floor_interval}}天内同一时刻绝对值的{{fetch_desc}}"
@@ -79,6 +83,23 @@ class AdvancedYearRound(RangeRatioAlgorithmsCollection):
         env.update(self.validated_config)
         return env
 
+    def aggregate_history_values(self, values):
+        """
+        按 fetch_type 聚合历史值，与 extra_context 保持一致
+        """
+        if self.validated_config["fetch_type"] == "avg":
+            return round(sum([abs(v) for v in values]) * 1.0 / len(values), settings.POINT_PRECISION)
+        return abs(values[-1])
+
+    def get_batch_history_baselines(self, history_values):
+        baselines = {}
+        for kind in ["floor", "ceil"]:
+            interval = self.validated_config[f"{kind}_interval"] or 0
+            values = [v for v in history_values[:interval] if v is not HISTORY_POINT_MISSING]
+            if values:
+                baselines[kind] = self.aggregate_history_values(values)
+        return baselines
+
     def get_history_offsets(self, item):
         return [
             CONST_ONE_DAY * i
@@ -24,6 +24,7 @@ from bkmonitor.strategy.serializers import RingRatioAmplitudeSerializer
 class RingRatioAmplitude(SimpleRingRatio):
     config_serializer = RingRatioAmplitudeSerializer
     expr_op = "and"
+    batch_detect_enabled = False
     desc_tpl = _(
         "{% load unit %} - 前一时刻值{{history_data_point.value|auto_unit:unit}}的绝对值 >= "
         "前一时刻值{{history_data_point.value|auto_unit:unit}} * {{ratio}} + {{shock}}{{unit|unit_suffix:algorithm_unit}}"
@@ -8,11 +8,13 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+
 """
 同比振幅算法
 当前值-前一时刻值{comp}过去{days}天内任一天同时刻差值*{ratio}+{shock}
 """
 
+import operator
 
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
@@ -20,15 +22,26 @@ from six.moves import range
 
 from alarm_backends.constants import CONST_ONE_DAY
 from alarm_backends.service.detect.strategy import (
+    HISTORY_POINT_MISSING,
     ExprDetectAlgorithms,
     RangeRatioAlgorithmsCollection,
 )
+from alarm_backends.templatetags.unit import unit_convert_min
 from bkmonitor.strategy.serializers import YearRoundAmplitudeSerializer, allowed_method
 
 
 class YearRoundAmplitude(RangeRatioAlgorithmsCollection):
     config_serializer = YearRoundAmplitudeSerializer
     expr_op = "or"
+    batch_detect_enabled = True
+
+    OPERATOR_MAPPINGS = {
+        "gt": operator.gt,
+        "gte": operator.ge,
+        "lt": operator.lt,
+        "lte": operator.le,
+        "eq": operator.eq,
+    }
 
     def gen_expr(self):
         comp = allowed_method[self.validated_config["method"]]
@@ -73,3 +86,37 @@ class YearRoundAmplitude(RangeRatioAlgorithmsCollection):
                 )
             )
         return diffs
+
+    def get_batch_history_offsets(self, item):
+        """
+        历史偏移为 (同一时刻, 前一时刻) 的成对偏移，按顺序展开
+        """
+        return [offset for offsets in self.get_history_offsets(item) for offset in offsets]
+
+    def _batch_detect_point(self, data_point, history_values):
+        # debug 数据点需要逐点输出检测上下文
+        if "__debug__" in data_point.as_dict():
+            return True
+
+        # 逐点检测时表达式变量缺失会抛出异常，该数据点被跳过
+        if history_values[0] is HISTORY_POINT_MISSING or history_values[1] is HISTORY_POINT_MISSING:
+            return False
+
+        try:
+            unit = data_point.unit
+            comp = self.OPERATOR_MAPPINGS[self.validated_config["method"]]
+            # 计算顺序与表达式保持一致，避免浮点误差导致结果不同
+            current_diff = unit_convert_min(abs(history_values[0] - history_values[1]), unit)
+            shock = unit_convert_min(self.validated_config["shock"], unit, self.unit)
+            for day in range(1, self.validated_config["days"] + 1):
+                pre_value, suf_value = history_values[day * 2], history_values[day * 2 + 1]
+                # 按天依次检测，缺失历史数据的一天会中断逐点检测
+                if pre_value is HISTORY_POINT_MISSING or suf_value is HISTORY_POINT_MISSING:
+                    return False
+                history_diff = unit_convert_min(abs(pre_value - suf_value), unit)
+                if comp(current_diff, history_diff * self.validated_config["ratio"] + shock):
+                    return True
+            return False
+        except Exception:
+            # 无法批量计算的数据点交由逐点检测处理
+            return True
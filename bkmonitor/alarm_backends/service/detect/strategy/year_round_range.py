@@ -27,6 +27,7 @@ from bkmonitor.strategy.serializers import YearRoundRangeSerializer, allowed_met
 class YearRoundRange(AdvancedYearRound):
     config_serializer = YearRoundRangeSerializer
     expr_op = "or"
+    batch_detect_enabled = False
 
     def gen_expr(self):
         comp = allowed_method[self.validated_config["method"]]
@@ -60,13 +60,17 @@ class BackendAssignMatchManager(AlertAssignMatchManager):
         if self.assign_mode is None or AssignMode.BY_RULE not in self.assign_mode:
             # 如果没有分派规则或者当前配置不需要分派的情况下，不做分派适配
             return matched_rules
-        for priority_id in AssignCacheManager.get_assign_priority_by_biz_id(self.bk_biz_id):
-            groups = AssignCacheManager.get_assign_groups_by_priority(self.bk_biz_id, priority_id)
-            group_rules = []
-            for group_id in groups:
-                group_rules.extend(AssignCacheManager.get_assign_rules_by_group(self.bk_biz_id, group_id))
-            for rule in group_rules:
-                rule_match_obj = AssignRuleMatch(rule, self.rule_snaps.get(str(rule["id"])), self.alert)
+        # 规则集合已按优先级排序并预编译条件，同一版本内进程级复用
+        ruleset = AssignCacheManager.get_compiled_ruleset(self.bk_biz_id)
+        for _priority, compiled_rules in ruleset.priority_rules:
+            for compiled_rule in compiled_rules:
+                # 规则对象在进程内共享，升级等流程会修改规则内容，这里需要浅拷贝
+                rule_match_obj = AssignRuleMatch(
+                    dict(compiled_rule.rule),
+                    self.rule_snaps.get(str(compiled_rule.rule_id)),
+                    self.alert,
+                    dimension_check=compiled_rule.dimension_check,
+                )
                 if rule_match_obj.is_matched(dimensions=self.dimensions):
                     matched_rules.append(rule_match_obj)
             if matched_rules:
@@ -8,11 +8,14 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import json
 import logging
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
 from django.conf import settings
+from django.db import close_old_connections
 
 from alarm_backends.core.cache import key
 from alarm_backends.core.control.item import Item
@@ -26,6 +29,7 @@ from alarm_backends.service.preparation.base import BasePreparationProcess
 from bkmonitor.models import AlgorithmModel
 from bkmonitor.models.strategy import QueryConfigModel
 from bkmonitor.strategy.new_strategy import QueryConfig
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.time_tools import (
     parse_time_compare_abbreviation,
     timestamp2datetime,
@@ -47,8 +51,27 @@ INIT_DEPEND_MAPPINGS = {
     AlgorithmModel.AlgorithmChoices.IntelligentDetect: api.aiops_sdk.kpi_init_depend,
 }
 
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """
+    获取进程内常驻的线程池，避免每个时间段重复创建
+    """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"preparation_{name}")
+        return _executors[name]
+
 
 class TsDependPreparationProcess(BasePreparationProcess):
+    """
+    历史依赖数据准备
+    按时间段从近到远流式拉取数据并推送到SDK，推送当前时间段的同时预加载下一个时间段
+    每个时间段全部推送成功后记录进度(时间游标)，任务重启或锁更新后从进度处继续，推送失败的时间段在下次任务中重试
+    """
+
     def __init__(self, *args, **kwargs) -> None:
         super().__init__()
         self.prepare_key = key.SERVICE_LOCK_PREPARATION
@@ -56,7 +79,6 @@ class TsDependPreparationProcess(BasePreparationProcess):
     def process(self, strategy_id: int, update_time: int = None, force: bool = False) -> None:
         logger.info(f"Start to refresh depend data for strategy({strategy_id})")
 
-        processed_dimensions = set()
         with refresh_service_lock(self.prepare_key, update_time, strategy_id=strategy_id):
             strategy = Strategy(strategy_id)
             query_config = strategy.config["items"][0]["query_configs"][0]
@@ -64,21 +86,60 @@ class TsDependPreparationProcess(BasePreparationProcess):
             if query_config.get("intelligent_detect") and query_config["intelligent_detect"].get("use_sdk", False):
                 # 历史依赖准备就绪才开始检测
                 if force or query_config["intelligent_detect"]["status"] == SDKDetectStatus.PREPARING:
-                    self.refresh_strategy_depend_data(strategy, processed_dimensions, update_time)
+                    # 强制刷新时不使用已有进度
+                    if force:
+                        self.clear_checkpoint(strategy_id)
+
+                    if not self.refresh_strategy_depend_data(strategy, update_time):
+                        logger.info(f"Interrupt to refresh depend data for strategy({strategy_id}), keep checkpoint")
+                        return
+
                     query_config = QueryConfig.from_models(QueryConfigModel.objects.filter(id=query_config["id"]))[0]
                     query_config.intelligent_detect["status"] = SDKDetectStatus.READY
                     query_config.save()
-                    logger.info(
-                        f"Finish to refresh depend data for strategy({strategy_id}),"
-                        f"total dimensions: {len(processed_dimensions)}"
-                    )
-
-    def refresh_strategy_depend_data(
-        self, strategy: Strategy, processed_dimensions: set, update_time: int = None
-    ) -> None:
+
+                    self.clear_checkpoint(strategy_id)
+                    logger.info(f"Finish to refresh depend data for strategy({strategy_id})")
+
+    @staticmethod
+    def load_checkpoint(strategy_id: int, algorithm_type: str, fingerprint: str) -> dict | None:
+        """
+        加载准备进度，策略查询或算法配置变更后进度失效
+        """
+        checkpoint_key = key.PREPARATION_DEPEND_CHECKPOINT_KEY
+        value = checkpoint_key.client.hget(
+            checkpoint_key.get_key(strategy_id=strategy_id), checkpoint_key.get_field(algorithm_type=algorithm_type)
+        )
+        if not value:
+            return None
+
+        checkpoint = json.loads(value)
+        if checkpoint.get("fingerprint") != fingerprint:
+            return None
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(strategy_id: int, checkpoint: dict) -> None:
+        checkpoint_key = key.PREPARATION_DEPEND_CHECKPOINT_KEY
+        name = checkpoint_key.get_key(strategy_id=strategy_id)
+        pipeline = checkpoint_key.client.pipeline(transaction=False)
+        pipeline.hset(
+            name, checkpoint_key.get_field(algorithm_type=checkpoint["algorithm_type"]), json.dumps(checkpoint)
+        )
+        pipeline.expire(name, checkpoint_key.ttl)
+        pipeline.execute()
+
+    @staticmethod
+    def clear_checkpoint(strategy_id: int) -> None:
+        key.PREPARATION_DEPEND_CHECKPOINT_KEY.client.delete(
+            key.PREPARATION_DEPEND_CHECKPOINT_KEY.get_key(strategy_id=strategy_id)
+        )
+
+    def refresh_strategy_depend_data(self, strategy: Strategy, update_time: int = None) -> bool:
         """根据同步信息，从Cache中获取策略的配置，并调用SDK初始化历史依赖数据.
 
         :param strategy: 策略
+        :return: 是否完成，被中断时返回False
         """
         logger.info(f"Start to init depend data for intelligent strategy({strategy.id})")
         item: Item = strategy.items[0]
@@ -97,26 +158,37 @@ class TsDependPreparationProcess(BasePreparationProcess):
             extra_config = {k: v for k, v in algorithm.get("config", {}).items() if k in EXTRA_CONFIG_KEYS}
             logger.info(f"Strategy({strategy.id}) extra_config: {extra_config}")
 
-            start_time, end_time = self.generate_depend_time_range(item)
+            fingerprint = count_md5({"query_configs": item.query_configs, "algorithm": algorithm})
+            checkpoint = self.load_checkpoint(strategy.id, algorithm_type, fingerprint)
+            if checkpoint:
+                logger.info(
+                    f"Resume to init depend data for intelligent strategy({strategy.id}) "
+                    f"from {timestamp2datetime(checkpoint['cursor'])}"
+                )
+            else:
+                start_time, end_time = self.generate_depend_time_range(item)
+                checkpoint = {
+                    "algorithm_type": algorithm_type,
+                    "fingerprint": fingerprint,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "cursor": end_time,
+                }
 
-            self.init_depend_data(
-                strategy, init_depend_api_func, start_time, end_time, processed_dimensions, update_time, extra_config
-            )
+            if not self.init_depend_data(strategy, init_depend_api_func, checkpoint, update_time, extra_config):
+                return False
 
             # 如果初始化完历史依赖后发现当前时间过长，则再添补刷新过程中的时间范围（如果超过12小时）
+            end_time = checkpoint["end_time"]
             latest_end_time = int(time.time())
             if latest_end_time - end_time >= 86400:
                 raise Exception(f"Init strategy({strategy.id}) depend data too long")
             if latest_end_time - end_time >= 3600:
-                self.init_depend_data(
-                    strategy,
-                    init_depend_api_func,
-                    latest_end_time,
-                    end_time,
-                    processed_dimensions,
-                    update_time,
-                    extra_config,
-                )
+                checkpoint.update(start_time=end_time, end_time=latest_end_time, cursor=latest_end_time)
+                if not self.init_depend_data(strategy, init_depend_api_func, checkpoint, update_time, extra_config):
+                    return False
+
+        return True
 
     def generate_depend_time_range(self, item: Item) -> tuple[int, int]:
         """根据配置生成历史依赖的开始时间和结束时间."""
@@ -126,99 +198,102 @@ class TsDependPreparationProcess(BasePreparationProcess):
         start_time = end_time + ts_depend_offset
         return start_time, end_time
 
+    @staticmethod
+    def fetch_item_records(item: Item, start_time: int, end_time: int) -> list[dict]:
+        """在常驻线程中查询数据，查询后释放线程持有的过期数据库连接"""
+        try:
+            return item.query_record(start_time, end_time)
+        finally:
+            close_old_connections()
+
     def init_depend_data(
         self,
         strategy: Strategy,
         init_depend_api_func: callable,
-        start_time: int,
-        end_time: int,
-        processed_dimensions: set,
+        checkpoint: dict,
         update_time: int = None,
         extra_config: dict = None,
-    ) -> None:
+    ) -> bool:
+        """
+        从进度游标处继续，按时间段从近到远初始化历史依赖数据
+
+        :param checkpoint: 准备进度，{"start_time": 开始时间, "end_time": 结束时间, "cursor": 已完成到的时间}
+        :return: 是否完成，被中断或推送失败时返回False
+        """
         item: Item = strategy.items[0]
+        start_time = checkpoint["start_time"]
+        fetch_executor = get_executor("fetch", max_workers=1)
 
         # 先查询5min估算大概数据量
         minute_step = 5
-        step_end_time = end_time
-        prefetch_results = {}
+        step_end_time = checkpoint["cursor"]
+        step_start_time = max(step_end_time - minute_step * 60, start_time)
+        fetch_future: Future | None = None
+        if start_time < step_end_time:
+            fetch_future = fetch_executor.submit(self.fetch_item_records, item, step_start_time, step_end_time)
 
         # 直到当前取数据的末尾时间超过实际时间，一直按照上一次数据量调整每次取数据的时间范围，根据上一次取数据的量
         # 1. 每次至少取5分钟的数据(DEPEND_DATA_MIN_FETCH_TIME_RANGE)
         # 2. 每次最多取30分钟的数据(DEPEND_DATA_MAX_FETCH_TIME_RANGE)
         # 3. 尽量保证每次取的数据不超过100万(DEPEND_DATA_MAX_FETCH_COUNT)，如果5分钟数据超过100万，则继续取5分钟的，
         #    （一般很少这种情况，如果出现，则该策略至少是一个超大维度组合的数据，这么配置告警策略其实也没法用）
-        while start_time < step_end_time:
-            # 如果历史依赖数据准备超过prepare key的ttl（默认一小时），也中断初始化任务
+        while fetch_future:
+            # 如果历史依赖数据准备超过prepare key的ttl（默认一小时），也中断初始化任务，进度保留给后续任务
             if check_lock_updated(self.prepare_key, update_time, strategy_id=strategy.id):
-                logger.warning("New event for update strategy({strategy.id}), interrupt current task now.")
-                break
+                logger.warning(f"New event for update strategy({strategy.id}), interrupt current task now.")
+                return False
 
-            step_start_time = max(step_end_time - minute_step * 60, start_time)
             logger.info(
-                f"Start to init depend data for intelligent strategy({strategy.id}) with time range({timestamp2datetime(step_start_time)} - {timestamp2datetime(step_end_time)})"
+                f"Start to init depend data for intelligent strategy({strategy.id}) with time range"
+                f"({timestamp2datetime(step_start_time)} - {timestamp2datetime(step_end_time)})"
             )
+            item_records = fetch_future.result()
 
-            # 如果预加载数据包含当前时间段，则直接使用预加载数据
-            if (step_start_time, step_end_time) in prefetch_results:
-                item_records = prefetch_results.pop((step_start_time, step_end_time), [])
-            else:
-                item_records = item.query_record(step_start_time, step_end_time)
-            step_end_time = step_start_time
-
+            # 根据实际数据量调整每次查询的时间范围
             if len(item_records) == 0:
                 minute_step = DEPEND_DATA_MAX_FETCH_TIME_RANGE
-                continue
-
-            # 根据实际数据量调整每次查询的时间范围
-            minute_step = max(
-                DEPEND_DATA_MIN_FETCH_TIME_RANGE, int(DEPEND_DATA_MAX_FETCH_COUNT / (len(item_records) / minute_step))
-            )
-            minute_step = min(minute_step, DEPEND_DATA_MAX_FETCH_TIME_RANGE)
-
-            tasks = []
-            with ThreadPoolExecutor(max_workers=2) as executor:
-                tasks.append(
-                    executor.submit(
-                        self.init_depend_data_by_records,
-                        strategy=strategy,
-                        init_depend_api_func=init_depend_api_func,
-                        strategy_records=item_records,
-                        processed_dimensions=processed_dimensions,
-                        extra_config=extra_config,
-                    )
+            else:
+                minute_step = max(
+                    DEPEND_DATA_MIN_FETCH_TIME_RANGE,
+                    int(DEPEND_DATA_MAX_FETCH_COUNT / (len(item_records) / minute_step)),
                 )
-                if start_time < step_end_time:
-                    tasks.append(
-                        executor.submit(
-                            self.prefetch_item_records,
-                            item=item,
-                            prefetch_results=prefetch_results,
-                            start_time=max(step_end_time - minute_step * 60, start_time),
-                            end_time=step_end_time,
-                        )
-                    )
-
-            as_completed(tasks)
-
-    def prefetch_item_records(self, item: Item, prefetch_results: dict, start_time: int, end_time: int):
-        """预加载查询结果
-
-        :param item: 策略项
-        :param prefetch_results: 预加载结果集
-        :param start_time: 开始时间
-        :param end_time: 结束时间
-        """
-        prefetch_results[(start_time, end_time)] = item.query_record(start_time, end_time)
+                minute_step = min(minute_step, DEPEND_DATA_MAX_FETCH_TIME_RANGE)
+
+            # 推送当前时间段的同时，预加载下一个时间段
+            step_end_time, fetch_future = step_start_time, None
+            if start_time < step_end_time:
+                step_start_time = max(step_end_time - minute_step * 60, start_time)
+                fetch_future = fetch_executor.submit(self.fetch_item_records, item, step_start_time, step_end_time)
+
+            if item_records and not self.init_depend_data_by_records(
+                strategy=strategy,
+                init_depend_api_func=init_depend_api_func,
+                strategy_records=item_records,
+                extra_config=extra_config,
+            ):
+                # 推送失败时不推进进度，下次任务从该时间段重新推送
+                logger.warning(f"Init depend data for strategy({strategy.id}) failed, keep checkpoint")
+                return False
+            del item_records
+
+            # 当前时间段推送完成，记录进度
+            checkpoint["cursor"] = step_end_time
+            self.save_checkpoint(strategy.id, checkpoint)
+
+        return True
 
     def init_depend_data_by_records(
         self,
         strategy: Strategy,
         init_depend_api_func: callable,
         strategy_records: list[dict],
-        processed_dimensions: set,
         extra_config: dict = None,
-    ) -> None:
+    ) -> bool:
+        """
+        按维度分组并发推送历史依赖数据
+
+        :return: 是否全部推送成功
+        """
         item: Item = strategy.items[0]
         extra_config = extra_config or {}
 
@@ -253,40 +328,54 @@ class TsDependPreparationProcess(BasePreparationProcess):
                 }
             )
 
-        tasks = []
-        with ThreadPoolExecutor(max_workers=settings.AIOPS_SDK_INIT_CONCURRENCY) as executor:
-            init_data = []
-            for dimensions_key, series_info in depend_data_by_dimensions.items():
-                series_info["dimensions"]["strategy_id"] = strategy.id
-                init_data.append(
-                    {
-                        "data": series_info["data"],
-                        "dimensions": series_info["dimensions"],
-                        "partition": series_info["data"][0]["timestamp"],
-                    }
-                )
-
-                if len(init_data) >= DEPEND_DATA_MAX_INIT_COUNT:
-                    # 将 extra_config 中的控制参数放入 serving_config 传递给 API
-                    serving_config = {
-                        "grey_to_bkfara": extra_config.get("grey_to_bkfara", False),
-                        "service_name": extra_config.get("service_name", "default"),
-                    }
-                    tasks.append(
-                        executor.submit(init_depend_api_func, dependency_data=init_data, serving_config=serving_config)
-                    )
-                    init_data = []
-
-                processed_dimensions.add(dimensions_key)
-
-            if len(init_data) > 0:
-                # 将 extra_config 中的控制参数放入 serving_config 传递给 API
-                serving_config = {
-                    "grey_to_bkfara": extra_config.get("grey_to_bkfara", False),
-                    "service_name": extra_config.get("service_name", "default"),
+        # 将 extra_config 中的控制参数放入 serving_config 传递给 API
+        serving_config = {
+            "grey_to_bkfara": extra_config.get("grey_to_bkfara", False),
+            "service_name": extra_config.get("service_name", "default"),
+        }
+        executor = get_executor("init", max_workers=settings.AIOPS_SDK_INIT_CONCURRENCY)
+        max_inflight_series = max(settings.AIOPS_SDK_INIT_MAX_INFLIGHT_SERIES, DEPEND_DATA_MAX_INIT_COUNT)
+        # 在途批次 -> 序列数
+        pending: dict[Future, int] = {}
+        errors: list[BaseException] = []
+
+        def wait_pending(return_when):
+            done, _ = wait(list(pending), return_when=return_when)
+            for future in done:
+                pending.pop(future)
+                if future.exception():
+                    errors.append(future.exception())
+                    logger.warning(f"Init depend data for strategy({strategy.id}) failed: {future.exception()}")
+
+        def submit(init_data: list[dict]):
+            # 在途序列数超过上限时，等待已提交的批次完成，限制内存占用
+            while pending and sum(pending.values()) + len(init_data) > max_inflight_series:
+                wait_pending(FIRST_COMPLETED)
+
+            future = executor.submit(init_depend_api_func, dependency_data=init_data, serving_config=serving_config)
+            pending[future] = len(init_data)
+
+        init_data = []
+        # 已有批次推送失败时，该时间段需要整体重试，不再提交剩余批次
+        while depend_data_by_dimensions and not errors:
+            # 提交后即从分组中移除，序列数据在推送完成后释放
+            _, series_info = depend_data_by_dimensions.popitem()
+            series_info["dimensions"]["strategy_id"] = strategy.id
+            init_data.append(
+                {
+                    "data": series_info["data"],
+                    "dimensions": series_info["dimensions"],
+                    "partition": series_info["data"][0]["timestamp"],
                 }
-                tasks.append(
-                    executor.submit(init_depend_api_func, dependency_data=init_data, serving_config=serving_config)
-                )
+            )
+
+            if len(init_data) >= DEPEND_DATA_MAX_INIT_COUNT:
+                submit(init_data)
+                init_data = []
+
+        if init_data and not errors:
+            submit(init_data)
 
-        as_completed(tasks)
+        if pending:
+            wait_pending(ALL_COMPLETED)
+        return not errors
@@ -21,7 +21,7 @@ from alarm_backends.core.cache.mail_report import MailReportCacheManager
 from alarm_backends.service.report.render.dashboard import (
     RenderDashboardConfig,
     generate_dashboard_url,
-    render_dashboard_panel,
+    get_dashboard_renderer,
 )
 from alarm_backends.service.report.tasks import render_mails
 from bkm_space.define import SpaceTypeEnum
@@ -92,10 +92,8 @@ async def start_tasks(elements):
     }
     :return: [(element, err_msg)]
     """
-    result = []
-    for element in elements:
-        err_msg = None
-        config = RenderDashboardConfig(
+    configs = [
+        RenderDashboardConfig(
             bk_tenant_id=element["bk_tenant_id"],
             bk_biz_id=element["bk_biz_id"],
             dashboard_uid=element["dashboard_uid"],
@@ -108,10 +106,19 @@ async def start_tasks(elements):
             start_time=element["start_time"] // 1000,
             end_time=element["end_time"] // 1000,
         )
-        try:
-            img = await render_dashboard_panel(config)
-        except Exception as e:
-            err_msg = {"tag": element["tag"], "exception_msg": str(e)}
+        for element in elements
+    ]
+
+    # 使用页面池并发渲染，相同的图表只渲染一次
+    images = await get_dashboard_renderer().render_many(configs)
+
+    result = []
+    for element, config, img in zip(elements, configs, images):
+        err_msg = None
+        if isinstance(img, Exception):
+            logger.warning(f"fetch_images_by_puppeteer: render({element['tag']}) failed: {img}")
+            err_msg = {"tag": element["tag"], "exception_msg": str(img)}
+            result.append((element, err_msg))
             continue
 
         element["base64"] = base64.b64encode(img).decode("utf-8")
@@ -1,6 +1,8 @@
+import asyncio
 import logging
 import os
 import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from urllib.parse import quote
 
@@ -86,9 +88,15 @@ def generate_dashboard_url(config: RenderDashboardConfig, external: bool = False
     return url
 
 
-async def render_dashboard_panel(config: RenderDashboardConfig, timeout: int = 60) -> bytes:
+# 图表渲染动画等待时间，单位秒
+PANEL_ANIMATION_WAIT = 2
+# 浏览器侧轮询图表加载状态的间隔，单位毫秒
+PANEL_RENDER_POLLING = 200
+
+
+async def render_on_page(page: Page, config: RenderDashboardConfig, timeout: int = 60) -> bytes:
     """
-    渲染仪表盘面板
+    使用指定页面渲染仪表盘面板，页面可复用
     :param timeout: 等待仪表盘加载完成的时间，单位秒
     """
     # 检查像素比
@@ -99,14 +107,10 @@ async def render_dashboard_panel(config: RenderDashboardConfig, timeout: int = 6
     url = generate_dashboard_url(config)
     logger.info(f"fetch_images_by_puppeteer: render dashboard url: {url}")
 
-    # 获取浏览器
-    browser: Browser = await get_browser()
-    # 打开仪表盘链接，等待网络请求完成
-    page = await browser.newPage()
-
     # 设置租户信息
     await page.setExtraHTTPHeaders({"X-BK-TENANT-ID": config.bk_tenant_id})
 
+    # 打开仪表盘链接，等待网络请求完成
     try:
         await page.goto(url, {"waitUntil": "networkidle0", "timeout": timeout * 1000})
     except TimeoutError:
@@ -136,44 +140,197 @@ async def render_dashboard_panel(config: RenderDashboardConfig, timeout: int = 6
     if config.transparent:
         await page.evaluate("document.body.style.setProperty('background-color', 'transparent', 'important');")
 
-    # 等待2秒，等待图表渲染动画完成
-    time.sleep(2)
+    # 等待图表渲染动画完成，不阻塞事件循环中的其他渲染
+    await asyncio.sleep(PANEL_ANIMATION_WAIT)
 
-    # 等待图表渲染动画完成
+    # 等待图表加载完成
     await wait_for_panel_render(page, timeout=timeout)
 
     # 截图
     target = await page.querySelector(content_selector)
     if not target:
         raise CustomError(message="screenshot target not found")
-    image = await target.screenshot(
+    return await target.screenshot(
         type=config.image_format, quality=config.image_quality, omitBackground=config.transparent
     )
 
-    # 关闭页面
-    try:
-        await page.close()
-    except Exception as e:
-        logger.exception(f"[render_dashboard_panel] close page error: {e}")
 
-    return image
+async def render_dashboard_panel(config: RenderDashboardConfig, timeout: int = 60) -> bytes:
+    """
+    渲染仪表盘面板
+    :param timeout: 等待仪表盘加载完成的时间，单位秒
+    """
+    # 获取浏览器
+    browser: Browser = await get_browser()
+    page = await browser.newPage()
+
+    try:
+        return await render_on_page(page, config, timeout=timeout)
+    finally:
+        # 关闭页面
+        try:
+            await page.close()
+        except Exception as e:
+            logger.exception(f"[render_dashboard_panel] close page error: {e}")
 
 
 async def wait_for_panel_render(page: Page, timeout: int = 60):
     """
     等待仪表盘加载完成
+    由浏览器侧轮询加载条，超时后不报错，直接截图
+    """
+    try:
+        await page.waitForFunction(
+            "() => document.querySelectorAll('[aria-label=\"Panel loading bar\"]').length === 0",
+            {"timeout": timeout * 1000, "polling": PANEL_RENDER_POLLING},
+        )
+    except TimeoutError:
+        logger.warning(f"[wait_for_panel_render] wait for panel render timeout({timeout}s)")
+
+
+class DashboardRenderer:
+    """
+    仪表盘并发渲染器
+    1. 复用常驻浏览器，维护有界的页面池，渲染完成的页面归还后复用
+    2. 相同的渲染(链接及截图参数一致)只执行一次，进行中的渲染合并等待，结果短暂缓存供其他订阅复用
     """
-    start_time = time.time()
-    while True:
-        # 获取等待加载的panel数量
-        waiting_panel_count = await page.evaluate(
-            "() => { return document.querySelectorAll('[aria-label=\"Panel loading bar\"]').length }"
+
+    def __init__(self, concurrency: int = 4, result_ttl: int = 300, result_cache_size: int = 64):
+        self.concurrency = max(concurrency, 1)
+        self.result_ttl = result_ttl
+        self.result_cache_size = result_cache_size
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._browser: Browser | None = None
+        self._idle_pages: list[Page] = []
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        self._results: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+
+    @staticmethod
+    def get_render_key(config: RenderDashboardConfig) -> tuple:
+        return (
+            config.bk_tenant_id,
+            generate_dashboard_url(config),
+            config.width,
+            config.height,
+            min(config.scale, 4),
+            config.with_panel_title,
+            config.image_format,
+            config.image_quality,
+            config.transparent,
         )
-        if waiting_panel_count == 0:
-            break
 
-        if time.time() - start_time > timeout:
+    def _bind_loop(self):
+        """
+        页面、信号量等均与事件循环绑定，事件循环变化时重置
+        """
+        loop = asyncio.get_event_loop()
+        if loop is self._loop:
             return
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._browser = None
+        self._idle_pages = []
+        self._inflight = {}
+
+    def _get_result(self, key: tuple) -> bytes | None:
+        result = self._results.get(key)
+        if not result:
+            return None
+        if time.time() - result[0] > self.result_ttl:
+            self._results.pop(key, None)
+            return None
+        return result[1]
+
+    def _set_result(self, key: tuple, image: bytes):
+        self._results[key] = (time.time(), image)
+        self._results.move_to_end(key)
+        while len(self._results) > self.result_cache_size:
+            self._results.popitem(last=False)
+
+    async def _acquire_page(self) -> Page:
+        browser: Browser = await get_browser()
+        if browser is not self._browser:
+            # 浏览器重启后，旧页面均已失效
+            self._browser = browser
+            self._idle_pages = []
+
+        while self._idle_pages:
+            page = self._idle_pages.pop()
+            if not page.isClosed():
+                return page
+        return await browser.newPage()
+
+    async def _release_page(self, page: Page, reusable: bool):
+        if reusable and not page.isClosed() and len(self._idle_pages) < self.concurrency:
+            self._idle_pages.append(page)
+            return
+
+        # 渲染失败的页面状态未知，直接关闭
+        try:
+            await page.close()
+        except Exception as e:
+            logger.exception(f"[DashboardRenderer] close page error: {e}")
+
+    async def _render(self, key: tuple, config: RenderDashboardConfig, timeout: int) -> bytes:
+        async with self._semaphore:
+            page = await self._acquire_page()
+            reusable = False
+            try:
+                image = await render_on_page(page, config, timeout=timeout)
+                reusable = True
+            finally:
+                await self._release_page(page, reusable)
 
-        # 等待图表渲染动画完成
-        time.sleep(1)
+        self._set_result(key, image)
+        return image
+
+    async def render(self, config: RenderDashboardConfig, timeout: int = 60) -> bytes:
+        """
+        渲染仪表盘面板，相同的渲染合并为一次
+        """
+        self._bind_loop()
+        key = self.get_render_key(config)
+
+        image = self._get_result(key)
+        if image is not None:
+            return image
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(key, config, timeout))
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._inflight.pop(key, None))
+
+        # 单个等待方取消时，不影响其他合并等待的渲染
+        return await asyncio.shield(future)
+
+    async def render_many(self, configs: list[RenderDashboardConfig], timeout: int = 60) -> list[bytes | Exception]:
+        """
+        并发渲染多个仪表盘面板，返回与配置一一对应的图片或异常
+        """
+        return await asyncio.gather(
+            *[self.render(config, timeout=timeout) for config in configs], return_exceptions=True
+        )
+
+    async def close(self):
+        """
+        关闭页面池中的页面
+        """
+        pages, self._idle_pages = self._idle_pages, []
+        for page in pages:
+            await self._release_page(page, reusable=False)
+
+
+_renderer: DashboardRenderer | None = None
+
+
+def get_dashboard_renderer() -> DashboardRenderer:
+    """
+    获取进程内共享的仪表盘渲染器，与浏览器一样常驻进程
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = DashboardRenderer(concurrency=settings.MAIL_REPORT_RENDER_CONCURRENCY)
+    return _renderer
@@ -23,6 +23,7 @@ from alarm_backends.service.report.render.dashboard import (
     render_dashboard_panel,
 )
 from alarm_backends.service.scheduler.app import app
+from alarm_backends.service.selfmonitor.collect.queue import QueueMetricCollectReport
 from alarm_backends.service.selfmonitor.collect.redis import RedisMetricCollectReport
 from alarm_backends.service.selfmonitor.collect.transfer import TransferMetricHelper
 from bkmonitor.browser import get_or_create_eventloop
@@ -277,6 +278,7 @@ def collect_redis_metric():
     if seq > 0:
         run_collect_redis_metric.apply_async(kwargs={"seq": seq}, countdown=collector_interval)
     RedisMetricCollectReport().collect_redis_metric_data()
+    QueueMetricCollectReport().collect_queue_metric_data()
 
 
 @app.task(ignore_result=True, queue="celery_report_cron")
@@ -286,6 +288,7 @@ def run_collect_redis_metric(seq):
     if seq > 0:
         run_collect_redis_metric.apply_async(kwargs={"seq": seq}, countdown=collector_interval)
     RedisMetricCollectReport().collect_redis_metric_data()
+    QueueMetricCollectReport().collect_queue_metric_data()
 
 
 @app.task(ignore_result=True, queue="celery_report_cron")
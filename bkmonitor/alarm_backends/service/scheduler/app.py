@@ -106,6 +106,8 @@ def rabbitmq_conf():
 
         # worker并发数
         worker_concurrency = int(getattr(settings, "CELERY_WORKERS", 0)) or default_celery_worker_num()
+        # 按队列积压及任务耗时自动扩缩容，需启动 worker 时指定 --autoscale=max,min
+        worker_autoscaler = "alarm_backends.service.scheduler.autoscale:BacklogAutoscaler"
 
         # 使用pickle序列化任务
         task_serializer = "pickle"
@@ -0,0 +1,210 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+import math
+from time import monotonic
+
+from celery.worker import state
+from celery.worker.autoscale import AUTOSCALE_KEEPALIVE, Autoscaler
+from django.conf import settings
+
+logger = logging.getLogger("celery")
+
+
+class BacklogScalingPolicy:
+    """
+    基于队列积压及任务耗时计算目标并发数
+    目标并发 = 在期望时间(target_latency)内消化当前积压所需的进程数，限制在 [min, max] 之间
+    扩容立即生效；缩容需距上次扩容超过 keepalive，且每次最多缩减一半，避免抖动
+    """
+
+    def __init__(self, min_concurrency, max_concurrency, target_latency=30, keepalive=30, smoothing=0.3):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.keepalive = keepalive
+        # 任务耗时的指数加权平均系数
+        self.smoothing = smoothing
+        self.avg_duration = None
+        self._last_scale_up = None
+
+    def observe(self, completed, busy, elapsed):
+        """
+        根据统计周期内完成的任务数及忙碌进程数估算单个任务的平均耗时
+        """
+        if completed <= 0 or busy <= 0 or elapsed <= 0:
+            return
+
+        duration = busy * elapsed / completed
+        if self.avg_duration is None:
+            self.avg_duration = duration
+        else:
+            self.avg_duration = self.smoothing * duration + (1 - self.smoothing) * self.avg_duration
+
+    def get_target(self, backlog, processes, now):
+        """
+        :param backlog: 积压任务数(含已预取未完成的任务)
+        :param processes: 当前进程数
+        :param now: 当前时间(单调时间)
+        """
+        if self.avg_duration is None:
+            # 尚无耗时统计时按积压数量扩容，与 celery 默认策略一致
+            need = backlog
+        else:
+            need = math.ceil(backlog * self.avg_duration / self.target_latency)
+        target = min(max(need, self.min_concurrency), self.max_concurrency)
+
+        if target > processes:
+            self._last_scale_up = now
+            return target
+
+        if target < processes:
+            if self._last_scale_up is not None and now - self._last_scale_up <= self.keepalive:
+                return processes
+            return processes - math.ceil((processes - target) / 2)
+
+        return processes
+
+
+class BacklogAutoscaler(Autoscaler):
+    """
+    按 broker 队列积压及任务耗时扩缩容的 celery autoscaler
+    启动 worker 时指定 --autoscale=max,min 生效，可通过 CELERY_AUTOSCALE_QUEUE_CONFIG 按队列覆盖并发上下限
+    """
+
+    # 队列积压检查间隔(秒)，maybe_scale 在每次收到任务时也会被调用，需要限频
+    check_interval = 10
+
+    def __init__(
+        self, pool, max_concurrency, min_concurrency=0, worker=None, keepalive=AUTOSCALE_KEEPALIVE, mutex=None
+    ):
+        super().__init__(pool, max_concurrency, min_concurrency, worker=worker, keepalive=keepalive, mutex=mutex)
+        self.queue_names = self.get_queue_names()
+
+        self.queue_config = queue_config = self.get_queue_config()
+        self.max_concurrency = queue_config.get("max", self.max_concurrency)
+        self.min_concurrency = queue_config.get("min", self.min_concurrency)
+        self.policy = BacklogScalingPolicy(
+            self.min_concurrency,
+            self.max_concurrency,
+            target_latency=queue_config.get("target_latency", settings.CELERY_AUTOSCALE_TARGET_LATENCY),
+            keepalive=self.keepalive,
+        )
+
+        self._last_check = monotonic()
+        self._last_total_count = state.all_total_count[0]
+        self._queue_depth = 0
+
+    def get_queue_names(self) -> list[str]:
+        if self.worker is None:
+            return []
+        return list(self.worker.app.amqp.queues.consume_from or self.worker.app.amqp.queues)
+
+    def get_queue_config(self) -> dict:
+        """
+        取 worker 所消费队列中首个有配置的队列
+        """
+        queue_config = getattr(settings, "CELERY_AUTOSCALE_QUEUE_CONFIG", {})
+        for queue_name in self.queue_names:
+            if queue_name in queue_config:
+                return queue_config[queue_name]
+        return {}
+
+    def get_queue_depth(self) -> int:
+        """
+        查询 broker 中未被消费的任务数，按队列的消费者数量分摊到当前 worker，查询失败时沿用上一次的结果
+        多个 worker 消费同一队列时，每个 worker 只需按比例消化积压，避免各 worker 同时按全部积压扩容
+        """
+        if not self.queue_names:
+            return 0
+
+        try:
+            queues = self.worker.app.amqp.queues
+            queue_depth = 0
+            with self.worker.app.connection_for_read() as connection:
+                channel = connection.default_channel
+                for queue_name in self.queue_names:
+                    result = queues[queue_name].bind(channel).queue_declare(passive=True)
+                    # 部分 broker(如 redis) 不返回消费者数量，此时按队列配置的消费者数量分摊
+                    consumers = result.consumer_count or self.queue_config.get("consumers", 1)
+                    queue_depth += math.ceil(result.message_count / max(consumers, 1))
+            self._queue_depth = queue_depth
+        except Exception as e:
+            logger.warning(f"[autoscale] get queue({self.queue_names}) depth failed: {e}")
+        return self._queue_depth
+
+    def _maybe_scale(self, req=None):
+        now = monotonic()
+        elapsed = now - self._last_check
+        if elapsed < self.check_interval:
+            return
+        self._last_check = now
+
+        total_count = state.all_total_count[0]
+        self.policy.observe(total_count - self._last_total_count, len(state.active_requests), elapsed)
+        self._last_total_count = total_count
+
+        procs = self.processes
+        backlog = self.get_queue_depth() + self.qty
+        target = self.policy.get_target(backlog, procs, now)
+        if target == procs:
+            return
+
+        logger.info(
+            f"[autoscale] queue({self.queue_names}) backlog({backlog}) "
+            f"avg_duration({self.policy.avg_duration}) processes: {procs} -> {target}"
+        )
+        if target > procs:
+            self._last_scale_up = now
+            self._grow(target - procs)
+        else:
+            self._shrink(procs - target)
+        return True
+
+    def update(self, max=None, min=None):
+        result = super().update(max=max, min=min)
+        self.policy.max_concurrency = self.max_concurrency
+        self.policy.min_concurrency = self.min_concurrency
+        return result
+
+
+def replay_queue_trace(trace, policy, interval=10, initial_processes=None) -> dict:
+    """
+    回放队列轨迹，模拟扩缩容策略的效果
+    :param trace: 每个统计周期的队列数据 [{"arrivals": 新增任务数, "duration": 单个任务耗时(秒)}]，
+        可由队列积压及任务耗时指标整理得到
+    :param policy: 扩缩容策略，需实现 observe 及 get_target
+    :param interval: 统计周期(秒)
+    :param initial_processes: 初始进程数，默认为策略的并发下限
+    :return: 积压峰值、最大等待时间、进程占用时间(进程数 * 秒)及各周期的进程数
+    """
+    processes = policy.min_concurrency if initial_processes is None else initial_processes
+    backlog = 0.0
+    result = {"peak_backlog": 0, "max_wait": 0, "process_seconds": 0, "processes": []}
+
+    for step, point in enumerate(trace):
+        duration = point["duration"]
+        backlog += point["arrivals"]
+
+        # 周期内各进程持续处理积压任务
+        completed = min(backlog, processes * interval / duration)
+        backlog -= completed
+        policy.observe(completed, completed * duration / interval, interval)
+
+        result["peak_backlog"] = max(result["peak_backlog"], backlog)
+        if backlog:
+            result["max_wait"] = max(result["max_wait"], backlog * duration / max(processes, 1))
+        result["process_seconds"] += processes * interval
+        result["processes"].append(processes)
+
+        processes = policy.get_target(math.ceil(backlog), processes, (step + 1) * interval)
+
+    return result
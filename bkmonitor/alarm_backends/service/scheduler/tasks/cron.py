@@ -16,8 +16,10 @@ import time
 from celery.schedules import crontab
 from django.conf import settings
 from django.utils.module_loading import import_string
+from redis.exceptions import ResponseError
 
 from alarm_backends.core.cluster import get_cluster
+from alarm_backends.core.storage.redis import Cache
 from alarm_backends.service.scheduler.app import periodic_task
 from core.prometheus import metrics
 
@@ -53,7 +55,83 @@ def task_duration(task_name, queue_name=None):
     return wrapper
 
 
-def _get_func(module_path, queue=None):
+# 锁仍由当前执行持有时刷新过期时间，锁已过期时重新加锁，已被其他执行持有时返回空
+REFRESH_LOCK_SCRIPT = """
+local token = redis.call("GET", KEYS[1])
+if token == ARGV[1] or not token then
+    return redis.call("SET", KEYS[1], ARGV[1], "EX", ARGV[2])
+end
+return nil
+"""
+
+# 只删除 token 与当前执行一致的锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def refresh_lock(client, lock_key, token, ttl) -> bool:
+    try:
+        return bool(client.eval(REFRESH_LOCK_SCRIPT, 1, lock_key, token, ttl))
+    except ResponseError:
+        # 后端不支持 lua 脚本时，退化为先比较再设置
+        if client.get(lock_key) == token:
+            return bool(client.set(lock_key, token, ex=ttl, xx=True))
+        return bool(client.set(lock_key, token, ex=ttl, nx=True))
+
+
+def release_lock(client, lock_key, token):
+    try:
+        return client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+    except ResponseError:
+        if client.get(lock_key) == token:
+            return client.delete(lock_key)
+        return 0
+
+
+def skip_overlapping(task_name, ttl, queue_name=None):
+    """
+    上一次执行尚未结束时跳过本次执行，并标记待执行
+    上一次执行结束后检查标记，将期间跳过的多次执行合并为一次补偿执行
+    """
+
+    def wrapper(_func):
+        @functools.wraps(_func)
+        def _inner(*args, **kwargs):
+            token = str(time.time())
+            lock_key = f"{get_cluster().name}_cron_task_running_{task_name}"
+            pending_key = f"{lock_key}_pending"
+            client = Cache("service-lock")
+            if not client.set(lock_key, token, ex=ttl, nx=True):
+                client.set(pending_key, token, ex=ttl)
+                logger.info("-[Cron Task](%s) previous run is still running, skip", task_name)
+                metrics.CRON_TASK_SKIPPED_COUNT.labels(task_name=task_name, queue=queue_name).inc()
+                metrics.report_all()
+                return
+
+            try:
+                while True:
+                    result = _func(*args, **kwargs)
+                    if not client.delete(pending_key):
+                        return result
+                    # 执行期间有被跳过的调度，刷新锁后补偿执行一次
+                    # 执行超过锁过期时间后，锁可能已被新的执行持有，此时由新的执行处理，不再补偿
+                    if not refresh_lock(client, lock_key, token, ttl):
+                        logger.info("-[Cron Task](%s) lock is held by another run, skip coalesced runs", task_name)
+                        return result
+                    logger.info("^[Cron Task](%s) run coalesced skipped runs", task_name)
+            finally:
+                release_lock(client, lock_key, token)
+
+        return _inner
+
+    return wrapper
+
+
+def _get_func(module_path, queue=None, lock_ttl=None):
     def _inner_func(*args, **kwargs):
         try:
             process_func = import_string(module_path)
@@ -61,7 +139,10 @@ def _get_func(module_path, queue=None):
         except ImportError:
             process_func = import_string("%s.main" % module_path)
 
-        return task_duration(module_path, queue)(process_func)(*args, **kwargs)
+        process_func = task_duration(module_path, queue)(process_func)
+        if lock_ttl:
+            process_func = skip_overlapping(module_path, lock_ttl, queue)(process_func)
+        return process_func(*args, **kwargs)
 
     return _inner_func
 
@@ -94,13 +175,15 @@ for queue, crontab_tasks in queue_define.items():
 
         func_name = str(module_name.replace(".", "_"))
         cron_list = cron_expr.split()
-        func = _get_func(module_name, queue=queue)
-        func.__name__ = func_name
         run_every = crontab(*cron_list)
+        # 超时范围: 5m-1h
+        expires = min(3600, max(get_interval(run_every), 300))
+        # 运行锁过期时间与任务超时一致，避免异常退出后锁无法释放
+        func = _get_func(module_name, queue=queue, lock_ttl=expires if settings.CRON_TASK_SKIP_OVERLAPPING else None)
+        func.__name__ = func_name
         locals()[func_name] = periodic_task(
             run_every=run_every,
             ignore_result=True,
             queue=queue,
-            # 超时范围: 5m-1h
-            expires=min(3600, max(get_interval(run_every), 300)),
+            expires=expires,
         )(func)
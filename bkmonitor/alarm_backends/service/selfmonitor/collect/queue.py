@@ -0,0 +1,192 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import json
+import logging
+import time
+from collections import defaultdict
+
+from alarm_backends.core.cache import key
+from alarm_backends.core.cache.strategy import StrategyCacheManager
+from alarm_backends.core.cluster import get_cluster
+from alarm_backends.core.storage.redis_cluster import get_node_by_strategy_id
+from bkmonitor.models import CacheNode
+from bkmonitor.utils.common_utils import chunks
+from constants.action import ActionPluginType
+from core.prometheus import metrics
+
+logger = logging.getLogger("self_monitor")
+
+
+class QueueMetricCollectReport:
+    """
+    告警后台 redis 队列积压采集
+    按节点统计各类队列的 key 数量、数据总量及队头(最早入队)数据的等待时长
+    队列 key 由策略缓存、事件信号及动作类型推算得到，直接读取，不扫描 redis 的 keyspace
+    """
+
+    QUEUE_KEYS = [
+        key.EVENT_LIST_KEY,
+        key.DATA_LIST_KEY,
+        key.DATA_SIGNAL_KEY,
+        key.NO_DATA_LIST_KEY,
+        key.ANOMALY_LIST_KEY,
+        key.ANOMALY_SIGNAL_KEY,
+        key.FTA_ACTION_LIST_KEY,
+    ]
+    # 单次 pipeline 查询的 key 数量
+    BATCH_SIZE = 1000
+    # 策略相关队列 key 的刷新间隔(秒)，避免每次采集都读取全部策略
+    STRATEGY_KEYS_REFRESH_INTERVAL = 5 * 60
+    # 数据中记录时间的字段，优先取各模块的入队时间
+    TIME_FIELDS = ("detect_time", "access_time", "time")
+
+    _strategy_keys = None
+    _strategy_keys_refresh_time = 0
+
+    def __init__(self):
+        self.cluster_name = get_cluster().name
+
+    @staticmethod
+    def get_queue_name(queue_key) -> str:
+        """
+        队列名，取 key 模板中变量之前的部分，如 access.data.{strategy_id}.{item_id} -> access.data
+        """
+        return queue_key.key_tpl.split(".{", 1)[0]
+
+    @classmethod
+    def get_strategy_keys(cls) -> dict:
+        """
+        按策略及监控项推算数据、无数据及异常队列的 key
+        """
+        now = time.time()
+        is_expired = now - cls._strategy_keys_refresh_time >= cls.STRATEGY_KEYS_REFRESH_INTERVAL
+        if cls._strategy_keys is not None and not is_expired:
+            return cls._strategy_keys
+
+        nodata_strategy_ids = set(map(int, StrategyCacheManager.get_nodata_strategy_ids()))
+        strategy_keys = defaultdict(list)
+        for strategy_ids in chunks(StrategyCacheManager.get_strategy_ids(), cls.BATCH_SIZE):
+            for strategy in StrategyCacheManager.get_strategy_by_ids(strategy_ids):
+                strategy_id = strategy["id"]
+                for item in strategy.get("items", []):
+                    params = {"strategy_id": strategy_id, "item_id": item["id"]}
+                    strategy_keys[key.DATA_LIST_KEY].append(key.DATA_LIST_KEY.get_key(**params))
+                    strategy_keys[key.ANOMALY_LIST_KEY].append(key.ANOMALY_LIST_KEY.get_key(**params))
+                    if strategy_id in nodata_strategy_ids:
+                        strategy_keys[key.NO_DATA_LIST_KEY].append(key.NO_DATA_LIST_KEY.get_key(**params))
+
+        cls._strategy_keys = strategy_keys
+        cls._strategy_keys_refresh_time = now
+        return strategy_keys
+
+    def get_queue_keys(self) -> dict:
+        """
+        获取各类队列的 key 列表
+        """
+        queue_keys = {
+            key.DATA_SIGNAL_KEY: [key.DATA_SIGNAL_KEY.get_key()],
+            key.ANOMALY_SIGNAL_KEY: [key.ANOMALY_SIGNAL_KEY.get_key()],
+            key.FTA_ACTION_LIST_KEY: [
+                key.FTA_ACTION_LIST_KEY.get_key(action_type=action_type)
+                for action_type in ActionPluginType.PLUGIN_TYPE_DICT
+            ],
+        }
+
+        # 事件队列按信号中待处理的数据ID推算
+        data_ids = key.EVENT_SIGNAL_KEY.client.smembers(key.EVENT_SIGNAL_KEY.get_key())
+        queue_keys[key.EVENT_LIST_KEY] = [key.EVENT_LIST_KEY.get_key(data_id=data_id) for data_id in data_ids]
+
+        queue_keys.update(self.get_strategy_keys())
+        return queue_keys
+
+    @classmethod
+    def get_item_time(cls, raw_data) -> float | None:
+        """
+        解析队列数据的时间，无法解析时返回 None
+        """
+        try:
+            data = json.loads(raw_data)
+        except (TypeError, ValueError):
+            return None
+
+        if not isinstance(data, dict):
+            return None
+        if isinstance(data.get("data"), dict):
+            data = data["data"]
+
+        for field in cls.TIME_FIELDS:
+            value = data.get(field)
+            if isinstance(value, int | float) and value > 0:
+                # 兼容毫秒时间戳
+                return value / 1000 if value > 10**12 else value
+        return None
+
+    def get_queue_info(self, client, keys: list, now: float) -> dict:
+        """
+        统计单个节点上单类队列的积压情况
+        """
+        info = {"key_count": 0, "length": 0, "head_age": 0}
+        for batch_keys in chunks(keys, self.BATCH_SIZE):
+            # 队列左进右出，队头为最右侧的数据
+            pipeline = client.pipeline(transaction=False)
+            for k in batch_keys:
+                pipeline.llen(k)
+                pipeline.lindex(k, -1)
+            results = pipeline.execute(raise_on_error=False)
+
+            for length, head in zip(results[::2], results[1::2]):
+                # 非 list 类型的 key 会返回错误，忽略
+                if not isinstance(length, int) or not length:
+                    continue
+                info["key_count"] += 1
+                info["length"] += length
+
+                head_time = self.get_item_time(head)
+                if head_time:
+                    info["head_age"] = max(info["head_age"], now - head_time)
+        return info
+
+    def collect_queue_metric_data(self):
+        # 与 redis 指标一致，由异步任务框架统一上报
+        redis_nodes = CacheNode.objects.filter(is_enable=True, cluster_name=self.cluster_name)
+
+        try:
+            queue_keys = self.get_queue_keys()
+        except Exception as e:
+            logger.exception(f"[queue metric] get queue keys failed: {e}")
+            return
+
+        # 按策略路由将 key 分配到所在节点
+        node_queue_keys = defaultdict(lambda: defaultdict(list))
+        for queue_key, keys in queue_keys.items():
+            for k in keys:
+                node_queue_keys[get_node_by_strategy_id(k.strategy_id).id][queue_key].append(k)
+
+        for node in redis_nodes:
+            labels = {"node": str(node), "cluster_name": self.cluster_name}
+            try:
+                client = key.DATA_LIST_KEY.client.get_client(node)
+            except Exception as e:
+                logger.exception(f"[queue metric] get client of node({node}) failed: {e}")
+                continue
+
+            now = time.time()
+            for queue_key in self.QUEUE_KEYS:
+                queue_labels = dict(labels, queue=self.get_queue_name(queue_key))
+                try:
+                    info = self.get_queue_info(client, node_queue_keys[node.id][queue_key], now)
+                except Exception as e:
+                    logger.exception(f"[queue metric] collect queue({queue_labels}) failed: {e}")
+                    continue
+
+                metrics.ALARM_QUEUE_KEY_COUNT.labels(**queue_labels).set(info["key_count"])
+                metrics.ALARM_QUEUE_LENGTH.labels(**queue_labels).set(info["length"])
+                metrics.ALARM_QUEUE_HEAD_AGE_SECONDS.labels(**queue_labels).set(info["head_age"])
@@ -110,6 +110,7 @@ class TriggerProcessor:
                 strategy_name=self.strategy.name,
             ).observe(max_latency)
         MonitorEventAdapter.push_to_kafka(events=events)
+        metrics.observe_stage_latency("trigger", event_records, lambda r: r["event_record"]["data"]["time"])
 
         if len(events) > 1000:
             # 获取 Redis 节点信息（带异常处理）
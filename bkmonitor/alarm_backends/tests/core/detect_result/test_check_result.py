@@ -12,7 +12,8 @@ specific language governing permissions and limitations under the License.
 
 from django.test import TestCase
 
-from alarm_backends.core.detect_result import CheckResult
+from alarm_backends.core.cache import key
+from alarm_backends.core.detect_result import CheckResult, LastCheckpointWriter
 from bkmonitor.models import CacheNode
 from bkmonitor.utils.common_utils import count_md5
 
@@ -102,3 +103,25 @@ class TestDetectResult(TestCase):
             CheckResult.get_dimensions_keys(service_type="detect", strategy_id=1, item_id=1),
             [check_result1.dimensions_md5],
         )
+
+    def test_last_checkpoint_writer(self):
+        writer = LastCheckpointWriter(chunk_size=1)
+        writer.add(1, 1, "md5_1", 100, 1)
+        writer.add(1, 1, "md5_2", 200, 1)
+        writer.add(2, 1, "md5_1", 300, 2)
+        # 同一字段以最后一次写入为准
+        writer.add(1, 1, "md5_1", 150, 1)
+        self.assertEqual(len(writer), 3)
+        writer.flush()
+        self.assertEqual(len(writer), 0)
+
+        client = key.LAST_CHECKPOINTS_CACHE_KEY.client
+        cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=1, item_id=1)
+        field = key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5="md5_1", level=1)
+        self.assertEqual(int(client.hget(cache_key, field)), 150)
+        self.assertEqual(client.hlen(cache_key), 2)
+        self.assertTrue(client.ttl(cache_key) > 0)
+
+        cache_key = key.LAST_CHECKPOINTS_CACHE_KEY.get_key(strategy_id=2, item_id=1)
+        field = key.LAST_CHECKPOINTS_CACHE_KEY.get_field(dimensions_md5="md5_1", level=2)
+        self.assertEqual(int(client.hget(cache_key, field)), 300)
@@ -18,8 +18,16 @@ from elasticsearch.helpers import BulkIndexError
 
 from alarm_backends.core.alert import Alert, Event
 from alarm_backends.core.alert.alert import AlertUIDManager
-from alarm_backends.core.cache.key import ALERT_DEDUPE_CONTENT_KEY, ALERT_SNAPSHOT_KEY
-from alarm_backends.service.alert.builder.processor import AlertBuilder
+from alarm_backends.core.cache.key import (
+    ALERT_DEDUPE_CONTENT_KEY,
+    ALERT_SNAPSHOT_KEY,
+    ALERT_UPDATE_LOCK,
+)
+from alarm_backends.core.storage.redis import Cache
+from alarm_backends.service.alert.builder.processor import (
+    ALERT_LOCK_RETRY_TIMES,
+    AlertBuilder,
+)
 from api.cmdb.define import Host
 from bkmonitor.models import CacheNode
 from constants.data_source import KubernetesResultTableLabel
@@ -248,6 +256,35 @@ class TestProcessor(TestCase):
         result = processor.dedupe_events_to_alerts([event])
         self.assertEqual(0, len(result))
 
+    @mock.patch("alarm_backends.service.alert.builder.processor.time.sleep")
+    @mock.patch("alarm_backends.service.alert.builder.tasks.dedupe_events_to_alerts.apply_async")
+    def test_dedupe_events_to_alerts__locked(self, apply_async, sleep):
+        event = Event(
+            {
+                "event_id": "1",
+                "plugin_id": "fta-test",
+                "strategy_id": 123,
+                "alert_name": "test locked",
+                "time": int(time.time()),
+                "tags": [{"key": "device", "value": "cpu1"}],
+                "ip": "10.0.0.1",
+                "severity": 2,
+                "dedupe_keys": ["alert_name", "tags.device", "ip"],
+            }
+        )
+        # 模拟其他进程持有告警更新锁
+        lock_key = ALERT_UPDATE_LOCK.get_key(dedupe_md5=event.dedupe_md5)
+        Cache("service-lock").set(lock_key, "other", ex=ALERT_UPDATE_LOCK.ttl)
+
+        result = AlertBuilder().dedupe_events_to_alerts([event])
+        self.assertEqual(0, len(result))
+        # 先在进程内重试，重试次数用尽后再投递到 celery
+        self.assertEqual(ALERT_LOCK_RETRY_TIMES, sleep.call_count)
+        apply_async.assert_called_once()
+        self.assertEqual([event], apply_async.call_args[1]["kwargs"]["events"])
+        # 其他进程持有的锁不能被释放
+        self.assertEqual("other", Cache("service-lock").get(lock_key))
+
     @mock.patch("bkmonitor.documents.base.BaseDocument.bulk_create")
     def test_build_alerts__event_drop(self, bulk_create):
         documents = []
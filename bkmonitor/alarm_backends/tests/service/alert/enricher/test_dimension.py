@@ -0,0 +1,100 @@
+import copy
+from unittest import mock
+
+from alarm_backends.core.alert import Alert
+from alarm_backends.service.alert.enricher.dimension import StandardTranslateEnricher
+from api.cmdb.define import ServiceInstance, TopoNode
+from constants.alert import EventTargetType
+
+HOSTS = {
+    "1": mock.Mock(display_name="host-1"),
+    "2": mock.Mock(display_name="host-2"),
+}
+SERVICE_INSTANCES = {"10": ServiceInstance(service_instance_id=10, name="instance-10")}
+TOPO_NODES = {("set", 100): TopoNode(bk_obj_id="set", bk_inst_id=100, bk_obj_name="集群", bk_inst_name="set-100")}
+
+EVENTS = [
+    {"target_type": EventTargetType.HOST, "bk_host_id": 1, "target": "127.0.0.1|0"},
+    {"target_type": EventTargetType.HOST, "bk_host_id": 2, "target": "127.0.0.2|0"},
+    {"target_type": EventTargetType.HOST, "bk_host_id": 3, "target": "127.0.0.3|0"},
+    {"target_type": EventTargetType.SERVICE, "target": "10"},
+    {"target_type": EventTargetType.SERVICE, "target": "11"},
+    {"target_type": EventTargetType.TOPO, "target": "set|100"},
+    {"target_type": EventTargetType.TOPO, "target": "module|200"},
+]
+
+
+def make_alerts():
+    alerts = []
+    for event in EVENTS:
+        event = copy.deepcopy(event)
+        event["extra_info"] = {"origin_alarm": {"data": {"dimension_fields": ["bk_host_id"]}}}
+        alert = Alert({"bk_tenant_id": "system", "event": event})
+        alert._is_new = True
+        alerts.append(alert)
+    return alerts
+
+
+def enrich(prefetch: bool):
+    """
+    执行标准字段翻译，prefetch 为 False 时预取失败，回退为逐条查询
+    """
+    with (
+        mock.patch("alarm_backends.core.cache.cmdb.HostManager.mget_by_ids") as mget_hosts,
+        mock.patch("alarm_backends.core.cache.cmdb.ServiceInstanceManager.mget") as mget_service_instances,
+        mock.patch("alarm_backends.core.cache.cmdb.TopoManager.mget") as mget_topo_nodes,
+        mock.patch("alarm_backends.core.cache.cmdb.HostManager.get_by_id") as get_host,
+        mock.patch("alarm_backends.core.cache.cmdb.ServiceInstanceManager.get") as get_service_instance,
+        mock.patch("alarm_backends.core.cache.cmdb.TopoManager.get") as get_topo_node,
+    ):
+        if prefetch:
+            mget_hosts.side_effect = lambda bk_tenant_id, bk_host_ids: {
+                bk_host_id: HOSTS[bk_host_id] for bk_host_id in bk_host_ids if bk_host_id in HOSTS
+            }
+        else:
+            mget_hosts.side_effect = ConnectionError("redis unavailable")
+        mget_service_instances.side_effect = lambda bk_tenant_id, service_instance_ids: {
+            i: SERVICE_INSTANCES[i] for i in service_instance_ids if i in SERVICE_INSTANCES
+        }
+        mget_topo_nodes.side_effect = lambda bk_tenant_id, topo_nodes: {
+            node: TOPO_NODES[node] for node in topo_nodes if node in TOPO_NODES
+        }
+        get_host.side_effect = lambda bk_tenant_id, bk_host_id: HOSTS.get(str(bk_host_id))
+        get_service_instance.side_effect = lambda bk_tenant_id, service_instance_id: SERVICE_INSTANCES.get(
+            str(service_instance_id)
+        )
+        get_topo_node.side_effect = lambda bk_tenant_id, bk_obj_id, bk_inst_id: TOPO_NODES.get((bk_obj_id, bk_inst_id))
+
+        alerts = StandardTranslateEnricher(make_alerts()).enrich()
+        calls = {
+            "mget": [mget_hosts.call_count, mget_service_instances.call_count, mget_topo_nodes.call_count],
+            "get": [get_host.call_count, get_service_instance.call_count, get_topo_node.call_count],
+        }
+        if prefetch:
+            calls["host_ids"] = sorted(mget_hosts.call_args.kwargs["bk_host_ids"])
+        return [alert.dimensions for alert in alerts], calls
+
+
+def test_standard_translate_batch_prefetch():
+    dimensions, calls = enrich(prefetch=True)
+
+    # 每批告警按租户只批量查询一次，不再逐条查询
+    assert calls["mget"] == [1, 1, 1]
+    assert calls["get"] == [0, 0, 0]
+    assert calls["host_ids"] == ["1", "2", "3"]
+
+    assert dimensions[0] == [
+        {"key": "bk_host_id", "value": 1, "display_key": "主机", "display_value": "host-1"},
+    ]
+    assert dimensions[2][0]["display_key"] == "主机ID"
+    assert dimensions[3][0]["display_value"] == "instance-10"
+    assert dimensions[5][0]["display_value"] == "set-100"
+
+
+def test_standard_translate_same_as_single_lookup():
+    batch_dimensions, _ = enrich(prefetch=True)
+    single_dimensions, calls = enrich(prefetch=False)
+
+    # 预取失败时逐条查询，翻译结果与批量查询一致
+    assert calls["get"] == [3, 2, 2]
+    assert batch_dimensions == single_dimensions
@@ -0,0 +1,165 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import json
+import logging
+import random
+import time
+from unittest import mock
+
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.service.detect import DataPoint
+from alarm_backends.service.detect.strategy import Algorithms
+from alarm_backends.service.detect.strategy.advanced_ring_ratio import AdvancedRingRatio
+from alarm_backends.service.detect.strategy.advanced_year_round import AdvancedYearRound
+from alarm_backends.service.detect.strategy.simple_ring_ratio import SimpleRingRatio
+from alarm_backends.service.detect.strategy.simple_year_round import SimpleYearRound
+from alarm_backends.service.detect.strategy.year_round_amplitude import YearRoundAmplitude
+from alarm_backends.tests.service.detect.mocked_data import mocked_item
+
+logger = logging.getLogger("detect")
+
+START_TIME = 1569246480
+# 取值集中在少量整数上，以覆盖 0 值、负值及恰好等于阈值的边界情况
+VALUES = [-5, -1, 0, 0.5, 1, 2, 50, 99, 100, 101, 199, 200, 201, 400]
+# 基准数据取值平稳，少量突增
+STABLE_VALUES = list(range(90, 111)) + [400]
+
+ALGORITHMS = [
+    (SimpleRingRatio, {"floor": 50, "ceil": 100}),
+    (SimpleRingRatio, {"floor": None, "ceil": 100}),
+    (SimpleYearRound, {"floor": 50, "ceil": 100}),
+    (AdvancedYearRound, {"floor": 50, "ceil": 100, "floor_interval": 3, "ceil_interval": 2, "fetch_type": "avg"}),
+    (AdvancedYearRound, {"floor": 101, "ceil": 100, "floor_interval": 2, "ceil_interval": 3, "fetch_type": "last"}),
+    (AdvancedRingRatio, {"floor": 50, "ceil": 100, "floor_interval": 5, "ceil_interval": 3, "fetch_type": "avg"}),
+    (AdvancedRingRatio, {"floor": 50, "ceil": None, "floor_interval": 3, "ceil_interval": None, "fetch_type": "last"}),
+    (YearRoundAmplitude, {"ratio": 1, "shock": 2, "days": 2, "method": "gte"}),
+    (YearRoundAmplitude, {"ratio": 0.5, "shock": 0, "days": 3, "method": "lt"}),
+]
+
+
+def make_data_points(dimension_count, point_count, seed=0, values=VALUES):
+    rnd = random.Random(seed)
+    data_points = []
+    for d in range(dimension_count):
+        dimensions_md5 = f"{d:032x}"
+        for i in range(point_count):
+            timestamp = START_TIME + i * 60
+            data_points.append(
+                DataPoint(
+                    {
+                        "record_id": f"{dimensions_md5}.{timestamp}",
+                        "value": rnd.choice(values),
+                        "values": {"timestamp": timestamp, "mocked_metric": 0},
+                        "dimensions": {"mocked": str(d)},
+                        "time": timestamp,
+                    },
+                    mocked_item,
+                )
+            )
+    return data_points
+
+
+def make_history_storage(detector, data_points, seed=0, missing_rate=0.1, values=VALUES):
+    """构造历史数据本地缓存，部分历史数据点缺失"""
+    rnd = random.Random(seed)
+    offsets = detector.get_batch_history_offsets(mocked_item)
+    history = {}
+    for point in data_points:
+        dimensions_md5 = point.record_id.split(".")[0]
+        for offset in offsets:
+            timestamp = point.timestamp - offset
+            points = history.setdefault(timestamp, {})
+            if dimensions_md5 in points or rnd.random() < missing_rate:
+                continue
+            points[dimensions_md5] = json.dumps(
+                {"record_id": f"{dimensions_md5}.{timestamp}", "value": rnd.choice(values), "time": timestamp}
+            )
+    return {
+        key.HISTORY_DATA_KEY.get_key(strategy_id=mocked_item.strategy.id, item_id=mocked_item.id, timestamp=t): v
+        for t, v in history.items()
+    }
+
+
+def detect(detector_cls, config, data_points, storage, batch):
+    detector = detector_cls(config=config)
+    detector._local_history_storage = dict(storage)
+    min_points = Algorithms.batch_detect_min_points if batch else len(data_points) + 1
+    with mock.patch.object(detector, "batch_detect_min_points", min_points):
+        anomaly_points = detector.detect_records(data_points, 1)
+    return [(ap.anomaly_id, ap.anomaly_message) for ap in anomaly_points]
+
+
+@pytest.mark.parametrize("detector_cls,config", ALGORITHMS)
+def test_batch_detect_parity(detector_cls, config):
+    data_points = make_data_points(dimension_count=20, point_count=10)
+    storage = make_history_storage(detector_cls(config=config), data_points)
+
+    expect = detect(detector_cls, config, data_points, storage, batch=False)
+    result = detect(detector_cls, config, data_points, storage, batch=True)
+
+    assert expect
+    assert result == expect
+
+
+def test_batch_detect_with_default_value():
+    # 事件类数据，缺失的历史数据补 0
+    data_points = make_data_points(dimension_count=5, point_count=10)
+    storage = make_history_storage(SimpleRingRatio(config={"floor": 50, "ceil": 100}), data_points, missing_rate=0.5)
+
+    results = []
+    for batch in [False, True]:
+        detector = SimpleRingRatio(config={"floor": 50, "ceil": 100})
+        detector.set_default(0)
+        detector._local_history_storage = dict(storage)
+        with mock.patch.object(detector, "batch_detect_min_points", 1 if batch else len(data_points) + 1):
+            results.append([ap.anomaly_id for ap in detector.detect_records(data_points, 1)])
+    assert results[0] == results[1]
+
+
+def test_batch_detect_candidates():
+    detector = SimpleRingRatio(config={"floor": 50, "ceil": None})
+    data_points = make_data_points(dimension_count=1, point_count=3)
+    detector._local_history_storage = make_history_storage(detector, data_points, missing_rate=0)
+    history_values = detector.fetch_history_values(mocked_item, data_points, [60])
+
+    candidates = detector.batch_detect(data_points)
+    expect = [bool(detector.detect(point)) for point in data_points]
+    assert candidates == expect
+    assert len(history_values) == 3
+
+    # 少量数据点不走批量检测
+    assert detector.get_batch_candidates(data_points) is None
+    # 不支持批量检测的算法
+    with mock.patch.object(detector, "batch_detect_enabled", False):
+        assert detector.batch_detect(data_points) is None
+
+
+@pytest.mark.parametrize("detector_cls,config", ALGORITHMS)
+def test_benchmark_batch_detect(detector_cls, config):
+    """基准：对比逐点检测与批量检测的耗时"""
+    data_points = make_data_points(dimension_count=200, point_count=10, seed=1, values=STABLE_VALUES)
+    storage = make_history_storage(detector_cls(config=config), data_points, seed=1, values=STABLE_VALUES)
+
+    begin = time.perf_counter()
+    expect = detect(detector_cls, config, data_points, storage, batch=False)
+    one_by_one_cost = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    result = detect(detector_cls, config, data_points, storage, batch=True)
+    batch_cost = time.perf_counter() - begin
+
+    assert result == expect
+    logger.info(
+        f"[test_benchmark_batch_detect] {detector_cls.__name__}({config}) points({len(data_points)}) "
+        f"one by one: {one_by_one_cost * 1000:.2f}ms, batch: {batch_cost * 1000:.2f}ms"
+    )
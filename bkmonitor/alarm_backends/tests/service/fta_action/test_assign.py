@@ -502,6 +502,26 @@ class TestAlertAssignRule:
             AssignCacheManager.get_assign_rules_by_group(2, setup.assign_group_id)[0]["user_type"] == UserGroupType.MAIN
         )
 
+    def test_compiled_ruleset_cache(self, biz_mock, setup):
+        AssignCacheManager.refresh()
+        AssignCacheManager.clear()
+        ruleset = AssignCacheManager.get_compiled_ruleset(2)
+        assert [priority for priority, _ in ruleset.priority_rules] == [1]
+        assert ruleset.priority_rules[0][1][0].rule_id == setup.id
+
+        # 版本未变化，进程内直接复用编译结果
+        AssignCacheManager.clear()
+        assert AssignCacheManager.get_compiled_ruleset(2) is ruleset
+
+        # 规则发生变化后，版本变化，重新编译
+        AlertAssignRule.objects.filter(id=setup.id).update(user_groups=[2])
+        AssignCacheManager.refresh()
+        AssignCacheManager.clear()
+        new_ruleset = AssignCacheManager.get_compiled_ruleset(2)
+        assert new_ruleset is not ruleset
+        assert new_ruleset.version != ruleset.version
+        assert new_ruleset.priority_rules[0][1][0].rule["user_groups"] == [2]
+
     def test_host_cmdb_dimension_matched(self, alert, host_mock):
         rule = {
             "conditions": [
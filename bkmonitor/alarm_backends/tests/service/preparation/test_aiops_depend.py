@@ -0,0 +1,158 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import threading
+import time
+from unittest import mock
+
+import fakeredis
+import pytest
+from django.conf import settings
+
+from alarm_backends.service.preparation.aiops import processor
+from alarm_backends.service.preparation.aiops.processor import (
+    TsDependPreparationProcess,
+)
+
+pytestmark = pytest.mark.django_db
+
+END_TIME = 1700006000
+START_TIME = END_TIME - 4 * 60 * 60
+
+
+class MockItem:
+    def __init__(self, host_count=3):
+        self.host_count = host_count
+        self.query_configs = [{"agg_dimension": ["host"]}]
+        self.query_ranges = []
+
+    def query_record(self, start_time, end_time):
+        self.query_ranges.append((start_time, end_time))
+        return [
+            {"host": f"host-{i}", "_time_": timestamp, "_result_": 1}
+            for timestamp in range(start_time - start_time % 60 + 60, end_time + 1, 60)
+            for i in range(self.host_count)
+        ]
+
+
+class MockStrategy:
+    def __init__(self, item):
+        self.id = 1
+        self.items = [item]
+
+
+class MockInitApi:
+    def __init__(self, cost=0, fail_calls=()):
+        self.cost = cost
+        # 指定第几次调用推送失败
+        self.fail_calls = set(fail_calls)
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.timestamps = set()
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def __call__(self, dependency_data, serving_config):
+        with self.lock:
+            self.calls += 1
+            if self.calls in self.fail_calls:
+                raise ConnectionError("sdk unavailable")
+            self.inflight += len(dependency_data)
+            self.max_inflight = max(self.max_inflight, self.inflight)
+        time.sleep(self.cost)
+        with self.lock:
+            self.inflight -= len(dependency_data)
+            for series in dependency_data:
+                self.timestamps.update(point["timestamp"] for point in series["data"])
+
+
+def make_checkpoint():
+    return {
+        "algorithm_type": "IntelligentDetect",
+        "fingerprint": "test",
+        "start_time": START_TIME,
+        "end_time": END_TIME,
+        "cursor": END_TIME,
+    }
+
+
+class TestTsDependPreparation:
+    def setup_method(self):
+        fakeredis.FakeRedis(decode_responses=True).flushall()
+
+    def test_resume_from_checkpoint(self):
+        item, api = MockItem(), MockInitApi()
+        strategy = MockStrategy(item)
+        process = TsDependPreparationProcess()
+
+        # 处理两个时间段后锁被更新，任务中断并保留进度
+        with mock.patch.object(processor, "check_lock_updated", side_effect=[False, False, True]):
+            assert not process.init_depend_data(strategy, api, make_checkpoint())
+
+        checkpoint = process.load_checkpoint(strategy.id, "IntelligentDetect", "test")
+        assert START_TIME < checkpoint["cursor"] < END_TIME
+        resume_cursor = checkpoint["cursor"]
+        interrupted_query_count = len(item.query_ranges)
+
+        # 从进度处继续，不重复处理已完成的时间段
+        with mock.patch.object(processor, "check_lock_updated", return_value=False):
+            assert process.init_depend_data(strategy, api, checkpoint)
+
+        assert all(end <= resume_cursor for _, end in item.query_ranges[interrupted_query_count:])
+        assert min(start for start, _ in item.query_ranges) == START_TIME
+        assert api.timestamps == {t * 1000 for t in range(START_TIME - START_TIME % 60 + 60, END_TIME + 1, 60)}
+        assert process.load_checkpoint(strategy.id, "IntelligentDetect", "test")["cursor"] == START_TIME
+
+        # 配置变更后进度失效
+        assert process.load_checkpoint(strategy.id, "IntelligentDetect", "changed") is None
+        process.clear_checkpoint(strategy.id)
+        assert process.load_checkpoint(strategy.id, "IntelligentDetect", "test") is None
+
+    def test_bounded_inflight_series(self):
+        item, api = MockItem(host_count=1000), MockInitApi(cost=0.01)
+        strategy = MockStrategy(item)
+
+        with mock.patch.object(settings, "AIOPS_SDK_INIT_MAX_INFLIGHT_SERIES", 200, create=True):
+            TsDependPreparationProcess().init_depend_data_by_records(
+                strategy, api, item.query_record(START_TIME, START_TIME + 600)
+            )
+
+        assert api.inflight == 0
+        assert 0 < api.max_inflight <= 200
+
+    def test_keep_checkpoint_when_push_failed(self):
+        item, api = MockItem(), MockInitApi(fail_calls=[2])
+        strategy = MockStrategy(item)
+        process = TsDependPreparationProcess()
+
+        # 第二个时间段推送失败，任务中断，进度停留在第一个时间段
+        with mock.patch.object(processor, "check_lock_updated", return_value=False):
+            assert not process.init_depend_data(strategy, api, make_checkpoint())
+
+        first_start, first_end = item.query_ranges[0]
+        assert first_end == END_TIME
+        checkpoint = process.load_checkpoint(strategy.id, "IntelligentDetect", "test")
+        assert checkpoint["cursor"] == first_start
+
+        # 重试时从失败的时间段继续，推送全部成功后完成
+        with mock.patch.object(processor, "check_lock_updated", return_value=False):
+            assert process.init_depend_data(strategy, api, checkpoint)
+        assert api.timestamps == {t * 1000 for t in range(START_TIME - START_TIME % 60 + 60, END_TIME + 1, 60)}
+        assert process.load_checkpoint(strategy.id, "IntelligentDetect", "test")["cursor"] == START_TIME
+
+    def test_push_failure_result(self):
+        item = MockItem(host_count=1000)
+        strategy = MockStrategy(item)
+        records = item.query_record(START_TIME, START_TIME + 600)
+
+        assert TsDependPreparationProcess().init_depend_data_by_records(strategy, MockInitApi(), records)
+        assert not TsDependPreparationProcess().init_depend_data_by_records(
+            strategy, MockInitApi(fail_calls=[1]), records
+        )
@@ -0,0 +1,224 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import asyncio
+import logging
+import time
+from unittest import mock
+
+from alarm_backends.service.report.render import dashboard
+from alarm_backends.service.report.render.dashboard import (
+    DashboardRenderer,
+    RenderDashboardConfig,
+    render_dashboard_panel,
+)
+
+logger = logging.getLogger(__name__)
+
+# 本地静态桩页面的导航及图表加载耗时，单位秒
+NAVIGATION_COST = 0.05
+PANEL_RENDER_COST = 0.05
+
+
+class StubElement:
+    def __init__(self, page):
+        self.page = page
+
+    async def screenshot(self, **kwargs):
+        return self.page.url.encode()
+
+
+class StubPage:
+    """本地静态桩页面，模拟导航及图表加载耗时"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.url = ""
+        self.closed = False
+
+    async def setExtraHTTPHeaders(self, headers):
+        pass
+
+    async def goto(self, url, options):
+        self.browser.requests.append(url)
+        self.url = url
+        await asyncio.sleep(NAVIGATION_COST)
+
+    async def setViewport(self, viewport):
+        pass
+
+    async def waitForSelector(self, selector):
+        pass
+
+    async def evaluate(self, *args):
+        return {"scroll": 1000, "client": 1000}
+
+    async def waitForFunction(self, page_function, options):
+        await asyncio.sleep(PANEL_RENDER_COST)
+
+    async def querySelector(self, selector):
+        return StubElement(self)
+
+    def isClosed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+class StubBrowser:
+    def __init__(self):
+        self.pages = []
+        self.requests = []
+
+    async def newPage(self):
+        page = StubPage(self)
+        self.pages.append(page)
+        return page
+
+
+def make_configs(count, start_time=1700000000):
+    return [
+        RenderDashboardConfig(
+            bk_tenant_id="system",
+            bk_biz_id=2,
+            dashboard_uid="uid",
+            panel_id=str(i),
+            width=620,
+            height=300,
+            start_time=start_time,
+            end_time=start_time + 3600,
+        )
+        for i in range(count)
+    ]
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestDashboardRenderer:
+    def setup_method(self):
+        self.browser = StubBrowser()
+        self.patchers = [
+            mock.patch.object(dashboard, "get_browser", side_effect=self.get_browser),
+            mock.patch.object(dashboard, "PANEL_ANIMATION_WAIT", 0.01),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def teardown_method(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    async def get_browser(self):
+        return self.browser
+
+    def test_render_many_with_page_pool(self):
+        configs = make_configs(10)
+        renderer = DashboardRenderer(concurrency=3)
+
+        images = run(renderer.render_many(configs))
+
+        assert [image.decode() for image in images] == [dashboard.generate_dashboard_url(c) for c in configs]
+        # 页面数量受并发数限制，且全部复用
+        assert len(self.browser.pages) == 3
+        assert not any(page.closed for page in self.browser.pages)
+
+    def test_coalesce_identical_render(self):
+        # 不同订阅的相同图表
+        configs = make_configs(4) + make_configs(4)
+        renderer = DashboardRenderer(concurrency=4)
+
+        images = run(renderer.render_many(configs))
+        assert images[:4] == images[4:]
+        assert len(self.browser.requests) == 4
+
+        # 结果短暂缓存，后续订阅直接复用
+        run(renderer.render_many(make_configs(4)))
+        assert len(self.browser.requests) == 4
+
+        # 时间范围不同时重新渲染
+        run(renderer.render_many(make_configs(4, start_time=1700000060)))
+        assert len(self.browser.requests) == 8
+
+    def test_failed_page_not_reused(self):
+        renderer = DashboardRenderer(concurrency=1, result_ttl=0)
+        configs = make_configs(2)
+
+        with mock.patch.object(StubPage, "querySelector", return_value=None):
+            results = run(renderer.render_many(configs))
+
+        assert all(isinstance(result, Exception) for result in results)
+        assert len(self.browser.pages) == 2
+        assert all(page.closed for page in self.browser.pages)
+
+    def test_benchmark_render(self):
+        """基准：对比逐个渲染与页面池并发渲染的耗时"""
+        configs = make_configs(20)
+
+        async def render_one_by_one():
+            return [await render_dashboard_panel(config) for config in configs]
+
+        begin = time.perf_counter()
+        sequential = run(render_one_by_one())
+        sequential_cost = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        concurrent = run(DashboardRenderer(concurrency=4).render_many(configs))
+        concurrent_cost = time.perf_counter() - begin
+
+        assert sequential == concurrent
+        assert concurrent_cost < sequential_cost
+        logger.info(
+            f"[test_benchmark_render] panels({len(configs)}) one by one: {sequential_cost * 1000:.2f}ms, "
+            f"page pool: {concurrent_cost * 1000:.2f}ms"
+        )
+
+    def test_start_tasks_keep_failed_elements(self):
+        from alarm_backends.service.report import handler
+
+        elements = [
+            {
+                "bk_tenant_id": "system",
+                "bk_biz_id": 2,
+                "dashboard_uid": "uid",
+                "panel_id": str(i),
+                "with_panel_title": False,
+                "width": 620,
+                "height": 300,
+                "scale": 2,
+                "variables": {},
+                "start_time": 1700000000000,
+                "end_time": 1700003600000,
+                "tag": f"tag-{i}",
+            }
+            for i in range(2)
+        ]
+
+        async def query_selector(page, selector):
+            # 第二个图表渲染失败
+            return None if "panelId=1&" in page.url else StubElement(page)
+
+        with (
+            mock.patch.object(handler, "get_dashboard_renderer", return_value=DashboardRenderer(concurrency=2)),
+            mock.patch.object(StubPage, "querySelector", new=query_selector),
+        ):
+            result = run(handler.start_tasks(elements))
+
+        # 渲染失败的图表同样返回错误信息
+        assert [(element["tag"], bool(element.get("base64")), err_msg) for element, err_msg in result] == [
+            ("tag-0", True, None),
+            ("tag-1", False, {"tag": "tag-1", "exception_msg": mock.ANY}),
+        ]
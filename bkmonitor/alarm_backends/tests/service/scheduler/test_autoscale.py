@@ -0,0 +1,165 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import override_settings
+
+from alarm_backends.core.cluster import get_cluster
+from alarm_backends.core.storage.redis import Cache
+from alarm_backends.service.scheduler.autoscale import (
+    BacklogAutoscaler,
+    BacklogScalingPolicy,
+    replay_queue_trace,
+)
+from alarm_backends.service.scheduler.tasks.cron import skip_overlapping
+
+logger = logging.getLogger(__name__)
+
+
+def make_trace(base=20, burst=600, duration=2):
+    """
+    队列轨迹(统计周期 10s)：平稳流量 -> 持续 1 分钟的突增 -> 平稳流量
+    """
+    return (
+        [{"arrivals": base, "duration": duration}] * 30
+        + [{"arrivals": burst, "duration": duration}] * 6
+        + [{"arrivals": base, "duration": duration}] * 60
+    )
+
+
+class TestBacklogScalingPolicy:
+    def test_observe_duration(self):
+        policy = BacklogScalingPolicy(1, 10)
+        # 无任务完成时不更新
+        policy.observe(0, 0, 10)
+        assert policy.avg_duration is None
+
+        # 2 个进程 10s 内完成 10 个任务，单个任务耗时 2s
+        policy.observe(10, 2, 10)
+        assert policy.avg_duration == 2
+        policy.observe(5, 2, 10)
+        assert policy.avg_duration == 0.3 * 4 + 0.7 * 2
+
+    def test_get_target(self):
+        policy = BacklogScalingPolicy(2, 10, target_latency=30, keepalive=30)
+        # 无耗时统计时按积压数量扩容
+        assert policy.get_target(4, 2, 0) == 4
+        policy.observe(10, 2, 10)
+
+        # 30s 内消化 60 个耗时 2s 的任务需要 4 个进程
+        assert policy.get_target(60, 2, 10) == 4
+        # 受并发上限限制
+        assert policy.get_target(1000, 4, 20) == 10
+        # 扩容后 keepalive 内不缩容
+        assert policy.get_target(0, 10, 40) == 10
+        # 每次最多缩减一半
+        assert policy.get_target(0, 10, 60) == 6
+        assert policy.get_target(0, 6, 70) == 4
+        assert policy.get_target(0, 4, 80) == 3
+        assert policy.get_target(0, 3, 90) == 2
+        assert policy.get_target(0, 2, 100) == 2
+
+
+def test_replay_queue_trace():
+    """
+    回放突增流量的队列轨迹，对比固定并发与按积压扩缩容的效果
+    """
+    trace = make_trace()
+    fixed_min = replay_queue_trace(trace, BacklogScalingPolicy(4, 4))
+    fixed_max = replay_queue_trace(trace, BacklogScalingPolicy(32, 32))
+    autoscale = replay_queue_trace(trace, BacklogScalingPolicy(4, 32, target_latency=30), initial_processes=4)
+
+    # 扩缩容的积压等待时间远小于固定最小并发，资源占用小于固定最大并发
+    assert autoscale["max_wait"] < fixed_min["max_wait"] / 2
+    assert autoscale["peak_backlog"] < fixed_min["peak_backlog"]
+    assert autoscale["process_seconds"] < fixed_max["process_seconds"]
+    # 积压消化后缩回并发下限
+    assert max(autoscale["processes"]) == 32
+    assert autoscale["processes"][-1] == 4
+
+    for name, result in [("fixed_min", fixed_min), ("fixed_max", fixed_max), ("autoscale", autoscale)]:
+        logger.info(
+            f"[test_replay_queue_trace] {name}: peak backlog({result['peak_backlog']:.0f}) "
+            f"max wait({result['max_wait']:.1f}s) process seconds({result['process_seconds']})"
+        )
+
+
+def test_skip_overlapping():
+    calls = []
+
+    @skip_overlapping("test_skip_overlapping", ttl=60)
+    def task(overlap=False):
+        calls.append(overlap)
+        if overlap and len(calls) == 1:
+            # 执行期间被多次调度，均跳过，结束后合并为一次补偿执行
+            assert task() is None
+            assert task() is None
+        return len(calls)
+
+    assert task(overlap=True) == 2
+    assert calls == [True, True]
+
+    # 锁已释放，可再次执行
+    assert task() == 3
+
+
+def test_skip_overlapping_lock_taken_over():
+    calls = []
+    lock_key = f"{get_cluster().name}_cron_task_running_test_skip_overlapping_taken_over"
+    client = Cache("service-lock")
+
+    @skip_overlapping("test_skip_overlapping_taken_over", ttl=60)
+    def task():
+        calls.append(1)
+        if len(calls) == 1:
+            assert task() is None
+            # 执行超时后锁过期，被新的执行持有
+            client.set(lock_key, "other", ex=60)
+        return len(calls)
+
+    # 锁已被其他执行持有，不再补偿执行，也不释放其他执行的锁
+    assert task() == 1
+    assert client.get(lock_key) == "other"
+    client.delete(lock_key)
+
+
+def make_autoscaler(queue_counts):
+    """
+    构造消费指定队列的 autoscaler，queue_counts: {队列名: (积压任务数, 消费者数量)}
+    """
+    queues = {}
+    for queue_name, (message_count, consumer_count) in queue_counts.items():
+        queue = mock.MagicMock()
+        queue.bind.return_value.queue_declare.return_value = SimpleNamespace(
+            message_count=message_count, consumer_count=consumer_count
+        )
+        queues[queue_name] = queue
+
+    worker = mock.MagicMock()
+    worker.app.amqp.queues = mock.MagicMock(consume_from=queues)
+    worker.app.amqp.queues.__getitem__.side_effect = queues.__getitem__
+    return BacklogAutoscaler(mock.MagicMock(), 10, 1, worker=worker)
+
+
+def test_queue_depth_per_consumer():
+    # 积压按消费者数量分摊到各 worker
+    autoscaler = make_autoscaler({"celery_service": (100, 4), "celery_cron": (9, 2)})
+    assert autoscaler.get_queue_depth() == 25 + 5
+
+    # broker 不返回消费者数量时，按队列配置的消费者数量分摊
+    with override_settings(CELERY_AUTOSCALE_QUEUE_CONFIG={"celery_service": {"consumers": 5}}):
+        autoscaler = make_autoscaler({"celery_service": (100, 0)})
+    assert autoscaler.get_queue_depth() == 20
+
+    autoscaler = make_autoscaler({"celery_service": (100, 0)})
+    assert autoscaler.get_queue_depth() == 100
@@ -0,0 +1,122 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import json
+from unittest import mock
+
+import fakeredis
+import pytest
+
+from alarm_backends.core.cache import key
+from alarm_backends.core.cache.strategy import StrategyCacheManager
+from alarm_backends.service.selfmonitor.collect.queue import QueueMetricCollectReport
+from constants.action import ActionPluginType
+from core.prometheus import metrics
+
+pytestmark = pytest.mark.django_db
+
+NOW = 1700000000
+
+
+def make_collector():
+    with mock.patch("alarm_backends.service.selfmonitor.collect.queue.get_cluster"):
+        return QueueMetricCollectReport()
+
+
+class TestQueueMetricCollectReport:
+    def setup_method(self):
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        self.client.flushall()
+
+    def test_get_queue_info(self):
+        # 队列左进右出，队头为最早推入的数据
+        data_keys = []
+        for strategy_id, access_times in [(1, [NOW - 30, NOW - 10]), (2, [NOW - 120, NOW - 60, NOW - 5]), (3, [])]:
+            data_key = key.DATA_LIST_KEY.get_key(strategy_id=strategy_id, item_id=1)
+            data_keys.append(data_key)
+            for access_time in access_times:
+                self.client.lpush(data_key, json.dumps({"time": NOW - 600, "access_time": access_time}))
+        self.client.lpush(key.DATA_SIGNAL_KEY.get_key(), "1")
+
+        collector = make_collector()
+        with mock.patch.object(QueueMetricCollectReport, "BATCH_SIZE", 2):
+            info = collector.get_queue_info(self.client, data_keys, NOW)
+        assert info == {"key_count": 2, "length": 5, "head_age": 120}
+
+        info = collector.get_queue_info(self.client, [key.DATA_SIGNAL_KEY.get_key()], NOW)
+        assert info == {"key_count": 1, "length": 1, "head_age": 0}
+
+    def test_skip_non_list_keys(self):
+        self.client.sadd(key.EVENT_SIGNAL_KEY.get_key(), "1001")
+        self.client.lpush(key.EVENT_LIST_KEY.get_key(data_id=1001), json.dumps({"time": NOW - 10}))
+
+        keys = [key.EVENT_SIGNAL_KEY.get_key(), key.EVENT_LIST_KEY.get_key(data_id=1001)]
+        info = make_collector().get_queue_info(self.client, keys, NOW)
+
+        assert info == {"key_count": 1, "length": 1, "head_age": 10}
+
+    def test_get_queue_keys(self):
+        strategies = [
+            {"id": 1, "items": [{"id": 11}]},
+            {"id": 2, "items": [{"id": 21}, {"id": 22}]},
+        ]
+        event_signal_key = key.EVENT_SIGNAL_KEY.get_key()
+        key.EVENT_SIGNAL_KEY.client.sadd(event_signal_key, "1001")
+        with (
+            mock.patch.object(StrategyCacheManager, "get_strategy_ids", return_value=[1, 2]) as get_strategy_ids,
+            mock.patch.object(StrategyCacheManager, "get_strategy_by_ids", return_value=strategies),
+            mock.patch.object(StrategyCacheManager, "get_nodata_strategy_ids", return_value=[2]),
+            mock.patch.object(QueueMetricCollectReport, "_strategy_keys", None),
+        ):
+            collector = make_collector()
+            queue_keys = collector.get_queue_keys()
+            # 策略相关的 key 在刷新间隔内复用，不重复读取策略缓存
+            collector.get_queue_keys()
+            assert get_strategy_ids.call_count == 1
+        key.EVENT_SIGNAL_KEY.client.delete(event_signal_key)
+
+        assert queue_keys[key.DATA_LIST_KEY] == [
+            key.DATA_LIST_KEY.get_key(strategy_id=1, item_id=11),
+            key.DATA_LIST_KEY.get_key(strategy_id=2, item_id=21),
+            key.DATA_LIST_KEY.get_key(strategy_id=2, item_id=22),
+        ]
+        assert queue_keys[key.ANOMALY_LIST_KEY][0].strategy_id == 1
+        assert queue_keys[key.NO_DATA_LIST_KEY] == [
+            key.NO_DATA_LIST_KEY.get_key(strategy_id=2, item_id=21),
+            key.NO_DATA_LIST_KEY.get_key(strategy_id=2, item_id=22),
+        ]
+        assert queue_keys[key.EVENT_LIST_KEY] == [key.EVENT_LIST_KEY.get_key(data_id="1001")]
+        assert queue_keys[key.DATA_SIGNAL_KEY] == [key.DATA_SIGNAL_KEY.get_key()]
+        assert len(queue_keys[key.FTA_ACTION_LIST_KEY]) == len(ActionPluginType.PLUGIN_TYPE_DICT)
+
+    def test_get_item_time(self):
+        test_cases = [
+            ({"data": {"time": NOW - 600, "access_time": NOW - 60, "detect_time": NOW - 1}}, NOW - 1),
+            ({"time": NOW - 600, "access_time": NOW - 60}, NOW - 60),
+            ({"time": (NOW - 600) * 1000}, NOW - 600),
+            ({"time": "2023-11-14"}, None),
+            ("1.2", None),
+        ]
+        for data, expect in test_cases:
+            assert QueueMetricCollectReport.get_item_time(json.dumps(data)) == expect
+        assert QueueMetricCollectReport.get_item_time("not json") is None
+
+    def test_observe_stage_latency(self):
+        records = [{"time": NOW - i} for i in range(1000)]
+        histogram = mock.MagicMock()
+        with (
+            mock.patch.object(metrics.PIPELINE_STAGE_LATENCY, "labels", return_value=histogram),
+            mock.patch("core.prometheus.metrics.time.time", return_value=NOW),
+        ):
+            metrics.observe_stage_latency("access", records, lambda r: r["time"], sample_size=100)
+
+        # 按步长抽样
+        assert histogram.observe.call_count == 100
+        assert histogram.observe.call_args_list[1] == mock.call(10)
@@ -43,6 +43,14 @@ DATABASE_CONNECTION_NAME = getattr(settings, "METADATA_DEFAULT_DATABASE_NAME", "
 #############################################################################
 DISCOVER_TIME_RANGE = "10m"
 DISCOVER_BATCH_SIZE = 10000
+# 流式拓扑发现: 单次最多回溯的时间(秒)，水位过旧或不存在时从此处开始
+DISCOVER_MAX_LOOKBACK = 10 * 60
+# 流式拓扑发现: 水位相对当前时间的延迟(秒)，等待数据写入 ES
+DISCOVER_WATERMARK_DELAY = 60
+# 流式拓扑发现: search_after 每页 Span 数量
+DISCOVER_SEARCH_AFTER_SIZE = 2000
+# 流式拓扑发现: PIT 保留时间
+DISCOVER_PIT_KEEP_ALIVE = "5m"
 
 ############################################################################
 # 计算平台清洗规则
@@ -576,6 +584,8 @@ PLATFORM_METRIC_DIMENSION_FILED = [
 
 APM_TOPO_INSTANCE = "BKMONITOR_{}_{}_APM_TOPO_INSTANCE_HEARTBEAT_{}_{}"
 APM_ENDPOINT = "BKMONITOR_{}_{}_APM_ENDPOINT_HEARTBEAT_{}_{}"
+APM_TOPO_INSTANCE_INDEX = "BKMONITOR_{}_{}_APM_TOPO_INSTANCE_INDEX_{}_{}"
+APM_TOPO_DISCOVER_WATERMARK = "BKMONITOR_{}_{}_APM_TOPO_DISCOVER_WATERMARK_{}_{}"
 
 # 针对高频修改字段 updated_at 的过期清理时间
 DEFAULT_APM_CACHE_EXPIRE = 7 * 24 * 60 * 60
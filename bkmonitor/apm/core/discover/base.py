@@ -10,8 +10,8 @@ specific language governing permissions and limitations under the License.
 
 import abc
 import datetime
-import itertools
 import logging
+import time
 import traceback
 from abc import ABC
 from collections import defaultdict
@@ -24,9 +24,8 @@ from opentelemetry.semconv.resource import ResourceAttributes
 
 from apm import constants
 from apm.constants import DiscoverRuleType
+from apm.core.handlers.apm_cache_handler import ApmCacheHandler
 from apm.models import ApmApplication, ApmTopoDiscoverRule, TraceDataSource
-from apm.utils.base import divide_biscuit
-from apm.utils.es_search import limits
 from bkmonitor.utils.tenant import bk_biz_id_to_bk_tenant_id
 from bkmonitor.utils.thread_backend import ThreadPool
 from constants.apm import OtlpKey, SpanKind, TelemetryDataType
@@ -155,13 +154,20 @@ class DiscoverBase(ABC):
     # 定义此发现器根据 span 列表发现时 span 列表是否为过滤后的 span 列表
     DISCOVERY_ALL_SPANS = False
 
-    def __init__(self, bk_biz_id, app_name):
+    def __init__(self, bk_biz_id, app_name, application=None, rule_instances=None):
         self.bk_biz_id = bk_biz_id
         self.bk_tenant_id = bk_biz_id_to_bk_tenant_id(bk_biz_id)
         self.app_name = app_name
+        # 应用及全部类型的发现规则可由 TopoHandler 预加载，同一轮发现内的各批次 Span 共用，避免重复查询 DB
+        self._application = application
+        self._rule_instances = rule_instances
+        self._rules_cache = {}
 
     @property
     def application(self):
+        if self._application is not None:
+            return self._application
+
         app = ApmApplication.objects.filter(bk_biz_id=self.bk_biz_id, app_name=self.app_name).first()
         if not app:
             raise CustomException(_("业务下的应用: {} 不存在").format(self.app_name))
@@ -177,8 +183,20 @@ class DiscoverBase(ABC):
     def join_keys(cls, keys):
         return ".".join(keys)
 
+    def list_rule_instances(self, _type=DiscoverRuleType.CATEGORY.value):
+        if self._rule_instances is None:
+            return ApmTopoDiscoverRule.get_application_rule(self.bk_biz_id, self.app_name, _type=_type)
+
+        # 预加载的规则已按 应用规则 + 全局规则 排序，按类型过滤后顺序不变
+        if _type == "all":
+            return self._rule_instances
+        return [rule for rule in self._rule_instances if rule.type == _type]
+
     def get_rules(self, _type=DiscoverRuleType.CATEGORY.value):
-        rule_instances = ApmTopoDiscoverRule.get_application_rule(self.bk_biz_id, self.app_name, _type=_type)
+        if _type in self._rules_cache:
+            return self._rules_cache[_type]
+
+        rule_instances = self.list_rule_instances(_type)
 
         rules = []
         other_rules = []
@@ -206,6 +224,8 @@ class DiscoverBase(ABC):
             )
 
             (rules, other_rules)[instance.category_id == ApmTopoDiscoverRule.APM_TOPO_CATEGORY_OTHER].append(instance)
+
+        self._rules_cache[_type] = (rules, other_rules[0])
         return rules, other_rules[0]
 
     def filter_rules(self, rule_kind):
@@ -265,10 +285,11 @@ class DiscoverBase(ABC):
 
 
 class TopoHandler:
+    # 单轮发现的最大耗时，超过后放弃剩余数据
     TRACE_ID_CHUNK_MAX_DURATION = 10 * 60
-    # 最大发现的TraceId数量
-    TRACE_ID_MAX_SIZE = 50000
-    # 每一轮最多分析多少个TraceId
+    # 读取的索引数量，避免时间窗口跨越索引轮转时遗漏数据
+    DISCOVER_INDEX_COUNT = 2
+    # 每一批最多分析多少个TraceId
     PER_ROUND_TRACE_ID_MAX_SIZE = 100
     FILTER_KIND = [
         SpanKind.SPAN_KIND_SERVER,
@@ -277,8 +298,6 @@ class TopoHandler:
         SpanKind.SPAN_KIND_CONSUMER,
     ]
 
-    _ES_MAX_RESULT_WINDOWS = 10000
-
     def __init__(self, bk_biz_id, app_name):
         self.bk_biz_id = bk_biz_id
         self.app_name = app_name
@@ -296,88 +315,138 @@ class TopoHandler:
 
         return True
 
-    def _get_after_key_body(self, after_key=None):
-        body = {
-            "size": 0,
-            "query": {"bool": {"must": {"range": {"time": {"gte": "now-10m", "lt": "now"}}}}},
-            "aggs": {
-                "unique_trace_id": {
-                    "composite": {
-                        "size": self.PER_ROUND_TRACE_ID_MAX_SIZE,
-                        "sources": [{"trace_id_source": {"terms": {"field": "trace_id"}}}],
-                    }
-                }
+    def get_time_range(self, now=None) -> tuple[int, int]:
+        """
+        根据水位获取本轮发现的时间范围(毫秒时间戳，左开右闭)
+        水位不存在或落后超过 DISCOVER_MAX_LOOKBACK 时，从 DISCOVER_MAX_LOOKBACK 前开始
+        """
+        now = now or time.time()
+        end_time = int((now - constants.DISCOVER_WATERMARK_DELAY) * 1000)
+        start_time = end_time - constants.DISCOVER_MAX_LOOKBACK * 1000
+
+        watermark = ApmCacheHandler().get_topo_discover_watermark(self.bk_biz_id, self.app_name)
+        if watermark and watermark > start_time:
+            start_time = min(watermark, end_time)
+
+        return start_time, end_time
+
+    def _get_search_body(self, start_time, end_time):
+        return {
+            "size": constants.DISCOVER_SEARCH_AFTER_SIZE,
+            # 只需排序值(时间、TraceId)，不返回文档内容
+            "_source": False,
+            "query": {
+                "bool": {"filter": [{"range": {"time": {"gt": start_time, "lte": end_time, "format": "epoch_millis"}}}]}
             },
+            # 按时间排序，中断时可将水位推进到已处理的时间点，避免窗口内靠后的数据长期得不到处理
+            "sort": [{"time": "asc"}, {OtlpKey.TRACE_ID: "asc"}, {OtlpKey.SPAN_ID: "asc"}],
         }
 
-        if after_key:
-            body["aggs"]["unique_trace_id"]["composite"]["after"] = after_key
-
-        return body
-
-    def list_trace_ids(self, index_name):
-        start = datetime.datetime.now()
-        after_key = None
+    def _get_trace_search_body(self, trace_ids, end_time):
+        # 按 TraceId 全量拉取时向前回溯，跨越上一轮时间窗口的 Trace 也能拿到完整的 Span
+        start_time = end_time - constants.DISCOVER_MAX_LOOKBACK * 1000
+        return {
+            "size": constants.DISCOVER_SEARCH_AFTER_SIZE,
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {OtlpKey.TRACE_ID: trace_ids}},
+                        {"range": {"time": {"gt": start_time, "lte": end_time, "format": "epoch_millis"}}},
+                    ]
+                }
+            },
+            "sort": [{OtlpKey.TRACE_ID: "asc"}, {OtlpKey.SPAN_ID: "asc"}],
+        }
 
-        while True:
-            query_body = self._get_after_key_body(after_key)
-            logger.info(f"[TopoHandler] {self.bk_biz_id} {self.app_name} list_trace_ids body: {query_body}")
-            response = self.datasource.es_client.search(index=index_name, body=query_body, request_timeout=60)
+    def _open_point_in_time(self, es_client, index_name):
+        """打开 PIT，ES 版本不支持时返回 None，退化为直接基于索引 search_after"""
+        if not hasattr(es_client, "open_point_in_time"):
+            return None
 
-            per_round_trace_ids = []
-            # 处理结果
-            buckets = response.get("aggregations", {}).get("unique_trace_id", {}).get("buckets", [])
-            for bucket in buckets:
-                per_round_trace_ids.append(bucket["key"]["trace_id_source"])
+        try:
+            response = es_client.open_point_in_time(index=index_name, keep_alive=constants.DISCOVER_PIT_KEEP_ALIVE)
+            return response["id"]
+        except Exception as e:  # noqa
+            logger.info(f"[TopoHandler] {self} open point in time failed, fallback to search_after, error: {e}")
+            return None
 
-            if (datetime.datetime.now() - start).seconds >= self.TRACE_ID_CHUNK_MAX_DURATION:
-                logger.warning(
-                    f"[TopoHandler] {self.bk_biz_id} {self.app_name} "
-                    f"list trace_ids over {constants.DISCOVER_TIME_RANGE}, break"
-                )
-                break
-            yield per_round_trace_ids
+    def _search_after(self, es_client, index_name, body, use_pit=True):
+        """基于 search_after(+PIT) 分页读取全部命中的文档"""
+        pit_id = self._open_point_in_time(es_client, index_name) if use_pit else None
 
-            after_key = response.get("aggregations", {}).get("unique_trace_id", {}).get("after_key")
-            if not after_key:
-                break
+        try:
+            while True:
+                if pit_id:
+                    body["pit"] = {"id": pit_id, "keep_alive": constants.DISCOVER_PIT_KEEP_ALIVE}
+                    response = es_client.search(body=body, request_timeout=60)
+                    pit_id = response.get("pit_id", pit_id)
+                else:
+                    response = es_client.search(index=index_name, body=body, request_timeout=60)
 
-    @limits(calls=100, period=1)
-    def list_span_by_trace_ids(self, trace_ids, max_result_count, index_name):
-        if max_result_count > constants.DISCOVER_BATCH_SIZE * len(trace_ids):
-            # 直接获取
-            query = {
-                "query": {"bool": {"must": [{"terms": {OtlpKey.TRACE_ID: trace_ids}}]}},
-                "size": constants.DISCOVER_BATCH_SIZE * len(trace_ids),
-            }
-            response = self.datasource.es_client.search(index=index_name, body=query)
-            hits = response["hits"]["hits"]
-            return [i["_source"] for i in hits]
-        else:
-            # 使用scroll获取
-            res = []
-            query = {
-                "query": {"bool": {"must": [{"terms": {OtlpKey.TRACE_ID: trace_ids}}]}},
-                "size": max_result_count,
-            }
-            response = self.datasource.es_client.search(index=index_name, body=query, scroll="5m")
-            hits = response["hits"]["hits"]
-            res += [i["_source"] for i in hits]
-
-            scroll_id = response["_scroll_id"]
-
-            while len(hits):
-                response = self.datasource.es_client.scroll(scroll_id=scroll_id, scroll="5m")
                 hits = response["hits"]["hits"]
-                res += [i["_source"] for i in hits]
+                yield from hits
+
+                if len(hits) < body["size"]:
+                    break
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            if pit_id:
+                try:
+                    es_client.close_point_in_time(body={"id": pit_id})
+                except Exception as e:  # noqa
+                    logger.warning(f"[TopoHandler] {self} close point in time failed, error: {e}")
+
+    def iter_spans(self, es_client, index_name, start_time, end_time):
+        """流式读取时间范围内全部 Span 的 (时间, TraceId)，按时间有序"""
+        for hit in self._search_after(es_client, index_name, self._get_search_body(start_time, end_time)):
+            yield hit["sort"][0], hit["sort"][1]
+
+    def list_span_by_trace_ids(self, es_client, index_name, trace_ids, end_time):
+        """按 TraceId 拉取完整的 Trace"""
+        body = self._get_trace_search_body(trace_ids, end_time)
+        return [hit["_source"] for hit in self._search_after(es_client, index_name, body, use_pit=False)]
 
-            self.datasource.es_client.clear_scroll(scroll_id=scroll_id)
-            return res
+    @classmethod
+    def iter_trace_id_batches(cls, spans, batch_size=None, span_batch_size=None):
+        """
+        将按时间有序的 (时间, TraceId) 流切分为 TraceId 批次，返回 (trace_ids, 批次内最后一个 Span 的时间)
+        TraceId 数量或 Span 数量达到上限时切分，同一时间点的 Span 不跨批次，批次返回时不晚于该时间的 Span 均已读取，
+        可作为中断时的水位。同一轮内已出现过的 TraceId 不重复返回(批次内按 TraceId 拉取完整 Trace)
+        """
+        batch_size = batch_size or cls.PER_ROUND_TRACE_ID_MAX_SIZE
+        span_batch_size = span_batch_size or settings.PER_ROUND_SPAN_MAX_SIZE
+        seen_trace_ids = set()
+        trace_ids = []
+        span_count = 0
+        last_time = None
+        for span_time, trace_id in spans:
+            if trace_ids and span_time != last_time and (len(trace_ids) >= batch_size or span_count >= span_batch_size):
+                yield trace_ids, last_time
+                trace_ids = []
+                span_count = 0
+
+            if trace_id not in seen_trace_ids:
+                seen_trace_ids.add(trace_id)
+                trace_ids.append(trace_id)
+            span_count += 1
+            last_time = span_time
+
+        if trace_ids:
+            yield trace_ids, last_time
+
+    def build_discovers(self):
+        """实例化全部 Trace 发现器，应用及发现规则只加载一次"""
+        rule_instances = ApmTopoDiscoverRule.get_application_rule(self.bk_biz_id, self.app_name, _type="all")
+
+        discovers = []
+        for c in DiscoverContainer.list_discovers(TelemetryDataType.TRACE.value):
+            instance = c(self.bk_biz_id, self.app_name, application=self.application, rule_instances=rule_instances)
+            discovers.append((instance, instance.get_remain_data()))
+        return discovers
 
     def _discover_handle(self, discover, spans, handle_type, remain_data):
         def _topo_handle():
-            instance = discover(self.bk_biz_id, self.app_name)
-            instance.discover_with_remain_data(spans, remain_data)
+            discover.discover_with_remain_data(spans, remain_data)
 
         def _pre_calculate_handle():
             discover.handle(spans)
@@ -394,43 +463,7 @@ class TopoHandler:
             )
 
         duration = (datetime.datetime.now() - start).seconds
-        logger.info(f"[{handle_type}] round discover success. span count: {len(spans)} duration: {duration}ms")
-
-    def _get_trace_task_splits(self):
-        """根据此索引最大的结果返回数量判断每个子任务需要传递多少个traceId"""
-        lastly_index_name = self.datasource.index_name.split(",")[0]
-        index_settings = self.datasource.es_client.indices.get_settings(index=lastly_index_name)
-        max_size_count = None
-        if not index_settings:
-            max_size_count = self._ES_MAX_RESULT_WINDOWS
-        else:
-            if lastly_index_name in index_settings:
-                max_size_count = (
-                    index_settings[lastly_index_name].get("settings", {}).get("index", {}).get("max_result_window")
-                )
-        # ES 1.x-7.x默认值为 10000
-        max_size_count = int(max_size_count) if max_size_count else self._ES_MAX_RESULT_WINDOWS
-
-        if max_size_count >= constants.DISCOVER_BATCH_SIZE:
-            return max_size_count, max_size_count // constants.DISCOVER_BATCH_SIZE, lastly_index_name
-
-        logger.info(f"[TopoHandler] found max_size_count: {max_size_count} < {constants.DISCOVER_BATCH_SIZE}")
-
-        return max_size_count, 1, lastly_index_name
-
-    @classmethod
-    def calculate_round_count(cls, avg_group_span_count):
-        # 最大分析 Span 的数量不能超过 1000，防止每轮 Trace 数量增多导致OOM
-        if cls.PER_ROUND_TRACE_ID_MAX_SIZE * avg_group_span_count > settings.PER_ROUND_SPAN_MAX_SIZE:
-            max_span_count = settings.PER_ROUND_SPAN_MAX_SIZE
-        else:
-            max_span_count = cls.PER_ROUND_TRACE_ID_MAX_SIZE * avg_group_span_count
-
-        per_trace_size = int(max_span_count / avg_group_span_count)
-        if per_trace_size > cls.PER_ROUND_TRACE_ID_MAX_SIZE:
-            per_trace_size = cls.PER_ROUND_TRACE_ID_MAX_SIZE
-
-        return 1 if not per_trace_size else per_trace_size
+        logger.info(f"[{handle_type}] round discover success. span count: {len(spans)} duration: {duration}s")
 
     def discover(self):
         """application spans discover"""
@@ -440,7 +473,9 @@ class TopoHandler:
         span_count = 0
         filter_span_count = 0
         try:
-            max_result_count, per_trace_size, index_name = self._get_trace_task_splits()
+            es_client = self.datasource.es_client
+            index_name = ",".join(self.datasource.index_name.split(",")[: self.DISCOVER_INDEX_COUNT])
+            discovers = self.build_discovers()
         except Exception as e:
             logger.error(
                 f"[TopoHandler] 业务id: {self.bk_biz_id}和应用名: {self.app_name}"
@@ -448,51 +483,40 @@ class TopoHandler:
             )
             return
 
-        # 提前构造topo_params结构
-        topo_params_template = []
-        for c in DiscoverContainer.list_discovers(TelemetryDataType.TRACE.value):
-            topo_params_template.append((c, None, "topo", c(self.bk_biz_id, self.app_name).get_remain_data()))
-
-        for round_index, trace_ids in enumerate(self.list_trace_ids(index_name)):
-            if not trace_ids:
-                continue
+        start_time, end_time = self.get_time_range()
+        logger.info(f"[TopoHandler] {self} index_name: {index_name} discover time range: ({start_time}, {end_time}]")
 
+        pool = ThreadPool()
+        watermark = end_time
+        spans = self.iter_spans(es_client, index_name, start_time, end_time)
+        for trace_ids, batch_end_time in self.iter_trace_id_batches(spans):
+            all_spans = self.list_span_by_trace_ids(es_client, index_name, trace_ids, end_time)
             trace_id_count += len(trace_ids)
-
-            pool = ThreadPool()
-            get_spans_params = [(i, max_result_count, index_name) for i in divide_biscuit(trace_ids, per_trace_size)]
-            results = pool.map_ignore_exception(self.list_span_by_trace_ids, get_spans_params)
-            all_spans_group = [i for i in results if i]
-            all_spans = list(itertools.chain(*all_spans_group))
-            avg_group_span_count = len(all_spans) / len(get_spans_params)
-            if round_index == 0 and avg_group_span_count:
-                per_trace_size = self.calculate_round_count(avg_group_span_count)
-
-                logger.info(
-                    f"[TopoHandler] {self.bk_biz_id} {self.app_name} "
-                    f"index_name: {index_name} "
-                    f"per_trace_size: {per_trace_size} "
-                    f"avg_group_span_count: {avg_group_span_count} "
-                    f"span_count: {len(all_spans)}"
-                )
-
             span_count += len(all_spans)
 
             # 拓扑发现任务
             # endpoint\relation\remote_service_relation\root_endpoint 需要 kind != 0/1 数据
             # host\instance\node 需要全部 span 数据
-            topo_params = []
             filter_spans = [i for i in all_spans if i[OtlpKey.KIND] in self.FILTER_KIND]
             filter_span_count += len(filter_spans)
-            # 根据模板更新spans数据
-            for c, spans, handle_type, remain_data in topo_params_template:
-                if c.DISCOVERY_ALL_SPANS:
-                    topo_params.append((c, all_spans, handle_type, remain_data))
-                else:
-                    topo_params.append((c, filter_spans, handle_type, remain_data))
-
+            topo_params = [
+                (d, all_spans if d.DISCOVERY_ALL_SPANS else filter_spans, "topo", remain_data)
+                for d, remain_data in discovers
+            ]
             pool.map_ignore_exception(self._discover_handle, topo_params)
 
+            if (datetime.datetime.now() - start).seconds >= self.TRACE_ID_CHUNK_MAX_DURATION:
+                logger.warning(
+                    f"[TopoHandler] {self.bk_biz_id} {self.app_name} "
+                    f"discover over {constants.DISCOVER_TIME_RANGE}, break"
+                )
+                spans.close()
+                # Span 流按时间排序，超时中断时水位推进到已处理的时间点，下一轮从此处继续
+                watermark = batch_end_time
+                break
+
+        ApmCacheHandler().set_topo_discover_watermark(self.bk_biz_id, self.app_name, watermark)
+
         logger.info(
             f"[TopoHandler] discover finished {self.bk_biz_id} {self.app_name} "
             f"trace count: {trace_id_count} all span count: {span_count} filter span count: {filter_span_count}"
@@ -9,6 +9,8 @@ specific language governing permissions and limitations under the License.
 """
 
 import datetime
+import hashlib
+import logging
 import time
 
 import pytz
@@ -24,11 +26,36 @@ from apm.core.handlers.apm_cache_handler import ApmCacheHandler
 from apm.models import ApmTopoDiscoverRule, TopoInstance
 from constants.apm import OtlpKey
 
+logger = logging.getLogger("apm")
+
 
 class InstanceDiscover(DiscoverBase):
+    """
+    实例发现
+    实例的 唯一键 -> (pk, updated_at, instance_id) 索引常驻 APM 缓存(redis hash)，发现时仅需:
+    1. 批量创建索引中不存在的实例
+    2. 实例心跳只更新索引，DB 中的 updated_at 按时间桶批量刷新
+    3. 基于索引计算过期及超量实例，按 pk 分批删除
+    索引不存在时从 DB 重建
+    """
+
     DISCOVERY_ALL_SPANS = True
     MAX_COUNT = 100000
     INSTANCE_ID_SPLIT = ":"
+    # DB 中 updated_at 的刷新粒度，同一时间桶内的心跳只记录在缓存中
+    TOUCH_BUCKET_SECONDS = 60 * 60
+    # 按 pk 批量更新/删除时每批数量
+    BATCH_SIZE = 1000
+    KEY_FIELDS = (
+        "topo_node_key",
+        "instance_id",
+        "instance_topo_kind",
+        "component_instance_category",
+        "component_instance_predicate_value",
+        "sdk_name",
+        "sdk_version",
+        "sdk_language",
+    )
     model = TopoInstance
 
     @classmethod
@@ -36,252 +63,252 @@ class InstanceDiscover(DiscoverBase):
         return cls.INSTANCE_ID_SPLIT.join([str(object_pk_id), str(instance_id)])
 
     @classmethod
-    def to_id_and_key(cls, instances: list):
-        """
-        数据提取转化
-        :param instances: 实例列表
-        :return:
-        """
-        ids, keys = set(), set()
-        for inst in instances:
-            inst_id = inst.get("id")
-            inst_key = cls.to_instance_key(inst_id, inst.get("instance_id"))
-            keys.add(inst_key)
-            ids.add(inst_id)
-        return ids, keys
+    def to_index_field(cls, key: tuple) -> str:
+        """实例唯一键(KEY_FIELDS 组成的元组) -> 索引 field"""
+        return hashlib.md5("\x1f".join(str(i) for i in key).encode()).hexdigest()
+
+    @classmethod
+    def dump_index_value(cls, entry: list) -> str:
+        pk, updated_ts, instance_id = entry
+        return f"{pk}{cls.INSTANCE_ID_SPLIT}{updated_ts}{cls.INSTANCE_ID_SPLIT}{instance_id}"
 
     @classmethod
-    def merge_data(cls, instances: list, cache_data: dict) -> list:
+    def load_index_value(cls, value: str) -> list:
+        pk, updated_ts, instance_id = value.split(cls.INSTANCE_ID_SPLIT, 2)
+        return [int(pk), int(updated_ts), instance_id]
+
+    @property
+    def index_cache_key(self):
+        return ApmCacheHandler.get_topo_instance_index_key(self.bk_biz_id, self.app_name)
+
+    def load_index(self) -> dict[str, list]:
         """
-        更新 updated_at 字段
-        :param instances: 实例数据
-        :param cache_data: 缓存数据
-        :return:
+        加载实例索引: field -> [pk, updated_ts, instance_id]
         """
-        merge_data = []
-        for instance in instances:
-            key = cls.to_instance_key(instance.get("id"), instance.get("instance_id"))
-            if key in cache_data:
-                instance["updated_at"] = datetime.datetime.fromtimestamp(cache_data.get(key), tz=pytz.UTC)
-            merge_data.append(instance)
-        return merge_data
-
-    def instance_clear_if_overflow(self, instances: list):
+        cache_handler = ApmCacheHandler()
+        data = cache_handler.get_hash_data(self.index_cache_key)
+        if data is not None:
+            return {field: self.load_index_value(value) for field, value in data.items()}
+
+        index = self.build_index()
+        cache_handler.update_hash_data(
+            self.index_cache_key,
+            {field: self.dump_index_value(entry) for field, entry in index.items()},
+            ex=DEFAULT_TOPO_INSTANCE_EXPIRE,
+        )
+        return index
+
+    def build_index(self) -> dict[str, list]:
         """
-        数据量大于100000时, 清除数据
-        :param instances: 实例数据
-        :return:
+        从 DB 重建实例索引，updated_at 取 DB 与心跳缓存中的较新值，重复的实例只保留最早创建的一条
         """
-        overflow_delete_data = []
-        count = len(instances)
-        if count > self.MAX_COUNT:
-            delete_count = count - self.MAX_COUNT
-            # 按照updated_at排序，从小到大
-            instances.sort(key=lambda item: item.get("updated_at"))
-            overflow_delete_data = instances[:delete_count]
-            remain_instance_data = instances[delete_count:]
-        else:
-            remain_instance_data = instances
-        return overflow_delete_data, remain_instance_data
+        name = ApmCacheHandler.get_topo_instance_cache_key(self.bk_biz_id, self.app_name)
+        heartbeats = ApmCacheHandler().get_cache_data(name)
+
+        index = {}
+        repeat_ids = []
+        instances = (
+            TopoInstance.objects.filter(bk_biz_id=self.bk_biz_id, app_name=self.app_name)
+            .order_by("id")
+            .values_list(*self.KEY_FIELDS, "id", "updated_at")
+        )
+        for *key, pk, updated_at in instances:
+            field = self.to_index_field(tuple(key))
+            if field in index:
+                repeat_ids.append(pk)
+                continue
+
+            instance_id = key[1]
+            updated_ts = max(int(updated_at.timestamp()), heartbeats.get(self.to_instance_key(pk, instance_id), 0))
+            index[field] = [pk, updated_ts, instance_id]
 
-    def instance_clear_expired(self, instances: list):
+        self.delete_by_ids(repeat_ids)
+        logger.info(
+            f"[InstanceDiscover] {self.bk_biz_id} {self.app_name} build index: {len(index)}, repeat: {len(repeat_ids)}"
+        )
+        return index
+
+    def delete_by_ids(self, ids: list):
+        for i in range(0, len(ids), self.BATCH_SIZE):
+            self.model.objects.filter(pk__in=ids[i : i + self.BATCH_SIZE]).delete()
+
+    def touch(self, index: dict[str, list], fields: set, now: int) -> bool:
         """
-        清除过期数据
-        :param instances: 实例数据
-        :return:
+        刷新实例心跳，跨越时间桶时批量更新 DB 中的 updated_at
+        返回 DB 中的实例是否与索引一致
         """
-        # mysql 中的 updated_at 时间字段, 它的时区是 UTC, 跟数据库保持一致
-        boundary = datetime.datetime.now(tz=pytz.UTC) - datetime.timedelta(
-            days=self.application.trace_datasource.retention
+        bucket = now // self.TOUCH_BUCKET_SECONDS
+        touch_ids = []
+        for field in fields:
+            entry = index[field]
+            if entry[1] // self.TOUCH_BUCKET_SECONDS != bucket:
+                touch_ids.append(entry[0])
+            entry[1] = now
+
+        updated_at = datetime.datetime.fromtimestamp(now, tz=pytz.UTC)
+        updated_count = 0
+        for i in range(0, len(touch_ids), self.BATCH_SIZE):
+            updated_count += self.model.objects.filter(pk__in=touch_ids[i : i + self.BATCH_SIZE]).update(
+                updated_at=updated_at
+            )
+        return updated_count == len(touch_ids)
+
+    def create(self, keys: dict[str, tuple], now: int) -> dict[str, list]:
+        """批量创建实例，并回查 pk 生成索引项"""
+        if not keys:
+            return {}
+
+        TopoInstance.objects.bulk_create(
+            [
+                TopoInstance(bk_biz_id=self.bk_biz_id, app_name=self.app_name, **dict(zip(self.KEY_FIELDS, key)))
+                for key in keys.values()
+            ],
+            batch_size=self.BATCH_SIZE,
         )
-        # 按照时间进行过滤
-        expired_delete_data = []
-        remain_instance_data = []
-        for instance in instances:
-            if instance.get("updated_at") <= boundary:
-                expired_delete_data.append(instance)
-            else:
-                remain_instance_data.append(instance)
-        return expired_delete_data, remain_instance_data
-
-    def list_exists(self):
-        res = {}
-        instances = TopoInstance.objects.filter(bk_biz_id=self.bk_biz_id, app_name=self.app_name)
-        for instance in instances:
-            res.setdefault(
-                (
-                    instance.topo_node_key,
-                    instance.instance_id,
-                    instance.instance_topo_kind,
-                    instance.component_instance_category,
-                    instance.component_instance_predicate_value,
-                    instance.sdk_name,
-                    instance.sdk_version,
-                    instance.sdk_language,
-                ),
-                dict(),
-            ).update({"id": instance.id, "instance_id": instance.instance_id})
-
-        return res
 
-    def discover(self, origin_data):
+        created = {}
+        instance_ids = list({key[1] for key in keys.values()})
+        for i in range(0, len(instance_ids), self.BATCH_SIZE):
+            instances = (
+                TopoInstance.objects.filter(
+                    bk_biz_id=self.bk_biz_id,
+                    app_name=self.app_name,
+                    instance_id__in=instance_ids[i : i + self.BATCH_SIZE],
+                )
+                .order_by("id")
+                .values_list(*self.KEY_FIELDS, "id")
+            )
+            for *key, pk in instances:
+                field = self.to_index_field(tuple(key))
+                if field in keys and field not in created:
+                    created[field] = [pk, now, key[1]]
+        return created
+
+    def clear_expired_and_overflow(self, index: dict[str, list]) -> set:
         """
-        Discover span instance
-        KIND | BASE | DESC
-        service | resource.bk.instance.id | this field will be filled during the bk_collector
-        component | instance_key from rules | join with ':'
-        need_update_instances -> [{"id": 243, "instance_id": "mysql:::3306"}]
-        *_instance_keys -> {"243:mysql:::3306", "244:elasticsearch:::"}
+        基于索引清除过期及超量的实例
+        :return: 被删除的索引 field
         """
-        exists_instances = self.list_exists()
-        component_rules = self.filter_rules(ApmTopoDiscoverRule.TOPO_COMPONENT)
+        boundary = int(time.time()) - self.application.trace_datasource.retention * 24 * 60 * 60
+        delete_fields = {field for field, entry in index.items() if entry[1] <= boundary}
 
-        need_update_instances = list()
-        need_create_instances = set()
-        need_create_instance_ids = set()
+        remain_count = len(index) - len(delete_fields)
+        if remain_count > self.MAX_COUNT:
+            remain_fields = sorted((f for f in index if f not in delete_fields), key=lambda f: index[f][1])
+            delete_fields.update(remain_fields[: remain_count - self.MAX_COUNT])
 
+        self.delete_by_ids([index[field][0] for field in delete_fields])
+        return delete_fields
+
+    def list_found_keys(self, origin_data) -> set[tuple]:
+        component_rules = self.filter_rules(ApmTopoDiscoverRule.TOPO_COMPONENT)
+
+        found_keys = set()
         for span in origin_data:
             # service/components have different sources that can be discovered in parallel
-            found_keys = []
-
             # SERVICE: supplemented by bk_collector
             instance_id = extract_field_value((OtlpKey.RESOURCE, OtlpKey.BK_INSTANCE_ID), span)
-            if instance_id and any(bool(i) for i in instance_id.split(self.INSTANCE_ID_SPLIT)):
-                service_name = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.SERVICE_NAME), span)
-                sdk_name = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_NAME), span)
-                sdk_version = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_VERSION), span)
-                sdk_language = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_LANGUAGE), span)
+            if not instance_id or not any(bool(i) for i in instance_id.split(self.INSTANCE_ID_SPLIT)):
+                continue
+
+            service_name = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.SERVICE_NAME), span)
+            sdk_name = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_NAME), span)
+            sdk_version = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_VERSION), span)
+            sdk_language = extract_field_value((OtlpKey.RESOURCE, ResourceAttributes.TELEMETRY_SDK_LANGUAGE), span)
 
-                found_keys.append(
+            found_keys.add(
+                (
+                    service_name,
+                    instance_id,
+                    ApmTopoDiscoverRule.TOPO_SERVICE,
+                    None,
+                    None,
+                    sdk_name,
+                    sdk_version,
+                    sdk_language,
+                )
+            )
+
+            match_component_rule = self.get_match_rule(span, component_rules)
+            if match_component_rule:
+                # COMPONENT
+                component_instance_id = get_topo_instance_key(
+                    match_component_rule.instance_keys,
+                    match_component_rule.topo_kind,
+                    match_component_rule.category_id,
+                    span,
+                    simple_component_instance=False,
+                    component_predicate_key=match_component_rule.predicate_key,
+                )
+                topo_key = get_topo_instance_key(
+                    match_component_rule.instance_keys,
+                    match_component_rule.topo_kind,
+                    match_component_rule.category_id,
+                    span,
+                    component_predicate_key=match_component_rule.predicate_key,
+                )
+                found_keys.add(
                     (
-                        service_name,
-                        instance_id,
-                        ApmTopoDiscoverRule.TOPO_SERVICE,
-                        None,
-                        None,
+                        f"{service_name}-{topo_key}",
+                        component_instance_id,
+                        ApmTopoDiscoverRule.TOPO_COMPONENT,
+                        match_component_rule.category_id,
+                        extract_field_value(match_component_rule.predicate_key, span),
                         sdk_name,
                         sdk_version,
                         sdk_language,
                     )
                 )
 
-                match_component_rule = self.get_match_rule(span, component_rules)
-                if match_component_rule:
-                    # COMPONENT
-                    component_instance_id = get_topo_instance_key(
-                        match_component_rule.instance_keys,
-                        match_component_rule.topo_kind,
-                        match_component_rule.category_id,
-                        span,
-                        simple_component_instance=False,
-                        component_predicate_key=match_component_rule.predicate_key,
-                    )
-                    topo_key = get_topo_instance_key(
-                        match_component_rule.instance_keys,
-                        match_component_rule.topo_kind,
-                        match_component_rule.category_id,
-                        span,
-                        component_predicate_key=match_component_rule.predicate_key,
-                    )
-                    found_keys.append(
-                        (
-                            f"{service_name}-{topo_key}",
-                            component_instance_id,
-                            ApmTopoDiscoverRule.TOPO_COMPONENT,
-                            match_component_rule.category_id,
-                            extract_field_value(match_component_rule.predicate_key, span),
-                            sdk_name,
-                            sdk_version,
-                            sdk_language,
-                        )
-                    )
-            for key in found_keys:
-                if key in exists_instances:
-                    need_update_instances.append(exists_instances[key])
-                else:
-                    need_create_instances.add(key)
-                    need_create_instance_ids.add(key[1])
-
-        # create
-        TopoInstance.objects.bulk_create(
-            [
-                TopoInstance(
-                    bk_biz_id=self.bk_biz_id,
-                    app_name=self.app_name,
-                    topo_node_key=i[0],
-                    instance_id=i[1],
-                    instance_topo_kind=i[2],
-                    component_instance_category=i[3],
-                    component_instance_predicate_value=i[4],
-                    sdk_name=i[5],
-                    sdk_version=i[6],
-                    sdk_language=i[7],
-                )
-                for i in need_create_instances
-            ]
-        )
-        # query cache data and database data(with object_pk_id)
-        cache_data, instance_data = self.query_cache_and_instance_data()
-
-        # delete database data
-        delete_instance_keys = self.clear_data(cache_data, instance_data)
-
-        # refresh cache data
-        _, create_instance_keys = self.to_id_and_key(
-            [i for i in instance_data if i.get("instance_id") in need_create_instance_ids]
-        )
-        _, update_instance_keys = self.to_id_and_key(need_update_instances)
-        self.refresh_cache_data(
-            old_cache_data=cache_data,
-            create_instance_keys=create_instance_keys,
-            update_instance_keys=update_instance_keys,
-            delete_instance_keys=delete_instance_keys,
-        )
+        return found_keys
 
-    def clear_data(self, cache_data, instance_data) -> set:
+    def discover(self, origin_data):
         """
-        数据清除
-        :param cache_data: 缓存数据
-        :param instance_data: mysql 数据
-        :return:
+        Discover span instance
+        KIND | BASE | DESC
+        service | resource.bk.instance.id | this field will be filled during the bk_collector
+        component | instance_key from rules | join with ':'
+        index -> {"<md5 of instance key>": [243, 1696733864, "mysql:::3306"]}
         """
-        merge_data = self.merge_data(instance_data, cache_data)
-        # 过期数据
-        expired_delete_data, remain_instance_data = self.instance_clear_expired(merge_data)
-        # 超量数据
-        overflow_delete_data, remain_instance_data = self.instance_clear_if_overflow(remain_instance_data)
-        delete_data = expired_delete_data + overflow_delete_data
-
-        delete_ids, delete_keys = self.to_id_and_key(delete_data)
-        if delete_ids:
-            self.model.objects.filter(pk__in=delete_ids).delete()
-
-        return delete_keys
-
-    def refresh_cache_data(
-        self,
-        old_cache_data: dict,
-        create_instance_keys: set,
-        update_instance_keys: set,
-        delete_instance_keys: set,
-    ):
+        index = self.load_index()
         now = int(time.time())
-        old_cache_data.update({i: now for i in (create_instance_keys | update_instance_keys)})
-        cache_data = {i: old_cache_data[i] for i in (set(old_cache_data.keys()) - delete_instance_keys)}
-        name = ApmCacheHandler.get_topo_instance_cache_key(self.bk_biz_id, self.app_name)
-        ApmCacheHandler().refresh_data(name, cache_data, DEFAULT_TOPO_INSTANCE_EXPIRE)
 
-    def query_cache_and_instance_data(self):
-        """
-        缓存数据及实例数据查询
-        """
+        touch_fields = set()
+        need_create_keys = {}
+        for key in self.list_found_keys(origin_data):
+            field = self.to_index_field(key)
+            if field in index:
+                touch_fields.add(field)
+            else:
+                need_create_keys[field] = key
 
-        # 查询应用下的缓存数据
-        name = ApmCacheHandler.get_topo_instance_cache_key(self.bk_biz_id, self.app_name)
-        cache_data = ApmCacheHandler().get_cache_data(name)
+        consistent = self.touch(index, touch_fields, now)
+        created = self.create(need_create_keys, now)
+        index.update(created)
+
+        delete_fields = self.clear_expired_and_overflow(index)
+
+        cache_handler = ApmCacheHandler()
+        if not consistent:
+            # DB 中的实例已被其他途径删除，丢弃索引，下次发现时重建
+            cache_handler.redis_client.delete(self.index_cache_key)
+        else:
+            cache_handler.update_hash_data(
+                self.index_cache_key,
+                {field: self.dump_index_value(index[field]) for field in (touch_fields | set(created)) - delete_fields},
+                delete_fields=delete_fields,
+                ex=DEFAULT_TOPO_INSTANCE_EXPIRE,
+            )
 
-        # 查询应用下的实例数据
-        filter_params = {"bk_biz_id": self.bk_biz_id, "app_name": self.app_name}
-        instance_data = list(TopoInstance.objects.filter(**filter_params).values("id", "instance_id", "updated_at"))
+        # 心跳缓存: {"<pk>:<instance_id>": updated_ts}，实例列表查询时用于合并 updated_at
+        self.refresh_cache_data(
+            {
+                self.to_instance_key(entry[0], entry[2]): entry[1]
+                for field, entry in index.items()
+                if field not in delete_fields
+            }
+        )
 
-        return cache_data, instance_data
+    def refresh_cache_data(self, cache_data: dict):
+        name = ApmCacheHandler.get_topo_instance_cache_key(self.bk_biz_id, self.app_name)
+        ApmCacheHandler().refresh_data(name, cache_data, DEFAULT_TOPO_INSTANCE_EXPIRE)
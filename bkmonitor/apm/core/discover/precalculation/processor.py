@@ -18,19 +18,19 @@ to the current version of the project delivered to anyone in the future.
 import datetime
 import logging
 import operator
+import os
 
-import networkx
-from networkx import dag_longest_path_length
+import billiard as multiprocessing
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.semconv.trace import SpanAttributes
 from opentelemetry.trace import StatusCode
 
 from apm.constants import KindCategory
+from apm.core.discover.precalculation.span_tree import SpanTree
 from apm.models import ApmApplication
 from apm_web.handlers.span_infer import InferenceHandler
 from bkm_space.api import SpaceApi
 from bkmonitor.utils import group_by
-from bkmonitor.utils.thread_backend import ThreadPool
 from constants.apm import (
     OtlpKey,
     PreCalculateSpecificField,
@@ -40,6 +40,25 @@ from constants.apm import (
 
 logger = logging.getLogger("apm")
 
+# 每个子进程单次处理的 Trace 数量
+PRECALCULATE_CHUNK_SIZE = 200
+# Span 总数超过此阈值才启用多进程，数据量较小时进程启动及序列化开销大于收益
+PRECALCULATE_PROCESS_SPAN_THRESHOLD = 5000
+# 最大进程数
+PRECALCULATE_MAX_PROCESSES = 4
+
+
+def _calculate_trace_chunk(chunk):
+    """计算一批 Trace 的预计算字段，单条 Trace 计算失败时返回 None 且不影响其他 Trace"""
+    results = []
+    for trace_id, spans in chunk:
+        try:
+            results.append(PrecalculateProcessor.calculate(trace_id, spans))
+        except Exception as e:  # noqa
+            logger.exception(f"[PrecalculateProcessor] calculate trace({trace_id}) failed, error: {e}")
+            results.append(None)
+    return results
+
 
 class PrecalculateProcessor:
     """
@@ -60,23 +79,59 @@ class PrecalculateProcessor:
         trace_mapping = group_by(all_span, operator.itemgetter(OtlpKey.TRACE_ID))
 
         logger.info(f"[PrecalculateProcessor] group by total {len(trace_mapping)} trace")
-        pool = ThreadPool()
         params = [(k, v) for k, v in trace_mapping.items()]
 
-        results = pool.map_ignore_exception(self.get_trace_info, params)
+        results = self.calculate_traces(params, span_count=len(all_span))
 
+        base_info = self.get_base_info()
         data = []
         for result in results:
             if not result:
                 continue
 
+            result = {**base_info, **result}
             # 指定 Id 字段
             data.append({"_index": self.storage.save_index_name, "_id": result["trace_id"], "_source": result})
 
         # 存储数据
         self.storage.save(data)
 
-    def get_status_code(self, span):
+    @classmethod
+    def calculate_traces(cls, params, span_count):
+        """
+        批量计算 Trace 预计算字段
+        计算为 CPU 密集型，数据量较大时按批拆分至多进程执行，进程池不可用时回退为当前进程计算
+        """
+        chunks = [params[i : i + PRECALCULATE_CHUNK_SIZE] for i in range(0, len(params), PRECALCULATE_CHUNK_SIZE)]
+        processes = min(PRECALCULATE_MAX_PROCESSES, len(chunks), os.cpu_count() or 1)
+        if span_count <= PRECALCULATE_PROCESS_SPAN_THRESHOLD or processes <= 1:
+            return _calculate_trace_chunk(params)
+
+        try:
+            # multiprocessing模块在celery中会导致worker假死，使用billiard模块启用多进程
+            pool = multiprocessing.Pool(processes=processes)
+            try:
+                chunk_results = pool.map(_calculate_trace_chunk, chunks)
+            finally:
+                pool.terminate()
+                pool.join()
+        except Exception as e:  # noqa
+            logger.warning(f"[PrecalculateProcessor] process pool unavailable, fallback to current process, error: {e}")
+            return _calculate_trace_chunk(params)
+
+        return [result for results in chunk_results for result in results]
+
+    def get_base_info(self):
+        return {
+            PreCalculateSpecificField.BK_TENANT_ID.value: self.bk_biz_id,
+            PreCalculateSpecificField.BIZ_ID.value: self.bk_biz_id,
+            PreCalculateSpecificField.BIZ_NAME.value: self.bk_biz_name,
+            PreCalculateSpecificField.APP_ID.value: self.application.id,
+            PreCalculateSpecificField.APP_NAME.value: self.app_name,
+        }
+
+    @classmethod
+    def get_status_code(cls, span):
         for i in [SpanAttributes.HTTP_STATUS_CODE, SpanAttributes.RPC_GRPC_STATUS_CODE]:
             if i in span[OtlpKey.ATTRIBUTES]:
                 return span[OtlpKey.ATTRIBUTES][i]
@@ -84,15 +139,18 @@ class PrecalculateProcessor:
         return None
 
     def get_trace_info(self, trace_id, spans):
+        return {**self.get_base_info(), **self.calculate(trace_id, spans)}
+
+    @classmethod
+    def calculate(cls, trace_id, spans):
+        """单次遍历计算 Trace 预计算字段(不包含业务及应用信息)"""
         from apm_web.constants import CategoryEnum
 
         sorted_spans = sorted(spans, key=lambda s: s[OtlpKey.START_TIME])
-        nodes = set()
-        edges = set()
+        span_tree = SpanTree()
         services = set()
-        start_times = []
-        end_times = []
-        durations = []
+        min_start_time = max_end_time = None
+        span_max_duration = span_min_duration = None
         error_count = 0
         category_statistics = {
             CategoryEnum.HTTP: 0,
@@ -108,59 +166,53 @@ class PrecalculateProcessor:
             KindCategory.INTERNAL: 0,
             KindCategory.UNSPECIFIED: 0,
         }
-        collections = self.init_collections()
+        collections = cls.init_collections()
+        collected = {}
 
         span_id_mapping = {}
 
         for i in sorted_spans:
             span_id_mapping[i[OtlpKey.SPAN_ID]] = i
-
-            if i[OtlpKey.PARENT_SPAN_ID]:
-                nodes.add(i[OtlpKey.PARENT_SPAN_ID])
-                nodes.add(i[OtlpKey.SPAN_ID])
-                edges.add((i[OtlpKey.PARENT_SPAN_ID], i[OtlpKey.SPAN_ID]))
-            else:
-                nodes.add(i[OtlpKey.SPAN_ID])
-                edges.add((i[OtlpKey.SPAN_ID], "--"))
+            span_tree.add_span(i[OtlpKey.SPAN_ID], i[OtlpKey.PARENT_SPAN_ID])
 
             service_name = i[OtlpKey.RESOURCE].get(ResourceAttributes.SERVICE_NAME)
             if service_name:
                 services.add(service_name)
 
-            start_times.append(i[OtlpKey.START_TIME])
-            end_times.append(i[OtlpKey.END_TIME])
-            durations.append(i[OtlpKey.END_TIME] - i[OtlpKey.START_TIME])
+            start_time, end_time = i[OtlpKey.START_TIME], i[OtlpKey.END_TIME]
+            duration = end_time - start_time
+            # 已按开始时间排序，首个 Span 即最早开始时间
+            if min_start_time is None:
+                min_start_time = start_time
+                max_end_time = end_time
+                span_max_duration = span_min_duration = duration
+            else:
+                max_end_time = max(max_end_time, end_time)
+                span_max_duration = max(span_max_duration, duration)
+                span_min_duration = min(span_min_duration, duration)
 
             if i[OtlpKey.STATUS]["code"] == StatusCode.ERROR.value:
                 error_count += 1
 
             category_statistics[InferenceHandler.infer(i)] += 1
             kind_statistics[KindCategory.get_category(i[OtlpKey.KIND])] += 1
-            self.collect(collections, i)
+            cls.collect(collections, i, collected)
 
         # 层级数
-        graph = networkx.DiGraph()
-        graph.add_nodes_from(nodes)
-        graph.add_edges_from(edges)
-        hierarchy_count = dag_longest_path_length(graph)
-        degree_mapping = self.list_span_degree(graph, span_id_mapping)
+        hierarchy_count = span_tree.hierarchy_count()
 
         # 入口服务&入口接口&入口状态码&入口调用类型
-        root_service_span = next(
-            iter(
-                sorted(
-                    [v for k, v in degree_mapping.items() if v["node"][OtlpKey.KIND] in SpanKind.called_kinds()],
-                    key=lambda x: (x["degree"], x["node"][OtlpKey.START_TIME]),
-                )
-            ),
-            None,
+        called_kinds = SpanKind.called_kinds()
+        root_service_span = min(
+            (v for v in span_id_mapping.values() if v[OtlpKey.KIND] in called_kinds),
+            key=lambda x: (span_tree.in_degree(x[OtlpKey.SPAN_ID]), x[OtlpKey.START_TIME]),
+            default=None,
         )
         if root_service_span:
-            root_service_span = root_service_span["node"]
             root_service_span_id = root_service_span[OtlpKey.SPAN_ID]
             root_service = root_service_span[OtlpKey.RESOURCE][ResourceAttributes.SERVICE_NAME]
             root_service_span_name = root_service_span[OtlpKey.SPAN_NAME]
-            root_service_status_code = self.get_status_code(root_service_span)
+            root_service_status_code = cls.get_status_code(root_service_span)
             root_service_category = InferenceHandler.infer(root_service_span)
             root_service_kind = root_service_span[OtlpKey.KIND]
         else:
@@ -171,50 +223,21 @@ class PrecalculateProcessor:
             root_service_category = None
             root_service_kind = None
 
-        # 根Span
-        root_span = next(iter(sorted([v for k, v in degree_mapping.items()], key=lambda x: x["degree"])))["node"]
+        # 根Span: 入度最小的 Span，入度相同时取最早出现的
+        root_span = min(span_id_mapping.values(), key=lambda x: span_tree.in_degree(x[OtlpKey.SPAN_ID]))
         root_span_id = root_span[OtlpKey.SPAN_ID]
         root_span_name = root_span[OtlpKey.SPAN_NAME]
         root_span_service = root_span[OtlpKey.RESOURCE].get(ResourceAttributes.SERVICE_NAME)
         root_span_kind = root_span[OtlpKey.KIND]
 
-        # 服务数
-        service_count = len(services)
-
-        # Span数量
-        span_count = len(spans)
-
-        # 最早开始时间
-        min_start_time = sorted(start_times)[0]
-
-        # 最晚结束时间
-        max_end_time = sorted(end_times, reverse=True)[0]
-
-        # Trace耗时
-        trace_duration = max_end_time - min_start_time
-
-        # 单Span最大耗时
-        span_max_duration = max(durations)
-
-        # 单Span最小耗时
-        span_min_duration = min(durations)
-
-        # 是否出错
-        error = bool(error_count)
-
         return {
-            PreCalculateSpecificField.BK_TENANT_ID.value: self.bk_biz_id,
-            PreCalculateSpecificField.BIZ_ID.value: self.bk_biz_id,
-            PreCalculateSpecificField.BIZ_NAME.value: self.bk_biz_name,
-            PreCalculateSpecificField.APP_ID.value: self.application.id,
-            PreCalculateSpecificField.APP_NAME.value: self.app_name,
             PreCalculateSpecificField.TRACE_ID.value: trace_id,
             PreCalculateSpecificField.HIERARCHY_COUNT.value: hierarchy_count,
-            PreCalculateSpecificField.SERVICE_COUNT.value: service_count,
-            PreCalculateSpecificField.SPAN_COUNT.value: span_count,
+            PreCalculateSpecificField.SERVICE_COUNT.value: len(services),
+            PreCalculateSpecificField.SPAN_COUNT.value: len(spans),
             PreCalculateSpecificField.MIN_START_TIME.value: min_start_time,
             PreCalculateSpecificField.MAX_END_TIME.value: max_end_time,
-            PreCalculateSpecificField.TRACE_DURATION.value: trace_duration,
+            PreCalculateSpecificField.TRACE_DURATION.value: max_end_time - min_start_time,
             PreCalculateSpecificField.SPAN_MAX_DURATION.value: span_max_duration,
             PreCalculateSpecificField.SPAN_MIN_DURATION.value: span_min_duration,
             PreCalculateSpecificField.ROOT_SERVICE.value: root_service,
@@ -227,7 +250,7 @@ class PrecalculateProcessor:
             PreCalculateSpecificField.ROOT_SPAN_NAME.value: root_span_name,
             PreCalculateSpecificField.ROOT_SPAN_SERVICE.value: root_span_service,
             PreCalculateSpecificField.ROOT_SPAN_KIND.value: root_span_kind,
-            PreCalculateSpecificField.ERROR.value: error,
+            PreCalculateSpecificField.ERROR.value: bool(error_count),
             PreCalculateSpecificField.ERROR_COUNT.value: error_count,
             PreCalculateSpecificField.TIME.value: int(datetime.datetime.now().timestamp() * 1000 * 1000),
             PreCalculateSpecificField.CATEGORY_STATISTICS.value: category_statistics,
@@ -235,7 +258,8 @@ class PrecalculateProcessor:
             PreCalculateSpecificField.COLLECTIONS.value: collections,
         }
 
-    def init_collections(self):
+    @classmethod
+    def init_collections(cls):
         res = {}
         for f in SpanStandardField.COMMON_STANDARD_FIELDS:
             if f.source == f.key:
@@ -248,26 +272,35 @@ class PrecalculateProcessor:
 
         return res
 
-    def collect(self, collections, span):
+    @classmethod
+    def collect(cls, collections, span, collected=None):
+        """
+        收集标准字段值
+        collected 记录各字段已收集的值，用于集合去重；不传入或值不可哈希时回退为列表判断
+        """
         for f in SpanStandardField.COMMON_STANDARD_FIELDS:
             v = span[f.source]
             if isinstance(v, dict):
-                if v.get(f.key) and v[f.key] not in collections[f.source][f.key]:
-                    collections[f.source][f.key].append(v[f.key])
+                value, values = v.get(f.key), collections[f.source][f.key]
             else:
-                if span.get(f.key) and span[f.key] not in collections[f.source]:
-                    collections[f.source].append(span[f.key])
+                value, values = span.get(f.key), collections[f.source]
 
-    @classmethod
-    def list_span_degree(cls, graph, node_data):
-        """获取span层级等信息"""
+            if not value:
+                continue
 
-        res = {}
-        for node in node_data.values():
-            degree = graph.in_degree(node[OtlpKey.SPAN_ID])
-            res[node[OtlpKey.SPAN_ID]] = {
-                "degree": degree,
-                "node": node,
-            }
+            seen = None if collected is None else collected.setdefault((f.source, f.key), set())
+            if not cls._is_collected(value, values, seen):
+                values.append(value)
 
-        return res
+    @classmethod
+    def _is_collected(cls, value, values, seen):
+        if seen is not None:
+            try:
+                if value in seen:
+                    return True
+                seen.add(value)
+                return False
+            except TypeError:
+                pass
+
+        return value in values
@@ -0,0 +1,82 @@
+"""
+TencentBlueKing is pleased to support the open source community by making
+蓝鲸智云 - Resource SDK (BlueKing - Resource SDK) available.
+Copyright (C) 2017-2025 Tencent,
+a Tencent company. All rights reserved.
+Licensed under the MIT License (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND,
+either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+We undertake not to change the open source license (MIT license) applicable
+to the current version of the project delivered to anyone in the future.
+"""
+
+from collections import defaultdict
+
+
+class SpanTree:
+    """
+    轻量级 Span 树
+    单次遍历构建 父->子 映射及入度，替代 networkx.DiGraph 计算层级数与入度，语义与原有图保持一致:
+    1. 存在父 Span 时连边 parent -> span，父 Span 可以不在当前数据中
+    2. 根 Span 额外连向虚拟节点 "--"，因此只有根 Span 的 Trace 层级数为 1
+    """
+
+    VIRTUAL_NODE = "--"
+
+    def __init__(self):
+        self.children: dict[str, set[str]] = defaultdict(set)
+        self.in_degrees: dict[str, int] = defaultdict(int)
+
+    def add_span(self, span_id: str, parent_span_id: str | None):
+        if parent_span_id:
+            parent, child = parent_span_id, span_id
+        else:
+            parent, child = span_id, self.VIRTUAL_NODE
+
+        # 重复的边不重复计数
+        if child in self.children[parent]:
+            return
+        self.children[parent].add(child)
+        self.in_degrees[child] += 1
+
+    def in_degree(self, span_id: str) -> int:
+        return self.in_degrees.get(span_id, 0)
+
+    def hierarchy_count(self) -> int:
+        """
+        层级数，即最长路径的边数
+        使用迭代 DFS 计算每个节点出发的最长路径，避免深层 Trace 触发递归深度限制；存在环时抛出 ValueError
+        """
+        longest: dict[str, int] = {}
+        visiting: set[str] = set()
+
+        for start in list(self.children):
+            if start in longest:
+                continue
+
+            visiting.add(start)
+            stack = [(start, iter(self.children[start]))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child in longest:
+                        continue
+                    if child in visiting:
+                        raise ValueError(f"span tree contains cycle at span({child})")
+                    if child in self.children:
+                        visiting.add(child)
+                        stack.append((child, iter(self.children[child])))
+                        break
+                    # 叶子节点
+                    longest[child] = 0
+                else:
+                    stack.pop()
+                    visiting.discard(node)
+                    longest[node] = max(longest[child] for child in self.children[node]) + 1
+
+        return max(longest.values(), default=0)
@@ -22,6 +22,25 @@ class RelationDiscover(DiscoverBase):
     MAX_COUNT = 100000
     model = TopoRelation
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 服务节点的 kind 及 category，单次发现内缓存，避免逐 Span 查询 TopoNode
+        self._service_nodes = {}
+
+    def get_service_kind_category(self, service_name):
+        if service_name not in self._service_nodes:
+            kind = ApmTopoDiscoverRule.TOPO_SERVICE
+            category = ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP
+            topo_node = TopoNode.objects.filter(
+                bk_biz_id=self.bk_biz_id, app_name=self.app_name, topo_key=service_name
+            ).first()
+            if topo_node:
+                kind = topo_node.extra_data.get("kind", ApmTopoDiscoverRule.TOPO_SERVICE)
+                category = topo_node.extra_data.get("category", ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP)
+            self._service_nodes[service_name] = (kind, category)
+
+        return self._service_nodes[service_name]
+
     def get_relation_map(self, origin_data):
         relation_mapping = defaultdict(lambda: {"from": None, "to": [], "kind": ""})
 
@@ -113,14 +132,7 @@ class RelationDiscover(DiscoverBase):
                         )
                     )
                 elif kind in [SpanKind.SPAN_KIND_SERVER, SpanKind.SPAN_KIND_CONSUMER]:
-                    topo_node = TopoNode.objects.filter(
-                        bk_biz_id=self.bk_biz_id, app_name=self.app_name, topo_key=self.get_service_name(from_span)
-                    ).first()
-                    kind = ApmTopoDiscoverRule.TOPO_SERVICE
-                    category = ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP
-                    if topo_node:
-                        kind = topo_node.extra_data.get("kind", ApmTopoDiscoverRule.TOPO_SERVICE)
-                        category = topo_node.extra_data.get("category", ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP)
+                    kind, category = self.get_service_kind_category(self.get_service_name(from_span))
                     found_keys.add(
                         (
                             to_key,
@@ -179,17 +191,10 @@ class RelationDiscover(DiscoverBase):
 
             if middleware_to_key == middleware_key:
                 messaging_service_name = self.get_service_name(t)
-                messaging_service_kind = ApmTopoDiscoverRule.TOPO_SERVICE
-                messaging_service_category = ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP
-                topo_node = TopoNode.objects.filter(
-                    bk_biz_id=self.bk_biz_id, app_name=self.app_name, topo_key=messaging_service_name
-                ).first()
-                # topo_node 存在则更新
-                if topo_node:
-                    messaging_service_category = topo_node.extra_data.get(
-                        "category", ApmTopoDiscoverRule.APM_TOPO_CATEGORY_HTTP
-                    )
-                    messaging_service_kind = topo_node.extra_data.get("kind", ApmTopoDiscoverRule.TOPO_SERVICE)
+                # topo_node 存在则使用节点的 kind 及 category
+                messaging_service_kind, messaging_service_category = self.get_service_kind_category(
+                    messaging_service_name
+                )
                 # 针对异步调用中消息队列，messaging --> 服务时， 目标节点类型为service， 目标节点分类为 http
                 found_keys.add(
                     (
@@ -241,6 +246,7 @@ class RelationDiscover(DiscoverBase):
         return found_keys
 
     def discover(self, origin_data):
+        self._service_nodes = {}
         rules, other_rule = self.get_rules()
         component_rules = [r for r in rules + [other_rule] if r.topo_kind == ApmTopoDiscoverRule.TOPO_COMPONENT]
 
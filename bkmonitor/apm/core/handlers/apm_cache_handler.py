@@ -7,7 +7,9 @@ from django.conf import settings
 
 from apm.constants import (
     APM_ENDPOINT,
+    APM_TOPO_DISCOVER_WATERMARK,
     APM_TOPO_INSTANCE,
+    APM_TOPO_INSTANCE_INDEX,
     DEFAULT_APM_CACHE_EXPIRE,
 )
 from bkmonitor.utils.common_utils import uniqid4
@@ -59,6 +61,56 @@ class ApmCacheHandler:
     def get_endpoint_cache_key(bk_biz_id, app_name):
         return APM_ENDPOINT.format(settings.PLATFORM, settings.ENVIRONMENT, bk_biz_id, app_name)
 
+    @staticmethod
+    def get_topo_instance_index_key(bk_biz_id, app_name):
+        return APM_TOPO_INSTANCE_INDEX.format(settings.PLATFORM, settings.ENVIRONMENT, bk_biz_id, app_name)
+
+    def get_hash_data(self, name: str) -> dict | None:
+        """
+        获取 hash 结构的缓存数据，key 不存在时返回 None
+        """
+        data = self.redis_client.hgetall(name)
+        if not data:
+            return None
+        return {self.decode_redis_value(k): self.decode_redis_value(v) for k, v in data.items()}
+
+    def update_hash_data(
+        self,
+        name: str,
+        update_map: dict,
+        delete_fields: list | set = None,
+        ex: int = DEFAULT_APM_CACHE_EXPIRE,
+        chunk_size: int = 5000,
+    ):
+        """
+        增量更新 hash 结构的缓存数据，并刷新过期时间
+        """
+        pipeline = self.redis_client.pipeline(transaction=False)
+        items = list(update_map.items())
+        for i in range(0, len(items), chunk_size):
+            pipeline.hset(name, mapping=dict(items[i : i + chunk_size]))
+        delete_fields = list(delete_fields or [])
+        for i in range(0, len(delete_fields), chunk_size):
+            pipeline.hdel(name, *delete_fields[i : i + chunk_size])
+        pipeline.expire(name, ex)
+        pipeline.execute()
+
+    @staticmethod
+    def get_topo_discover_watermark_key(bk_biz_id, app_name):
+        return APM_TOPO_DISCOVER_WATERMARK.format(settings.PLATFORM, settings.ENVIRONMENT, bk_biz_id, app_name)
+
+    def get_topo_discover_watermark(self, bk_biz_id, app_name) -> int | None:
+        """
+        获取拓扑发现水位(毫秒时间戳)，水位之前的 Span 已完成发现
+        """
+        value = self.decode_redis_value(
+            self.redis_client.get(self.get_topo_discover_watermark_key(bk_biz_id, app_name))
+        )
+        return int(value) if value else None
+
+    def set_topo_discover_watermark(self, bk_biz_id, app_name, watermark: int, ex: int = DEFAULT_APM_CACHE_EXPIRE):
+        self.redis_client.set(self.get_topo_discover_watermark_key(bk_biz_id, app_name), watermark, ex=ex)
+
     def refresh_data(self, name: str, update_map: dict, ex: int = DEFAULT_APM_CACHE_EXPIRE):
         """
         更新、删除数据
@@ -0,0 +1,188 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+import random
+import time
+from unittest import mock
+
+import networkx
+import pytest
+
+from apm.core.discover.precalculation import processor as processor_module
+from apm.core.discover.precalculation.processor import PrecalculateProcessor
+from apm.core.discover.precalculation.span_tree import SpanTree
+from constants.apm import OtlpKey, SpanKind, SpanStandardField
+
+logger = logging.getLogger("apm")
+
+SERVICES = ["frontend", "checkout", "payment", "inventory"]
+KINDS = [
+    SpanKind.SPAN_KIND_SERVER,
+    SpanKind.SPAN_KIND_CLIENT,
+    SpanKind.SPAN_KIND_INTERNAL,
+    SpanKind.SPAN_KIND_CONSUMER,
+]
+
+
+def make_trace(trace_id, span_count, seed=0):
+    """构造合成 Trace：随机树结构，包含重复 span_id 及缺失的父 Span"""
+    rnd = random.Random(seed)
+    spans = []
+    for i in range(span_count):
+        if i == 0:
+            parent_span_id = ""
+        elif rnd.random() < 0.01:
+            # 父 Span 未上报
+            parent_span_id = f"missing-{i}"
+        else:
+            parent_span_id = f"{trace_id}-{rnd.randrange(max(0, i - 8), i)}"
+        start_time = 1700000000000000 + i * 10 + rnd.randrange(5)
+        spans.append(
+            {
+                OtlpKey.TRACE_ID: trace_id,
+                OtlpKey.SPAN_ID: f"{trace_id}-{i}",
+                OtlpKey.PARENT_SPAN_ID: parent_span_id,
+                OtlpKey.SPAN_NAME: f"span-{i % 20}",
+                OtlpKey.KIND: rnd.choice(KINDS),
+                OtlpKey.START_TIME: start_time,
+                OtlpKey.END_TIME: start_time + rnd.randrange(1, 1000),
+                OtlpKey.STATUS: {"code": rnd.choice([0, 1, 2]), "message": ""},
+                OtlpKey.RESOURCE: {"service.name": rnd.choice(SERVICES)},
+                OtlpKey.ATTRIBUTES: {"http.method": rnd.choice(["GET", "POST"]), "http.status_code": 200},
+            }
+        )
+    # 重复上报的 Span
+    if span_count > 1:
+        spans.append(dict(spans[-1]))
+    return spans
+
+
+def legacy_tree_info(spans):
+    """原基于 networkx 的层级数及根 Span 计算，作为对照"""
+    sorted_spans = sorted(spans, key=lambda s: s[OtlpKey.START_TIME])
+    graph = networkx.DiGraph()
+    span_id_mapping = {}
+    for i in sorted_spans:
+        span_id_mapping[i[OtlpKey.SPAN_ID]] = i
+        if i[OtlpKey.PARENT_SPAN_ID]:
+            graph.add_edge(i[OtlpKey.PARENT_SPAN_ID], i[OtlpKey.SPAN_ID])
+        else:
+            graph.add_edge(i[OtlpKey.SPAN_ID], "--")
+
+    degrees = [{"degree": graph.in_degree(k), "node": v} for k, v in span_id_mapping.items()]
+    root_service_span = next(
+        iter(
+            sorted(
+                [d for d in degrees if d["node"][OtlpKey.KIND] in SpanKind.called_kinds()],
+                key=lambda x: (x["degree"], x["node"][OtlpKey.START_TIME]),
+            )
+        ),
+        None,
+    )
+    root_span = sorted(degrees, key=lambda x: x["degree"])[0]["node"]
+    return {
+        "hierarchy_count": networkx.dag_longest_path_length(graph),
+        "root_span_id": root_span[OtlpKey.SPAN_ID],
+        "root_service_span_id": root_service_span["node"][OtlpKey.SPAN_ID] if root_service_span else None,
+    }
+
+
+def legacy_collections(spans):
+    collections = PrecalculateProcessor.init_collections()
+    for span in sorted(spans, key=lambda s: s[OtlpKey.START_TIME]):
+        for f in SpanStandardField.COMMON_STANDARD_FIELDS:
+            v = span[f.source]
+            if isinstance(v, dict):
+                if v.get(f.key) and v[f.key] not in collections[f.source][f.key]:
+                    collections[f.source][f.key].append(v[f.key])
+            else:
+                if span.get(f.key) and span[f.key] not in collections[f.source]:
+                    collections[f.source].append(span[f.key])
+    return collections
+
+
+@pytest.mark.parametrize("span_count", [1, 10, 1000, 10000])
+def test_calculate_parity_with_networkx(span_count):
+    spans = make_trace("t1", span_count, seed=span_count)
+
+    result = PrecalculateProcessor.calculate("t1", spans)
+    expect = legacy_tree_info(spans)
+
+    assert result["hierarchy_count"] == expect["hierarchy_count"]
+    assert result["root_span_id"] == expect["root_span_id"]
+    assert result["root_service_span_id"] == expect["root_service_span_id"]
+    assert result["collections"] == legacy_collections(spans)
+    assert result["span_count"] == len(spans)
+    assert result["min_start_time"] == min(s[OtlpKey.START_TIME] for s in spans)
+    assert result["max_end_time"] == max(s[OtlpKey.END_TIME] for s in spans)
+
+
+def test_span_tree():
+    tree = SpanTree()
+    assert tree.hierarchy_count() == 0
+
+    # 仅有根 Span 时层级为 1
+    tree.add_span("a", "")
+    assert tree.hierarchy_count() == 1
+
+    tree.add_span("b", "a")
+    tree.add_span("b", "a")
+    tree.add_span("c", "b")
+    assert tree.hierarchy_count() == 3
+    assert tree.in_degree("b") == 1
+    assert tree.in_degree("a") == 0
+
+    # 成环
+    tree.add_span("a", "c")
+    with pytest.raises(ValueError):
+        tree.hierarchy_count()
+
+
+def test_calculate_traces_with_process_pool():
+    params = [(f"trace-{i}", make_trace(f"trace-{i}", 50, seed=i)) for i in range(20)]
+    # 成环的 Trace 计算失败，不影响其他 Trace
+    loop_span = dict(params[0][1][0], **{OtlpKey.SPAN_ID: "loop", OtlpKey.PARENT_SPAN_ID: "loop"})
+    params.append(("cycle", [loop_span]))
+
+    sequential = PrecalculateProcessor.calculate_traces(params, span_count=0)
+    with (
+        mock.patch.object(processor_module, "PRECALCULATE_PROCESS_SPAN_THRESHOLD", 0),
+        mock.patch.object(processor_module, "PRECALCULATE_CHUNK_SIZE", 5),
+    ):
+        parallel = PrecalculateProcessor.calculate_traces(params, span_count=1000)
+
+    assert sequential[-1] is None and parallel[-1] is None
+    assert [r["trace_id"] for r in parallel[:-1]] == [f"trace-{i}" for i in range(20)]
+    for left, right in zip(sequential[:-1], parallel[:-1]):
+        assert {k: v for k, v in left.items() if k != "time"} == {k: v for k, v in right.items() if k != "time"}
+
+
+def test_benchmark_span_tree():
+    """基准：对比 networkx 与 SpanTree 的层级数计算耗时"""
+    for span_count in [10, 100, 1000, 10000]:
+        spans = make_trace("bench", span_count, seed=span_count)
+
+        begin = time.perf_counter()
+        expect = legacy_tree_info(spans)
+        networkx_cost = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        tree = SpanTree()
+        for span in spans:
+            tree.add_span(span[OtlpKey.SPAN_ID], span[OtlpKey.PARENT_SPAN_ID])
+        hierarchy_count = tree.hierarchy_count()
+        span_tree_cost = time.perf_counter() - begin
+
+        assert hierarchy_count == expect["hierarchy_count"]
+        logger.info(
+            f"[test_benchmark_span_tree] spans({span_count}) networkx: {networkx_cost * 1000:.2f}ms, "
+            f"span_tree: {span_tree_cost * 1000:.2f}ms"
+        )
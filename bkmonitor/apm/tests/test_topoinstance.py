@@ -121,3 +121,43 @@ class TestTopoInstance(django.test.TestCase):
         metadata_models.ESStorage.objects.all().delete()
 
         ApmCacheHandler().redis_client.delete(name)
+
+    def test_topo_instance_index(self):
+        from metadata import models as metadata_models
+
+        ApmApplication.objects.create(
+            bk_biz_id=BK_BIZ_ID, app_name=APP_NAME, app_alias=APP_ALIAS, description=DESCRIPTION
+        )
+        TraceDataSource.objects.create(bk_biz_id=BK_BIZ_ID, app_name=APP_NAME, result_table_id=TABLE_ID)
+        metadata_models.ESStorage.objects.create(table_id=TABLE_ID, storage_cluster_id=STORAGE_CLUSTER_ID)
+
+        topo_instance = InstanceDiscover(bk_biz_id=BK_BIZ_ID, app_name=APP_NAME)
+        index_name = ApmCacheHandler.get_topo_instance_index_key(bk_biz_id=BK_BIZ_ID, app_name=APP_NAME)
+        queryset = TopoInstance.objects.filter(bk_biz_id=BK_BIZ_ID, app_name=APP_NAME)
+
+        topo_instance.discover(SPAN_DATA_LIST)
+        ids = set(queryset.values_list("id", flat=True))
+        index = topo_instance.load_index()
+        assert ids and {entry[0] for entry in index.values()} == ids
+
+        # 已存在的实例只刷新索引，不重复创建
+        topo_instance.discover(SPAN_DATA_LIST)
+        assert set(queryset.values_list("id", flat=True)) == ids
+
+        # 重复实例在重建索引时被清理
+        duplicate = queryset.first()
+        duplicate.pk = None
+        duplicate.save()
+        ApmCacheHandler().redis_client.delete(index_name)
+        rebuilt_index = topo_instance.load_index()
+        assert set(rebuilt_index) == set(index)
+        assert {entry[0] for entry in rebuilt_index.values()} == ids
+        assert set(queryset.values_list("id", flat=True)) == ids
+
+        TopoInstance.objects.all().delete()
+        ApmApplication.objects.all().delete()
+        TraceDataSource.objects.all().delete()
+        metadata_models.ESStorage.objects.all().delete()
+
+        ApmCacheHandler().redis_client.delete(index_name)
+        ApmCacheHandler().redis_client.delete(ApmCacheHandler.get_topo_instance_cache_key(BK_BIZ_ID, APP_NAME))
@@ -74,16 +74,18 @@ class UpgradeRuleMatch:
 class AssignRuleMatch:
     """分派规则适配"""
 
-    def __init__(self, assign_rule, assign_rule_snap=None, alert: AlertDocument = None):
+    def __init__(self, assign_rule, assign_rule_snap=None, alert: AlertDocument = None, dimension_check=None):
         """
         :param assign_rule:  规则ID
         :param assign_rule_snap:
+        :param dimension_check: 预编译的条件对象，不传则根据规则条件解析
         :return:
         """
         self.assign_rule = assign_rule
         self.assign_rule_snap = assign_rule_snap or {}
-        self.dimension_check = None
-        self.parse_dimension_conditions()
+        self.dimension_check = dimension_check
+        if self.dimension_check is None:
+            self.parse_dimension_conditions()
         self.alert = alert
 
     def parse_dimension_conditions(self):
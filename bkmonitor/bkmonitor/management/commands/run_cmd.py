@@ -28,6 +28,7 @@ from bkmonitor.models.strategy import (
     StrategyModel,
     UserGroup,
 )
+from bkmonitor.strategy.summary import refresh_strategy_summary
 from constants.common import DEFAULT_TENANT_ID
 from constants.data_source import DataSourceLabel, DataTypeLabel
 from constants.strategy import TargetFieldType
@@ -479,3 +480,4 @@ def parse_usergroup_not_under_business(preview: bool = True):
 
     if not preview:
         StrategyActionConfigRelation.objects.bulk_update(strategy_relation_instances, ["user_groups"])
+        refresh_strategy_summary(relation.strategy_id for relation in strategy_relation_instances)
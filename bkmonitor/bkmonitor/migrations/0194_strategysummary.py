@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2025-12-15 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bkmonitor", "0193_update_20251303"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StrategySummary",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("strategy_id", models.IntegerField(unique=True, verbose_name="策略ID")),
+                ("bk_biz_id", models.IntegerField(db_index=True, verbose_name="业务ID")),
+                ("strategy_update_time", models.DateTimeField(verbose_name="策略最后修改时间")),
+                ("alert_count", models.IntegerField(default=0, verbose_name="未屏蔽的未恢复告警数量")),
+                ("shield_alert_count", models.IntegerField(default=0, verbose_name="已屏蔽的未恢复告警数量")),
+                ("update_time", models.DateTimeField(auto_now=True, verbose_name="最后修改时间")),
+            ],
+            options={
+                "verbose_name": "策略列表摘要",
+                "verbose_name_plural": "策略列表摘要",
+                "db_table": "alarm_strategy_summary",
+            },
+        ),
+        migrations.CreateModel(
+            name="StrategySummaryFacet",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("strategy_id", models.IntegerField(db_index=True, verbose_name="策略ID")),
+                ("bk_biz_id", models.IntegerField(verbose_name="业务ID")),
+                ("facet", models.CharField(max_length=32, verbose_name="分类")),
+                ("value", models.CharField(max_length=128, verbose_name="分类值")),
+            ],
+            options={
+                "verbose_name": "策略列表分类属性",
+                "verbose_name_plural": "策略列表分类属性",
+                "db_table": "alarm_strategy_summary_facet",
+                "index_together": {("bk_biz_id", "facet", "value")},
+            },
+        ),
+    ]
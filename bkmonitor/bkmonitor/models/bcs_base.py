@@ -17,6 +17,7 @@ from datetime import datetime
 from functools import reduce
 from typing import Any
 
+from django.core.cache import cache
 from django.core.exceptions import EmptyResultSet
 from django.db import models
 from django.db.models import Count, Q
@@ -40,6 +41,9 @@ IGNORE_LABEL_KEYS = {
     "job-name",
 }
 
+# 集群标签索引缓存时间，标签同步时主动失效
+LABEL_INDEX_CACHE_TIMEOUT = 60 * 10
+
 
 class BCSBaseManager(models.Manager):
     def count_service_status_quantity(self, query_set_list):
@@ -357,6 +361,55 @@ class BCSBase(models.Model):
                     bcs_cluster_id=bcs_cluster_id, label_id=label_hash_id, resource_id=resource_id
                 ).delete()
 
+        # 标签变更后清除集群标签索引
+        if resource_label_hash_set_inserted or label_hash_set_inserted_deleted:
+            cache.delete_many([cls.get_label_index_cache_key(cluster_id) for cluster_id in set(bcs_cluster_id_list)])
+
+    @classmethod
+    def get_label_index_cache_key(cls, bcs_cluster_id: str) -> str:
+        return f"kubernetes:label_index:{cls.labels.through._meta.db_table}:{bcs_cluster_id}"
+
+    @classmethod
+    def get_label_index(cls, bcs_cluster_ids: list[str]) -> dict[str, set[str]]:
+        """获得集群下资源的标签索引 {标签名: 标签值集合}，按集群缓存 ."""
+        cache_keys = {cls.get_label_index_cache_key(cluster_id): cluster_id for cluster_id in set(bcs_cluster_ids)}
+        cluster_indexes = cache.get_many(list(cache_keys))
+
+        missing_cluster_ids = [cluster_id for key, cluster_id in cache_keys.items() if key not in cluster_indexes]
+        if missing_cluster_ids:
+            cluster_label_ids = {cluster_id: set() for cluster_id in missing_cluster_ids}
+            for cluster_id, label_id in (
+                cls.labels.through.objects.filter(bcs_cluster_id__in=missing_cluster_ids)
+                .values_list("bcs_cluster_id", "label_id")
+                .distinct()
+            ):
+                cluster_label_ids[cluster_id].add(label_id)
+
+            all_label_ids = set().union(*cluster_label_ids.values())
+            labels = {}
+            for hash_ids in chunks(list(all_label_ids), 500):
+                for hash_id, key, value in BCSLabel.objects.filter(hash_id__in=hash_ids).values_list(
+                    "hash_id", "key", "value"
+                ):
+                    labels[hash_id] = (key, value)
+
+            new_indexes = {}
+            for cluster_id, label_ids in cluster_label_ids.items():
+                label_index = {}
+                for label_id in label_ids:
+                    if label_id in labels:
+                        key, value = labels[label_id]
+                        label_index.setdefault(key, []).append(value)
+                new_indexes[cls.get_label_index_cache_key(cluster_id)] = label_index
+            cache.set_many(new_indexes, LABEL_INDEX_CACHE_TIMEOUT)
+            cluster_indexes.update(new_indexes)
+
+        result = {}
+        for label_index in cluster_indexes.values():
+            for key, values in label_index.items():
+                result.setdefault(key, set()).update(values)
+        return result
+
     @staticmethod
     def md5str(source: str):
         m = hashlib.md5()
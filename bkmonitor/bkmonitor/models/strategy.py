@@ -34,6 +34,8 @@ __all__ = [
     "AlgorithmModel",
     "QueryConfigModel",
     "StrategyLabel",
+    "StrategySummary",
+    "StrategySummaryFacet",
     "StrategyHistoryModel",
     "StrategyModelAdmin",
     "StrategyHistoryModelAdmin",
@@ -322,6 +324,50 @@ class StrategyLabel(Model):
             resource.strategies.strategy_label(label_name=label, strategy_id=strategy_id, bk_biz_id=bk_biz_id)
 
 
+class StrategySummary(Model):
+    """
+    策略列表摘要
+    记录策略列表所需的告警统计，策略保存/删除时同步，告警数量由周期任务根据告警状态刷新
+    """
+
+    strategy_id = models.IntegerField("策略ID", unique=True)
+    bk_biz_id = models.IntegerField("业务ID", db_index=True)
+    strategy_update_time = models.DateTimeField("策略最后修改时间")
+    alert_count = models.IntegerField("未屏蔽的未恢复告警数量", default=0)
+    shield_alert_count = models.IntegerField("已屏蔽的未恢复告警数量", default=0)
+    update_time = models.DateTimeField("最后修改时间", auto_now=True)
+
+    class Meta:
+        verbose_name = "策略列表摘要"
+        verbose_name_plural = "策略列表摘要"
+        db_table = "alarm_strategy_summary"
+
+
+class StrategySummaryFacet(Model):
+    """
+    策略列表分类属性，如数据源、标签、告警级别、算法类型、告警组及处理套餐，每个属性值一条记录
+    """
+
+    class FacetType:
+        DATA_SOURCE = "data_source"
+        LABEL = "label"
+        LEVEL = "level"
+        ALGORITHM_TYPE = "algorithm_type"
+        USER_GROUP = "user_group"
+        ACTION_CONFIG = "action_config"
+
+    strategy_id = models.IntegerField("策略ID", db_index=True)
+    bk_biz_id = models.IntegerField("业务ID")
+    facet = models.CharField("分类", max_length=32)
+    value = models.CharField("分类值", max_length=128)
+
+    class Meta:
+        verbose_name = "策略列表分类属性"
+        verbose_name_plural = "策略列表分类属性"
+        db_table = "alarm_strategy_summary_facet"
+        index_together = (("bk_biz_id", "facet", "value"),)
+
+
 class StrategyModelAdmin(admin.ModelAdmin):
     """
     策略表展示
@@ -90,6 +90,7 @@ from bkmonitor.strategy.serializers import (
     YearRoundAmplitudeSerializer,
     YearRoundRangeSerializer,
 )
+from bkmonitor.strategy.summary import delete_strategy_summary, refresh_strategy_summary
 from bkmonitor.utils.time_tools import parse_time_compare_abbreviation, strftime_local
 from bkmonitor.utils.user import get_global_user
 from constants.action import ActionPluginType, ActionSignal, AssignMode, UserGroupType
@@ -2473,6 +2474,9 @@ class Strategy(AbstractConfig):
         history.status = True
         history.save()
 
+        # 更新策略列表摘要
+        refresh_strategy_summary([self.id])
+
         if need_access_aiops:
             self.access_aiops(algorithm_name)
 
@@ -2738,6 +2742,7 @@ class Strategy(AbstractConfig):
         AlgorithmModel.objects.filter(strategy_id=self.id).delete()
         QueryConfigModel.objects.filter(strategy_id=self.id).delete()
         StrategyLabel.objects.filter(strategy_id=self.id).delete()
+        delete_strategy_summary([self.id])
 
     @classmethod
     def delete_by_strategy_ids(cls, strategy_ids: list[int]):
@@ -2762,6 +2767,7 @@ class Strategy(AbstractConfig):
         AlgorithmModel.objects.filter(strategy_id__in=strategy_ids).delete()
         QueryConfigModel.objects.filter(strategy_id__in=strategy_ids).delete()
         StrategyLabel.objects.filter(strategy_id__in=strategy_ids).delete()
+        delete_strategy_summary(strategy_ids)
 
     @classmethod
     def from_models(cls, strategies: list[StrategyModel] | QuerySet) -> list["Strategy"]:
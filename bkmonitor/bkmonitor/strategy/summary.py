@@ -0,0 +1,231 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+"""
+策略列表摘要维护
+
+策略列表的分类属性(数据源/标签/告警级别/算法类型/告警组/处理套餐)及告警数量预先写入摘要表，
+列表页的过滤及分类统计只需查询摘要表
+"""
+
+import logging
+from collections.abc import Iterable
+
+from django.db import transaction
+from django.db.models import Q, QuerySet
+
+from bkmonitor.documents import AlertDocument
+from bkmonitor.models import (
+    AlgorithmModel,
+    DetectModel,
+    QueryConfigModel,
+    StrategyActionConfigRelation,
+    StrategyLabel,
+    StrategyModel,
+    StrategySummary,
+    StrategySummaryFacet,
+)
+from constants.alert import EventStatus
+
+logger = logging.getLogger("strategy")
+
+FacetType = StrategySummaryFacet.FacetType
+
+BATCH_SIZE = 500
+# 告警按策略聚合时每页的桶数量
+ALERT_AGG_PAGE_SIZE = 5000
+
+
+def get_strategy_facets(strategy_ids: list[int]) -> dict[int, set[tuple[str, str]]]:
+    """
+    查询策略的分类属性
+    """
+    facets = {strategy_id: set() for strategy_id in strategy_ids}
+
+    for record in QueryConfigModel.objects.filter(strategy_id__in=strategy_ids).values(
+        "strategy_id", "data_source_label", "data_type_label"
+    ):
+        facets[record["strategy_id"]].add(
+            (FacetType.DATA_SOURCE, f"{record['data_source_label']}|{record['data_type_label']}")
+        )
+
+    for strategy_id, label_name in StrategyLabel.objects.filter(strategy_id__in=strategy_ids).values_list(
+        "strategy_id", "label_name"
+    ):
+        facets[strategy_id].add((FacetType.LABEL, label_name))
+
+    for strategy_id, level in DetectModel.objects.filter(strategy_id__in=strategy_ids).values_list(
+        "strategy_id", "level"
+    ):
+        facets[strategy_id].add((FacetType.LEVEL, str(level)))
+
+    for strategy_id, algorithm_type in AlgorithmModel.objects.filter(strategy_id__in=strategy_ids).values_list(
+        "strategy_id", "type"
+    ):
+        if algorithm_type:
+            facets[strategy_id].add((FacetType.ALGORITHM_TYPE, algorithm_type))
+
+    for relation in StrategyActionConfigRelation.objects.filter(strategy_id__in=strategy_ids).values(
+        "strategy_id", "relate_type", "config_id", "user_groups"
+    ):
+        for user_group_id in relation["user_groups"] or []:
+            facets[relation["strategy_id"]].add((FacetType.USER_GROUP, str(user_group_id)))
+        if relation["relate_type"] == StrategyActionConfigRelation.RelateType.ACTION:
+            facets[relation["strategy_id"]].add((FacetType.ACTION_CONFIG, str(relation["config_id"])))
+
+    # 未配置处理套餐的策略记为 0
+    for strategy_facets in facets.values():
+        if not any(facet == FacetType.ACTION_CONFIG for facet, _ in strategy_facets):
+            strategy_facets.add((FacetType.ACTION_CONFIG, "0"))
+
+    return facets
+
+
+def refresh_strategy_summary(strategy_ids: Iterable[int]):
+    """
+    重建策略摘要，不存在的策略删除其摘要，告警数量保持不变
+    """
+    strategy_ids = list(set(strategy_ids))
+    for index in range(0, len(strategy_ids), BATCH_SIZE):
+        _refresh_strategy_summary(strategy_ids[index : index + BATCH_SIZE])
+
+
+@transaction.atomic
+def _refresh_strategy_summary(strategy_ids: list[int]):
+    strategies = {
+        strategy["id"]: strategy
+        for strategy in StrategyModel.objects.filter(id__in=strategy_ids).values("id", "bk_biz_id", "update_time")
+    }
+    facets = get_strategy_facets(list(strategies))
+
+    StrategySummaryFacet.objects.filter(strategy_id__in=strategy_ids).delete()
+    StrategySummaryFacet.objects.bulk_create(
+        [
+            StrategySummaryFacet(
+                strategy_id=strategy_id, bk_biz_id=strategies[strategy_id]["bk_biz_id"], facet=facet, value=value
+            )
+            for strategy_id, strategy_facets in facets.items()
+            for facet, value in strategy_facets
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    summaries = {
+        summary.strategy_id: summary for summary in StrategySummary.objects.filter(strategy_id__in=strategy_ids)
+    }
+    StrategySummary.objects.filter(strategy_id__in=set(summaries) - set(strategies)).delete()
+
+    new_summaries, changed_summaries = [], []
+    for strategy_id, strategy in strategies.items():
+        summary = summaries.get(strategy_id)
+        if summary is None:
+            new_summaries.append(
+                StrategySummary(
+                    strategy_id=strategy_id,
+                    bk_biz_id=strategy["bk_biz_id"],
+                    strategy_update_time=strategy["update_time"],
+                )
+            )
+            continue
+        summary.bk_biz_id = strategy["bk_biz_id"]
+        summary.strategy_update_time = strategy["update_time"]
+        changed_summaries.append(summary)
+    StrategySummary.objects.bulk_create(new_summaries, batch_size=BATCH_SIZE)
+    StrategySummary.objects.bulk_update(changed_summaries, ["bk_biz_id", "strategy_update_time"], batch_size=BATCH_SIZE)
+
+
+def delete_strategy_summary(strategy_ids: Iterable[int]):
+    """
+    删除策略摘要
+    """
+    strategy_ids = list(strategy_ids)
+    StrategySummary.objects.filter(strategy_id__in=strategy_ids).delete()
+    StrategySummaryFacet.objects.filter(strategy_id__in=strategy_ids).delete()
+
+
+def sync_strategy_summary(strategies: QuerySet = None) -> list[int]:
+    """
+    根据策略修改时间补齐缺失或过期的策略摘要
+    :return: 重建的策略ID
+    """
+    if strategies is None:
+        strategies = StrategyModel.objects.all()
+
+    update_times = dict(
+        StrategySummary.objects.filter(strategy_id__in=strategies.values("id")).values_list(
+            "strategy_id", "strategy_update_time"
+        )
+    )
+    stale_strategy_ids = [
+        strategy_id
+        for strategy_id, update_time in strategies.values_list("id", "update_time")
+        if update_times.get(strategy_id) != update_time
+    ]
+    if stale_strategy_ids:
+        refresh_strategy_summary(stale_strategy_ids)
+    return stale_strategy_ids
+
+
+def iter_strategy_alert_buckets():
+    """
+    按策略分页聚合未恢复告警，使用 composite 聚合翻页，策略数量不受单次聚合桶数限制
+    """
+    after_key = None
+    while True:
+        search_object = AlertDocument.search(all_indices=True).filter("term", status=EventStatus.ABNORMAL)[:0]
+        composite_params = {
+            "size": ALERT_AGG_PAGE_SIZE,
+            "sources": [{"strategy_id": {"terms": {"field": "strategy_id"}}}],
+        }
+        if after_key:
+            composite_params["after"] = after_key
+        search_object.aggs.bucket("strategy_id", "composite", **composite_params).bucket(
+            "shielded", "filter", {"term": {"is_shielded": True}}
+        )
+        search_result = search_object.execute()
+        if not search_result.aggs:
+            return
+
+        buckets = search_result.aggs.strategy_id.buckets
+        yield from buckets
+
+        after_key = getattr(search_result.aggs.strategy_id, "after_key", None)
+        if len(buckets) < ALERT_AGG_PAGE_SIZE or not after_key:
+            return
+        after_key = {"strategy_id": after_key.strategy_id}
+
+
+def refresh_strategy_alert_summary():
+    """
+    根据未恢复告警刷新策略告警数量，只更新发生变化的记录
+    """
+    alert_counts = {}
+    for bucket in iter_strategy_alert_buckets():
+        try:
+            strategy_id = int(bucket.key.strategy_id)
+        except (TypeError, ValueError):
+            continue
+        # 屏蔽状态告警生成时未写入值，可能为null，未标记为屏蔽的均视为未屏蔽
+        alert_counts[strategy_id] = (bucket.doc_count - bucket.shielded.doc_count, bucket.shielded.doc_count)
+
+    changed_summaries = []
+    # 有告警的策略及原先有告警数量的策略需要对比
+    for summary in StrategySummary.objects.filter(
+        Q(strategy_id__in=list(alert_counts)) | ~Q(alert_count=0, shield_alert_count=0)
+    ):
+        alert_count, shield_alert_count = alert_counts.get(summary.strategy_id, (0, 0))
+        if (summary.alert_count, summary.shield_alert_count) == (alert_count, shield_alert_count):
+            continue
+        summary.alert_count = alert_count
+        summary.shield_alert_count = shield_alert_count
+        changed_summaries.append(summary)
+
+    StrategySummary.objects.bulk_update(changed_summaries, ["alert_count", "shield_alert_count"], batch_size=BATCH_SIZE)
+    logger.info("[refresh_strategy_alert_summary] %s strategies changed", len(changed_summaries))
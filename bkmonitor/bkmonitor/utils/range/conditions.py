@@ -80,10 +80,19 @@ class AndCondition(CompositeCondition):
 
 
 class EqualCondition(SimpleCondition):
+    def __init__(self, cond_field, default_value_if_not_exists=False):
+        super().__init__(cond_field, default_value_if_not_exists)
+        self._cond_value_set = None
+
+    @property
+    def cond_value_set(self):
+        # 条件值(如动态分组解析出的主机列表)可能很大，只转换一次
+        if self._cond_value_set is None:
+            self._cond_value_set = frozenset(self.cond_field.to_str_list())
+        return self._cond_value_set
+
     def _is_match(self, data_field):
-        data_value = data_field.to_str_list()
-        cond_value = self.cond_field.to_str_list()
-        return bool(set(data_value) & set(cond_value))
+        return not self.cond_value_set.isdisjoint(data_field.to_str_list())
 
 
 class NotEqualCondition(EqualCondition):
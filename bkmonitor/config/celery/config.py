@@ -36,6 +36,11 @@ class Config:
             "schedule": crontab(minute="*/10"),
             "enabled": True,
         },
+        "monitor_web.tasks.refresh_strategy_summary": {
+            "task": "monitor_web.tasks.refresh_strategy_summary",
+            "schedule": crontab(),
+            "enabled": True,
+        },
         "monitor_web.tasks.update_metric_list": {
             "task": "monitor_web.tasks.update_metric_list",
             "schedule": crontab(),
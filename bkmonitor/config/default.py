@@ -436,12 +436,21 @@ THROTTLE_APP_WHITE_LIST = []
 # 邮件订阅默认业务ID，当ID为0时关闭邮件订阅
 MAIL_REPORT_BIZ = 0
 MAIL_REPORT_ALL_BIZ_USERNAMES = []
+# 订阅报表截图并发数(浏览器页面池大小)
+MAIL_REPORT_RENDER_CONCURRENCY = 4
 
 # 订阅报表运营数据内置指标UID
 REPORT_DASHBOARD_UID = "CzhKanwtf"
 
 # celery worker进程数量
 CELERY_WORKERS = 0
+# celery worker 按队列积压自动扩缩容，需启动时指定 --autoscale=max,min
+# 按队列配置并发上下限及期望的积压消化时间(秒)，如 {"celery_service": {"min": 2, "max": 16, "target_latency": 30}}
+# 积压按队列的消费者数量分摊到各 worker，broker 不返回消费者数量(如 redis)时可通过 consumers 指定消费该队列的 worker 数
+CELERY_AUTOSCALE_QUEUE_CONFIG = {}
+CELERY_AUTOSCALE_TARGET_LATENCY = 30
+# 周期任务上一次执行未结束时跳过本次执行，结束后合并补偿执行一次
+CRON_TASK_SKIP_OVERLAPPING = True
 
 # 当 ES 存在不合法别名时，是否保留该索引
 ES_RETAIN_INVALID_ALIAS = True
@@ -587,8 +596,8 @@ APM_V4_METRIC_DATA_STATUS_CONFIG = {}
 APM_CUSTOM_METRIC_SDK_MAPPING_CONFIG = {}
 # UnifyQuery查询表映射配置
 UNIFY_QUERY_TABLE_MAPPING_CONFIG = {}
-# 拓扑发现允许的最大 Span 数量(预估值)
-PER_ROUND_SPAN_MAX_SIZE = 1000
+# 拓扑发现每批次处理的最大 Span 数量(在 Trace 边界切分，实际数量可能略大)
+PER_ROUND_SPAN_MAX_SIZE = 10000
 # profiling 汇聚方法映射配置
 APM_PROFILING_AGG_METHOD_MAPPING = {
     "HEAP-SPACE": "AVG",
@@ -1603,6 +1612,8 @@ ENABLE_V2_ROTATION_ES_CLUSTER_IDS = []
 ES_INDEX_ROTATION_SLEEP_INTERVAL_SECONDS = 3
 # ES索引轮转步长
 ES_INDEX_ROTATION_STEP = 50
+# 同一ES集群内并发轮转的采集项个数
+ES_INDEX_ROTATION_CONCURRENCY = 4
 # ES采集项整体偏移量（小时）
 ES_STORAGE_OFFSET_HOURS = 8
 # ES请求默认超时时间（秒）
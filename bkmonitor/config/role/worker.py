@@ -561,3 +561,5 @@ AIOPS_INCIDENT_SYNC_QUEUE = os.environ.get("AIOPS_INCIDENT_SYNC_QUEUE", "")
 # AIOPS SDK批量预测并行度
 AIOPS_SDK_PREDICT_CONCURRENCY = int(os.environ.get("AIOPS_SDK_PREDICT_CONCURRENCY", 20))
 AIOPS_SDK_INIT_CONCURRENCY = int(os.environ.get("AIOPS_SDK_INIT_CONCURRENCY", 20))
+# AIOPS SDK历史依赖初始化时同时在途的最大序列数，限制准备过程的内存占用
+AIOPS_SDK_INIT_MAX_INFLIGHT_SERIES = int(os.environ.get("AIOPS_SDK_INIT_MAX_INFLIGHT_SERIES", 5000))
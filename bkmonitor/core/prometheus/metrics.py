@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 
 # 数据源
 import logging
+import time
 
 from django.conf import settings
 from prometheus_client.exposition import push_to_gateway
@@ -81,6 +82,28 @@ def safe_push_to_gateway(job: str = settings.DEFAULT_METRIC_PUSH_JOB, registry:
         logger.exception("failed to report data to gateway")
 
 
+def observe_stage_latency(stage: str, records: list, get_time, sample_size: int = 100):
+    """
+    记录数据从数据时间到进入模块队列的延迟，数据量较大时按固定步长抽样，降低开销
+    :param stage: 模块
+    :param records: 推送的数据
+    :param get_time: 获取数据时间的函数
+    :param sample_size: 最大抽样数量
+    """
+    if not records:
+        return
+
+    now = time.time()
+    histogram = PIPELINE_STAGE_LATENCY.labels(stage=stage)
+    for record in records[:: max(len(records) // sample_size, 1)]:
+        try:
+            data_time = get_time(record)
+        except (KeyError, TypeError, AttributeError):
+            continue
+        if data_time:
+            histogram.observe(now - data_time)
+
+
 class StatusEnum:
     """
     任务状态枚举
@@ -119,6 +142,12 @@ CRON_TASK_EXECUTE_COUNT = Counter(
     labelnames=("task_name", "status", "exception", "queue"),
 )
 
+CRON_TASK_SKIPPED_COUNT = Counter(
+    name="bkmonitor_cron_task_skipped_count",
+    documentation="周期任务因上一次执行未结束而跳过的次数",
+    labelnames=("task_name", "queue"),
+)
+
 CRON_BCS_SUB_TASK_EXECUTE_TIME = Histogram(
     name="bkmonitor_cron_bcs_sub_task_execute_time",
     documentation="BCS子任务执行时间",
@@ -374,6 +403,13 @@ ACCESS_TO_ALERT_PROCESS_LATENCY = Histogram(
     buckets=(1, 2, 3, 5, 10, 15, 20, 30, 60, 180, 300, INF),
 )
 
+PIPELINE_STAGE_LATENCY = Histogram(
+    name="bkmonitor_pipeline_stage_latency",
+    documentation="告警数据从数据时间到进入各模块队列的延迟",
+    labelnames=("stage",),
+    buckets=(10, 30, 60, 90, 120, 180, 240, 300, 600, 900, 1800, INF),
+)
+
 ALERT_MANAGE_PUSH_DATA_COUNT = Counter(
     name="bkmonitor_alert_manage_push_data_count",
     documentation="alert(manager) 模块数据推送条数",
@@ -734,6 +770,24 @@ EXPORTER_LAST_SCRAPE_DURATION_SECONDS = Gauge(
     labelnames=("node", "role", "host", "port", "cluster_name"),
 )
 
+ALARM_QUEUE_KEY_COUNT = Gauge(
+    name="bkmonitor_alarm_queue_key_count",
+    documentation="告警后台 redis 队列 key 数量",
+    labelnames=("node", "cluster_name", "queue"),
+)
+
+ALARM_QUEUE_LENGTH = Gauge(
+    name="bkmonitor_alarm_queue_length",
+    documentation="告警后台 redis 队列积压数据量",
+    labelnames=("node", "cluster_name", "queue"),
+)
+
+ALARM_QUEUE_HEAD_AGE_SECONDS = Gauge(
+    name="bkmonitor_alarm_queue_head_age_seconds",
+    documentation="告警后台 redis 队列中最早入队数据的等待时长",
+    labelnames=("node", "cluster_name", "queue"),
+)
+
 EXPORTER_LAST_SCRAPE_ERROR = Gauge(
     name="redis_exporter_last_scrape_error",
     documentation="The last scrape error status",
@@ -26,6 +26,7 @@ from bkmonitor.models import (
     UserGroup,
 )
 from bkmonitor.strategy.serializers import NoticeGroupSerializer
+from bkmonitor.strategy.summary import refresh_strategy_summary
 from constants.action import ActionSignal, NoticeWay, NotifyStep
 from core.drf_resource import Resource, resource
 from core.drf_resource.viewsets import ResourceRoute, ResourceViewSet
@@ -281,6 +282,8 @@ class SaveNoticeGroupResource(Resource):
                 )
 
             StrategyActionConfigRelation.objects.bulk_create(need_add_action_relation_list)
+            # 直接写入关联关系不会更新策略修改时间，需要主动刷新策略摘要
+            refresh_strategy_summary(relation.strategy_id for relation in need_add_action_relation_list)
 
         return {"id": user_group.id, "webhook_action_id": user_group.webhook_action_id}
 
@@ -118,3 +118,7 @@ KAFKA_SASL_PROTOCOL = "SASL_PLAINTEXT"
 VM_STORAGE_TYPE = "vm"
 # metadata 结果表白名单 key
 METADATA_RESULT_TABLE_WHITE_LIST = "metadata:query_metric:table_id_list"
+# 自定义时序分组指标同步水位 key，field 为分组ID，value 为上次同步的 zset 分数
+METADATA_TS_METRIC_WATERMARK_KEY = "metadata:ts_metric:watermark"
+# 自定义时序分组指标同步水位回退时长，transfer 写入 zset 的分数可能落后于当前时间，回退后下次同步重新读取该时间段
+METADATA_TS_METRIC_WATERMARK_OVERLAP_SECONDS = 5 * 60
@@ -11,7 +11,6 @@ specific language governing permissions and limitations under the License.
 import datetime
 import json
 import logging
-import math
 import re
 import time
 
@@ -381,7 +380,13 @@ class TimeSeriesGroup(CustomGroupBase):
         logger.info("bulk refresh rt fields successfully")
 
     @atomic(config.DATABASE_CONNECTION_NAME)
-    def update_metrics(self, metric_info):
+    def update_metrics(self, metric_info, exist_metrics: dict | None = None, expired_metrics: list | None = None):
+        """
+        刷新分组下的指标及结果表字段
+        :param metric_info: 指标信息列表
+        :param exist_metrics: 预加载的分组已有指标，参考 TimeSeriesMetric.bulk_refresh_ts_metrics
+        :param expired_metrics: 增量同步时新过期的指标，参考 TimeSeriesMetric.bulk_refresh_ts_metrics
+        """
         # 判断是否真的存在某个group_id
         group_id = self.time_series_group_id
         try:
@@ -391,7 +396,12 @@ class TimeSeriesGroup(CustomGroupBase):
             raise ValueError(f"ts group id: {group_id} not found")
         # 刷新 ts 中指标和维度
         is_updated = TimeSeriesMetric.bulk_refresh_ts_metrics(
-            group_id, group.table_id, metric_info, group.is_auto_discovery()
+            group_id,
+            group.table_id,
+            metric_info,
+            group.is_auto_discovery(),
+            exist_metrics=exist_metrics,
+            expired_metrics=expired_metrics,
         )
         # 刷新 rt 表中的指标和维度
         self.bulk_refresh_rt_fields(group.table_id, metric_info)
@@ -465,45 +475,77 @@ class TimeSeriesGroup(CustomGroupBase):
             ret_data.append(item)
         return ret_data
 
-    def get_metrics_from_redis(self, expired_time: int | None = settings.TIME_SERIES_METRIC_EXPIRED_SECONDS):
-        """从 redis 中获取数据
+    def is_metric_from_bkdata(self, white_list: list | set | None = None) -> bool:
+        """指标是否需要从 bkdata 获取
 
-        其中，redis 中数据有 transfer 上报
+        :param white_list: 预加载的结果表白名单，为空时从 redis 读取
         """
-        # 从 bkdata 获取指标数据
-        data = RedisTools.get_list(config.METADATA_RESULT_TABLE_WHITE_LIST)
+        if white_list is None:
+            white_list = RedisTools.get_list(config.METADATA_RESULT_TABLE_WHITE_LIST)
         # 默认开启单指标单表后，需要根据数据源的来源决定从哪里获取指标数据（redis/bkdata）
-        if self.table_id in data or self.data_source.created_from == DataIdCreatedFromSystem.BKDATA.value:
-            return self.get_metric_from_bkdata()
+        return self.table_id in white_list or self.data_source.created_from == DataIdCreatedFromSystem.BKDATA.value
 
-        # 获取redis中数据
-        client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
-        custom_metrics_key = f"{settings.METRICS_KEY_PREFIX}{self.bk_data_id}"
-        metric_dimensions_key = f"{settings.METRIC_DIMENSIONS_KEY_PREFIX}{self.bk_data_id}"
+    @staticmethod
+    def _iter_metrics_by_score(client, key: str, min_score, max_score: float, withscores: bool = True):
+        """按分数游标分批遍历 zset，避免 start/num 偏移量过大时 redis 反复跳过已读数据
 
-        now_time = tz_now()
+        :param min_score: 起始分数，支持 "(score" 形式的开区间
+        """
         fetch_step = settings.MAX_METRICS_FETCH_STEP
-        valid_begin_ts = (now_time - datetime.timedelta(seconds=expired_time)).timestamp()
-        metrics_filter_params = {"name": custom_metrics_key, "min": valid_begin_ts, "max": now_time.timestamp()}
+        offset = 0
+        while True:
+            batch = client.zrangebyscore(
+                name=key, min=min_score, max=max_score, start=offset, num=fetch_step, withscores=True
+            )
+            if not batch:
+                return
+            yield batch if withscores else [member for member, _ in batch]
+            if len(batch) < fetch_step:
+                return
+
+            # 下一批从本批最大分数开始，跳过与最大分数相同且已读取的成员
+            last_score = batch[-1][1]
+            tail_count = sum(1 for _, score in batch if score == last_score)
+            offset = offset + tail_count if last_score == min_score else tail_count
+            min_score = last_score
+
+    def _fetch_metrics_with_dimensions(
+        self, client, min_score, max_score: float, raise_exception: bool = False
+    ) -> list:
+        """获取分数区间内的指标及其维度
+
+        :param raise_exception: 读取 redis 失败时是否抛出异常，按水位同步时需抛出，避免跳过读取失败的指标后推进水位
+        """
+        custom_metrics_key = f"{settings.METRICS_KEY_PREFIX}{self.bk_data_id}"
+        metric_dimensions_key = f"{settings.METRIC_DIMENSIONS_KEY_PREFIX}{self.bk_data_id}"
 
         metrics_info = []
+        metrics_batches = self._iter_metrics_by_score(client, custom_metrics_key, min_score, max_score)
         # 分批拉取 redis 数据，防止大批量数据拖垮
-        for i in range(math.ceil(client.zcount(**metrics_filter_params) / fetch_step)):
+        while True:
             try:
-                # 0. 首先获取有效期内的所有 metrics
-                metrics_with_scores: list[tuple[bytes, float]] = client.zrangebyscore(
-                    **metrics_filter_params, start=fetch_step * i, num=fetch_step, withscores=True
-                )
+                # 0. 首先获取分数区间内的 metrics
+                metrics_with_scores: list[tuple[bytes, float]] = next(metrics_batches)
+            except StopIteration:
+                break
             except Exception:
-                logger.exception("failed to get metrics from storage, filter params: %s", metrics_filter_params)
-                # metrics 可能存在大批量内容，可容忍某一步出错
-                continue
+                logger.exception(
+                    "failed to get metrics from storage, key: %s, min: %s, max: %s",
+                    custom_metrics_key,
+                    min_score,
+                    max_score,
+                )
+                if raise_exception:
+                    raise
+                break
 
             # 1. 获取当前这批 metrics 的 dimensions 信息
             try:
                 dimensions_list: list[bytes] = client.hmget(metric_dimensions_key, [x[0] for x in metrics_with_scores])
             except Exception:
                 logger.exception("failed to get dimensions from metrics")
+                if raise_exception:
+                    raise
                 continue
 
             # 2. 尝试更新 metrics 和对应 dimensions(tags)
@@ -538,18 +580,108 @@ class TimeSeriesGroup(CustomGroupBase):
                 )
         return metrics_info
 
-    def update_time_series_metrics(self) -> bool:
+    def get_metrics_from_redis(
+        self,
+        expired_time: int | None = settings.TIME_SERIES_METRIC_EXPIRED_SECONDS,
+        white_list: list | set | None = None,
+    ):
+        """从 redis 中获取数据
+
+        其中，redis 中数据有 transfer 上报
+        :param white_list: 预加载的结果表白名单，批量处理时避免每个分组都读取一次
+        """
+        # 从 bkdata 获取指标数据
+        if self.is_metric_from_bkdata(white_list):
+            return self.get_metric_from_bkdata()
+
+        # 获取redis中数据
+        client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
+        now_time = tz_now()
+        valid_begin_ts = (now_time - datetime.timedelta(seconds=expired_time)).timestamp()
+        return self._fetch_metrics_with_dimensions(client, valid_begin_ts, now_time.timestamp())
+
+    def get_metrics_from_redis_by_watermark(
+        self, watermark: float, now_ts: float, expired_time: int = settings.FETCH_TIME_SERIES_METRIC_INTERVAL_SECONDS
+    ) -> tuple[list, list]:
+        """基于分数水位增量获取指标
+
+        transfer 以指标最近的上报时间作为 zset 分数，因此：
+        1. 分数落在 (watermark, now_ts] 的指标，为上次同步后重新上报过的指标
+        2. 分数落在 (watermark - expired_time, now_ts - expired_time] 的指标，为上次同步后新过期的指标
+        :return: (有变动的指标信息列表, 新过期的指标名列表)
+        """
+        client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
+        custom_metrics_key = f"{settings.METRICS_KEY_PREFIX}{self.bk_data_id}"
+
+        metrics_info = self._fetch_metrics_with_dimensions(client, f"({watermark}", now_ts, raise_exception=True)
+
+        expired_metrics = []
+        for members in self._iter_metrics_by_score(
+            client, custom_metrics_key, f"({watermark - expired_time}", now_ts - expired_time, withscores=False
+        ):
+            expired_metrics.extend(m.decode("utf-8") if isinstance(m, bytes) else m for m in members)
+        return metrics_info, expired_metrics
+
+    @classmethod
+    def get_metric_watermarks(cls, group_ids: list[int]) -> dict[int, float]:
+        """批量获取分组的指标同步水位"""
+        if not group_ids:
+            return {}
+        values = RedisTools.hmget(config.METADATA_TS_METRIC_WATERMARK_KEY, [str(group_id) for group_id in group_ids])
+        return {group_id: float(value) for group_id, value in zip(group_ids, values) if value}
+
+    @classmethod
+    def set_metric_watermarks(cls, watermarks: dict[int, float]):
+        """批量记录分组的指标同步水位"""
+        if not watermarks:
+            return
+        RedisTools.hmset_to_redis(
+            config.METADATA_TS_METRIC_WATERMARK_KEY,
+            {str(group_id): str(watermark) for group_id, watermark in watermarks.items()},
+        )
+
+    def update_time_series_metrics(
+        self,
+        white_list: list | set | None = None,
+        exist_metrics: dict | None = None,
+        watermark: float | None = None,
+    ) -> bool:
         """从远端存储中同步TS的指标和维度对应关系
 
+        存在有效水位时仅处理水位之后有变动的指标，否则全量同步；同步成功后新的水位记录在 synced_watermark 中，
+        读取 redis 失败时抛出异常，不记录新水位，
+        新水位较当前时间回退一段时长，避免遗漏延迟写入的指标
+        :param white_list: 预加载的结果表白名单
+        :param exist_metrics: 预加载的分组已有指标 {field_name: TimeSeriesMetric}
+        :param watermark: 上次同步的分数水位
         :return: 返回是否有更新指标
         """
-        metrics_info = self.get_metrics_from_redis(expired_time=settings.FETCH_TIME_SERIES_METRIC_INTERVAL_SECONDS)
+        self.synced_watermark = None
+        expired_time = settings.FETCH_TIME_SERIES_METRIC_INTERVAL_SECONDS
+        now_ts = tz_now().timestamp()
+
+        # 分数晚于当前时间写入的指标在下次同步时仍能读取到，重复读取的指标比对后无变更
+        synced_watermark = now_ts - config.METADATA_TS_METRIC_WATERMARK_OVERLAP_SECONDS
+
+        expired_metrics = None
+        if self.is_metric_from_bkdata(white_list):
+            metrics_info = self.get_metric_from_bkdata()
+        elif watermark is not None and now_ts - expired_time < watermark <= now_ts:
+            metrics_info, expired_metrics = self.get_metrics_from_redis_by_watermark(watermark, now_ts, expired_time)
+            self.synced_watermark = synced_watermark
+        else:
+            client = RedisClient.from_envs(prefix="BK_MONITOR_TRANSFER")
+            metrics_info = self._fetch_metrics_with_dimensions(
+                client, now_ts - expired_time, now_ts, raise_exception=True
+            )
+            self.synced_watermark = synced_watermark
+
         # 如果为空，直接返回
-        if not metrics_info:
+        if not metrics_info and not expired_metrics:
             return False
 
         # 记录是否有更新，然后推送redis并发布通知
-        is_updated = self.update_metrics(metrics_info)
+        is_updated = self.update_metrics(metrics_info, exist_metrics=exist_metrics, expired_metrics=expired_metrics)
         logger.debug("TimeSeriesGroup<%s> already updated all metrics", self.pk)
 
         return is_updated
@@ -1016,6 +1148,17 @@ class TimeSeriesMetric(models.Model):
 
         return result
 
+    @classmethod
+    def load_group_metrics(cls, group_ids: list[int]) -> dict[int, dict[str, "TimeSeriesMetric"]]:
+        """批量预加载多个分组的已有指标，供指标同步时在内存中比对差异
+
+        :return: {group_id: {field_name: TimeSeriesMetric}}，不存在指标的分组同样返回空字典
+        """
+        group_metrics = {group_id: {} for group_id in group_ids}
+        for obj in filter_model_by_in_page(cls, "group_id__in", group_ids):
+            group_metrics[obj.group_id][obj.field_name] = obj
+        return group_metrics
+
     @classmethod
     def get_metric_tag_from_metric_info(cls, metric_info: dict) -> list:
         # 获取 tag
@@ -1064,12 +1207,20 @@ class TimeSeriesMetric(models.Model):
 
     @classmethod
     def _bulk_update_metrics(
-        cls, metrics_dict: dict, need_update_metrics: list | set, group_id: int, is_auto_discovery: bool
+        cls,
+        metrics_dict: dict,
+        need_update_metrics: list | set,
+        group_id: int,
+        is_auto_discovery: bool,
+        exist_metrics: dict | None = None,
     ) -> bool:
         """批量更新指标，针对记录仅更新最后更新时间和 tag 字段"""
-        qs_objs = filter_model_by_in_page(
-            TimeSeriesMetric, "field_name__in", need_update_metrics, other_filter={"group_id": group_id}
-        )
+        if exist_metrics is not None:
+            qs_objs = [exist_metrics[metric] for metric in need_update_metrics if metric in exist_metrics]
+        else:
+            qs_objs = filter_model_by_in_page(
+                TimeSeriesMetric, "field_name__in", need_update_metrics, other_filter={"group_id": group_id}
+            )
         records, white_list_disabled_metric = [], set()
         # 组装更新的数据
         # 标识变动是否需要更新路由
@@ -1129,7 +1280,13 @@ class TimeSeriesMetric(models.Model):
 
     @classmethod
     def bulk_refresh_ts_metrics(
-        cls, group_id: int, table_id: str, metric_info_list: list, is_auto_discovery: bool
+        cls,
+        group_id: int,
+        table_id: str,
+        metric_info_list: list,
+        is_auto_discovery: bool,
+        exist_metrics: dict | None = None,
+        expired_metrics: list | None = None,
     ) -> bool:
         """
             更新或创建时序指标数据
@@ -1147,11 +1304,17 @@ class TimeSeriesMetric(models.Model):
                 "last_modify_time": 1464567890123,
             }]
             :param is_auto_discovery: 指标是否自动发现
+            :param exist_metrics: 预加载的分组已有指标 {field_name: TimeSeriesMetric}，为空时从 DB 查询
+            :param expired_metrics: 增量同步时新过期的指标，传入时仅将这部分指标置为非活跃；
+                否则将不在返回列表中的已有指标均置为非活跃
             :return: True or raise
         """
         _metrics_dict = {m["field_name"]: m for m in metric_info_list if m.get("field_name")}
         # 获取不存在的指标，然后批量创建
-        metrics_by_group_id = cls.objects.filter(group_id=group_id).values_list("field_name", flat=True)
+        if exist_metrics is not None:
+            metrics_by_group_id = list(exist_metrics.keys())
+        else:
+            metrics_by_group_id = cls.objects.filter(group_id=group_id).values_list("field_name", flat=True)
         # 获取需要批量创建的指标
         _metrics = set(_metrics_dict.keys())
         # NOTE: 针对创建或者时间变动时，推送路由数据
@@ -1167,11 +1330,13 @@ class TimeSeriesMetric(models.Model):
         # 批量更新
         if need_update_metrics:
             need_push_router |= cls._bulk_update_metrics(
-                _metrics_dict, need_update_metrics, group_id, is_auto_discovery
+                _metrics_dict, need_update_metrics, group_id, is_auto_discovery, exist_metrics=exist_metrics
             )
 
         # 处理不在返回列表中的已存在指标，设置为非活跃
         existing_metrics_set = set(metrics_by_group_id)
+        if expired_metrics is not None:
+            existing_metrics_set &= set(expired_metrics)
         inactive_metrics = existing_metrics_set - _metrics
         if inactive_metrics:
             # 批量更新不在返回列表中的指标为非活跃状态
@@ -186,8 +186,11 @@ def get_space_table_id_data_id(
     include_platform_data_id: bool | None = True,
     exclude_data_id_list: list | None = None,
     bk_tenant_id: str | None = DEFAULT_TENANT_ID,
+    platform_data_ids: dict | None = None,
 ) -> dict:
-    """获取空间下的结果表和数据源信息"""
+    """获取空间下的结果表和数据源信息
+    :param platform_data_ids: 预先获取的平台级数据源，批量处理空间时避免重复查询
+    """
     logger.info(
         "get_space_table_id_data_id: try to get data,for space_type->[%s],space_id->[%s],bk_tenant_id->[%s]",
         space_type,
@@ -224,7 +227,9 @@ def get_space_table_id_data_id(
 
     # 过滤包含全局空间级的数据源,平台数据源、租户下全业务等
     if include_platform_data_id:
-        data_ids |= set(get_platform_data_ids(space_type=space_type, bk_tenant_id=bk_tenant_id).keys())
+        if platform_data_ids is None:
+            platform_data_ids = get_platform_data_ids(space_type=space_type, bk_tenant_id=bk_tenant_id)
+        data_ids |= set(platform_data_ids.keys())
 
     # 排除元素
     if exclude_data_id_list:
@@ -12,6 +12,7 @@ import datetime
 import itertools
 import json
 import logging
+import threading
 
 from django.conf import settings
 from django.db.models import Q
@@ -57,6 +58,134 @@ from metadata.utils.redis_tools import RedisTools
 
 logger = logging.getLogger("metadata")
 
+# 批量写入/对比空间路由时，每次 hmget/hmset 的字段数量
+SPACE_ROUTING_CHUNK_SIZE = 500
+
+
+class SpaceRoutingPreload:
+    """
+    空间路由批量计算时共享的 ORM 数据
+    与具体空间无关的数据(存储结果表、平台数据源、全局结果表等)在一次同步中只查询一次，
+    各个空间直接在内存中过滤，避免逐个空间重复查询 DB
+    同一实例会被 bulk_handle 的多个线程共享，加载过程需要加锁
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _get_or_load(self, cache_key, loader):
+        if cache_key in self._cache:
+            return self._cache[cache_key]
+        with self._lock:
+            if cache_key not in self._cache:
+                self._cache[cache_key] = loader()
+            return self._cache[cache_key]
+
+    def space(self, space_type: str, space_id: str) -> dict | None:
+        """空间基本信息"""
+        spaces = self._get_or_load(
+            "spaces",
+            lambda: {
+                (s["space_type_id"], s["space_id"]): s
+                for s in models.Space.objects.values("id", "space_type_id", "space_id", "bk_tenant_id")
+            },
+        )
+        return spaces.get((space_type, str(space_id)))
+
+    def biz_id(self, space_type: str, space_id: str) -> int | None:
+        """与 SpaceManager.get_biz_id_by_space 保持一致"""
+        space = self.space(space_type, space_id)
+        if not space:
+            return None
+        if space_type == SpaceTypes.BKCC.value:
+            return int(space["space_id"])
+        return -space["id"]
+
+    def storage_table_ids(self, bk_tenant_id: str) -> set:
+        """写入 influxdb/vm/es 的结果表，与 _refine_table_ids 的过滤规则保持一致"""
+
+        def _load():
+            table_ids = set(models.InfluxDBStorage.objects.values_list("table_id", flat=True))
+            vm_qs = models.AccessVMRecord.objects.all()
+            es_qs = models.ESStorage.objects.all()
+            if settings.ENABLE_MULTI_TENANT_MODE:
+                vm_qs = vm_qs.filter(bk_tenant_id=bk_tenant_id)
+                es_qs = es_qs.filter(bk_tenant_id=bk_tenant_id)
+            table_ids.update(vm_qs.values_list("result_table_id", flat=True))
+            table_ids.update(es_qs.values_list("table_id", flat=True))
+            return table_ids
+
+        return self._get_or_load(("storage_table_ids", bk_tenant_id), _load)
+
+    def platform_data_ids(self, space_type: str, bk_tenant_id: str) -> dict[int, str]:
+        return self._get_or_load(
+            ("platform_data_ids", space_type, bk_tenant_id),
+            lambda: get_platform_data_ids(space_type=space_type, bk_tenant_id=bk_tenant_id),
+        )
+
+    def log_table_ids(self) -> dict:
+        """按业务分组的 ES/Doris 结果表, {bk_biz_id: [(table_id, default_storage, bk_tenant_id)]}"""
+
+        def _load():
+            biz_tables = {}
+            qs = models.ResultTable.objects.filter(
+                default_storage__in=[models.ClusterInfo.TYPE_ES, models.ClusterInfo.TYPE_DORIS],
+                is_deleted=False,
+                is_enable=True,
+            ).values("table_id", "bk_biz_id", "default_storage", "bk_tenant_id")
+            for rt in qs:
+                biz_tables.setdefault(rt["bk_biz_id"], []).append(
+                    (rt["table_id"], rt["default_storage"], rt["bk_tenant_id"])
+                )
+            return biz_tables
+
+        return self._get_or_load("log_table_ids", _load)
+
+    def record_rule_table_ids(self, space_type: str, space_id: str, bk_tenant_id: str) -> list[str]:
+        from metadata.models.record_rule.rules import RecordRule
+
+        def _load():
+            rules = {}
+            for rule in RecordRule.objects.values("space_type", "space_id", "bk_tenant_id", "table_id"):
+                rules.setdefault((rule["space_type"], rule["space_id"], rule["bk_tenant_id"]), []).append(
+                    rule["table_id"]
+                )
+            return rules
+
+        return self._get_or_load("record_rules", _load).get((space_type, space_id, bk_tenant_id), [])
+
+    def prefix_table_ids(self, prefix: str) -> list[str]:
+        return self._get_or_load(
+            ("prefix_table_ids", prefix),
+            lambda: list(
+                models.ResultTable.objects.filter(table_id__startswith=prefix).values_list("table_id", flat=True)
+            ),
+        )
+
+    def bkci_system_table_ids(self, bk_tenant_id: str) -> list[str]:
+        def _load():
+            rts = models.ResultTable.objects.filter(
+                Q(table_id__startswith=BKCI_SYSTEM_TABLE_ID_PREFIX)
+                | Q(table_id__in=settings.BKCI_SPACE_ACCESS_PLUGIN_LIST)
+            )
+            if settings.ENABLE_MULTI_TENANT_MODE:
+                rts = rts.filter(bk_tenant_id=bk_tenant_id)
+            return list(rts.values_list("table_id", flat=True))
+
+        return self._get_or_load(("bkci_system_table_ids", bk_tenant_id), _load)
+
+    def apm_global_tables(self, bk_tenant_id: str) -> list[tuple[str, str]]:
+        return self._get_or_load(
+            ("apm_global_tables", bk_tenant_id),
+            lambda: [
+                (rt.table_id, rt.bk_biz_id_alias)
+                for rt in models.ResultTable.objects.filter(
+                    table_id__contains="apm_global.precalculate_storage", bk_tenant_id=bk_tenant_id
+                )
+            ],
+        )
+
 
 class SpaceTableIDRedis:
     """
@@ -64,6 +193,16 @@ class SpaceTableIDRedis:
     多租户环境下,不允许跨租户推送路由,即每次操作的目标数据,必须是同一租户下的,不能跨租户
     """
 
+    def __init__(self, preload: SpaceRoutingPreload | None = None):
+        # 批量推送时共享的预加载数据，为空时按空间逐个查询 DB
+        self.preload = preload
+
+    @staticmethod
+    def get_space_redis_key(space_type: str, space_id: str, bk_tenant_id: str) -> str:
+        if settings.ENABLE_MULTI_TENANT_MODE:
+            return f"{space_type}__{space_id}|{bk_tenant_id}"
+        return f"{space_type}__{space_id}"
+
     def push_space_table_ids(self, space_type: str, space_id: str, is_publish: bool | None = False):
         """
         推送空间及对应的结果表和过滤条件
@@ -74,34 +213,14 @@ class SpaceTableIDRedis:
         space_id = str(space_id)
 
         space = models.Space.objects.get(space_type_id=space_type, space_id=space_id)
-        bk_tenant_id = space.bk_tenant_id
-
-        # 过滤空间关联的数据源信息
-        if space_type == SpaceTypes.BKCC.value:
-            redis_values = self._compose_bkcc_space_table_ids(space)
-        elif space_type == SpaceTypes.BKCI.value:
-            # 开启容器服务，则需要处理集群+业务+构建机+其它(在当前空间下创建的插件、自定义上报等)
-            redis_values = self._compose_bkci_space_table_ids(space)
-        elif space_type == SpaceTypes.BKSAAS.value:
-            redis_values = self._compose_bksaas_space_table_ids(space)
-        else:
-            logger.error("not found space_type: %s, space_id: %s", space_type, space_id)
-            raise ValueError("not found space type")
-
-        # 二段式校验&补充
-        values_to_redis = {}
-        for key, value in redis_values.items():
-            values_to_redis[reformat_table_id(key)] = value
+        values_to_redis = self.compose_space_table_ids(space)
 
         # 组装redis key
-        if settings.ENABLE_MULTI_TENANT_MODE:
-            space_redis_key = f"{space_type}__{space_id}|{bk_tenant_id}"
-        else:
-            space_redis_key = f"{space_type}__{space_id}"
+        space_redis_key = self.get_space_redis_key(space_type, space_id, space.bk_tenant_id)
 
         # 推送数据
         if values_to_redis:
-            RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, {space_redis_key: json.dumps(values_to_redis)})
+            RedisTools.hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, {space_redis_key: self._dump_values(values_to_redis)})
 
         logger.info(
             "push redis space_to_result_table, space_type: %s, space_id: %s",
@@ -114,23 +233,71 @@ class SpaceTableIDRedis:
             RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, [space_redis_key])
         logger.info("push space table_id data successfully, space_type: %s, space_id: %s", space_type, space_id)
 
-    def push_multi_space_table_ids(self, spaces: list[models.Space], is_publish: bool | None = False) -> None:
+    def compose_space_table_ids(self, space: models.Space) -> dict[str, dict]:
+        """计算空间对应的结果表及过滤条件"""
+        space_type, space_id = space.space_type_id, space.space_id
+        # 过滤空间关联的数据源信息
+        if space_type == SpaceTypes.BKCC.value:
+            redis_values = self._compose_bkcc_space_table_ids(space)
+        elif space_type == SpaceTypes.BKCI.value:
+            # 开启容器服务，则需要处理集群+业务+构建机+其它(在当前空间下创建的插件、自定义上报等)
+            redis_values = self._compose_bkci_space_table_ids(space)
+        elif space_type == SpaceTypes.BKSAAS.value:
+            redis_values = self._compose_bksaas_space_table_ids(space)
+        else:
+            logger.error("not found space_type: %s, space_id: %s", space_type, space_id)
+            raise ValueError("not found space type")
+
+        # 二段式校验&补充
+        return {reformat_table_id(key): value for key, value in redis_values.items()}
+
+    @staticmethod
+    def _dump_values(values: dict) -> str:
+        # 固定 key 顺序，保证相同内容序列化结果一致，便于批量推送时直接比对
+        return json.dumps(values, sort_keys=True)
+
+    def push_multi_space_table_ids(self, spaces: list[models.Space], is_publish: bool | None = False) -> list[str]:
         """
         批量推送空间数据
+        1. 共享的 ORM 数据在本实例内只加载一次，所有空间在内存中计算
+        2. 与 redis 中已有的路由对比，只写入和通知发生变化的空间
+        :return: 发生变化的空间 redis key 列表
         """
-        # 推送数据
+        if self.preload is None:
+            self.preload = SpaceRoutingPreload()
+
+        space_values = {}
         for space in spaces:
-            self.push_space_table_ids(space.space_type_id, space.space_id, is_publish=False)
+            values_to_redis = self.compose_space_table_ids(space)
+            if not values_to_redis:
+                continue
+            space_redis_key = self.get_space_redis_key(space.space_type_id, space.space_id, space.bk_tenant_id)
+            space_values[space_redis_key] = self._dump_values(values_to_redis)
+
+        # 对比现有路由，过滤出变化的空间
+        changed_values = {}
+        space_redis_keys = list(space_values.keys())
+        for index in range(0, len(space_redis_keys), SPACE_ROUTING_CHUNK_SIZE):
+            chunk_keys = space_redis_keys[index : index + SPACE_ROUTING_CHUNK_SIZE]
+            for space_redis_key, current_value in zip(
+                chunk_keys, RedisTools.hmget(SPACE_TO_RESULT_TABLE_KEY, chunk_keys)
+            ):
+                if isinstance(current_value, bytes):
+                    current_value = current_value.decode("utf-8")
+                if current_value != space_values[space_redis_key]:
+                    changed_values[space_redis_key] = space_values[space_redis_key]
+
+        logger.info(
+            "push_multi_space_table_ids: total spaces->[%s], changed spaces->[%s]", len(spaces), len(changed_values)
+        )
+        if changed_values:
+            RedisTools.pipeline_hmset_to_redis(SPACE_TO_RESULT_TABLE_KEY, changed_values, SPACE_ROUTING_CHUNK_SIZE)
 
         # 通知使用方
-        if is_publish:
-            push_redis_keys = []
-            for space in spaces:
-                if settings.ENABLE_MULTI_TENANT_MODE:
-                    push_redis_keys.append(f"{space.space_type_id}__{space.space_id}|{space.bk_tenant_id}")
-                else:
-                    push_redis_keys.append(f"{space.space_type_id}__{space.space_id}")
-            RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, push_redis_keys)
+        changed_keys = list(changed_values.keys())
+        if is_publish and changed_keys:
+            RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, changed_keys)
+        return changed_keys
 
     def push_data_label_table_ids(
         self,
@@ -899,13 +1066,17 @@ class SpaceTableIDRedis:
             return {}
         # 获取空间关联的业务，注意这里业务 ID 为字符串类型
         # 追加空间访问指定插件的 filter
-        rts = models.ResultTable.objects.filter(
-            Q(table_id__startswith=BKCI_SYSTEM_TABLE_ID_PREFIX) | Q(table_id__in=settings.BKCI_SPACE_ACCESS_PLUGIN_LIST)
-        )
+        if self.preload:
+            tids = self.preload.bkci_system_table_ids(bk_tenant_id)
+        else:
+            rts = models.ResultTable.objects.filter(
+                Q(table_id__startswith=BKCI_SYSTEM_TABLE_ID_PREFIX)
+                | Q(table_id__in=settings.BKCI_SPACE_ACCESS_PLUGIN_LIST)
+            )
 
-        if settings.ENABLE_MULTI_TENANT_MODE:  # 若开启多租户模式,则这里应该会变成新版1001数据
-            rts = rts.filter(bk_tenant_id=bk_tenant_id)
-        tids = rts.values_list("table_id", flat=True)
+            if settings.ENABLE_MULTI_TENANT_MODE:  # 若开启多租户模式,则这里应该会变成新版1001数据
+                rts = rts.filter(bk_tenant_id=bk_tenant_id)
+            tids = rts.values_list("table_id", flat=True)
 
         return {tid: {"filters": [{"bk_biz_id": str(obj.resource_id)}]} for tid in tids}
 
@@ -963,7 +1134,10 @@ class SpaceTableIDRedis:
         """组装 bkci 全局下的结果表"""
         logger.info("start to push bkci level table_id, space_type: %s, space_id: %s", space_type, space_id)
         # 过滤空间级的数据源
-        data_ids = get_platform_data_ids(space_type=space_type, bk_tenant_id=bk_tenant_id)
+        if self.preload:
+            data_ids = self.preload.platform_data_ids(space_type, bk_tenant_id)
+        else:
+            data_ids = get_platform_data_ids(space_type=space_type, bk_tenant_id=bk_tenant_id)
         # 一个空间下 data_id 不会太多
         table_is_list = list(
             models.DataSourceResultTable.objects.filter(bk_data_id__in=data_ids.keys()).values_list(
@@ -1021,13 +1195,17 @@ class SpaceTableIDRedis:
         logger.info(
             "start to push bkci space cross space_type table_id, space_type: %s, space_id: %s", space_type, space_id
         )
-        tids = models.ResultTable.objects.filter(table_id__startswith=BKCI_1001_TABLE_ID_PREFIX).values_list(
-            "table_id", flat=True
-        )
-        # bkci 访问 p4 主机数据对应的结果表
-        p4_tids = models.ResultTable.objects.filter(table_id__startswith=P4_1001_TABLE_ID_PREFIX).values_list(
-            "table_id", flat=True
-        )
+        if self.preload:
+            tids = self.preload.prefix_table_ids(BKCI_1001_TABLE_ID_PREFIX)
+            p4_tids = self.preload.prefix_table_ids(P4_1001_TABLE_ID_PREFIX)
+        else:
+            tids = models.ResultTable.objects.filter(table_id__startswith=BKCI_1001_TABLE_ID_PREFIX).values_list(
+                "table_id", flat=True
+            )
+            # bkci 访问 p4 主机数据对应的结果表
+            p4_tids = models.ResultTable.objects.filter(table_id__startswith=P4_1001_TABLE_ID_PREFIX).values_list(
+                "table_id", flat=True
+            )
         # 组装结果表对应的 filter
         tid_filters = {tid: {"filters": [{"projectId": space_id}]} for tid in tids}
         tid_filters.update({tid: {"filters": [{"devops_id": space_id}]} for tid in p4_tids})
@@ -1037,10 +1215,16 @@ class SpaceTableIDRedis:
         """组装非业务类型的全空间类型的结果表数据"""
         logger.info("start to push all space type table_id, space_type: %s, space_id: %s", space_type, space_id)
         # 转换空间对应的bk_biz_id
-        try:
-            _id = models.Space.objects.get(space_type_id=space_type, space_id=space_id).id
-        except models.Space.DoesNotExist:
-            return {}
+        if self.preload:
+            space = self.preload.space(space_type, space_id)
+            if not space:
+                return {}
+            _id = space["id"]
+        else:
+            try:
+                _id = models.Space.objects.get(space_type_id=space_type, space_id=space_id).id
+            except models.Space.DoesNotExist:
+                return {}
         return {tid: {"filters": [{"bk_biz_id": str(-_id)}]} for tid in ALL_SPACE_TYPE_TABLE_ID_LIST}
 
     def _compose_apm_all_type_table_ids(self, space_type: str, space_id: str) -> dict:
@@ -1050,6 +1234,15 @@ class SpaceTableIDRedis:
         """
         # TODO： 该方法为临时支持，长期需要改造抽象为公共逻辑
         logger.info("start to push apm all space type table_id, space_type: %s, space_id: %s", space_type, space_id)
+        if self.preload:
+            space = self.preload.space(space_type, space_id)
+            if not space:
+                return {}
+            return {
+                tid: {"filters": [{bk_biz_id_alias: str(-space["id"])}]}
+                for tid, bk_biz_id_alias in self.preload.apm_global_tables(space["bk_tenant_id"])
+            }
+
         try:
             space = models.Space.objects.get(space_type_id=space_type, space_id=space_id)
         except models.Space.DoesNotExist:
@@ -1175,6 +1368,7 @@ class SpaceTableIDRedis:
             include_platform_data_id=include_platform_data_id,
             from_authorization=from_authorization,
             bk_tenant_id=bk_tenant_id,
+            platform_data_ids=self.preload.platform_data_ids(space_type, bk_tenant_id) if self.preload else None,
         )
         _values = {}
         # 如果为空，返回默认值
@@ -1292,11 +1486,22 @@ class SpaceTableIDRedis:
             space_id,
             bk_tenant_id,
         )
+        if self.preload:
+            return {
+                tid: {"filters": []} for tid in self.preload.record_rule_table_ids(space_type, space_id, bk_tenant_id)
+            }
         objs = RecordRule.objects.filter(space_type=space_type, space_id=space_id, bk_tenant_id=bk_tenant_id)
         return {obj.table_id: {"filters": []} for obj in objs}
 
     def _compose_es_table_ids(self, space_type: str, space_id: str, bk_tenant_id=DEFAULT_TENANT_ID):
         """组装es的结果表"""
+        if self.preload:
+            biz_id = self.preload.biz_id(space_type, space_id)
+            return {
+                tid: {"filters": []}
+                for tid, storage, tenant_id in self.preload.log_table_ids().get(biz_id, [])
+                if storage == models.ClusterInfo.TYPE_ES and tenant_id == bk_tenant_id
+            }
         biz_id = models.Space.objects.get_biz_id_by_space(space_type, space_id)
         tids = models.ResultTable.objects.filter(
             bk_biz_id=biz_id,
@@ -1311,6 +1516,13 @@ class SpaceTableIDRedis:
         """
         组装Doris链路结果表
         """
+        if self.preload:
+            biz_id = self.preload.biz_id(space_type, space_id)
+            return {
+                tid: {"filters": []}
+                for tid, storage, _ in self.preload.log_table_ids().get(biz_id, [])
+                if storage == models.ClusterInfo.TYPE_DORIS
+            }
         biz_id = models.Space.objects.get_biz_id_by_space(space_type, space_id)
         tids = models.ResultTable.objects.filter(
             bk_biz_id=biz_id, default_storage=models.ClusterInfo.TYPE_DORIS, is_deleted=False, is_enable=True
@@ -1333,6 +1545,15 @@ class SpaceTableIDRedis:
         )
         biz_ids = get_biz_ids_by_space_ids(SpaceTypes.BKCI.value, space_ids)
 
+        if self.preload:
+            log_table_ids = self.preload.log_table_ids()
+            return {
+                tid: {"filters": []}
+                for biz_id in biz_ids
+                for tid, _, tenant_id in log_table_ids.get(biz_id, [])
+                if tenant_id == bk_tenant_id
+            }
+
         tids = models.ResultTable.objects.filter(
             bk_biz_id__in=biz_ids,
             default_storage__in=[models.ClusterInfo.TYPE_ES, models.ClusterInfo.TYPE_DORIS],
@@ -1458,6 +1679,9 @@ class SpaceTableIDRedis:
 
     def _refine_table_ids(self, table_id_list: list | None = None, bk_tenant_id: str | None = DEFAULT_TENANT_ID) -> set:
         """提取写入到influxdb或vm的结果表数据"""
+        if self.preload and table_id_list:
+            return set(table_id_list) & self.preload.storage_table_ids(bk_tenant_id)
+
         # 过滤写入 influxdb 的结果表
         influxdb_table_ids = models.InfluxDBStorage.objects.values_list("table_id", flat=True)
 
@@ -2391,13 +2391,13 @@ class ESStorage(models.Model, StorageResultTable):
         判断该index是否已经存在,优先v2，随后v1
         :return: True | False
         """
-        stat_info_list = self.es_client.indices.stats(self.search_format_v2())
+        stat_info_list = self.get_indices_stats("v2")
         for stat_index_name in list(stat_info_list["indices"].keys()):
             re_result = self.index_re_v2.match(stat_index_name)
             if re_result:
                 logger.debug("table_id->[%s] found v2 index list->[%s]", self.table_id, str(stat_info_list))
                 return True
-        stat_info_list = self.es_client.indices.stats(self.search_format_v1())
+        stat_info_list = self.get_indices_stats("v1")
         for stat_index_name in list(stat_info_list["indices"].keys()):
             re_result = self.index_re_v1.match(stat_index_name)
             if re_result:
@@ -2408,6 +2408,14 @@ class ESStorage(models.Model, StorageResultTable):
 
     def _get_index_infos(self, namespaced: str) -> tuple[dict[str, dict[str, Any]], str]:
         index_version = ""
+        # 存在集群快照时直接使用快照中的索引统计信息，调用方仅依赖索引名及store统计
+        if self.es_snapshot is not None:
+            for version in ("v2", "v1"):
+                index_info_map = self.es_snapshot.get_indices(self.index_name, version)
+                if index_info_map:
+                    return index_info_map, version
+            return {}, index_version
+
         extra = {ESNamespacedClientType.CAT.value: {"format": "json"}, ESNamespacedClientType.INDICES.value: {}}[
             namespaced
         ]
@@ -2559,6 +2567,31 @@ class ESStorage(models.Model, StorageResultTable):
 
     es_client = cached_property(get_client, name="es_client")
 
+    # 集群索引快照，由 ESLifecyclePlanner 注入；存在时索引及别名的读取优先走快照，本表发生写操作后立即失效
+    es_snapshot = None
+
+    def bind_es_snapshot(self, snapshot):
+        """绑定集群索引快照，并复用快照所在集群的客户端"""
+        self.es_snapshot = snapshot
+        self.es_client = snapshot.es_client
+
+    def invalidate_es_snapshot(self):
+        """索引或别名即将变更，后续读取回退为实时请求"""
+        self.es_snapshot = None
+
+    def get_indices_stats(self, version):
+        """获取指定版本索引的统计信息，格式同 indices.stats"""
+        if self.es_snapshot is not None:
+            return {"indices": self.es_snapshot.get_indices(self.index_name, version)}
+        search_format = self.search_format_v2() if version == "v2" else self.search_format_v1()
+        return self.es_client.indices.stats(search_format)
+
+    def get_index_alias_list(self):
+        """获取该存储所有索引及其别名，格式同 indices.get_alias"""
+        if self.es_snapshot is not None:
+            return self.es_snapshot.get_aliases(self.index_name)
+        return self.es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+
     def add_field(self, field):
         """需要修改ES的mapping"""
         pass
@@ -3093,6 +3126,7 @@ class ESStorage(models.Model, StorageResultTable):
                 self.table_id,
                 last_index_name,
             )
+            self.invalidate_es_snapshot()
             self.es_client.indices.delete(index=last_index_name)
             # 重新获取最新的index，这里没做防护，默认存在超前的index，就一定存在不超前的可用index
             current_index_info = self.current_index_info()
@@ -3120,7 +3154,7 @@ class ESStorage(models.Model, StorageResultTable):
         if now_datetime_object.strftime(self.date_format) == current_index_info["datetime_object"].strftime(
             self.date_format
         ):
-            alias_list = self.es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+            alias_list = self.get_index_alias_list()
             filter_result = self.group_expired_alias(alias_list, self.retention)
             bounded_not_expired_alias_length = len(filter_result[last_index_name]["not_expired_alias"])
 
@@ -3129,6 +3163,7 @@ class ESStorage(models.Model, StorageResultTable):
                 self.es_client.count(index=last_index_name).get("count", 0) == 0
             ):
                 new_index = current_index_info["index"]
+                self.invalidate_es_snapshot()
                 self.es_client.indices.delete(index=last_index_name)
                 logger.info(
                     "update_index_v2: table_id->[%s] has index->[%s] which has bounded alias but not data, "
@@ -3331,6 +3366,7 @@ class ESStorage(models.Model, StorageResultTable):
             )
             raise elasticsearch5.NotFoundError(404, f"index {new_index_name} not found", None)
 
+        self.invalidate_es_snapshot()
         try:
             response = self.es_client.indices.update_aliases(
                 body={"actions": actions}, request_timeout=settings.METADATA_REQUEST_ES_TIMEOUT_SECONDS
@@ -3352,6 +3388,7 @@ class ESStorage(models.Model, StorageResultTable):
                 new_index_name,
             )
             return
+        self.invalidate_es_snapshot()
         try:
             response = self.es_client.indices.create(
                 index=new_index_name, body=self.index_body, params={"request_timeout": 30}
@@ -3448,16 +3485,17 @@ class ESStorage(models.Model, StorageResultTable):
             return old_write_result.group("datetime")
         return ""
 
-    def clean_index_v2(self):
+    def plan_clean_index_v2(self, alias_list=None):
         """
-        清理过期的写入别名及index的操作，如果发现某个index已经没有写入别名，那么将会清理该index
-        :return: int(清理的index个数) | raise Exception
+        规划过期别名及index的清理动作，本身不对ES做任何变更
+        :param alias_list: 索引的别名信息，为空时从集群快照或ES实时获取
+        :return: {"delete_alias": {index_name: [alias_name]}, "delete_index": [index_name]} | None(不允许清理)
         """
         # 没有快照任务可以直接删除
         # 有快照任务需要判断是否可以删除
         if not self.can_delete():
             logger.info("clean_index_v2:table_id->[%s] clean index is not allowed, skip", self.table_id)
-            return
+            return None
 
         logger.info("clean_index_v2:table_id->[%s] start clean index", self.table_id)
 
@@ -3488,7 +3526,8 @@ class ESStorage(models.Model, StorageResultTable):
                 long_term_storage_indices = []
 
         # 获取所有的写入别名
-        alias_list = self.es_client.indices.get_alias(index=f"*{self.index_name}_*_*")
+        if alias_list is None:
+            alias_list = self.get_index_alias_list()
 
         # 获取当前日期的字符串
         now_datetime_str = self.now.strftime(self.date_format)
@@ -3509,6 +3548,7 @@ class ESStorage(models.Model, StorageResultTable):
             ).values_list("index_name", flat=True)
         )
 
+        plan = {"delete_alias": {}, "delete_index": []}
         for index_name, alias_info in filter_result.items():
             # 回溯的索引不经过正常删除的逻辑删除
             if index_name.startswith(self.restore_index_prefix):
@@ -3539,17 +3579,7 @@ class ESStorage(models.Model, StorageResultTable):
             if alias_info["not_expired_alias"]:
                 if alias_info["expired_alias"]:
                     # 如果存在已过期的别名，则将别名删除
-                    logger.info(
-                        "clean_index_v2::table_id->[%s] delete_alias_list->[%s] is not empty will delete the alias.",
-                        self.table_id,
-                        alias_info["expired_alias"],
-                    )
-                    self.es_client.indices.delete_alias(index=index_name, name=",".join(alias_info["expired_alias"]))
-                    logger.warning(
-                        "clean_index_v2::table_id->[%s] delete_alias_list->[%s] is deleted.",
-                        self.table_id,
-                        alias_info["expired_alias"],
-                    )
+                    plan["delete_alias"][index_name] = alias_info["expired_alias"]
                 continue
             # 如果已经不存在未过期的别名，则将索引删除
             # 等待所有别名过期删除索引，防止删除别名快照时，丢失数据
@@ -3566,6 +3596,36 @@ class ESStorage(models.Model, StorageResultTable):
                     index_name,
                 )
                 continue
+            plan["delete_index"].append(index_name)
+
+        return plan
+
+    def clean_index_v2(self):
+        """
+        清理过期的写入别名及index的操作，如果发现某个index已经没有写入别名，那么将会清理该index
+        :return: int(清理的index个数) | raise Exception
+        """
+        plan = self.plan_clean_index_v2()
+        if plan is None:
+            return
+
+        if plan["delete_alias"] or plan["delete_index"]:
+            self.invalidate_es_snapshot()
+
+        for index_name, expired_alias in plan["delete_alias"].items():
+            logger.info(
+                "clean_index_v2::table_id->[%s] delete_alias_list->[%s] is not empty will delete the alias.",
+                self.table_id,
+                expired_alias,
+            )
+            self.es_client.indices.delete_alias(index=index_name, name=",".join(expired_alias))
+            logger.warning(
+                "clean_index_v2::table_id->[%s] delete_alias_list->[%s] is deleted.",
+                self.table_id,
+                expired_alias,
+            )
+
+        for index_name in plan["delete_index"]:
             try:
                 self.es_client.indices.delete(index=index_name)
                 logger.info("clean_index_v2:table_id->[%s] index->[%s] is deleted.", self.table_id, index_name)
@@ -0,0 +1,307 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import datetime
+import logging
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import elasticsearch
+import elasticsearch5
+import elasticsearch6
+from django.conf import settings
+
+logger = logging.getLogger("metadata")
+
+# 拉取集群快照的超时时间（秒），全量索引信息较大，需要比普通请求宽松
+ES_SNAPSHOT_REQUEST_TIMEOUT = 60
+# 单次 _aliases 请求携带的最大动作数
+ES_ALIAS_ACTIONS_CHUNK_SIZE = 500
+# 单次批量删除的最大索引数，避免请求URL过长
+ES_DELETE_INDEX_CHUNK_SIZE = 50
+
+ES_EXCEPTIONS = (
+    elasticsearch5.ElasticsearchException,
+    elasticsearch.ElasticsearchException,
+    elasticsearch6.ElasticsearchException,
+)
+
+# 轮转索引名格式：[v2_]{index_name}_{datetime}_{index}
+INDEX_NAME_RE = re.compile(r"^(?P<prefix>v2_)?(?P<index_name>.+)_(?P<datetime>\d+)_(?P<index>\d+)$")
+
+
+class ESClusterSnapshot:
+    """
+    ES集群索引快照
+    一次请求拉取集群内全部索引的 store 统计及别名绑定关系，按采集项 index_name 建立索引，供同集群的采集项复用
+    """
+
+    def __init__(self, es_client, indices: dict[str, dict], aliases: dict[str, dict]):
+        self.es_client = es_client
+        # {index_name: {"v1": {index: stats}, "v2": {index: stats}}}
+        self._indices: dict[str, dict[str, dict]] = defaultdict(lambda: {"v1": {}, "v2": {}})
+        # {index_name: {index: {"aliases": {...}}}}
+        self._aliases: dict[str, dict[str, dict]] = defaultdict(dict)
+        # {alias: {index}}
+        self._alias_indices: dict[str, set[str]] = defaultdict(set)
+
+        for index, stats in indices.items():
+            result = INDEX_NAME_RE.match(index)
+            if result is None:
+                continue
+            version = "v2" if result.group("prefix") else "v1"
+            self._indices[result.group("index_name")][version][index] = stats
+
+        for index, alias_info in aliases.items():
+            index_aliases = alias_info.get("aliases") or {}
+            for alias in index_aliases:
+                self._alias_indices[alias].add(index)
+            result = INDEX_NAME_RE.match(index)
+            if result is None:
+                continue
+            self._aliases[result.group("index_name")][index] = {"aliases": index_aliases}
+
+    @classmethod
+    def fetch(cls, es_client) -> "ESClusterSnapshot":
+        """拉取集群快照，整个集群仅需两次请求"""
+        stats = es_client.indices.stats(index="*", metric="store", request_timeout=ES_SNAPSHOT_REQUEST_TIMEOUT)
+        aliases = es_client.indices.get_alias(index="*", request_timeout=ES_SNAPSHOT_REQUEST_TIMEOUT)
+        return cls(es_client, indices=stats.get("indices", {}), aliases=aliases)
+
+    def get_indices(self, index_name: str, version: str) -> dict[str, dict]:
+        """获取采集项指定版本的索引统计信息"""
+        if index_name not in self._indices:
+            return {}
+        return dict(self._indices[index_name][version])
+
+    def get_aliases(self, index_name: str) -> dict[str, dict]:
+        """获取采集项全部索引的别名信息，格式同 indices.get_alias"""
+        if index_name not in self._aliases:
+            return {}
+        return dict(self._aliases[index_name])
+
+    def get_alias_indices(self, alias: str) -> set[str]:
+        """获取别名当前绑定的索引"""
+        return set(self._alias_indices.get(alias, ()))
+
+
+class ESLifecyclePlanner:
+    """
+    集群级ES索引生命周期规划器
+    1. 每个集群只拉取一次索引及别名快照，采集项的读取均走快照，发生写操作的采集项自动回退为实时读取
+    2. 别名已全部就绪的采集项跳过逐轮次的别名检查
+    3. 过期别名及索引的清理在内存中汇总后，通过批量 _aliases 请求及批量删除统一下发
+    4. 采集项之间按有限并发执行，dry_run 模式下仅返回规划结果，不做任何变更
+    """
+
+    def __init__(self, cluster_id: int, es_storages: list, dry_run: bool = False, concurrency: int | None = None):
+        self.cluster_id = cluster_id
+        self.es_storages = es_storages
+        self.dry_run = dry_run
+        self.concurrency = concurrency or settings.ES_INDEX_ROTATION_CONCURRENCY
+        self.snapshot: ESClusterSnapshot | None = None
+        # {index: [alias]}
+        self.delete_aliases: dict[str, list[str]] = {}
+        self.delete_indices: list[str] = []
+        # {index: table_id}，用于日志定位
+        self._index_table_ids: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def load_snapshot(self):
+        """拉取集群快照并绑定到各个采集项，失败时各采集项保持实时读取"""
+        if not self.es_storages:
+            return
+        try:
+            self.snapshot = ESClusterSnapshot.fetch(self.es_storages[0].get_client())
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("ESLifecyclePlanner: cluster_id->[%s] fetch snapshot failed, error->[%s]", self.cluster_id, e)
+            return
+
+        for es_storage in self.es_storages:
+            es_storage.bind_es_snapshot(self.snapshot)
+
+    def is_alias_ready(self, es_storage, ahead_time: int) -> bool:
+        """
+        根据快照判断未来 ahead_time 内的读写别名是否已全部指向最新索引，是则无需再逐轮次更新别名
+        与 ESStorage.create_or_update_aliases 的轮次计算保持一致
+        """
+        if self.snapshot is None or es_storage.es_snapshot is not self.snapshot:
+            return False
+
+        try:
+            current_index_info = es_storage.current_index_info()
+        except Exception:  # pylint: disable=broad-except
+            return False
+        last_index_name = es_storage.make_index_name(
+            current_index_info["datetime_object"], current_index_info["index"], current_index_info["index_version"]
+        )
+
+        now_datetime_object = es_storage.now
+        now_gap = 0
+        while now_gap <= ahead_time:
+            round_time_str = (now_datetime_object + datetime.timedelta(minutes=now_gap)).strftime(
+                es_storage.date_format
+            )
+            write_alias = f"write_{round_time_str}_{es_storage.index_name}"
+            read_alias = f"{es_storage.index_name}_{round_time_str}_read"
+            if self.snapshot.get_alias_indices(write_alias) != {last_index_name}:
+                return False
+            if last_index_name not in self.snapshot.get_alias_indices(read_alias):
+                return False
+            if es_storage.slice_gap <= 0:
+                break
+            now_gap += es_storage.slice_gap
+        return True
+
+    def rotate(self, es_storage):
+        """创建或轮转索引，并在别名未就绪时更新别名"""
+        if not es_storage.index_exist():
+            logger.info(
+                "ESLifecyclePlanner: table_id->[%s] found no index in es,will create new one", es_storage.table_id
+            )
+            es_storage.create_index_and_aliases(es_storage.slice_gap)
+            return
+
+        logger.info("ESLifecyclePlanner: table_id->[%s] found index in es,now try to update it", es_storage.table_id)
+        es_storage.update_index_v2()
+        if self.is_alias_ready(es_storage, es_storage.slice_gap):
+            logger.info("ESLifecyclePlanner: table_id->[%s] aliases are up to date, skip", es_storage.table_id)
+            return
+        es_storage.create_or_update_aliases(ahead_time=es_storage.slice_gap)
+
+    def collect_clean_plan(self, es_storage):
+        """汇总采集项的清理动作，由 apply_clean_plan 统一下发"""
+        plan = es_storage.plan_clean_index_v2()
+        if not plan:
+            return
+        with self._lock:
+            self._merge_clean_plan(es_storage.table_id, plan)
+
+    def _merge_clean_plan(self, table_id: str, plan: dict):
+        for index, aliases in plan["delete_alias"].items():
+            self.delete_aliases[index] = aliases
+            self._index_table_ids[index] = table_id
+        for index in plan["delete_index"]:
+            self.delete_indices.append(index)
+            self._index_table_ids[index] = table_id
+
+    def apply_clean_plan(self):
+        """批量下发别名及索引的清理动作，批量失败时回退为逐个处理"""
+        if self.dry_run or not (self.delete_aliases or self.delete_indices):
+            return
+        es_client = self.snapshot.es_client if self.snapshot else self.es_storages[0].es_client
+
+        actions = [
+            {"remove": {"index": index, "alias": alias}}
+            for index, aliases in self.delete_aliases.items()
+            for alias in aliases
+        ]
+        for start in range(0, len(actions), ES_ALIAS_ACTIONS_CHUNK_SIZE):
+            chunk = actions[start : start + ES_ALIAS_ACTIONS_CHUNK_SIZE]
+            try:
+                es_client.indices.update_aliases(
+                    body={"actions": chunk}, request_timeout=settings.METADATA_REQUEST_ES_TIMEOUT_SECONDS
+                )
+                logger.info("ESLifecyclePlanner: cluster_id->[%s] removed [%s] aliases", self.cluster_id, len(chunk))
+            except ES_EXCEPTIONS as e:
+                logger.warning(
+                    "ESLifecyclePlanner: cluster_id->[%s] bulk remove aliases failed->[%s], fallback one by one",
+                    self.cluster_id,
+                    e,
+                )
+                self._remove_aliases_one_by_one(es_client, chunk)
+
+        for start in range(0, len(self.delete_indices), ES_DELETE_INDEX_CHUNK_SIZE):
+            chunk = self.delete_indices[start : start + ES_DELETE_INDEX_CHUNK_SIZE]
+            try:
+                es_client.indices.delete(index=",".join(chunk))
+                logger.warning("ESLifecyclePlanner: cluster_id->[%s] indices->[%s] deleted", self.cluster_id, chunk)
+            except ES_EXCEPTIONS as e:
+                logger.warning(
+                    "ESLifecyclePlanner: cluster_id->[%s] bulk delete indices failed->[%s], fallback one by one",
+                    self.cluster_id,
+                    e,
+                )
+                self._delete_indices_one_by_one(es_client, chunk)
+
+    def _remove_aliases_one_by_one(self, es_client, actions: list[dict]):
+        index_aliases: dict[str, list[str]] = defaultdict(list)
+        for action in actions:
+            index_aliases[action["remove"]["index"]].append(action["remove"]["alias"])
+        for index, aliases in index_aliases.items():
+            try:
+                es_client.indices.delete_alias(index=index, name=",".join(aliases))
+            except ES_EXCEPTIONS as e:
+                logger.warning(
+                    "ESLifecyclePlanner: table_id->[%s] index->[%s] delete aliases->[%s] failed, error->[%s]",
+                    self._index_table_ids.get(index),
+                    index,
+                    aliases,
+                    e,
+                )
+
+    def _delete_indices_one_by_one(self, es_client, indices: list[str]):
+        for index in indices:
+            try:
+                es_client.indices.delete(index=index)
+            except ES_EXCEPTIONS:
+                logger.warning(
+                    "ESLifecyclePlanner: table_id->[%s] index->[%s] delete failed, index maybe doing snapshot",
+                    self._index_table_ids.get(index),
+                    index,
+                )
+
+    def plan(self) -> dict[str, Any]:
+        """
+        生成规划结果，不做任何变更(索引及别名信息读取快照)
+        create: 索引不存在，需要新建；rotate: 需要轮转新索引；update: 仅需维护别名
+        """
+        result = {"create": [], "rotate": [], "update": [], "alias_ready": []}
+        for es_storage in self.es_storages:
+            if not es_storage.index_exist():
+                result["create"].append(es_storage.table_id)
+                continue
+
+            if es_storage._should_create_index():
+                result["rotate"].append(es_storage.table_id)
+            else:
+                result["update"].append(es_storage.table_id)
+                # 轮转后别名会指向新索引，仅在无需轮转时判断别名是否就绪
+                if self.is_alias_ready(es_storage, es_storage.slice_gap):
+                    result["alias_ready"].append(es_storage.table_id)
+            self.collect_clean_plan(es_storage)
+        return result
+
+    def run(self, handler) -> dict[str, Any]:
+        """
+        执行集群内全部采集项的生命周期管理
+        :param handler: 单个采集项的处理函数，签名为 handler(es_storage, planner)
+        """
+        self.load_snapshot()
+
+        if self.dry_run:
+            result = self.plan()
+        else:
+            result = {}
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                list(executor.map(lambda es_storage: handler(es_storage, self), self.es_storages))
+            self.apply_clean_plan()
+
+        result.update(
+            {
+                "cluster_id": self.cluster_id,
+                "delete_alias": self.delete_aliases,
+                "delete_index": self.delete_indices,
+            }
+        )
+        return result
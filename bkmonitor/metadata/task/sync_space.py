@@ -669,20 +669,24 @@ def push_and_publish_space_router(
     """推送数据和通知"""
     from metadata.models.space.constants import SPACE_TO_RESULT_TABLE_CHANNEL
     from metadata.models.space.ds_rt import get_space_table_id_data_id
-    from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
+    from metadata.models.space.space_table_id_redis import (
+        SpaceRoutingPreload,
+        SpaceTableIDRedis,
+    )
 
     # 过滤数据
-    spaces = models.Space.objects.values("space_type_id", "space_id", "bk_tenant_id")
+    space_qs = models.Space.objects.all()
     if space_type:
-        spaces = spaces.filter(space_type_id=space_type)
+        space_qs = space_qs.filter(space_type_id=space_type)
     if space_id:
-        spaces = spaces.filter(space_id=space_id)
+        space_qs = space_qs.filter(space_id=space_id)
     if bk_tenant_id:
         logger.info("push and publish space router with bk_tenant_id->[%s]", bk_tenant_id)
-        spaces = spaces.filter(bk_tenant_id=bk_tenant_id)
+        space_qs = space_qs.filter(bk_tenant_id=bk_tenant_id)
     # 这里不应该会有太多空间 ID 的输入
     if space_id_list:
-        spaces = spaces.filter(space_id__in=space_id_list)
+        space_qs = space_qs.filter(space_id__in=space_id_list)
+    spaces = space_qs.values("space_type_id", "space_id", "bk_tenant_id")
 
     # 拼装数据
     space_list = [
@@ -690,21 +694,19 @@ def push_and_publish_space_router(
         for space in spaces
     ]
 
-    # 批量处理 -- SPACE_TO_RESULT_TABLE 路由
-    bulk_handle(
-        lambda batch_spaces: SpaceTableIDRedis().push_multi_space_table_ids(batch_spaces, is_publish=False),
-        list(spaces),
-    )
+    # 批量处理 -- SPACE_TO_RESULT_TABLE 路由，共享的 ORM 数据在本次同步中只加载一次
+    space_routing_client = SpaceTableIDRedis(preload=SpaceRoutingPreload())
+    changed_space_keys = []
 
-    # 通知到使用方
-    if is_publish:
-        space_uid_list = []
-        for space in spaces:
-            if settings.ENABLE_MULTI_TENANT_MODE:
-                space_uid_list.append(f"{space['space_type_id']}__{space['space_id']}|{space['bk_tenant_id']}")
-            else:
-                space_uid_list.append(f"{space['space_type_id']}__{space['space_id']}")
-        RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, space_uid_list)
+    def _push_batch(batch_spaces):
+        # list.extend 为原子操作，可直接在多线程中收集
+        changed_space_keys.extend(space_routing_client.push_multi_space_table_ids(batch_spaces, is_publish=False))
+
+    bulk_handle(_push_batch, list(space_qs))
+
+    # 通知到使用方，仅通知路由发生变化的空间
+    if is_publish and changed_space_keys:
+        RedisTools.publish(SPACE_TO_RESULT_TABLE_CHANNEL, changed_space_keys)
 
     # 仅存在空间 id 时，可以直接按照结果表进行处理
     # 非多租户环境: 所有table_id的路由一并推送
@@ -25,7 +25,7 @@ from alarm_backends.service.scheduler.app import app
 from constants.common import DEFAULT_TENANT_ID
 from core.drf_resource import api
 from core.prometheus import metrics
-from metadata import models
+from metadata import config, models
 from metadata.models import BkBaseResultTable, ClusterInfo, DataSource
 from metadata.models.constants import (
     BASE_EVENT_RESULT_TABLE_FIELD_MAP,
@@ -52,6 +52,7 @@ from metadata.models.vm.utils import (
     get_vm_cluster_id_name,
     report_metadata_data_link_status_info,
 )
+from metadata.service.es_lifecycle import ESLifecyclePlanner
 from metadata.service.sync_metadata import (
     sync_es_metadata,
     sync_kafka_metadata,
@@ -179,9 +180,21 @@ def delete_restore_indices(restore_id):
 
 def update_time_series_metrics(time_series_metrics):
     data_id_list, table_id_list = [], []
+    time_series_metrics = list(time_series_metrics)
+    # 批量预加载白名单、同步水位及已有指标，避免逐个分组查询
+    white_list = set(RedisTools.get_list(config.METADATA_RESULT_TABLE_WHITE_LIST))
+    group_ids = [time_series_group.time_series_group_id for time_series_group in time_series_metrics]
+    watermarks = models.TimeSeriesGroup.get_metric_watermarks(group_ids)
+    group_metrics = models.TimeSeriesMetric.load_group_metrics(group_ids)
+    synced_watermarks = {}
     for time_series_group in time_series_metrics:
+        group_id = time_series_group.time_series_group_id
         try:
-            is_updated = time_series_group.update_time_series_metrics()
+            is_updated = time_series_group.update_time_series_metrics(
+                white_list=white_list, exist_metrics=group_metrics[group_id], watermark=watermarks.get(group_id)
+            )
+            if time_series_group.synced_watermark is not None:
+                synced_watermarks[group_id] = time_series_group.synced_watermark
             logger.info(
                 "bk_data_id->[%s] metric add from redis success, is_updated: %s",
                 time_series_group.bk_data_id,
@@ -204,6 +217,9 @@ def update_time_series_metrics(time_series_metrics):
         else:
             logger.info("time_series_group->[%s] metric update from redis success.", time_series_group.bk_data_id)
 
+    # 仅记录同步成功的分组水位，失败的分组下次从旧水位继续
+    models.TimeSeriesGroup.set_metric_watermarks(synced_watermarks)
+
     # 仅当指标有变动的结果表存在时，才进行路由配置更新
     if table_id_list:
         from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
@@ -215,11 +231,12 @@ def update_time_series_metrics(time_series_metrics):
 
 # todo: es 索引管理，迁移至BMW
 @app.task(ignore_result=True, queue="celery_long_task_cron")
-def manage_es_storage(storage_record_ids, cluster_id: int = None):
+def manage_es_storage(storage_record_ids, cluster_id: int = None, dry_run: bool = False):
     """
     ES索引轮转异步任务
     @param es_storages: 待轮转采集项
     @param cluster_id: 集群ID
+    @param dry_run: 仅输出规划结果，不对ES做任何变更
     @return:
     """
     # 统计&上报 任务状态指标
@@ -230,31 +247,32 @@ def manage_es_storage(storage_record_ids, cluster_id: int = None):
     logger.info("manage_es_storage: start to manage_es_storage")
     start_time = time.time()
 
-    es_storages = models.ESStorage.objects.filter(id__in=storage_record_ids)
+    es_storages = list(models.ESStorage.objects.filter(id__in=storage_record_ids))
 
-    # 不再使用白名单，默认全量使用新方式轮转
-    for es_storage in es_storages:
+    def _handle(es_storage, planner):
         logger.info(
             "manage_es_storage:cluster_id->[%s],table_id->[%s],start to rotate index",
             cluster_id,
             es_storage.table_id,
         )
-        try:
-            _manage_es_storage(es_storage)
-            time.sleep(settings.ES_INDEX_ROTATION_SLEEP_INTERVAL_SECONDS)  # 等待一段时间，降低负载
-            logger.info(
-                "manage_es_storage:cluster_id->[%s],table_id->[%s],rotate index finished",
-                cluster_id,
-                es_storage.table_id,
-            )
-        except Exception as e:
-            logger.error(
-                "manage_es_storage:cluster_id->[%s],table_id->[%s],rotate index failed, error->[%s]",
-                cluster_id,
-                es_storage.table_id,
-                e,
-            )
-            continue
+        _manage_es_storage(es_storage, planner=planner)
+        # 仅对ES发生过变更的采集项等待一段时间，降低负载
+        if es_storage.es_snapshot is None:
+            time.sleep(settings.ES_INDEX_ROTATION_SLEEP_INTERVAL_SECONDS)
+        logger.info(
+            "manage_es_storage:cluster_id->[%s],table_id->[%s],rotate index finished",
+            cluster_id,
+            es_storage.table_id,
+        )
+
+    # 不再使用白名单，默认全量使用新方式轮转
+    # 同一集群共用一份索引快照，清理动作汇总后批量下发
+    planner = ESLifecyclePlanner(cluster_id=cluster_id, es_storages=es_storages, dry_run=dry_run)
+    try:
+        result = planner.run(_handle)
+        logger.info("manage_es_storage:cluster_id->[%s],dry_run->[%s],plan->[%s]", cluster_id, dry_run, result)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error("manage_es_storage:cluster_id->[%s],rotate index failed, error->[%s]", cluster_id, e)
 
     cost_time = time.time() - start_time
 
@@ -358,9 +376,10 @@ def _clean_disable_es_storage(es_storage):
     metrics.report_all()
 
 
-def _manage_es_storage(es_storage):
+def _manage_es_storage(es_storage, planner=None):
     """
     NOTE: 针对结果表校验使用的es集群状态，不要统一校验
+    @param planner: 集群级生命周期规划器，存在时索引轮转及清理经由规划器执行
     """
     # 遍历所有的ES存储并创建index, 并执行完整的es生命周期操作
 
@@ -398,7 +417,9 @@ def _manage_es_storage(es_storage):
             )
             return
 
-        if not es_storage.index_exist():
+        if planner is not None:
+            planner.rotate(es_storage)
+        elif not es_storage.index_exist():
             #   如果该table_id的index在es中不存在，说明要走初始化流程
             logger.info(
                 "manage_es_storage:table_id->[%s] found no index in es,will create new one", es_storage.table_id
@@ -415,7 +436,10 @@ def _manage_es_storage(es_storage):
 
         # 清理过期的index
         logger.info("manage_es_storage:table_id->[%s] try to clean index", es_storage.table_id)
-        es_storage.clean_index_v2()
+        if planner is not None:
+            planner.collect_clean_plan(es_storage)
+        else:
+            es_storage.clean_index_v2()
 
         # 清理历史ES集群中的过期Index
         logger.info("manage_es_storage:table_id->[%s] try to clean index in old es cluster", es_storage.table_id)
@@ -17,7 +17,10 @@ from django.conf import settings
 from django.utils import timezone
 
 from metadata import models
-from metadata.models.space.space_table_id_redis import SpaceTableIDRedis
+from metadata.models.space.space_table_id_redis import (
+    SpaceRoutingPreload,
+    SpaceTableIDRedis,
+)
 from metadata.tests.common_utils import consul_client
 
 base_time = datetime(2020, 1, 1, tzinfo=timezone.utc)
@@ -307,6 +310,81 @@ def test_push_space_to_rt_router_for_bksaas(create_or_delete_records):
             )
 
 
+@pytest.mark.django_db(databases="__all__")
+def test_push_multi_space_table_ids_with_preload(create_or_delete_records):
+    """批量推送使用预加载数据，结果需要与逐个空间计算一致，且只推送变化的空间"""
+    settings.ENABLE_MULTI_TENANT_MODE = True
+    spaces = [
+        models.Space.objects.get(space_type_id="bkcc", space_id="1"),
+        models.Space.objects.get(space_type_id="bkci", space_id="bkmonitor"),
+        models.Space.objects.get(space_type_id="bksaas", space_id="monitor_saas"),
+    ]
+    expected = {}
+    for space in spaces:
+        values = SpaceTableIDRedis().compose_space_table_ids(space)
+        if values:
+            expected[SpaceTableIDRedis.get_space_redis_key(space.space_type_id, space.space_id, "system")] = values
+
+    redis_data = {}
+
+    def mock_hmget(key, fields):
+        return [redis_data.get(field) for field in fields]
+
+    with patch("metadata.utils.redis_tools.RedisTools.hmget", side_effect=mock_hmget):
+        with patch("metadata.utils.redis_tools.RedisTools.pipeline_hmset_to_redis") as mock_hmset:
+            with patch("metadata.utils.redis_tools.RedisTools.publish") as mock_publish:
+                client = SpaceTableIDRedis(preload=SpaceRoutingPreload())
+                changed_keys = client.push_multi_space_table_ids(spaces, is_publish=True)
+
+                assert set(changed_keys) == set(expected.keys())
+                args, _ = mock_hmset.call_args
+                assert args[0] == "bkmonitorv3:spaces:space_to_result_table"
+                assert {key: json.loads(value) for key, value in args[1].items()} == expected
+                mock_publish.assert_called_once_with("bkmonitorv3:spaces:space_to_result_table:channel", changed_keys)
+                redis_data.update(args[1])
+
+            # 路由没有变化时，不再写入和通知
+            with patch("metadata.utils.redis_tools.RedisTools.publish") as mock_publish:
+                mock_hmset.reset_mock()
+                assert client.push_multi_space_table_ids(spaces, is_publish=True) == []
+                mock_hmset.assert_not_called()
+                mock_publish.assert_not_called()
+
+
+@pytest.mark.django_db(databases="__all__")
+def test_push_and_publish_space_router_only_publish_changed(create_or_delete_records):
+    """全量推送时只通知路由发生变化的空间，没有变化时不通知"""
+    from metadata.task.sync_space import push_and_publish_space_router
+
+    settings.ENABLE_MULTI_TENANT_MODE = False
+
+    def mock_push_multi(self, spaces, is_publish=False):
+        return [f"{space.space_type_id}__{space.space_id}" for space in spaces if space.space_type_id == "bkcc"]
+
+    with (
+        patch.object(SpaceTableIDRedis, "push_multi_space_table_ids", mock_push_multi),
+        patch.object(SpaceTableIDRedis, "push_data_label_table_ids"),
+        patch.object(SpaceTableIDRedis, "push_table_id_detail"),
+        patch("metadata.utils.redis_tools.RedisTools.publish") as mock_publish,
+    ):
+        push_and_publish_space_router(bk_tenant_id=None)
+        args, _ = mock_publish.call_args
+        assert args[0] == "bkmonitorv3:spaces:space_to_result_table:channel"
+        assert sorted(args[1]) == sorted(
+            f"bkcc__{space_id}"
+            for space_id in models.Space.objects.filter(space_type_id="bkcc").values_list("space_id", flat=True)
+        )
+
+    with (
+        patch.object(SpaceTableIDRedis, "push_multi_space_table_ids", return_value=[]),
+        patch.object(SpaceTableIDRedis, "push_data_label_table_ids"),
+        patch.object(SpaceTableIDRedis, "push_table_id_detail"),
+        patch("metadata.utils.redis_tools.RedisTools.publish") as mock_publish,
+    ):
+        push_and_publish_space_router(bk_tenant_id=None)
+        mock_publish.assert_not_called()
+
+
 @pytest.mark.django_db(databases="__all__")
 def test_compose_apm_all_type_table_ids(create_or_delete_records):
     client = SpaceTableIDRedis()
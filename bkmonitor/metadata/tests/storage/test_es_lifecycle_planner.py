@@ -0,0 +1,183 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import fnmatch
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from dateutil import tz
+
+from metadata.models.storage import ESStorage
+from metadata.service.es_lifecycle import ESClusterSnapshot, ESLifecyclePlanner
+
+WRITE_REQUESTS = {"update_aliases", "delete_alias", "delete"}
+
+
+class StubIndicesClient:
+    """本地ES桩，仅实现生命周期管理涉及的 indices 接口，并记录请求"""
+
+    def __init__(self, es):
+        self.es = es
+
+    def stats(self, index=None, metric=None, **kwargs):
+        self.es.requests.append("stats")
+        return {
+            "indices": {
+                name: {"primaries": {"store": {"size_in_bytes": 1024}}} for name in self.es.match_indices(index)
+            }
+        }
+
+    def get_alias(self, index=None, name=None, **kwargs):
+        self.es.requests.append("get_alias")
+        return {
+            index_name: {"aliases": {alias: {} for alias in self.es.index_aliases[index_name]}}
+            for index_name in self.es.match_indices(index)
+        }
+
+    def update_aliases(self, body, **kwargs):
+        self.es.requests.append("update_aliases")
+        for action in body["actions"]:
+            self.es.index_aliases[action["remove"]["index"]].discard(action["remove"]["alias"])
+
+    def delete_alias(self, index, name, **kwargs):
+        self.es.requests.append("delete_alias")
+        self.es.index_aliases[index] -= set(name.split(","))
+
+    def delete(self, index, **kwargs):
+        self.es.requests.append("delete")
+        for index_name in index.split(","):
+            self.es.index_aliases.pop(index_name)
+
+
+class StubES:
+    """本地ES桩，index_aliases 记录当前的 索引-别名 绑定关系"""
+
+    def __init__(self, index_aliases):
+        self.index_aliases = {index: set(aliases) for index, aliases in index_aliases.items()}
+        self.requests = []
+        self.indices = StubIndicesClient(self)
+
+    def match_indices(self, pattern):
+        return [name for name in list(self.index_aliases) if fnmatch.fnmatchcase(name, pattern or "*")]
+
+    @property
+    def write_requests(self):
+        return [request for request in self.requests if request in WRITE_REQUESTS]
+
+
+def make_stub_es(index_names):
+    indices = {}
+    for index_name in index_names:
+        # 已无未过期别名，需要删除索引
+        indices[f"v2_{index_name}_20241201_0"] = {f"{index_name}_20241201_read"}
+        # 部分别名过期，需要删除别名
+        indices[f"v2_{index_name}_20241210_0"] = {f"{index_name}_20241205_read", f"{index_name}_20241218_read"}
+        # 当前索引，别名均已就绪
+        indices[f"v2_{index_name}_20241219_0"] = {
+            f"write_20241219_{index_name}",
+            f"{index_name}_20241219_read",
+            f"write_20241220_{index_name}",
+            f"{index_name}_20241220_read",
+        }
+    return StubES(indices)
+
+
+@pytest.fixture
+def es_storages():
+    storages = [
+        ESStorage(
+            table_id=f"2_bklog.rt_{i}",
+            storage_cluster_id=1,
+            retention=7,
+            slice_gap=1440,
+            date_format="%Y%m%d",
+        )
+        for i in range(50)
+    ]
+    with (
+        patch.object(ESStorage, "now", new=datetime(2024, 12, 19, 10, 0, tzinfo=tz.tzutc())),
+        patch.object(ESStorage, "can_delete", return_value=True),
+    ):
+        yield storages
+
+
+@pytest.mark.django_db(databases="__all__")
+def test_planner_clean_index_with_batch_requests(es_storages):
+    """规划器与逐个清理的结果一致，且请求数与采集项个数无关"""
+    index_names = [es_storage.index_name for es_storage in es_storages]
+
+    # 逐个采集项清理
+    legacy_es = make_stub_es(index_names)
+    for es_storage in es_storages:
+        es_storage.es_client = legacy_es
+        es_storage.clean_index_v2()
+
+    # 集群级规划器清理
+    planner_es = make_stub_es(index_names)
+    with patch.object(ESStorage, "get_client", return_value=planner_es):
+        planner = ESLifecyclePlanner(cluster_id=1, es_storages=es_storages, concurrency=4)
+        planner.run(lambda es_storage, p: p.collect_clean_plan(es_storage))
+
+    assert planner_es.index_aliases == legacy_es.index_aliases
+    assert "v2_2_bklog_rt_0_20241201_0" not in planner_es.index_aliases
+    assert planner_es.index_aliases["v2_2_bklog_rt_0_20241210_0"] == {"2_bklog_rt_0_20241218_read"}
+
+    # 逐个清理：每个采集项 get_alias + delete_alias + delete
+    assert len(legacy_es.requests) == 3 * len(es_storages)
+    # 规划器：快照 stats + get_alias，一次批量删除别名，一次批量删除索引
+    assert planner_es.requests == ["stats", "get_alias", "update_aliases", "delete"]
+
+
+@pytest.mark.django_db(databases="__all__")
+def test_planner_dry_run(es_storages):
+    """dry_run 仅输出规划结果，不做任何变更"""
+    es_storages = es_storages[:4]
+    # rt_3 无索引，需要新建
+    es = make_stub_es([es_storage.index_name for es_storage in es_storages[:3]])
+    # rt_1 索引大小超过分片大小，需要轮转
+    es_storages[1].slice_size = 0
+    # rt_2 今天的读写别名未指向最新索引，需要更新别名
+    es.index_aliases["v2_2_bklog_rt_2_20241219_0"] -= {"write_20241219_2_bklog_rt_2"}
+    with (
+        patch.object(ESStorage, "get_client", return_value=es),
+        patch.object(ESStorage, "is_mapping_same", return_value=True),
+    ):
+        result = ESLifecyclePlanner(cluster_id=1, es_storages=es_storages, dry_run=True).run(None)
+
+    assert es.write_requests == []
+    assert es.requests == ["stats", "get_alias"]
+    assert result["create"] == ["2_bklog.rt_3"]
+    assert result["rotate"] == ["2_bklog.rt_1"]
+    assert result["update"] == ["2_bklog.rt_0", "2_bklog.rt_2"]
+    # 今明两天的读写别名均已指向最新索引，无需逐轮次更新别名
+    assert result["alias_ready"] == ["2_bklog.rt_0"]
+    assert result["delete_index"] == [f"v2_2_bklog_rt_{i}_20241201_0" for i in range(3)]
+    assert result["delete_alias"] == {
+        f"v2_2_bklog_rt_{i}_20241210_0": [f"2_bklog_rt_{i}_20241205_read"] for i in range(3)
+    }
+
+
+def test_cluster_snapshot_group_by_index_name():
+    snapshot = ESClusterSnapshot(
+        es_client=None,
+        indices={
+            "v2_2_bklog_rt_20241219_0": {},
+            "2_bklog_rt_20241218_1": {},
+            "v2_2_bklog_rt_other_20241219_0": {},
+            ".kibana": {},
+        },
+        aliases={"v2_2_bklog_rt_20241219_0": {"aliases": {"write_20241219_2_bklog_rt": {}}}},
+    )
+
+    assert list(snapshot.get_indices("2_bklog_rt", "v2")) == ["v2_2_bklog_rt_20241219_0"]
+    assert list(snapshot.get_indices("2_bklog_rt", "v1")) == ["2_bklog_rt_20241218_1"]
+    assert snapshot.get_indices("2_bklog_rt_not_exist", "v2") == {}
+    assert snapshot.get_alias_indices("write_20241219_2_bklog_rt") == {"v2_2_bklog_rt_20241219_0"}
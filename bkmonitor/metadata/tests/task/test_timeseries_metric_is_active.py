@@ -12,7 +12,8 @@ import datetime
 
 import pytest
 
-from metadata import models
+from metadata import config, models
+from metadata.task.tasks import update_time_series_metrics
 
 pytestmark = pytest.mark.django_db(databases="__all__")
 
@@ -297,3 +298,106 @@ def test_empty_metric_list_sets_all_to_inactive(create_and_delete_records):
 
     metric3 = models.TimeSeriesMetric.objects.get(group_id=DEFAULT_GROUP_ID, field_name="metric3")
     assert metric3.is_active is False
+
+
+def test_incremental_refresh_only_expires_given_metrics(create_and_delete_records):
+    """
+    测试增量同步：基于预加载的已有指标比对，仅将新过期的指标设置为非活跃
+    """
+    curr_time = int(datetime.datetime.now().timestamp())
+    metric_info_list = [
+        {
+            "field_name": "metric3",
+            "tag_value_list": {"endpoint": {"last_update_time": curr_time, "values": []}},
+            "last_modify_time": curr_time,
+        }
+    ]
+    exist_metrics = models.TimeSeriesMetric.load_group_metrics([DEFAULT_GROUP_ID])[DEFAULT_GROUP_ID]
+    assert set(exist_metrics) == {"metric1", "metric2", "metric3"}
+
+    models.TimeSeriesMetric.bulk_refresh_ts_metrics(
+        group_id=DEFAULT_GROUP_ID,
+        table_id=DEFAULT_TABLE_ID,
+        metric_info_list=metric_info_list,
+        is_auto_discovery=True,
+        exist_metrics=exist_metrics,
+        expired_metrics=["metric2"],
+    )
+
+    # metric1 没有变动也没有过期，保持不变
+    assert models.TimeSeriesMetric.objects.get(group_id=DEFAULT_GROUP_ID, field_name="metric1").is_active is True
+    assert models.TimeSeriesMetric.objects.get(group_id=DEFAULT_GROUP_ID, field_name="metric2").is_active is False
+    metric3 = models.TimeSeriesMetric.objects.get(group_id=DEFAULT_GROUP_ID, field_name="metric3")
+    assert metric3.is_active is True
+    assert set(metric3.tag_list) == {"endpoint", "target"}
+
+
+class FakeZSetClient:
+    """仅实现 zrangebyscore 的 zset 桩，用于验证按分数游标分页"""
+
+    def __init__(self, members):
+        self.members = sorted(members, key=lambda x: (x[1], x[0]))
+        self.calls = 0
+
+    def zrangebyscore(self, name, min, max, start, num, withscores):
+        self.calls += 1
+        if isinstance(min, str) and min.startswith("("):
+            matched = [m for m in self.members if float(min[1:]) < m[1] <= max]
+        else:
+            matched = [m for m in self.members if min <= m[1] <= max]
+        return matched[start : start + num]
+
+
+def test_iter_metrics_by_score(mocker):
+    """
+    测试按分数游标分页时，分数相同的成员跨页不会重复或遗漏
+    """
+    mocker.patch("metadata.models.custom_report.time_series.settings.MAX_METRICS_FETCH_STEP", 3)
+    members = [(f"metric{i}".encode(), 100 + i // 4) for i in range(10)] + [(b"old_metric", 90)]
+    client = FakeZSetClient(members)
+
+    batches = list(models.TimeSeriesGroup._iter_metrics_by_score(client, "key", "(95", 200, withscores=False))
+
+    result = [member for batch in batches for member in batch]
+    assert sorted(result) == sorted(f"metric{i}".encode() for i in range(10))
+    assert len(result) == 10
+
+
+def test_synced_watermark_overlap(create_and_delete_records, mocker):
+    """
+    测试同步后的水位较当前时间回退，延迟写入的指标在下次同步时仍能读取到
+    """
+    now_time = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    now_ts = now_time.timestamp()
+    mocker.patch("metadata.models.custom_report.time_series.tz_now", return_value=now_time)
+    mocker.patch.object(models.TimeSeriesGroup, "is_metric_from_bkdata", return_value=False)
+    fetch_by_watermark = mocker.patch.object(
+        models.TimeSeriesGroup, "get_metrics_from_redis_by_watermark", return_value=([], [])
+    )
+
+    group = models.TimeSeriesGroup.objects.get(time_series_group_id=DEFAULT_GROUP_ID)
+    group.update_time_series_metrics(white_list=set(), exist_metrics={}, watermark=now_ts - 60)
+
+    assert fetch_by_watermark.call_args[0][:2] == (now_ts - 60, now_ts)
+    assert group.synced_watermark == now_ts - config.METADATA_TS_METRIC_WATERMARK_OVERLAP_SECONDS
+
+
+def test_fetch_failure_keeps_watermark(create_and_delete_records, mocker):
+    """
+    测试按水位同步时读取 redis 失败，不推进分组水位
+    """
+    client = mocker.MagicMock()
+    client.zrangebyscore.side_effect = ConnectionError("redis unavailable")
+    mocker.patch("metadata.models.custom_report.time_series.RedisClient.from_envs", return_value=client)
+    mocker.patch.object(models.TimeSeriesGroup, "is_metric_from_bkdata", return_value=False)
+    mocker.patch("metadata.task.tasks.RedisTools.get_list", return_value=[])
+    mocker.patch.object(models.TimeSeriesGroup, "get_metric_watermarks", return_value={})
+    set_metric_watermarks = mocker.patch.object(models.TimeSeriesGroup, "set_metric_watermarks")
+
+    group = models.TimeSeriesGroup.objects.get(time_series_group_id=DEFAULT_GROUP_ID)
+    with pytest.raises(ConnectionError):
+        group.update_time_series_metrics(white_list=set(), exist_metrics={})
+    assert group.synced_watermark is None
+
+    update_time_series_metrics([group])
+    set_metric_watermarks.assert_called_once_with({})
@@ -49,8 +49,11 @@ class RedisTools:
         """当数据变动时，发布数据"""
         logger.info("publish: channel->[%s],publish msg_list->[%s]", channel, msg_list)
         try:
+            # 使用 pipeline 批量发布，避免逐条消息往返
+            pipeline = cls().client.pipeline(transaction=False)
             for msg in msg_list:
-                cls().client.publish(channel, msg)
+                pipeline.publish(channel, msg)
+            pipeline.execute()
         except Exception as e:  # pylint: disable=broad-except
             logging.error("publish: publish msg into channel->[%s] for ->[%s], error->[%s]", channel, msg_list, e)
             raise Exception(f"publish msg error, {e}")
@@ -67,6 +70,16 @@ class RedisTools:
         logger.info("hmset_to_redis: key->[%s], field_value->[%s]", key, field_value)
         return cls().client.hmset(key, field_value)
 
+    @classmethod
+    def pipeline_hmset_to_redis(cls, key: str, field_value: dict[str, str], chunk_size: int = 500):
+        """通过 pipeline 分批推送表数据到 redis"""
+        logger.info("pipeline_hmset_to_redis: key->[%s], fields->[%s]", key, list(field_value.keys()))
+        items = list(field_value.items())
+        pipeline = cls().client.pipeline(transaction=False)
+        for index in range(0, len(items), chunk_size):
+            pipeline.hmset(key, dict(items[index : index + chunk_size]))
+        return pipeline.execute()
+
     @classmethod
     def sadd(cls, key: str, value: list) -> int | None:
         if not value:
@@ -8,19 +8,24 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import hashlib
+import json
 import logging
 import operator
 import re
 import time
 from collections import defaultdict
+from collections.abc import Iterable
 from datetime import datetime, timezone
 from functools import reduce
 from itertools import chain
+from types import SimpleNamespace
 
+from django.core.cache import cache
 from django.db.models import Q as DQ
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy as _lazy
-from elasticsearch_dsl import Q
+from elasticsearch_dsl import AttrDict, Q
 from elasticsearch_dsl.response.aggs import BucketData
 from luqum.tree import FieldGroup, OrOperation, Phrase, SearchField, Word
 
@@ -28,6 +33,7 @@ from bkmonitor.documents import ActionInstanceDocument, AlertDocument, AlertLog
 from bkmonitor.models import ActionInstance, ConvergeRelation, MetricListCache, Shield
 from bkmonitor.models.fta.action import ActionConfig
 from bkmonitor.strategy.new_strategy import get_metric_id
+from bkmonitor.utils.cache import lru_cache_with_ttl
 from bkmonitor.utils.ip import exploded_ip
 from bkmonitor.utils.request import get_request_tenant_id
 from bkmonitor.utils.time_tools import hms_string
@@ -61,7 +67,12 @@ from fta_web.alert.handlers.translator import (
     PluginTranslator,
     StrategyTranslator,
 )
-from fta_web.alert.utils import is_include_promql
+from fta_web.alert.utils import (
+    TopNCounter,
+    is_include_promql,
+    merge_aggregations,
+    slice_time_interval,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -152,11 +163,11 @@ def _query_alert_ids_from_es(action_names, include=False, exclude=False, **kwarg
     return list(set(alert_ids))
 
 
-def _query_alert_ids_from_db(
-    action_names, bk_biz_ids, start_time, end_time, page, page_size, include=False, exclude=False
-):
-    """内部方法：通过DB查询获取告警ID"""
-    # 构建查询条件
+@lru_cache_with_ttl(maxsize=1024, ttl=60)
+def get_action_config_ids(action_names: tuple, bk_biz_ids: tuple | None, include=False, exclude=False) -> list[int]:
+    """
+    按名称查询处理套餐ID，自动刷新的查询会重复查询相同的套餐，短时间内缓存
+    """
     if include:
         # 模糊查询多个名称
         name_conditions = DQ()
@@ -170,7 +181,30 @@ def _query_alert_ids_from_db(
     if include is False and exclude:
         filter_params_query = ~filter_params_query
 
-    action_config_ids = ActionConfig.objects.filter(filter_params_query).values_list("id", flat=True)
+    return list(ActionConfig.objects.filter(filter_params_query).values_list("id", flat=True))
+
+
+@lru_cache_with_ttl(maxsize=1024, ttl=60)
+def get_topo_node_ids(bk_tenant_id: str, bk_biz_ids: tuple, bk_obj_id: str, name: str) -> list[int]:
+    """
+    按名称查询模块/集群ID，短时间内缓存
+    :param bk_tenant_id: 租户ID，仅用于区分缓存
+    """
+    values = resource.commons.get_topo_list(
+        bk_biz_ids=list(bk_biz_ids),
+        bk_obj_id=bk_obj_id,
+        condition={f"bk_{bk_obj_id}_name": name},
+    )
+    return [value[f"bk_{bk_obj_id}_id"] for value in values]
+
+
+def _query_alert_ids_from_db(
+    action_names, bk_biz_ids, start_time, end_time, page, page_size, include=False, exclude=False
+):
+    """内部方法：通过DB查询获取告警ID"""
+    action_config_ids = get_action_config_ids(
+        tuple(action_names), tuple(bk_biz_ids) if bk_biz_ids is not None else None, include=include, exclude=exclude
+    )
 
     start_time = datetime.fromtimestamp(start_time, tz=timezone.utc)
     end_time = datetime.fromtimestamp(end_time, tz=timezone.utc)
@@ -423,18 +457,16 @@ class AlertQueryTransformer(BaseQueryTransformer):
         # 如果值不是数字，则将其作为模块名，并尝试查询对应的模块ID
         if not node.value.isdigit():
             if bk_biz_ids:
-                values = resource.commons.get_topo_list(
-                    bk_biz_ids=bk_biz_ids,
-                    bk_obj_id="module",
-                    condition={"bk_module_name": node.value},
+                values = get_topo_node_ids(
+                    get_request_tenant_id(peaceful=True), tuple(sorted(bk_biz_ids)), "module", node.value
                 )
             else:
                 values = []
 
             if len(values) == 1:
-                node.value = f"module|{values[0]['bk_module_id']}"
+                node.value = f"module|{values[0]}"
             elif len(values) > 1:
-                node = FieldGroup(OrOperation(*[Word(f"module|{value['bk_module_id']}") for value in values]))
+                node = FieldGroup(OrOperation(*[Word(f"module|{value}") for value in values]))
             else:
                 node.value = "module|''"
 
@@ -460,18 +492,16 @@ class AlertQueryTransformer(BaseQueryTransformer):
 
         if not node.value.isdigit():
             if bk_biz_ids:
-                values = resource.commons.get_topo_list(
-                    bk_biz_ids=bk_biz_ids,
-                    bk_obj_id="set",
-                    condition={"bk_set_name": node.value},
+                values = get_topo_node_ids(
+                    get_request_tenant_id(peaceful=True), tuple(sorted(set(bk_biz_ids))), "set", node.value
                 )
             else:
                 values = []
 
             if len(values) == 1:
-                node.value = f"set|{values[0]['bk_set_id']}"
+                node.value = f"set|{values[0]}"
             elif len(values) > 1:
-                node = FieldGroup(OrOperation(*[Word(f"set|{value['bk_set_id']}") for value in values]))
+                node = FieldGroup(OrOperation(*[Word(f"set|{value}") for value in values]))
             else:
                 node.value = "set|''"
 
@@ -558,6 +588,13 @@ class AlertQueryHandler(BaseBizQueryHandler):
     SHIELD_ABNORMAL_STATUS_NAME = "SHIELDED_ABNORMAL"
     NOT_SHIELD_ABNORMAL_STATUS_NAME = "NOT_SHIELDED_ABNORMAL"
 
+    # 总览及高级筛选聚合结果的缓存时间(秒)，相同查询条件翻页及刷新列表时复用
+    AGGS_CACHE_TIMEOUT = 60
+    # 已结束时间桶的聚合结果缓存时间(秒)
+    AGGS_BUCKET_CACHE_TIMEOUT = 60 * 60
+    # 时间范围不小于该长度时，按告警结束时间切分时间桶增量聚合
+    AGGS_BUCKET_MIN_RANGE = 24 * 60 * 60
+
     def __init__(
         self,
         bk_biz_ids: list[int] = None,
@@ -607,17 +644,9 @@ class AlertQueryHandler(BaseBizQueryHandler):
 
         if start_time and end_time:
             if is_time_partitioned:
-                if is_finaly_partition:
-                    search_object = search_object.filter(
-                        (Q("range", end_time={"gte": start_time}) | ~Q("exists", field="end_time"))
-                        & (Q("range", begin_time={"lte": end_time}) | Q("range", create_time={"lte": end_time}))
-                    )
-                else:
-                    # ES 的时间切片应该使用 [start, end)
-                    search_object = search_object.filter(
-                        (Q("range", end_time={"gte": start_time, "lt": end_time}) | ~Q("exists", field="end_time"))
-                        & (Q("range", begin_time={"lt": end_time}) | Q("range", create_time={"lt": end_time}))
-                    )
+                search_object = search_object.filter(
+                    self.get_partition_query(start_time, end_time, is_finaly_partition)
+                )
             else:
                 search_object = search_object.filter(
                     (Q("range", end_time={"gte": start_time}) | ~Q("exists", field="end_time"))
@@ -658,6 +687,20 @@ class AlertQueryHandler(BaseBizQueryHandler):
 
         return search_object
 
+    @staticmethod
+    def get_partition_query(start_time: int, end_time: int, is_finaly_partition: bool = False) -> Q:
+        """
+        时间分片的查询条件，按告警结束时间划分，未结束的告警只归入最后一个分片，保证各分片互不重叠
+        """
+        if is_finaly_partition:
+            return (Q("range", end_time={"gte": start_time}) | ~Q("exists", field="end_time")) & (
+                Q("range", begin_time={"lte": end_time}) | Q("range", create_time={"lte": end_time})
+            )
+        # ES 的时间切片应该使用 [start, end)
+        return Q("range", end_time={"gte": start_time, "lt": end_time}) & (
+            Q("range", begin_time={"lt": end_time}) | Q("range", create_time={"lt": end_time})
+        )
+
     def search_raw(self, show_overview=False, show_aggs=False, show_dsl=False):
         search_object = self.get_search_object()
         search_object = self.add_conditions(search_object)
@@ -665,14 +708,15 @@ class AlertQueryHandler(BaseBizQueryHandler):
         search_object = self.add_ordering(search_object)
         search_object = self.add_pagination(search_object)
 
-        if show_overview:
-            search_object = self.add_overview(search_object)
-
-        if show_aggs:
-            search_object = self.add_aggs(search_object)
+        aggs_context = None
+        if show_overview or show_aggs:
+            search_object, aggs_context = self.add_cached_aggs(search_object, show_overview, show_aggs)
 
         search_result = search_object.params(track_total_hits=True).execute()
 
+        if aggs_context:
+            self.fill_cached_aggs(search_result, aggs_context)
+
         if show_dsl:
             return search_result, search_object.to_dict()
 
@@ -717,6 +761,116 @@ class AlertQueryHandler(BaseBizQueryHandler):
 
         return result
 
+    def get_aggs_fingerprint(self, show_overview=False, show_aggs=False) -> str:
+        """
+        聚合查询指纹，包含除时间范围、分页及排序以外的查询条件
+        """
+        query = {
+            "bk_biz_ids": self.bk_biz_ids,
+            "authorized_bizs": sorted(self.authorized_bizs) if self.authorized_bizs else self.authorized_bizs,
+            "unauthorized_bizs": sorted(self.unauthorized_bizs) if self.unauthorized_bizs else self.unauthorized_bizs,
+            "username": self.username,
+            "request_username": self.request_username,
+            "status": self.status,
+            "conditions": self.conditions,
+            "query_string": self.query_string,
+            "must_exists_fields": self.must_exists_fields,
+            "show_overview": show_overview,
+            "show_aggs": show_aggs,
+        }
+        return hashlib.md5(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_aggs_time_buckets(self, now: int = None) -> tuple[int, list[int]]:
+        """
+        按告警结束时间切分已结束的时间桶，返回桶大小及各桶的开始时间
+        结束时间早于当前时间一个桶长度以上的时间桶视为已结束，其中告警的统计结果不随查询时间范围变化
+        """
+        if not (self.start_time and self.end_time) or self.end_time - self.start_time < self.AGGS_BUCKET_MIN_RANGE:
+            return 0, []
+
+        # 两天以内按小时切分，否则按天切分
+        bucket_size = 60 * 60 if self.end_time - self.start_time <= 2 * 24 * 60 * 60 else 24 * 60 * 60
+        now = int(time.time()) if now is None else now
+        first_bucket = -(-self.start_time // bucket_size) * bucket_size
+        closed_end = min(self.end_time, now - bucket_size) // bucket_size * bucket_size
+        return bucket_size, list(range(first_bucket, closed_end, bucket_size))
+
+    def add_cached_aggs(self, search_object, show_overview=False, show_aggs=False):
+        """
+        添加总览及高级筛选聚合，优先复用缓存
+        1. 相同查询条件及时间范围的聚合结果短时间缓存，翻页及刷新列表时不再重复聚合
+        2. 长时间范围按告警结束时间切分时间桶，已结束时间桶的聚合结果单独缓存，只需聚合未结束的部分
+        """
+        fingerprint = self.get_aggs_fingerprint(show_overview, show_aggs)
+        context = {
+            "cache_key": f"alert_aggs_{fingerprint}_{self.start_time}_{self.end_time}",
+            "aggregations": None,
+            "bucket_keys": {},
+            "buckets": {},
+        }
+        if self.AGGS_CACHE_TIMEOUT:
+            context["aggregations"] = cache.get(context["cache_key"])
+        if context["aggregations"] is not None:
+            return search_object, context
+
+        bucket_size, bucket_starts = self.get_aggs_time_buckets()
+        if bucket_starts:
+            bucket_keys = {start: f"alert_aggs_bucket_{fingerprint}_{bucket_size}_{start}" for start in bucket_starts}
+            cached_buckets = cache.get_many(list(bucket_keys.values()))
+            context["bucket_keys"] = bucket_keys
+            context["buckets"] = {
+                start: cached_buckets[key] for start, key in bucket_keys.items() if key in cached_buckets
+            }
+
+            # 未结束部分：首个整点桶之前、最后一个已结束桶之后及未结束的告警
+            filters = {
+                "live": Q("range", end_time={"lt": bucket_starts[0]})
+                | Q("range", end_time={"gte": bucket_starts[-1] + bucket_size})
+                | ~Q("exists", field="end_time")
+            }
+            for start in bucket_starts:
+                if start not in context["buckets"]:
+                    filters[str(start)] = Q("range", end_time={"gte": start, "lt": start + bucket_size})
+            aggs_target = SimpleNamespace(aggs=search_object.aggs.bucket("time_buckets", "filters", filters=filters))
+        else:
+            aggs_target = search_object
+
+        if show_overview:
+            self.add_overview(aggs_target)
+
+        if show_aggs:
+            self.add_aggs(aggs_target)
+
+        return search_object, context
+
+    def fill_cached_aggs(self, search_result, context: dict):
+        """
+        合并各时间桶的聚合结果并写入缓存，替换查询结果中的聚合数据
+        """
+        aggregations = context["aggregations"]
+        if aggregations is None:
+            raw_aggregations = search_result.to_dict().get("aggregations", {})
+            if context["bucket_keys"]:
+                time_buckets = raw_aggregations.get("time_buckets", {}).get("buckets", {})
+                aggregations = {}
+                new_buckets = {}
+                for start, key in context["bucket_keys"].items():
+                    if start in context["buckets"]:
+                        bucket = context["buckets"][start]
+                    else:
+                        bucket = new_buckets[key] = time_buckets.get(str(start), {})
+                    merge_aggregations(aggregations, bucket)
+                merge_aggregations(aggregations, time_buckets.get("live", {}))
+                cache.set_many(new_buckets, timeout=self.AGGS_BUCKET_CACHE_TIMEOUT)
+            else:
+                aggregations = raw_aggregations
+
+            if self.AGGS_CACHE_TIMEOUT:
+                cache.set(context["cache_key"], aggregations, timeout=self.AGGS_CACHE_TIMEOUT)
+
+        # 与 elasticsearch_dsl 一致，聚合结果不写入原始数据
+        super(AttrDict, search_result).__setattr__("_aggs", AttrDict(aggregations))
+
     def _get_buckets(
         self,
         result: dict[tuple[tuple[str, any]], any],
@@ -1220,6 +1374,14 @@ class AlertQueryHandler(BaseBizQueryHandler):
         cleaned_docs = (self.clean_document(doc, exclude=["extra_info"]) for doc in raw_docs)
         return raw_docs, list(self.translate_field_names(cleaned_docs))
 
+    def export_with_docs_iter(self) -> Iterable[tuple[list[AlertDocument], list[dict]]]:
+        """流式导出告警数据，按块返回原始文档及导出数据。"""
+        hits = self.scan_slices(source_fields=self.get_export_fields())
+        for chunk in self.iter_chunks(hits):
+            raw_docs = [AlertDocument(**hit.to_dict()) for hit in chunk]
+            cleaned_docs = (self.clean_document(doc, exclude=["extra_info"]) for doc in raw_docs)
+            yield raw_docs, list(self.translate_field_names(cleaned_docs))
+
     def get_export_fields(self):
         """
         获取导出时需要查询的字段列表
@@ -1361,7 +1523,10 @@ class AlertQueryHandler(BaseBizQueryHandler):
             event[field] = alert.get(field)
         return event
 
-    def top_n(self, fields: list, size=10, translators: dict = None, char_add_quotes=True):
+    def top_n(self, fields: list, size=10, translators: dict = None, char_add_quotes=True, partitioned=False):
+        """
+        :param partitioned: 是否按时间分片统计，大时间范围下避免单次聚合过重
+        """
         translators = {
             "metric": MetricTranslator(name_format="{name} ({id})", bk_biz_ids=self.bk_biz_ids),
             "bk_biz_id": BizTranslator(),
@@ -1370,7 +1535,10 @@ class AlertQueryHandler(BaseBizQueryHandler):
             "plugin_id": PluginTranslator(),
         }
 
-        result = super().top_n(fields, size, translators, char_add_quotes)
+        if partitioned:
+            result = self.partitioned_top_n(fields, size, translators, char_add_quotes)
+        else:
+            result = super().top_n(fields, size, translators, char_add_quotes)
 
         # 对metric字段进行特殊处理
         # metric对应的id可能是promql语句，需要进行转义
@@ -1392,6 +1560,174 @@ class AlertQueryHandler(BaseBizQueryHandler):
 
         return result
 
+    @staticmethod
+    def get_top_n_agg(aggs, field: str):
+        """
+        获取字段的 TOP N 聚合结果
+        """
+        agg = getattr(aggs, field)
+        if field.strip("-+").startswith("tags."):
+            agg = agg.key.value
+        return agg
+
+    def get_top_n_bucket_count(self, aggs, field: str, keys: list) -> int | None:
+        """
+        获取字段的桶总数
+        :param keys: 统计到的字段值
+        """
+        if not self.bucket_count_suffix:
+            return None
+
+        actual_field = field.strip("-+")
+        if actual_field == "duration":
+            return len(self.DurationOption.AGG)
+        if actual_field == "bk_biz_id" and hasattr(self, "authorized_bizs"):
+            return len(set(self.authorized_bizs or []) | {int(key) for key in keys})
+        if not aggs:
+            return None
+
+        bucket_count = self.get_top_n_agg(aggs, f"{field}{self.bucket_count_suffix}").value
+        if not actual_field.startswith("tags.") and "" in keys:
+            bucket_count -= 1
+        return bucket_count
+
+    def partitioned_top_n(
+        self, fields: list, size=10, translators: dict = None, char_add_quotes=True, partitions: list = None
+    ) -> dict:
+        """
+        按时间分片统计字段值 TOP N
+        1. 一次请求统计各分片的文档数及各字段的桶总数
+        2. 按文档数从大到小逐个查询分片，每个分片一次请求完成所有字段的聚合，按误差上界合并结果
+        3. 所有字段的 TOP N 成员确定后不再逐个查询剩余分片，改为一次请求统计 TOP N 成员在剩余分片中的计数
+        :param partitions: 时间分片 [(start_time, end_time)]，默认按时间跨度自动切分
+        """
+        translators = translators or {}
+        # 最多不能超过10000个桶
+        size = min(size, 10000)
+        partitions = partitions or slice_time_interval(self.start_time, self.end_time)
+        partition_queries = [
+            self.get_partition_query(start_time, end_time, index == len(partitions) - 1)
+            for index, (start_time, end_time) in enumerate(partitions)
+        ]
+
+        search_object = self.get_search_object()
+        search_object = self.add_conditions(search_object)
+        search_object = self.add_query_string(search_object)
+        search_object = search_object.extra(size=0)
+
+        plan_search_object = search_object.params(track_total_hits=True)
+        plan_search_object.aggs.bucket(
+            "partitions", "filters", filters={str(index): query for index, query in enumerate(partition_queries)}
+        )
+        if self.bucket_count_suffix:
+            for field in fields:
+                if field.strip("-+") not in ["duration", "bk_biz_id"]:
+                    self.add_cardinality_bucket(plan_search_object.aggs, field, self.bucket_count_suffix)
+        plan_result = plan_search_object.execute()
+
+        partition_doc_counts = {}
+        if plan_result.aggs:
+            for index, bucket in plan_result.aggs.partitions.buckets.to_dict().items():
+                if bucket["doc_count"]:
+                    partition_doc_counts[int(index)] = bucket["doc_count"]
+
+        bucket_counts = {}
+        if plan_result.aggs and self.bucket_count_suffix:
+            for field in fields:
+                if field.strip("-+") not in ["duration", "bk_biz_id"]:
+                    bucket_counts[field] = self.get_top_n_agg(
+                        plan_result.aggs, f"{field}{self.bucket_count_suffix}"
+                    ).value
+
+        counters = {field: TopNCounter(size, reverse=not field.startswith("+")) for field in fields}
+        # 范围聚合的桶固定，剩余分片的计数可以一次统计
+        stable_fields = {field for field in fields if field.strip("-+") == "duration"}
+        remaining = sum(partition_doc_counts.values())
+        pending = sorted(partition_doc_counts, key=lambda index: partition_doc_counts[index], reverse=True)
+        # 与 ES 分片的 shard_size 一致，每个分片多取部分桶以降低合并误差
+        partition_size = min(int(size * 1.5 + 10), 10000)
+
+        while pending:
+            index = pending.pop(0)
+            remaining -= partition_doc_counts[index]
+            partition_search_object = search_object.filter(partition_queries[index])
+            for field in fields:
+                self.add_agg_bucket(partition_search_object.aggs, field, size=partition_size)
+            partition_result = partition_search_object.execute()
+
+            for field in fields:
+                if not partition_result.aggs:
+                    continue
+                agg = self.get_top_n_agg(partition_result.aggs, field)
+                counters[field].add(
+                    [(bucket.key, bucket.doc_count) for bucket in agg.buckets],
+                    sum_other_doc_count=getattr(agg, "sum_other_doc_count", 0),
+                    doc_count_error=getattr(agg, "doc_count_error_upper_bound", 0),
+                )
+
+            if pending and all(
+                field in stable_fields or counters[field].is_stable(remaining, bucket_counts.get(field))
+                for field in fields
+            ):
+                break
+
+        if pending:
+            # TOP N 成员已确定，剩余分片只需统计这些成员的计数
+            rest_search_object = search_object.filter(
+                reduce(operator.or_, [partition_queries[index] for index in pending])
+            )
+            rest_fields = []
+            for field in fields:
+                if field in stable_fields:
+                    self.add_agg_bucket(rest_search_object.aggs, field, size=size)
+                    rest_fields.append(field)
+                    continue
+                keys = [key for key, _ in counters[field].top()]
+                if keys:
+                    self.add_agg_bucket(rest_search_object.aggs, field, size=len(keys), include=keys)
+                    rest_fields.append(field)
+            rest_result = rest_search_object.execute()
+
+            for field in rest_fields:
+                if rest_result.aggs:
+                    agg = self.get_top_n_agg(rest_result.aggs, field)
+                    counters[field].add([(bucket.key, bucket.doc_count) for bucket in agg.buckets])
+
+        result = {"doc_count": plan_result.hits.total.value, "fields": []}
+        for field in fields:
+            actual_field = field.strip("-+")
+            counter = counters[field]
+            keys = list(counter.counts)
+
+            if actual_field == "duration":
+                buckets = [
+                    {
+                        "id": self.DurationOption.QUERYSTRING[key],
+                        "name": self.DurationOption.DISPLAY[key],
+                        "count": count,
+                    }
+                    for key, count in counter.top()
+                ]
+            else:
+                buckets = [{"id": key, "name": key, "count": count} for key, count in counter.top() if key != ""]
+
+            if actual_field == "bk_biz_id" and hasattr(self, "authorized_bizs"):
+                exist_bizs = {int(bucket["id"]) for bucket in buckets}
+                for bk_biz_id in self.authorized_bizs or []:
+                    # 数量为0的业务，查不出来，但也需要填充
+                    if len(buckets) >= size:
+                        break
+                    if int(bk_biz_id) not in exist_bizs:
+                        buckets.append({"id": bk_biz_id, "name": bk_biz_id, "count": 0})
+
+            bucket_count = self.get_top_n_bucket_count(plan_result.aggs, field, keys)
+            # 基数聚合为近似值，桶数量较少时以实际统计到的数量为准
+            if bucket_count is not None and bucket_count <= size:
+                bucket_count = max(len([key for key in keys if key != ""]), len(buckets))
+
+            result["fields"].append(self.format_top_n_field(field, buckets, bucket_count, translators, char_add_quotes))
+        return result
+
     def list_tags(self):
         """
         获取告警标签列表
@@ -8,10 +8,15 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import heapq
+import queue
+import threading
 import time
 from abc import ABC
 from collections.abc import Callable, Iterable
 
+from django.core.cache import cache
+from django.utils import translation
 from django.utils.translation import gettext as _
 from elasticsearch_dsl import AttrDict, Q, Search
 from elasticsearch_dsl.aggs import Bucket
@@ -22,9 +27,11 @@ from luqum.exceptions import ParseError
 from luqum.parser import lexer, parser
 from luqum.tree import AndOperation, FieldGroup, SearchField, Word
 
+from bkmonitor.utils.common_utils import count_md5
 from bkmonitor.utils.elasticsearch.handler import BaseTreeTransformer
 from bkmonitor.utils.ip import exploded_ip
-from bkmonitor.utils.request import get_request, get_request_username
+from bkmonitor.utils.request import get_request, get_request_tenant_id, get_request_username
+from bkmonitor.utils.thread_backend import InheritParentThread
 from constants.alert import EventTargetType
 from core.drf_resource import resource
 from core.errors.alert import QueryStringParseError
@@ -94,6 +101,11 @@ class BaseQueryTransformer(BaseTreeTransformer):
     # ES 文档类
     doc_cls = None
 
+    # 查询语句编译结果的缓存时间(秒)，自动刷新的仪表盘及列表重复查询时复用
+    QUERY_CACHE_TIMEOUT = 60
+    # 缓存 key 中的查询时间按该粒度(秒)对齐
+    QUERY_CACHE_TIME_BUCKET = 60
+
     def visit_search_field(self, node, context):
         if context.get("ignore_search_field"):
             yield from self.generic_visit(node, context)
@@ -134,8 +146,45 @@ class BaseQueryTransformer(BaseTreeTransformer):
             else:
                 yield from self.generic_visit(node, context)
 
+    @classmethod
+    def get_query_cache_key(cls, query_string: str, context: dict) -> str:
+        """
+        查询语句编译结果的缓存 key，翻译过程依赖业务、查询时间、租户及语言
+        """
+        key_context = dict(context)
+        for field in ["start_time", "end_time"]:
+            if key_context.get(field):
+                key_context[field] = int(key_context[field]) // cls.QUERY_CACHE_TIME_BUCKET
+
+        fingerprint = count_md5(
+            {
+                "query_string": query_string,
+                "context": key_context,
+                "bk_tenant_id": get_request_tenant_id(peaceful=True),
+                "language": translation.get_language(),
+            }
+        )
+        return f"{cls.__name__}_query_string_{fingerprint}"
+
     @classmethod
     def transform_query_string(cls, query_string: str, context=None):
+        """
+        将 query_string 转换为 ES 查询，编译结果按查询条件短暂缓存
+        """
+        if not query_string:
+            return ""
+
+        context = context or {}
+        cache_key = cls.get_query_cache_key(query_string, context)
+        query_dsl = cache.get(cache_key)
+        if query_dsl is None:
+            # 翻译过程会修改上下文，使用副本避免影响调用方的后续查询
+            query_dsl = cls.compile_query_string(query_string, dict(context))
+            cache.set(cache_key, query_dsl, timeout=cls.QUERY_CACHE_TIMEOUT)
+        return query_dsl
+
+    @classmethod
+    def compile_query_string(cls, query_string: str, context=None):
         def parse_query_string_node(_transform_obj, _query_string, _context):
             try:
                 query_node = parser.parse(_query_string, lexer=lexer.clone())
@@ -179,10 +228,38 @@ class BaseQueryTransformer(BaseTreeTransformer):
         return field
 
 
+class SortValues:
+    """
+    ES 排序值，用于多个有序结果的归并，支持升降序混合，缺失值排在最后
+    """
+
+    __slots__ = ("values", "reverses")
+
+    def __init__(self, values: list, reverses: list[bool]):
+        self.values = values
+        self.reverses = reverses
+
+    def __lt__(self, other: "SortValues") -> bool:
+        for value, other_value, reverse in zip(self.values, other.values, self.reverses):
+            if value == other_value:
+                continue
+            if value is None:
+                return False
+            if other_value is None:
+                return True
+            return value > other_value if reverse else value < other_value
+        return False
+
+
 class BaseQueryHandler:
     # query_string 语法树自定义解析类
     query_transformer = None
 
+    # 导出时并行滚动的切片数
+    EXPORT_SCAN_SLICES = 4
+    # 导出时每个切片缓存的文档数及分块处理的文档数
+    EXPORT_CHUNK_SIZE = 1000
+
     class DurationOption:
         # 关于时间差的选项
         FILTER = {
@@ -234,12 +311,7 @@ class BaseQueryHandler:
         self.conditions = self.query_transformer.transform_condition_fields(conditions)
         self.bucket_count_suffix = ".bucket_count" if need_bucket_count else ""
 
-    def scan(self, source_fields=None):
-        """
-        扫描全量符合条件的文档
-
-        :param source_fields: 可选，指定需要返回的字段。如果为None，返回所有字段。
-        """
+    def get_scan_search_object(self, source_fields=None) -> Search:
         search_object = self.get_search_object()
         search_object = self.add_conditions(search_object)
         search_object = self.add_query_string(search_object)
@@ -247,9 +319,114 @@ class BaseQueryHandler:
 
         if source_fields:
             search_object = search_object.source(source_fields)
+        return search_object
 
+    def scan(self, source_fields=None):
+        """
+        扫描全量符合条件的文档
+
+        :param source_fields: 可选，指定需要返回的字段。如果为None，返回所有字段。
+        """
+        search_object = self.get_scan_search_object(source_fields)
         yield from search_object.params(preserve_order=True).scan()
 
+    @staticmethod
+    def get_sort_reverses(search_object: Search) -> list[bool]:
+        """
+        获取查询中各排序字段是否为降序
+        """
+        reverses = []
+        for sort in search_object.to_dict().get("sort", []):
+            if isinstance(sort, str):
+                reverses.append(sort == "_score" or sort.startswith("-"))
+                continue
+            order = list(sort.values())[0]
+            if isinstance(order, dict):
+                order = order.get("order", "asc")
+            reverses.append(order == "desc")
+        return reverses
+
+    def scan_slices(self, source_fields=None, slices: int = None):
+        """
+        并行切片滚动扫描全量符合条件的文档，输出顺序与 scan 一致
+        各切片在独立线程中滚动(scroll 上下文即切片的时间点快照)，主线程按排序值归并
+        每个切片最多缓存 EXPORT_CHUNK_SIZE 条文档，内存占用与文档总数无关
+
+        :param source_fields: 可选，指定需要返回的字段。如果为None，返回所有字段。
+        :param slices: 切片数，默认为 EXPORT_SCAN_SLICES
+        """
+        slices = self.EXPORT_SCAN_SLICES if slices is None else slices
+        if slices <= 1:
+            yield from self.scan(source_fields)
+            return
+
+        search_object = self.get_scan_search_object(source_fields)
+        reverses = self.get_sort_reverses(search_object)
+        # 无排序时按 _doc 滚动效率最高
+        params = {"preserve_order": bool(reverses), "size": self.EXPORT_CHUNK_SIZE}
+
+        buffers = [queue.Queue(maxsize=self.EXPORT_CHUNK_SIZE) for _ in range(slices)]
+        stopped = threading.Event()
+        scan_end = object()
+
+        def put(buffer: queue.Queue, item):
+            # 消费方提前退出时不再阻塞
+            while not stopped.is_set():
+                try:
+                    buffer.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce(slice_id: int):
+            slice_search = search_object.extra(slice={"id": slice_id, "max": slices}).params(**params)
+            try:
+                for hit in slice_search.scan():
+                    if not put(buffers[slice_id], hit):
+                        return
+            except Exception as e:
+                put(buffers[slice_id], e)
+            put(buffers[slice_id], scan_end)
+
+        def consume(slice_id: int):
+            while True:
+                item = buffers[slice_id].get()
+                if item is scan_end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+        threads = [InheritParentThread(target=produce, args=(slice_id,)) for slice_id in range(slices)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            yield from heapq.merge(
+                *[consume(slice_id) for slice_id in range(slices)],
+                key=lambda hit: SortValues(list(getattr(hit.meta, "sort", [])), reverses),
+            )
+        finally:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+
+    @classmethod
+    def iter_chunks(cls, items: Iterable, chunk_size: int = None) -> Iterable[list]:
+        """
+        按块切分迭代器
+        """
+        chunk_size = chunk_size or cls.EXPORT_CHUNK_SIZE
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     def export(self) -> list[dict]:
         """
         将数据导出，用于生成 csv 文件
@@ -258,6 +435,13 @@ class BaseQueryHandler:
         cleaned_docs = (self.handle_hit(hit) for hit in self.scan())
         return list(self.translate_field_names(cleaned_docs))
 
+    def export_iter(self) -> Iterable[dict]:
+        """
+        流式导出数据，切片并行扫描，逐条清洗及转换字段名
+        """
+        cleaned_docs = (self.handle_hit(hit) for hit in self.scan_slices())
+        return self.translate_field_names(cleaned_docs)
+
     def translate_field_names(self, docs: Iterable[dict]) -> Iterable[dict]:
         """将字段名转换为显示名。"""
         # 预先翻译
@@ -453,9 +637,10 @@ class BaseQueryHandler:
         result = {"hits": {"total": {"value": 0, "relation": "eq"}, "max_score": 1.0, "hits": []}}
         return Response(Search(), result)
 
-    def add_agg_bucket(self, search_object: Bucket, field: str, size: int = 10):
+    def add_agg_bucket(self, search_object: Bucket, field: str, size: int = 10, include: list = None):
         """
         按字段添加聚合桶
+        :param include: 仅统计指定的字段值
         """
         # 处理桶排序
         if field.startswith("-"):
@@ -469,6 +654,13 @@ class BaseQueryHandler:
             order = {"_count": "desc"}
             actual_field = field
 
+        terms_params = {}
+        if include is not None:
+            # ES 中布尔字段的词项为小写的 true/false
+            terms_params["include"] = [
+                str(value).lower() if isinstance(value, bool) else str(value) for value in include
+            ]
+
         if actual_field.startswith("tags."):
             # tags 标签需要做嵌套查询
             tag_key = actual_field[len("tags.") :]
@@ -483,6 +675,7 @@ class BaseQueryHandler:
                     field="event.tags.value.raw",
                     size=size,
                     order=order,
+                    **terms_params,
                 )
             )
 
@@ -503,6 +696,7 @@ class BaseQueryHandler:
                     field=agg_field,
                     order=order,
                     size=size,
+                    **terms_params,
                 )
 
         return new_search_object
@@ -637,24 +831,38 @@ class BaseQueryHandler:
                     else:
                         buckets.append({"id": bucket.key, "name": bucket.key, "count": bucket.doc_count})
 
-            if actual_field in translators:
-                translators[actual_field].translate_from_dict(buckets, "id", "name")
+            result["fields"].append(self.format_top_n_field(field, buckets, bucket_count, translators, char_add_quotes))
+        return result
 
-            # 对于字符字段，需要将桶的 key 加上双引号
-            if char_add_quotes:
-                for bucket in buckets:
-                    if actual_field in char_fields or actual_field.startswith("tags."):
-                        bucket["id"] = '"{}"'.format(bucket["id"])
+    def format_top_n_field(
+        self,
+        field: str,
+        buckets: list[dict],
+        bucket_count: int | None,
+        translators: dict[str, AbstractTranslator],
+        char_add_quotes=True,
+    ) -> dict:
+        """
+        翻译 TOP N 统计的桶名称，并组装字段的统计结果
+        """
+        actual_field = field.strip("-+")
+        char_fields = [field_info.field for field_info in self.query_transformer.query_fields if field_info.is_char]
+        is_char = actual_field in char_fields or actual_field.startswith("tags.")
 
-            result["fields"].append(
-                {
-                    "field": field,
-                    "is_char": actual_field in char_fields or actual_field.startswith("tags."),
-                    "bucket_count": bucket_count,
-                    "buckets": buckets,
-                }
-            )
-        return result
+        if actual_field in translators:
+            translators[actual_field].translate_from_dict(buckets, "id", "name")
+
+        # 对于字符字段，需要将桶的 key 加上双引号
+        if char_add_quotes and is_char:
+            for bucket in buckets:
+                bucket["id"] = '"{}"'.format(bucket["id"])
+
+        return {
+            "field": field,
+            "is_char": is_char,
+            "bucket_count": bucket_count,
+            "buckets": buckets,
+        }
 
 
 class BaseBizQueryHandler(BaseQueryHandler, ABC):
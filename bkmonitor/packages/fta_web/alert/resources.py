@@ -124,6 +124,7 @@ from monitor_web.aiops.metric_recommend.constant import (
     METRIC_RECOMMAND_SCENE_SERVICE_TEMPLATE,
 )
 from monitor_web.constants import AlgorithmType
+from monitor_web.export_import.resources import ExportPackageResource
 from monitor_web.models import CustomEventGroup
 
 logger = logging.getLogger("root")
@@ -1690,17 +1691,24 @@ class ExportAlertResource(Resource):
         ordering = serializers.ListField(label="排序", child=serializers.CharField(), default=[])
         bk_biz_id = serializers.IntegerField(label="业务ID", required=True)
 
-    def perform_request(self, validated_request_data):
-        handler = AlertQueryHandler(**validated_request_data)
-        alert_docs, alerts = handler.export_with_docs()
-
-        related_infos = resource.alert.alert_related_info(alerts=alert_docs)
+    @staticmethod
+    def iter_alerts(handler: AlertQueryHandler):
+        """
+        分块查询告警关联信息，逐条返回导出数据
+        """
         id_key = AlertFieldDisplay.ID
-        for alert in alerts:
-            # 更新关联信息
-            alert.update({AlertFieldDisplay.RELATED_INFO: related_infos.get(alert[id_key], {})})
+        for alert_docs, alerts in handler.export_with_docs_iter():
+            related_infos = resource.alert.alert_related_info(alerts=alert_docs)
+            for alert in alerts:
+                # 更新关联信息
+                alert.update({AlertFieldDisplay.RELATED_INFO: related_infos.get(alert[id_key], {})})
+                yield alert
 
-        return resource.export_import.export_package(list_data=alerts, bk_biz_id=validated_request_data["bk_biz_id"])
+    def perform_request(self, validated_request_data):
+        handler = AlertQueryHandler(**validated_request_data)
+        return ExportPackageResource().export_list_data(
+            self.iter_alerts(handler), bk_biz_id=validated_request_data["bk_biz_id"]
+        )
 
 
 class SearchEventResource(ApiAuthResource):
@@ -1948,8 +1956,8 @@ class ExportActionResource(Resource):
 
     def perform_request(self, validated_request_data):
         handler = ActionQueryHandler(**validated_request_data)
-        return resource.export_import.export_package(
-            list_data=handler.export(),
+        return ExportPackageResource().export_list_data(
+            handler.export_iter(),
             bk_biz_id=validated_request_data["bk_biz_id"],
         )
 
@@ -2094,131 +2102,11 @@ class AlertTopNResource(Resource):
         if not need_time_partition:
             return resource.alert.alert_top_n_result(**validated_request_data)
 
-        executor = ThreadPool(processes=1)
-        future = executor.apply_async(self.get_bucket_count, [validated_request_data])
-
-        start_time = validated_request_data.pop("start_time")
-        end_time = validated_request_data.pop("end_time")
-        slice_times = slice_time_interval(start_time, end_time)
-        size = validated_request_data.get("size", 10)
-
-        results = resource.alert.alert_top_n_result.bulk_request(
-            [
-                {
-                    "start_time": sliced_start_time,
-                    "end_time": sliced_end_time,
-                    "is_finaly_partition": True if index == len(slice_times) - 1 else False,
-                    "is_time_partitioned": True,
-                    "need_bucket_count": False,  # 不在分片查询中进行基数聚合
-                    **validated_request_data,
-                }
-                for index, (sliced_start_time, sliced_end_time) in enumerate(slice_times)
-            ]
-        )
-
-        result = {
-            "doc_count": 0,
-            "fields": [],
-        }
-        field_buckets_map = {}
-
-        for sliced_result in results:
-            result["doc_count"] += sliced_result["doc_count"]
-
-            for field_info in sliced_result["fields"]:
-                field = field_info["field"]
-                if field not in field_buckets_map:
-                    field_buckets_map[field] = {
-                        "id_buckets_map": {},
-                        "field": field,
-                        "is_char": field_info["is_char"],
-                    }
-
-                id_buckets_map = field_buckets_map[field]["id_buckets_map"]
-
-                for bucket in field_info["buckets"]:
-                    _id = bucket["id"]
-                    name = bucket["name"]
-                    if (_id, name) not in id_buckets_map:
-                        id_buckets_map[(_id, name)] = {
-                            "id": _id,
-                            "name": name,
-                            "count": bucket["count"],
-                        }
-                    else:
-                        id_buckets_map[(_id, name)]["count"] += bucket["count"]
-
-        for filed_info in field_buckets_map.values():
-            field = {
-                "field": filed_info["field"],
-                "is_char": filed_info["is_char"],
-                "bucket_count": 0,
-                "buckets": list(filed_info["id_buckets_map"].values()),
-            }
-            result["fields"].append(field)
-
-        # 补充bucket_count值，以及限制buckets长度与size一致
-        field_bucket_count_map = future.get()
-        executor.close()
-        # 对每个字段的桶按count降序排序，并截取前size个
-        for field_data in result["fields"]:
-            field = field_data["field"]
-            if field == "bk_biz_id":
-                exist_bizs = {int(bucket["id"]) for bucket in field_data["buckets"]}
-                authorized_bizs = field_bucket_count_map[field]["authorized_bizs"]
-                bucket_count = field_bucket_count_map[field]["bucket_count"]
-                for biz in authorized_bizs:
-                    if len(exist_bizs) > size:
-                        break
-                    if int(biz) not in exist_bizs:
-                        field_data["buckets"].append({"id": biz, "name": biz, "count": 0})
-                        bucket_count += 1
-                field_bucket_count_map[field] = bucket_count
-            bucket_length = len(field_data["buckets"])
-            field_data["buckets"].sort(key=lambda x: x["count"], reverse=True)
-            field_data["buckets"] = field_data["buckets"][:size]
-
-            field_data["bucket_count"] = field_bucket_count_map.get(field, 0)
-            if field_data["bucket_count"] <= size:
-                field_data["bucket_count"] = bucket_length
-
-        return result
-
-    def get_bucket_count(self, validated_request_data):
-        fields = validated_request_data.get("fields", [])
+        # 按时间分片统计，各字段在同一请求中聚合，TOP N 确定后提前结束
         handler = self.handler_cls(**validated_request_data)
-        search_object = handler.get_search_object()
-        search_object = handler.add_conditions(search_object)
-        search_object = handler.add_query_string(search_object)
-        search_object = search_object.params(track_total_hits=True).extra(size=0)
-
-        bucket_count_suffix = handler.bucket_count_suffix
-
-        for filed in fields:
-            handler.add_cardinality_bucket(search_object.aggs, filed, bucket_count_suffix)
-
-        search_result = search_object.execute()
-
-        result = {}
-
-        # 返回结果的数据处理
-        for field in fields:
-            if not search_result.aggs:
-                continue
-            actual_field = field.lstrip("-+")
-            if actual_field.startswith("tags."):
-                bucket_count = getattr(search_result.aggs, f"{field}{bucket_count_suffix}").key.value.value
-
-            elif actual_field == "duration":
-                bucket_count = len(handler.DurationOption.AGG)
-            elif actual_field == "bk_biz_id" and hasattr(handler, "authorized_bizs"):
-                authorized_bizs = set(handler.authorized_bizs)
-                bucket_count = {"bucket_count": len(authorized_bizs), "authorized_bizs": authorized_bizs}
-            else:
-                bucket_count = getattr(search_result.aggs, f"{field}{bucket_count_suffix}").value
-
-            result[actual_field] = bucket_count
-        return result
+        return handler.top_n(
+            fields=validated_request_data["fields"], size=validated_request_data["size"], partitioned=True
+        )
 
 
 class ActionTopNResource(BaseTopNResource):
@@ -154,6 +154,109 @@ def add_aggs(agg_id_map: dict, result: dict, sliced_result: dict):
                         res_child["count"] += child["count"]
 
 
+def merge_aggregations(target: dict, source: dict) -> dict:
+    """
+    累加 ES filter/terms 聚合的原始结果，terms 聚合按 key 合并桶
+    """
+    for name, value in source.items():
+        if name in ("key", "key_as_string"):
+            continue
+
+        if not isinstance(value, dict):
+            if isinstance(value, int | float) and not isinstance(value, bool):
+                target[name] = target.get(name, 0) + value
+            continue
+
+        if name not in target:
+            target[name] = copy.deepcopy(value)
+            continue
+
+        if isinstance(value.get("buckets"), list):
+            target_buckets = {bucket["key"]: bucket for bucket in target[name]["buckets"]}
+            for bucket in value["buckets"]:
+                if bucket["key"] in target_buckets:
+                    merge_aggregations(target_buckets[bucket["key"]], bucket)
+                else:
+                    target[name]["buckets"].append(copy.deepcopy(bucket))
+            target[name]["buckets"].sort(key=lambda b: -b["doc_count"])
+
+        merge_aggregations(target[name], {k: v for k, v in value.items() if k != "buckets"})
+    return target
+
+
+class TopNCounter:
+    """
+    跨时间分片合并 terms 聚合的 TOP N 结果
+    分片只返回计数最高的部分桶，未返回的值在该分片中的计数不超过分片阈值(返回桶的最小计数 + 聚合误差)，
+    据此为每个值维护计数下界及误差上界，用于判断 TOP N 排名是否已经稳定
+    """
+
+    def __init__(self, size: int, reverse: bool = True):
+        self.size = size
+        # 是否按计数降序，升序时无法提前判断排名
+        self.reverse = reverse
+        self.counts = {}
+        self.errors = {}
+        # 从未出现在分片结果中的值的计数上界
+        self.unseen_error = 0
+
+    def add(self, buckets: list[tuple], sum_other_doc_count: int = 0, doc_count_error: int = 0):
+        """
+        合并单个分片的聚合结果
+        :param buckets: 分片返回的桶 [(key, doc_count)]
+        :param sum_other_doc_count: 分片中未返回的桶的文档总数
+        :param doc_count_error: 分片聚合的计数误差上界
+        """
+        threshold = 0
+        if sum_other_doc_count:
+            threshold = min(min((count for _, count in buckets), default=0) + doc_count_error, sum_other_doc_count)
+
+        keys = set()
+        for key, count in buckets:
+            if key not in self.counts:
+                self.counts[key] = 0
+                self.errors[key] = self.unseen_error
+            self.counts[key] += count
+            self.errors[key] += doc_count_error
+            keys.add(key)
+
+        if threshold:
+            for key in self.counts:
+                if key not in keys:
+                    self.errors[key] += threshold
+            self.unseen_error += threshold
+
+    def top(self, size: int = None) -> list[tuple]:
+        """
+        按计数排序的前 size 个值 [(key, count)]
+        """
+        ordered = sorted(self.counts.items(), key=lambda item: item[1], reverse=self.reverse)
+        return ordered[: self.size if size is None else size]
+
+    def is_stable(self, remaining: int, bucket_count: int = None) -> bool:
+        """
+        判断 TOP N 的成员是否已经确定，即剩余文档全部计入其他值时，也无法超过当前第 N 名的计数下界
+        :param remaining: 尚未统计的文档数
+        :param bucket_count: 字段值的总数，已统计到全部字段值时，不需要考虑未出现的值
+        """
+        if not remaining:
+            return True
+        if not self.reverse:
+            return False
+
+        all_seen = bucket_count is not None and len(self.counts) >= bucket_count
+        top = self.top()
+        if len(top) < self.size:
+            # 未出现的值只要有计数就会进入 TOP N
+            return all_seen
+
+        top_keys = {key for key, _ in top}
+        ceilings = [self.counts[key] + self.errors[key] for key in self.counts if key not in top_keys]
+        if not all_seen:
+            ceilings.append(self.unseen_error)
+        return not ceilings or top[-1][1] >= max(ceilings) + remaining
+
+
 def is_include_promql(query_string: str) -> bool:
     """
     判断是否包含promql 语句
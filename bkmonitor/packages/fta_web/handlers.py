@@ -94,6 +94,7 @@ def migrate_actions(sender, **kwargs):
         StrategyActionConfigRelation,
         StrategyModel,
     )
+    from bkmonitor.strategy.summary import refresh_strategy_summary
     from constants.action import ActionSignal
 
     if GlobalConfig.objects.filter(key="MIGRATE_ACTIONS_OPERATE", value="1").exists():
@@ -268,6 +269,7 @@ def migrate_actions(sender, **kwargs):
                 )
 
     StrategyActionConfigRelation.objects.bulk_create(strategy_action_relations)
+    refresh_strategy_summary(relation.strategy_id for relation in strategy_action_relations)
     GlobalConfig.objects.update_or_create(key="MIGRATE_ACTIONS_OPERATE", defaults={"value": 1})
 
 
@@ -0,0 +1,136 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response
+
+from fta_web.alert.handlers import alert
+from fta_web.alert.handlers.alert import AlertQueryHandler
+from fta_web.alert.utils import merge_aggregations
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+NOW = 1700000000 // DAY * DAY
+
+
+def make_handler(start_time, end_time):
+    handler = AlertQueryHandler.__new__(AlertQueryHandler)
+    handler.start_time = start_time
+    handler.end_time = end_time
+    handler.bk_biz_ids = [2]
+    handler.authorized_bizs = [2]
+    handler.unauthorized_bizs = []
+    handler.username = ""
+    handler.request_username = "admin"
+    handler.status = None
+    handler.conditions = []
+    handler.query_string = ""
+    handler.must_exists_fields = []
+    return handler
+
+
+def make_bucket(abnormal, recovered, severity):
+    return {
+        "doc_count": abnormal + recovered,
+        "status": {
+            "buckets": [
+                {
+                    "key": "ABNORMAL",
+                    "doc_count": abnormal,
+                    "is_shielded": {"buckets": [{"key": 0, "doc_count": abnormal}]},
+                },
+                {
+                    "key": "RECOVERED",
+                    "doc_count": recovered,
+                    "is_shielded": {"buckets": [{"key": 0, "doc_count": recovered}]},
+                },
+            ]
+        },
+        "mine": {"doc_count": abnormal},
+        "assignee": {"doc_count": abnormal},
+        "appointee": {"doc_count": 0},
+        "follower": {"doc_count": 0},
+        "severity": {"buckets": [{"key": severity, "doc_count": abnormal + recovered}], "sum_other_doc_count": 0},
+    }
+
+
+def search_with_cache(handler, time_buckets):
+    """执行一次带缓存的聚合，ES 按查询中的时间桶返回聚合结果"""
+    search_object, context = handler.add_cached_aggs(Search(), show_overview=True)
+    aggs = search_object.to_dict().get("aggs", {})
+    raw = {"hits": {"total": {"value": 0}, "hits": []}}
+    filters = []
+    if aggs:
+        filters = list(aggs["time_buckets"]["filters"]["filters"])
+        raw["aggregations"] = {"time_buckets": {"buckets": {name: time_buckets[name] for name in filters}}}
+    search_result = Response(search_object, raw)
+    handler.fill_cached_aggs(search_result, context)
+    return search_result, filters
+
+
+def test_merge_aggregations():
+    result = merge_aggregations({}, make_bucket(1, 2, 1))
+    merge_aggregations(result, make_bucket(3, 1, 2))
+
+    assert result["doc_count"] == 7
+    assert result["mine"]["doc_count"] == 4
+    status = {bucket["key"]: bucket for bucket in result["status"]["buckets"]}
+    assert status["ABNORMAL"]["doc_count"] == 4
+    assert status["ABNORMAL"]["is_shielded"]["buckets"] == [{"key": 0, "doc_count": 4}]
+    assert status["RECOVERED"]["doc_count"] == 3
+    # 合并后按数量重新排序
+    assert result["severity"]["buckets"] == [{"key": 2, "doc_count": 4}, {"key": 1, "doc_count": 3}]
+
+
+def test_get_aggs_time_buckets():
+    # 短时间范围不切分
+    assert make_handler(NOW - HOUR, NOW).get_aggs_time_buckets(NOW) == (0, [])
+
+    # 两天以内按小时切分，最近一个小时视为未结束
+    bucket_size, buckets = make_handler(NOW - DAY - 30, NOW).get_aggs_time_buckets(NOW)
+    assert bucket_size == HOUR
+    assert buckets == list(range(NOW - DAY, NOW - HOUR, HOUR))
+
+    # 长时间范围按天切分
+    bucket_size, buckets = make_handler(NOW - 7 * DAY, NOW + 60).get_aggs_time_buckets(NOW + 60)
+    assert bucket_size == DAY
+    assert buckets == list(range(NOW - 7 * DAY, NOW - DAY, DAY))
+
+
+def test_cached_aggs():
+    time_buckets = {str(start): make_bucket(1, 1, 1) for start in range(NOW - 7 * DAY, NOW, DAY)}
+    time_buckets["live"] = make_bucket(5, 0, 3)
+
+    with (
+        mock.patch.object(alert, "cache", LocMemCache("test_alert_aggs", {})),
+        mock.patch.object(alert.time, "time", return_value=NOW + 60),
+    ):
+        # 首次查询聚合全部时间桶
+        search_result, filters = search_with_cache(make_handler(NOW - 7 * DAY, NOW + 60), time_buckets)
+        assert len(filters) == 7
+        assert search_result.aggs.mine.doc_count == 6 + 5
+        overview = AlertQueryHandler.handle_overview(search_result)
+        assert {child["id"]: child["count"] for child in overview["children"]}["RECOVERED"] == 6
+
+        # 翻页复用完整的聚合结果，不再聚合
+        search_result, filters = search_with_cache(make_handler(NOW - 7 * DAY, NOW + 60), time_buckets)
+        assert filters == []
+        assert search_result.aggs.mine.doc_count == 11
+
+        # 刷新列表，已结束的时间桶复用缓存，只聚合未结束部分
+        time_buckets["live"] = make_bucket(6, 0, 3)
+        search_result, filters = search_with_cache(make_handler(NOW - 7 * DAY + 10, NOW + 70), time_buckets)
+        assert filters == ["live"]
+        assert search_result.aggs.mine.doc_count == 5 + 6
+        severity = {bucket.key: bucket.doc_count for bucket in search_result.aggs.severity.buckets}
+        assert severity == {1: 10, 3: 6}
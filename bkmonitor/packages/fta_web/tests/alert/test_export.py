@@ -0,0 +1,118 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import random
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from fta_web.alert.handlers.base import BaseQueryHandler, SortValues
+
+
+class FakeSearch:
+    """按 slice 参数切分文档的 ES 查询桩"""
+
+    def __init__(self, docs, sort, slice_param=None):
+        self.docs = docs
+        self.sort = sort
+        self.slice_param = slice_param
+        self.scanned = []
+
+    def to_dict(self):
+        return {"sort": self.sort}
+
+    def extra(self, slice):
+        search = FakeSearch(self.docs, self.sort, slice)
+        search.scanned = self.scanned
+        return search
+
+    def params(self, **kwargs):
+        return self
+
+    def scan(self):
+        for index, doc in enumerate(self.docs):
+            if index % self.slice_param["max"] != self.slice_param["id"]:
+                continue
+            if doc.get("error"):
+                raise ValueError(doc["error"])
+            self.scanned.append(doc)
+            yield SimpleNamespace(meta=SimpleNamespace(sort=[doc["status"], doc["create_time"]]), doc=doc)
+
+
+def make_docs(count, seed=0):
+    rnd = random.Random(seed)
+    return [
+        {"id": i, "status": rnd.choice(["ABNORMAL", "CLOSED", "RECOVERED", None]), "create_time": rnd.randint(0, 100)}
+        for i in range(count)
+    ]
+
+
+def sort_key(doc):
+    # status 升序，create_time 降序，缺失值排在最后
+    return doc["status"] is None, doc["status"] or "", -doc["create_time"]
+
+
+def sort_docs(docs):
+    return sorted(docs, key=sort_key)
+
+
+def scan_slices(docs, slices=4, chunk_size=10):
+    search = FakeSearch(docs, ["status", {"create_time": {"order": "desc"}}])
+    handler = BaseQueryHandler.__new__(BaseQueryHandler)
+    with (
+        mock.patch.object(BaseQueryHandler, "get_scan_search_object", return_value=search),
+        mock.patch.object(BaseQueryHandler, "EXPORT_CHUNK_SIZE", chunk_size),
+    ):
+        yield from (hit.doc for hit in handler.scan_slices(slices=slices))
+
+
+def test_sort_values():
+    assert SortValues(["a", 2], [False, True]) < SortValues(["a", 1], [False, True])
+    assert SortValues(["a", 1], [False, True]) < SortValues(["b", 2], [False, True])
+    assert SortValues(["a", 1], [False, False]) < SortValues([None, 0], [False, False])
+    assert not SortValues([None, 0], [True, False]) < SortValues(["a", 1], [True, False])
+    assert not SortValues(["a", 1], [False, False]) < SortValues(["a", 1], [False, False])
+
+
+def test_get_sort_reverses():
+    search = FakeSearch([], ["status", {"create_time": {"order": "desc"}}, {"seq_id": "asc"}, "_score"])
+    assert BaseQueryHandler.get_sort_reverses(search) == [False, True, False, True]
+
+
+def test_scan_slices_keep_order():
+    # 各切片内部按排序返回，归并后整体有序
+    docs = sort_docs(make_docs(500))
+    result = list(scan_slices(docs))
+    assert [sort_key(d) for d in result] == [sort_key(d) for d in docs]
+    assert sorted(d["id"] for d in result) == list(range(500))
+
+
+def test_scan_slices_stop_early():
+    # 提前结束消费时各切片线程退出，不再继续滚动
+    docs = sort_docs(make_docs(500))
+    result = []
+    for doc in scan_slices(docs, chunk_size=5):
+        result.append(doc)
+        if len(result) == 10:
+            break
+    assert [sort_key(d) for d in result] == [sort_key(d) for d in docs[:10]]
+
+
+def test_scan_slices_error():
+    docs = sort_docs(make_docs(100))
+    docs[50]["error"] = "scroll failed"
+    with pytest.raises(ValueError):
+        list(scan_slices(docs))
+
+
+def test_iter_chunks():
+    chunks = list(BaseQueryHandler.iter_chunks(iter(range(25)), chunk_size=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
@@ -0,0 +1,73 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from fta_web.alert.handlers import alert, base
+from fta_web.alert.handlers.alert import AlertQueryTransformer
+
+START_TIME = 1700000000 // 60 * 60
+
+
+def test_transform_query_string_cache():
+    compiled = []
+
+    def compile_query_string(query_string, context=None):
+        compiled.append((query_string, context))
+        # 翻译过程会修改上下文
+        context["search_field_name"] = "alert_name"
+        return f"compiled({query_string})"
+
+    context = {"bk_biz_ids": [2], "start_time": START_TIME, "end_time": START_TIME + 3600}
+    with (
+        mock.patch.object(base, "cache", LocMemCache("test_query_string", {})),
+        mock.patch.object(AlertQueryTransformer, "compile_query_string", side_effect=compile_query_string),
+    ):
+        assert AlertQueryTransformer.transform_query_string("alert_name: cpu", context) == "compiled(alert_name: cpu)"
+        assert AlertQueryTransformer.transform_query_string("alert_name: cpu", context) == "compiled(alert_name: cpu)"
+        assert len(compiled) == 1
+        # 调用方的上下文不受翻译过程影响
+        assert "search_field_name" not in context
+
+        # 同一时间桶内复用编译结果
+        AlertQueryTransformer.transform_query_string(
+            "alert_name: cpu", dict(context, start_time=START_TIME + 30, end_time=START_TIME + 3630)
+        )
+        assert len(compiled) == 1
+
+        # 查询语句、业务或时间桶变化时重新编译
+        AlertQueryTransformer.transform_query_string("alert_name: mem", context)
+        AlertQueryTransformer.transform_query_string("alert_name: cpu", dict(context, bk_biz_ids=[3]))
+        AlertQueryTransformer.transform_query_string("alert_name: cpu", dict(context, end_time=START_TIME + 3660))
+        assert len(compiled) == 4
+
+        assert AlertQueryTransformer.transform_query_string("", context) == ""
+        assert len(compiled) == 4
+
+
+def test_lookup_memoized():
+    alert.get_topo_node_ids.cache_clear()
+    alert.get_action_config_ids.cache_clear()
+
+    with mock.patch.object(alert, "resource") as mocked_resource:
+        mocked_resource.commons.get_topo_list.return_value = [{"bk_module_id": 1}, {"bk_module_id": 2}]
+        for _ in range(3):
+            assert alert.get_topo_node_ids("system", (2,), "module", "nginx") == [1, 2]
+        assert alert.get_topo_node_ids("system", (3,), "module", "nginx") == [1, 2]
+        assert mocked_resource.commons.get_topo_list.call_count == 2
+
+    with mock.patch.object(alert, "ActionConfig") as mocked_action_config:
+        mocked_action_config.objects.filter.return_value.values_list.return_value = [10, 11]
+        for _ in range(3):
+            assert alert.get_action_config_ids(("notice",), (2,)) == [10, 11]
+        assert alert.get_action_config_ids(("notice",), (2,), include=True) == [10, 11]
+        assert mocked_action_config.objects.filter.call_count == 2
@@ -0,0 +1,352 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from unittest import mock
+
+from elasticsearch_dsl import Search
+from elasticsearch_dsl.response import Response
+
+from fta_web.alert.handlers import alert
+from fta_web.alert.handlers.alert import AlertQueryHandler
+from fta_web.alert.utils import TopNCounter, slice_time_interval
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+START_TIME = 1700000000 // DAY * DAY
+END_TIME = START_TIME + 6 * DAY
+FIELDS = ["alert_name", "severity", "duration"]
+
+
+class LocalES:
+    """
+    本地 ES 桩：在内存文档上执行查询及聚合
+    terms 聚合按文档 id 模拟多分片，各分片只返回 shard_size 个桶，与 ES 一样会产生计数误差
+    """
+
+    SHARDS = 3
+
+    def __init__(self, docs):
+        self.docs = docs
+        # 每次请求命中的文档数
+        self.requests = []
+
+    def execute(self, search):
+        body = search.to_dict()
+        docs = [doc for doc in self.docs if self.match(doc, body.get("query", {"match_all": {}}))]
+        self.requests.append(len(docs))
+
+        raw = {"hits": {"total": {"value": len(docs), "relation": "eq"}, "hits": []}}
+        if body.get("aggs"):
+            raw["aggregations"] = self.aggregate(docs, body["aggs"])
+        return Response(search, raw)
+
+    def match(self, doc, query) -> bool:
+        name, params = next(iter(query.items()))
+        if name == "match_all":
+            return True
+        if name == "bool":
+            if not all(self.match(doc, q) for q in params.get("filter", []) + params.get("must", [])):
+                return False
+            if any(self.match(doc, q) for q in params.get("must_not", [])):
+                return False
+            should = params.get("should", [])
+            # 查询均位于 filter 上下文，should 默认至少命中一个
+            minimum_should_match = params.get("minimum_should_match", 1 if should else 0)
+            return sum(self.match(doc, q) for q in should) >= minimum_should_match
+        if name == "exists":
+            return doc.get(params["field"]) is not None
+
+        field, value = next(iter(params.items()))
+        doc_value = doc.get(field)
+        if doc_value is None:
+            return False
+        if name == "term":
+            return doc_value == value
+        if name == "terms":
+            return doc_value in value
+        if name == "range":
+            operators = {
+                "gte": doc_value >= value.get("gte", doc_value),
+                "gt": "gt" not in value or doc_value > value["gt"],
+                "lte": doc_value <= value.get("lte", doc_value),
+                "lt": "lt" not in value or doc_value < value["lt"],
+            }
+            return all(operators.values())
+        raise NotImplementedError(name)
+
+    def aggregate(self, docs, aggs) -> dict:
+        result = {}
+        for name, agg in aggs.items():
+            agg_type, params = next((key, value) for key, value in agg.items() if key != "aggs")
+            sub_aggs = agg.get("aggs", {})
+            if agg_type == "filters":
+                result[name] = {
+                    "buckets": {
+                        key: self.bucket([doc for doc in docs if self.match(doc, query)], sub_aggs)
+                        for key, query in params["filters"].items()
+                    }
+                }
+            elif agg_type == "cardinality":
+                result[name] = {"value": len({doc[params["field"]] for doc in docs if params["field"] in doc})}
+            elif agg_type == "range":
+                values = [doc[params["field"]] for doc in docs if params["field"] in doc]
+                result[name] = {
+                    "buckets": [
+                        {
+                            "key": r["key"],
+                            "doc_count": len([v for v in values if r.get("from", v) <= v < r.get("to", v + 1)]),
+                        }
+                        for r in params["ranges"]
+                    ]
+                }
+            elif agg_type == "terms":
+                result[name] = self.terms(docs, params)
+            else:
+                raise NotImplementedError(agg_type)
+        return result
+
+    @staticmethod
+    def term(value) -> str:
+        # 与 ES 一致，布尔值的词项为小写
+        return str(value).lower() if isinstance(value, bool) else str(value)
+
+    def bucket(self, docs, aggs) -> dict:
+        return {"doc_count": len(docs), **self.aggregate(docs, aggs)}
+
+    def terms(self, docs, params) -> dict:
+        field = params["field"]
+        size = params.get("size", 10)
+        shard_size = params.get("shard_size", int(size * 1.5 + 10))
+        include = set(params["include"]) if "include" in params else None
+
+        merged = Counter()
+        total = error = 0
+        for shard in range(self.SHARDS):
+            counts = Counter(
+                doc[field]
+                for doc in docs
+                if doc["id"] % self.SHARDS == shard
+                and doc.get(field) is not None
+                and (include is None or self.term(doc[field]) in include)
+            )
+            total += sum(counts.values())
+            shard_buckets = sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:shard_size]
+            if len(counts) > shard_size:
+                error += shard_buckets[-1][1]
+            merged.update(dict(shard_buckets))
+
+        buckets = sorted(merged.items(), key=lambda item: (-item[1], str(item[0])))[:size]
+        return {
+            "doc_count_error_upper_bound": error,
+            "sum_other_doc_count": total - sum(count for _, count in buckets),
+            "buckets": [{"key": key, "doc_count": count} for key, count in buckets],
+        }
+
+
+def make_docs(count=6000, names=300, seed=0, skew=1.2):
+    """
+    构造告警文档，告警名称按幂律分布，少量告警未结束
+    """
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) ** skew for i in range(names)]
+    docs = []
+    for i in range(count):
+        end_time = rnd.randrange(START_TIME, END_TIME)
+        duration = rnd.choice([60, 3600 * 2, DAY * 2])
+        doc = {
+            "id": i,
+            "alert_name.raw": f"alert-{rnd.choices(range(names), weights)[0]}",
+            "severity": rnd.choice([1, 1, 2, 3]),
+            "event.bk_biz_id": 2,
+            "begin_time": end_time - duration,
+            "create_time": end_time - duration,
+            "duration": duration,
+        }
+        if rnd.random() > 0.05:
+            doc["end_time"] = end_time
+        docs.append(doc)
+    return docs
+
+
+def make_handler(start_time=START_TIME, end_time=END_TIME, **kwargs):
+    handler = AlertQueryHandler.__new__(AlertQueryHandler)
+    handler.start_time = start_time
+    handler.end_time = end_time
+    handler.bk_biz_ids = [2]
+    handler.authorized_bizs = [2]
+    handler.unauthorized_bizs = []
+    handler.username = ""
+    handler.request_username = "admin"
+    handler.status = None
+    handler.conditions = []
+    handler.query_string = ""
+    handler.must_exists_fields = []
+    handler.bucket_count_suffix = ".bucket_count"
+    handler.is_time_partitioned = False
+    handler.is_finaly_partition = False
+    handler.__dict__.update(kwargs)
+    return handler
+
+
+def exact_top_n(docs, field, size):
+    counts = Counter(doc[field] for doc in docs if doc.get(field) is not None)
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))[:size])
+
+
+def slice_top_n(fields, size):
+    """
+    原有的分片统计方式：每个分片单独执行 top_n，另起一个请求统计桶总数，合并各分片的桶
+    """
+    partitions = slice_time_interval(START_TIME, END_TIME)
+    counts = defaultdict(Counter)
+    for index, (start_time, end_time) in enumerate(partitions):
+        handler = make_handler(
+            start_time,
+            end_time,
+            is_time_partitioned=True,
+            is_finaly_partition=index == len(partitions) - 1,
+            bucket_count_suffix="",
+        )
+        for field in handler.top_n(fields, size, char_add_quotes=False)["fields"]:
+            counts[field["field"]].update({bucket["id"]: bucket["count"] for bucket in field["buckets"]})
+
+    handler = make_handler()
+    search_object = handler.get_search_object().extra(size=0)
+    for field in fields:
+        handler.add_cardinality_bucket(search_object.aggs, field, handler.bucket_count_suffix)
+    search_object.execute()
+    return {field: dict(counts[field].most_common(size)) for field in fields}
+
+
+def run_top_n(es, fields, size=10):
+    with (
+        mock.patch.object(alert.AlertDocument, "search", side_effect=lambda **kwargs: Search()),
+        mock.patch.object(Search, "execute", lambda search, *args, **kwargs: es.execute(search)),
+    ):
+        return make_handler().top_n(fields, size, char_add_quotes=False, partitioned=True)
+
+
+def test_top_n_counter():
+    counter = TopNCounter(size=2)
+    # 分片结果完整
+    counter.add([("a", 10), ("b", 8), ("c", 1)])
+    assert counter.top() == [("a", 10), ("b", 8)]
+    assert counter.unseen_error == 0
+    assert counter.is_stable(remaining=7)
+    assert not counter.is_stable(remaining=8)
+
+    # 分片只返回部分桶，未返回的值计数不超过最后一个桶的计数加聚合误差
+    counter.add([("a", 5), ("c", 3)], sum_other_doc_count=20, doc_count_error=1)
+    assert counter.counts == {"a": 15, "b": 8, "c": 4}
+    assert counter.errors == {"a": 1, "b": 4, "c": 1}
+    assert counter.unseen_error == 4
+    # 第 2 名 b 的计数下界为 8，c 的计数上界为 5
+    assert counter.is_stable(remaining=3)
+    assert not counter.is_stable(remaining=4)
+
+    # 已统计到全部取值时，不需要考虑未出现的值
+    counter = TopNCounter(size=2)
+    counter.add([("a", 10), ("b", 10)], sum_other_doc_count=5)
+    assert counter.unseen_error == 5
+    assert not counter.is_stable(remaining=6)
+    assert counter.is_stable(remaining=6, bucket_count=2)
+
+    # 升序统计无法提前判断
+    counter = TopNCounter(size=1, reverse=False)
+    counter.add([("a", 1), ("b", 5)])
+    assert counter.top() == [("a", 1)]
+    assert not counter.is_stable(remaining=1)
+
+
+def test_agg_bucket_include_bool():
+    docs = [{"id": i, "is_shielded": i % 3 == 0} for i in range(30)]
+    search_object = Search()
+    make_handler().add_agg_bucket(search_object.aggs, "is_shielded", include=[True])
+
+    terms = search_object.to_dict()["aggs"]["is_shielded"]["terms"]
+    assert terms["include"] == ["true"]
+    assert LocalES(docs).terms(docs, terms)["buckets"] == [{"key": True, "doc_count": 10}]
+
+
+def test_partitioned_top_n():
+    # 取值较少的字段，统计到全部取值后即可确定 TOP N
+    docs = make_docs(names=8)
+    es = LocalES(docs)
+    result = run_top_n(es, FIELDS)
+
+    assert result["doc_count"] == len(docs)
+    fields = {field["field"]: field for field in result["fields"]}
+    for field, es_field in [("alert_name", "alert_name.raw"), ("severity", "severity")]:
+        assert {bucket["id"]: bucket["count"] for bucket in fields[field]["buckets"]} == exact_top_n(docs, es_field, 10)
+    assert fields["alert_name"]["bucket_count"] == 8
+    assert fields["severity"]["bucket_count"] == 3
+    assert sum(bucket["count"] for bucket in fields["duration"]["buckets"]) == len(docs)
+
+    # 1 个统计请求 + 1 个分片请求 + 1 个剩余分片请求
+    assert len(es.requests) == 3
+    assert len(slice_time_interval(START_TIME, END_TIME)) == 6
+
+
+def test_partitioned_top_n_without_early_return():
+    # 取值多且分布均匀时 TOP N 无法提前确定，逐个查询全部分片
+    docs = make_docs(names=300, skew=0.5)
+    es = LocalES(docs)
+    result = run_top_n(es, ["alert_name", "+severity"], size=5)
+
+    partitions = slice_time_interval(START_TIME, END_TIME)
+    assert len(es.requests) == len(partitions) + 1
+
+    fields = {field["field"]: field for field in result["fields"]}
+    # 合并结果为计数下界
+    counts = Counter(doc["alert_name.raw"] for doc in docs)
+    for bucket in fields["alert_name"]["buckets"]:
+        assert bucket["count"] <= counts[bucket["id"]]
+    severity_counts = Counter(doc["severity"] for doc in docs)
+    assert [bucket["id"] for bucket in fields["+severity"]["buckets"]] == [3, 2, 1]
+    assert {bucket["id"]: bucket["count"] for bucket in fields["+severity"]["buckets"]} == severity_counts
+
+
+def test_benchmark_top_n():
+    """基准：对比原有分片统计与 TOP N 引擎的请求数、聚合文档数及耗时"""
+    docs = make_docs(count=20000, names=8)
+    size = 10
+
+    es = LocalES(docs)
+    with (
+        mock.patch.object(alert.AlertDocument, "search", side_effect=lambda **kwargs: Search()),
+        mock.patch.object(Search, "execute", lambda search, *args, **kwargs: es.execute(search)),
+    ):
+        begin = time.perf_counter()
+        expect = slice_top_n(FIELDS, size)
+        slice_cost = time.perf_counter() - begin
+    slice_requests = list(es.requests)
+
+    es = LocalES(docs)
+    begin = time.perf_counter()
+    result = run_top_n(es, FIELDS, size)
+    engine_cost = time.perf_counter() - begin
+
+    result = {field["field"]: field for field in result["fields"]}
+    for field, es_field in [("alert_name", "alert_name.raw"), ("severity", "severity")]:
+        exact = exact_top_n(docs, es_field, size)
+        assert {bucket["id"]: bucket["count"] for bucket in result[field]["buckets"]} == exact
+        # 原有分片方式中未结束的告警会在每个分片中重复计数
+        assert set(expect[field]) == set(exact)
+    assert len(es.requests) < len(slice_requests)
+    logger.info(
+        f"[test_benchmark_top_n] docs({len(docs)}) "
+        f"slice: {len(slice_requests)} requests, {sum(slice_requests)} docs, {slice_cost * 1000:.2f}ms; "
+        f"engine: {len(es.requests)} requests, {sum(es.requests)} docs, {engine_cost * 1000:.2f}ms"
+    )
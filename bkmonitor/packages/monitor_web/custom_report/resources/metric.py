@@ -36,6 +36,7 @@ from monitor_web.models.custom_report import (
     CustomTSGroupingRule,
     CustomTSTable,
 )
+from monitor_web.strategies.metric_search import MetricSearchResult
 from monitor_web.strategies.resources import GetMetricListV2Resource
 
 logger = logging.getLogger(__name__)
@@ -801,6 +802,8 @@ class AddCustomMetricResource(Resource):
         create_params.update(extra_params)
         new_metric = MetricListCache(**create_params)
         new_metric.save()
+        # 手动添加的指标不会被指标缓存刷新任务识别为变更，需要立即刷新业务的检索索引
+        MetricSearchResult.refresh(filter_params["bk_tenant_id"], [params["bk_biz_id"]])
         return GetMetricListV2Resource.get_metric_list(
             params["bk_biz_id"], MetricListCache.objects.filter(id=new_metric.id)
         )
@@ -11,6 +11,7 @@ specific language governing permissions and limitations under the License.
 import copy
 import csv
 import datetime
+import itertools
 import json
 import logging
 import os
@@ -19,6 +20,7 @@ import tarfile
 import uuid
 import zipfile
 from collections import defaultdict
+from collections.abc import Iterable
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from uuid import uuid4
@@ -333,6 +335,16 @@ class ExportPackageResource(Resource):
 
         return {"download_path": download_path, "download_name": download_name}
 
+    def export_list_data(self, list_data: Iterable[dict], bk_biz_id: int = None):
+        """
+        流式导出列表数据，数据逐条写入 csv 文件，不在内存中汇总
+        """
+        list_data = iter(list_data)
+        first = next(list_data, None)
+        if first is None:
+            raise ValidationError(_("未选择任何配置"))
+        return self.perform_request({"bk_biz_id": bk_biz_id, "list_data": itertools.chain([first], list_data)})
+
     @step(state="PREPARE_FILE", message=_("准备文件中..."))
     def prepare_file(self):
         collect_config_file = len(self.collect_config_ids)
@@ -409,7 +421,9 @@ class ExportPackageResource(Resource):
                 fs.write(json.dumps(collect_config_detail, indent=4))
 
     def make_list_to_csv_file(self):
-        if not self.list_data:
+        list_data = iter(self.list_data)
+        first = next(list_data, None)
+        if first is None:
             return
         os.makedirs(os.path.join(self.package_path, "csv_files"))
         with open(
@@ -421,9 +435,10 @@ class ExportPackageResource(Resource):
             "w",
             encoding="utf-8-sig",
         ) as fs:
-            writer = csv.DictWriter(fs, fieldnames=self.list_data[0].keys())
+            writer = csv.DictWriter(fs, fieldnames=first.keys())
             writer.writeheader()
-            for data in self.list_data:
+            writer.writerow(first)
+            for data in list_data:
                 writer.writerow(data)
 
     def make_plugin_file(self):
@@ -8,8 +8,11 @@ an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express o
 specific language governing permissions and limitations under the License.
 """
 
+import hashlib
+import json
 import logging
 import re
+import time
 from collections import defaultdict
 from collections.abc import Callable
 from dataclasses import asdict
@@ -20,6 +23,7 @@ from typing import Any
 
 import arrow
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q
 from django.forms import model_to_dict
 from django.utils import timezone
@@ -65,6 +69,164 @@ from monitor_web.strategies.constant import CORE_FILE_SIGNAL_LIST
 logger = logging.getLogger(__name__)
 
 
+class TimeBucketQueryCache:
+    """
+    查询结果分桶缓存
+
+    按查询周期对齐的时间桶缓存已结束时间段的查询结果，图表刷新时只查询缺失的时间桶及仍在写入的尾部时间段，再拼接结果
+    """
+
+    # 每个时间桶包含的查询周期数
+    BUCKET_POINTS = 60
+    # 时间桶结束超过该时长后才认为数据已写入完整
+    SETTLE_SECONDS = 10 * 60
+    # 等待时长至少覆盖的查询周期数，周期较大的数据上报及入库更晚
+    SETTLE_POINTS = 3
+    # 按数据来源配置等待时长，计算平台及日志平台存在较长的入库延迟
+    DATA_SOURCE_SETTLE_SECONDS = {
+        DataSourceLabel.BK_DATA: 30 * 60,
+        DataSourceLabel.BK_LOG_SEARCH: 15 * 60,
+    }
+    # 单次查询最多使用的时间桶数量
+    MAX_BUCKETS = 1000
+    # 单个时间桶最多缓存的记录数
+    MAX_BUCKET_RECORDS = 10000
+    CACHE_TIMEOUT = 24 * 60 * 60
+    # 最近的时间桶仍可能有延迟数据补录，缩短缓存时长，补录数据最迟在缓存过期后可见
+    RECENT_BUCKET_SECONDS = 6 * 60 * 60
+    RECENT_CACHE_TIMEOUT = 10 * 60
+    CACHE_KEY_PREFIX = "grafana_query_bucket"
+
+    def __init__(self, query: UnifyQuery):
+        self.query = query
+
+    @property
+    def step(self) -> int:
+        """
+        查询步长，与统一查询模块的步长计算保持一致
+        """
+        step = 0
+        for data_source in self.query.data_sources:
+            if data_source.interval:
+                step = min(data_source.interval, step) if step else data_source.interval
+        return int(step or 60)
+
+    @property
+    def settle_seconds(self) -> int:
+        """
+        时间桶结束后等待数据写入完整的时长，取各数据源中最长的等待时长
+        """
+        settle_seconds = max(self.SETTLE_SECONDS, self.step * self.SETTLE_POINTS)
+        for data_source in self.query.data_sources:
+            settle_seconds = max(settle_seconds, self.DATA_SOURCE_SETTLE_SECONDS.get(data_source.data_source_label, 0))
+        return settle_seconds
+
+    def get_cache_timeout(self, bucket: int) -> int:
+        """
+        时间桶缓存时长，最近的时间桶使用较短的缓存时长
+        """
+        bucket_end = bucket // 1000 + self.step * self.BUCKET_POINTS
+        if bucket_end > time.time() - self.RECENT_BUCKET_SECONDS:
+            return self.RECENT_CACHE_TIMEOUT
+        return self.CACHE_TIMEOUT
+
+    def get_fingerprint(self, limit: int | None, slimit: int | None) -> str:
+        """
+        查询指纹，不包含查询时间范围
+        """
+        self.query.process_data_sources(self.query.data_sources)
+        query_params = self.query.get_unify_query_params()
+        query_params.update(limit=limit, slimit=slimit, timezone=timezone.get_current_timezone_name())
+        return hashlib.md5(json.dumps(query_params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get_closed_buckets(self, start_time: int, end_time: int) -> list[int]:
+        """
+        获取查询范围内已结束的时间桶起始时间(ms)
+        """
+        bucket_size = self.step * self.BUCKET_POINTS
+        closed_time = min(end_time // 1000, int(time.time()) - self.settle_seconds)
+        first_bucket = time_interval_align(start_time // 1000, bucket_size)
+        last_bucket = time_interval_align(closed_time, bucket_size)
+        return [bucket * 1000 for bucket in range(first_bucket, last_bucket, bucket_size)]
+
+    def is_cacheable(self, buckets: list[int], down_sample_range: str = "", not_time_align: bool = False, **kwargs):
+        if not buckets or len(buckets) > self.MAX_BUCKETS:
+            return False
+
+        # 降采样及不对齐的查询结果与查询范围相关，无法分段查询
+        if down_sample_range or not_time_align or not kwargs.get("time_alignment", True) or kwargs.get("instant"):
+            return False
+
+        return bool(self.query.data_sources) and self.query.use_unify_query()
+
+    def fetch(self, start_time: int, end_time: int, **kwargs) -> tuple[list[dict], bool]:
+        """
+        查询时间段数据，返回数据及是否为完整数据
+        """
+        records = self.query.query_data(start_time=start_time, end_time=end_time, **kwargs)
+        return records, not self.query.is_partial
+
+    def query_data(
+        self,
+        start_time: int,
+        end_time: int,
+        limit: int | None = settings.SQL_MAX_LIMIT,
+        slimit: int | None = settings.SQL_MAX_LIMIT,
+        down_sample_range: str | None = "",
+        not_time_align: bool = False,
+        **kwargs,
+    ) -> list[dict]:
+        kwargs.update(limit=limit, slimit=slimit, down_sample_range=down_sample_range, not_time_align=not_time_align)
+        buckets = self.get_closed_buckets(start_time, end_time)
+        if not self.is_cacheable(buckets, **kwargs):
+            return self.query.query_data(start_time=start_time, end_time=end_time, **kwargs)
+
+        bucket_size = self.step * self.BUCKET_POINTS * 1000
+        fingerprint = self.get_fingerprint(limit, slimit)
+        cache_keys = {bucket: f"{self.CACHE_KEY_PREFIX}:{fingerprint}:{bucket}" for bucket in buckets}
+        cached_data = cache.get_many(list(cache_keys.values()))
+        bucket_records = {bucket: cached_data[key] for bucket, key in cache_keys.items() if key in cached_data}
+
+        # 连续缺失的时间桶合并查询
+        missing_ranges = []
+        for bucket in buckets:
+            if bucket in bucket_records:
+                continue
+            if missing_ranges and missing_ranges[-1][1] == bucket:
+                missing_ranges[-1][1] = bucket + bucket_size
+            else:
+                missing_ranges.append([bucket, bucket + bucket_size])
+
+        new_cache_data = defaultdict(dict)
+        for range_start, range_end in missing_ranges:
+            records, is_complete = self.fetch(range_start, range_end, **kwargs)
+            range_records = defaultdict(list)
+            for record in records:
+                if range_start <= record["_time_"] < range_end:
+                    range_records[(record["_time_"] - range_start) // bucket_size * bucket_size + range_start].append(
+                        record
+                    )
+
+            for bucket in range(range_start, range_end, bucket_size):
+                bucket_records[bucket] = range_records[bucket]
+                # 空数据可能是数据尚未入库，不进行缓存
+                if is_complete and 0 < len(range_records[bucket]) <= self.MAX_BUCKET_RECORDS:
+                    new_cache_data[self.get_cache_timeout(bucket)][cache_keys[bucket]] = range_records[bucket]
+
+        for timeout, timeout_cache_data in new_cache_data.items():
+            cache.set_many(timeout_cache_data, timeout=timeout)
+
+        # 首个时间桶可能早于查询开始时间，按对齐后的开始时间截取
+        first_time = time_interval_align(start_time // 1000, self.step) * 1000
+        data = [record for bucket in buckets for record in bucket_records[bucket] if record["_time_"] >= first_time]
+
+        # 尾部未结束的时间段实时查询
+        tail_start = buckets[-1] + bucket_size
+        if tail_start < end_time:
+            data.extend(self.fetch(tail_start, end_time, **kwargs)[0])
+        return data
+
+
 class TimeCompareProcessor:
     """
     时间对比
@@ -106,7 +268,7 @@ class TimeCompareProcessor:
                 expression=params["expression"],
                 functions=params["functions"],
             )
-            extra_data = query.query_data(
+            extra_data = TimeBucketQueryCache(query).query_data(
                 start_time=new_params["start_time"],
                 end_time=new_params["end_time"],
                 limit=new_params["limit"],
@@ -282,63 +444,56 @@ class RankProcessor:
             # 过滤排序函数
             query_config["functions"] = [f for f in query_config["functions"] if f["id"] not in ["top", "bottom"]]
 
-            n = int(function["params"][0]["value"])
-
-            # 按均值查出所有维度的值
-            data_source_class = load_data_source(query_config["data_source_label"], query_config["data_type_label"])
-            data_source = data_source_class(bk_biz_id=params["bk_biz_id"], **query_config)
-            for i in [43200, 7200, 3600, 600, 300, 120, 60]:
-                if i < data_source.interval:
-                    break
-
-                if (params["end_time"] - params["start_time"]) / 20 > i:
-                    data_source.interval = i
-                    break
-            data_source.metrics = [data_source.metrics[0].copy()]
-            query = UnifyQuery(
-                bk_biz_id=params["bk_biz_id"],
-                data_sources=[data_source],
-                expression=query_config["metrics"][0]["alias"],
+            rank_filter = cls.query_rank_dimensions(
+                params, query_config, function["id"], int(function["params"][0]["value"])
             )
+            if rank_filter:
+                query_config["filter_dict"]["rank"] = rank_filter
 
-            points = query.query_data(
-                start_time=params["start_time"] * 1000,
-                end_time=params["end_time"] * 1000,
-                limit=1000,
-                slimit=params["slimit"],
-                not_time_align=params.get("not_time_align", False),
-            )
+        return params
 
-            metric_field = data_source.metrics[0].get("alias") or data_source.metrics[0]["field"]
-            # 按维度将值合并后进行排序
-            dimension_values = defaultdict(int)
-            for point in points:
-                dimensions = tuple(
-                    (key, value) for key, value in point.items() if key not in ["_time_", "_result_", metric_field]
-                )
-                if point["_result_"] is not None:
-                    dimension_values[dimensions] += point["_result_"]
-            dimension_value_list = [(dimensions, value) for dimensions, value in dimension_values.items()]
-            dimension_value_list.sort(key=lambda x: x[1], reverse=function["id"] == "top")
-
-            # 取前n个维度进行过滤
-            rank_filter = []
-            for dimension_value in dimension_value_list:
-                # 存在维度值为空的情况，跳过
-                if not dimension_value[0]:
-                    continue
-                rank_filter.append({key: value for key, value in dimension_value[0]})
-                if len(rank_filter) >= n:
-                    break
+    @classmethod
+    def query_rank_dimensions(cls, params: dict, query_config: dict, method: str, n: int) -> list[dict]:
+        """
+        查询排名前n的维度组合
+        聚合窗口覆盖整个查询时间范围，由统一查询模块通过即时查询完成窗口聚合及 topk/bottomk 排序，
+        每个维度组合只返回一个值，后续查询只拉取这些维度的数据
+        """
+        data_source_class = load_data_source(query_config["data_source_label"], query_config["data_type_label"])
+        data_source = data_source_class(bk_biz_id=params["bk_biz_id"], **query_config)
+        data_source.metrics = [data_source.metrics[0].copy()]
+        data_source.interval = max(params["end_time"] - params["start_time"], data_source.interval or 0)
+        query = UnifyQuery(
+            bk_biz_id=params["bk_biz_id"],
+            data_sources=[data_source],
+            expression=query_config["metrics"][0]["alias"],
+            functions=[{"id": "topk" if method == "top" else "bottomk", "params": [{"id": "k", "value": n}]}],
+        )
 
-            if rank_filter:
-                query_config["filter_dict"]["rank"] = rank_filter
+        query_kwargs = {}
+        # 不支持统一查询模块的数据源，由原始数据源按整个时间范围聚合后在下方排序
+        if query.use_unify_query():
+            query_kwargs["instant"] = True
+        points = query.query_data(
+            start_time=params["start_time"] * 1000,
+            end_time=params["end_time"] * 1000,
+            not_time_align=True,
+            **query_kwargs,
+        )
 
-            # 去除目标过滤
-            if "target" in data_source.filter_dict:
-                del data_source.filter_dict["target"]
+        metric_field = data_source.metrics[0].get("alias") or data_source.metrics[0]["field"]
+        # 按维度将值合并后进行排序，下推时每个维度只有一个值，此处仅确定维度的先后顺序
+        dimension_values = defaultdict(int)
+        for point in points:
+            dimensions = tuple(
+                (key, value) for key, value in point.items() if key not in ["_time_", "_result_", metric_field]
+            )
+            if point["_result_"] is not None:
+                dimension_values[dimensions] += point["_result_"]
+        dimension_value_list = sorted(dimension_values.items(), key=lambda x: x[1], reverse=method == "top")
 
-        return params
+        # 存在维度值为空的情况，跳过
+        return [dict(dimensions) for dimensions, _ in dimension_value_list if dimensions][:n]
 
     @classmethod
     def process_formatted_data(cls, params: dict, data: list) -> list:
@@ -880,7 +1035,7 @@ class UnifyQueryRawResource(ApiAuthResource):
         safe_push_to_gateway(registry=OPERATION_REGISTRY)
 
         query_method_map: dict[str, Callable[[Any], list[dict]]] = {
-            "query_data": query.query_data,
+            "query_data": TimeBucketQueryCache(query).query_data,
             "query_reference": query.query_reference,
         }
         query_method: Callable[[Any], list[dict]] = query_method_map.get(params.get("query_method"), query.query_data)
@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 
 import abc
 import copy
+import hashlib
 import json
 import logging
 import operator
@@ -19,8 +20,9 @@ from functools import reduce
 from typing import Any
 from collections.abc import Iterable
 
-from django.core.exceptions import EmptyResultSet
-from django.db.models import Count, Q
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.db.models import Count, Q, QuerySet
 from django.db.models.aggregates import Avg, Sum
 from django.utils.translation import gettext as _
 from rest_framework import serializers
@@ -36,7 +38,6 @@ from bkmonitor.models import (
     BCSContainer,
     BCSContainerLabels,
     BCSIngress,
-    BCSLabel,
     BCSNode,
     BCSNodeLabels,
     BCSPod,
@@ -80,6 +81,48 @@ from monitor_web.data_explorer.event import (
 
 logger = logging.getLogger("kubernetes")
 
+# 状态统计缓存时间
+STATUS_SUMMARY_CACHE_TIMEOUT = 60
+# 指标查询结果缓存时间
+METRIC_QUERY_CACHE_TIMEOUT = 60
+# 指标查询锁超时时间及等待其他请求查询结果的最长时间
+METRIC_QUERY_LOCK_TIMEOUT = 30
+METRIC_QUERY_WAIT_SECONDS = 10
+
+
+def coalesce_query(cache_key: str, func, *args, **kwargs):
+    """
+    合并相同的查询
+
+    查询结果短时间缓存，并发的相同查询只由一个请求执行，其余请求等待其结果
+    """
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    lock_key = f"{cache_key}:lock"
+    locked = cache.add(lock_key, 1, METRIC_QUERY_LOCK_TIMEOUT)
+    if not locked:
+        # 其他请求正在查询，等待其结果，超时后自行查询
+        deadline = time.time() + METRIC_QUERY_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(0.2)
+            result = cache.get(cache_key)
+            if result is not None:
+                return result
+
+    try:
+        result = func(*args, **kwargs)
+        cache.set(cache_key, result, METRIC_QUERY_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return result
+
+
+def get_query_cache_key(prefix: str, params: dict) -> str:
+    return f"kubernetes:{prefix}:{hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()}"
+
 
 def params_to_conditions(params):
     conditions = {"bk_biz_id": params["bk_biz_id"]}
@@ -103,6 +146,8 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.space_associated_clusters = {}
+        self.status_summary = None
+        self.monitor_status = None
 
     def get_columns(self):
         return self.model_class.get_columns()
@@ -143,6 +188,8 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
         view_options["condition_list"] = params.get("condition_list", [])
         view_options["page"] = params.get("page", 1)
         view_options["page_size"] = params.get("page_size", 10)
+        if "cursor" in params:
+            view_options["cursor"] = params["cursor"]
         view_options["sort"] = params.get("sort")
         view_options["filter_dict"] = params.get("filter_dict", {})
         view_options["monitor_status"] = params.get("status", "all")
@@ -164,6 +211,7 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
         self.add_column_filter(view_options)
 
         # 计算每种状态的资源数量
+        self.status_summary = None
         status_filter_data = self.get_status_filter_data(view_options)
         # 添加根据数据状态过滤的条件
         self.add_monitor_status_filter(view_options)
@@ -203,6 +251,9 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
         }
         if overview_data_rendered:
             results["overview_data"] = overview_data_rendered
+        # 按游标分页时返回下一页的游标
+        if "cursor" in view_options:
+            results["next_cursor"] = self.get_next_cursor(view_options)
 
         return results
 
@@ -410,6 +461,12 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
         """计算资源总数 ."""
         if not self.query_set_list:
             return 0
+        if self.status_summary is not None:
+            # 由状态统计得到总数，不再单独count
+            status_param = self.monitor_status
+            if status_param and status_param != "all":
+                return self.status_summary.get(status_param, 0)
+            return sum(self.status_summary.values())
         return self.model_class.objects.filter(*self.query_set_list).count()
 
     def get_sort(self, params: dict) -> str:
@@ -430,22 +487,69 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
             return f"-{sort_field}"
         return sort_field
 
+    def get_cursor_filter(self, cursor: str, sort_field: str) -> Q | None:
+        """
+        根据游标生成翻页条件，游标为上一页最后一条记录的ID，按排序列及ID定位
+
+        排序列可为空或游标记录已删除时返回None，使用页码分页
+        """
+        try:
+            last_id = int(cursor)
+        except (TypeError, ValueError):
+            return None
+
+        if not sort_field:
+            return Q(id__gt=last_id)
+
+        field_name = sort_field.lstrip("-")
+        try:
+            if self.model_class._meta.get_field(field_name).null:
+                return None
+        except FieldDoesNotExist:
+            return None
+
+        last_values = self.model_class.objects.filter(id=last_id).values_list(field_name, flat=True)
+        if not last_values:
+            return None
+        last_value = last_values[0]
+
+        lookup = "lt" if sort_field.startswith("-") else "gt"
+        return Q(**{f"{field_name}__{lookup}": last_value}) | Q(**{field_name: last_value, f"id__{lookup}": last_id})
+
+    def get_page_queryset(self, queryset: QuerySet, params: dict):
+        """取一页数据，传入游标时按游标翻页，否则按页码偏移 ."""
+        page_size = params.get("page_size", 10)
+        sort_field = self.get_sort(params)
+        # 以ID作为排序的第二列，保证翻页顺序稳定
+        if sort_field:
+            queryset = queryset.order_by(sort_field, "-id" if sort_field.startswith("-") else "id")
+        else:
+            queryset = queryset.order_by("id")
+
+        cursor = params.get("cursor")
+        if cursor:
+            cursor_q = self.get_cursor_filter(cursor, sort_field)
+            if cursor_q is not None:
+                return queryset.filter(cursor_q)[:page_size]
+
+        page = params.get("page", 1)
+        offset = (page - 1) * page_size
+        return queryset[offset : offset + page_size]
+
+    def get_next_cursor(self, params: dict) -> str | None:
+        """获得下一页的游标，没有下一页时返回None ."""
+        page_size = params.get("page_size", 10)
+        data = list(self.data)
+        if not data or len(data) < page_size:
+            return None
+        return str(data[-1].id)
+
     def pagination_data(self, params: dict):
         """获得分页后的数据 ."""
         if not self.query_set_list:
             # 如果label查询失败空
             return []
-        page = params.get("page", 1)
-        page_size = params.get("page_size", 10)
-        offset = (page - 1) * page_size
-        sort_field = self.get_sort(params)
-        if sort_field:
-            result_data = self.model_class.objects.order_by(sort_field).filter(*self.query_set_list)[
-                offset : offset + page_size
-            ]
-        else:
-            result_data = self.model_class.objects.filter(*self.query_set_list)[offset : offset + page_size]
-        self.data = result_data
+        self.data = self.get_page_queryset(self.model_class.objects.filter(*self.query_set_list), params)
 
     def patch_status_filter_data_wrap(self, data: dict) -> list:
         return [
@@ -469,10 +573,25 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
             },
         ]
 
+    def get_status_summary(self) -> dict:
+        """统计每种数据状态的资源数量，相同查询条件的统计结果短时间缓存 ."""
+        queryset = self.model_class.objects.filter(*self.query_set_list)
+        try:
+            cache_key = get_query_cache_key("status_summary", {"query": str(queryset.query)})
+        except EmptyResultSet:
+            return {}
+
+        status_summary = cache.get(cache_key)
+        if status_summary is None:
+            status_summary = self.model_class.objects.count_monitor_status_quantity(self.query_set_list)
+            cache.set(cache_key, status_summary, STATUS_SUMMARY_CACHE_TIMEOUT)
+        return status_summary
+
     def get_status_filter_data(self, params: dict) -> list:
         """计算每种状态的资源数量 ."""
-        status_summary = self.model_class.objects.count_monitor_status_quantity(self.query_set_list)
-        return self.patch_status_filter_data_wrap(status_summary)
+        self.status_summary = self.get_status_summary()
+        self.monitor_status = params.get("monitor_status")
+        return self.patch_status_filter_data_wrap(self.status_summary)
 
     def rendered_data(self, params):
         bk_biz_id = params["bk_biz_id"]
@@ -496,19 +615,11 @@ class KubernetesResource(ApiAuthResource, abc.ABC):
         if not cluster_ids:
             return condition_list
 
-        label_ids = [
-            item["label_id"]
-            for item in self.model_label_class.objects.filter(bcs_cluster_id__in=cluster_ids)
-            .values("label_id")
-            .distinct()
-        ]
-        labels = BCSLabel.objects.filter(hash_id__in=label_ids)
-        label_key_map_values = {}
-        for label in labels:
-            label_key_map_values.setdefault(label.key, []).append(label.value)
+        # 使用按集群缓存的标签索引
+        label_key_map_values = self.model_class.get_label_index(cluster_ids)
 
         for key, values in label_key_map_values.items():
-            values = sorted(list(set(values)))
+            values = sorted(values)
             condition_list.append(
                 {
                     "name": key,
@@ -685,13 +796,20 @@ class GetKubernetesGrafanaMetricRecords(ApiAuthResource, abc.ABC):
         start_time = request_data.get("start_time")
         end_time = request_data.get("end_time")
         if not start_time:
-            end_time = int(time.time())
-            start_time = int(time.time() - 3600)
+            # 默认时间范围按分钟对齐，便于合并相同的查询
+            end_time = int(time.time()) // 60 * 60
+            start_time = end_time - 3600
         request_data["start_time"] = int(start_time)
         request_data["end_time"] = int(end_time)
 
         return request_data
 
+    @classmethod
+    def request_graph_unify_query_coalesced(cls, validated_request_data) -> tuple:
+        """相同的指标查询合并执行 ."""
+        cache_key = get_query_cache_key(f"graph_unify_query:{cls.__name__}", validated_request_data)
+        return coalesce_query(cache_key, cls.request_graph_unify_query, validated_request_data)
+
     @staticmethod
     def request_graph_unify_query(validated_request_data) -> tuple:
         bk_biz_id = validated_request_data["bk_biz_id"]
@@ -738,9 +856,13 @@ class GetKubernetesGrafanaMetricRecords(ApiAuthResource, abc.ABC):
         return False
 
     def request_performance_data(self, validated_request_data: dict) -> list:
-        pool = ThreadPool()
         args = self.build_graph_unify_query_iterable(validated_request_data)
-        performance_data = pool.map(self.request_graph_unify_query, args)
+        if len(args) <= 1:
+            # 单个查询无需使用线程池
+            return [self.request_graph_unify_query_coalesced(arg) for arg in args]
+
+        pool = ThreadPool(len(args))
+        performance_data = pool.map(self.request_graph_unify_query_coalesced, args)
         pool.close()
         pool.join()
         return performance_data
@@ -1383,26 +1505,26 @@ class GetKubernetesNodeList(KubernetesResource):
             filter_q &= control_plane_q
         return filter_q
 
+    def is_client_sort(self, params: dict) -> bool:
+        sort = params.get("sort")
+        return bool(sort) and sort.lstrip("-") in self.client_sort_fields
+
     def pagination_data(self, params: dict):
         """获得分页后的数据 ."""
         if not self.query_set_list:
             return []
-        page = params.get("page", 1)
-        page_size = params.get("page_size", 10)
-        offset = (page - 1) * page_size
-        sort_field = self.get_sort(params)
-        if sort_field:
-            if sort_field not in self.client_sort_fields:
-                # 取一页数据
-                result_data = self.model_class.objects.order_by(sort_field).filter(*self.query_set_list)[
-                    offset : offset + page_size
-                ]
-            else:
-                # 如果排序列是资源使用率列，则取全部数据，用于按资源使用率排序，排序后再取指定页
-                result_data = self.model_class.objects.order_by(sort_field).filter(*self.query_set_list)
+        if self.is_client_sort(params):
+            # 如果排序列是资源使用率列，则取全部数据，用于按资源使用率排序，排序后再取指定页
+            self.data = self.model_class.objects.filter(*self.query_set_list)
         else:
-            result_data = self.model_class.objects.filter(*self.query_set_list)[offset : offset + page_size]
-        self.data = result_data
+            # 取一页数据
+            self.data = self.get_page_queryset(self.model_class.objects.filter(*self.query_set_list), params)
+
+    def get_next_cursor(self, params: dict) -> str | None:
+        # 按资源使用率排序时只支持页码分页
+        if self.is_client_sort(params):
+            return None
+        return super().get_next_cursor(params)
 
     def get_overview_data(self, params, data):
         bk_biz_id = params["bk_biz_id"]
@@ -1426,16 +1548,19 @@ class GetKubernetesNodeList(KubernetesResource):
     def get_performance_data(self, bk_biz_id, group_by):
         """获得资源使用率 ."""
         if not self.performance_data:
-            node_ips = [item.ip for item in self.data]
-            performance_data = api.kubernetes.fetch_k8s_node_performance(
-                {
-                    "bk_biz_id": bk_biz_id,
-                    "overview": True,
-                    "group_by": group_by,
-                    "node_ips": node_ips,
-                }
+            node_ips = sorted(item.ip for item in self.data)
+            query_params = {
+                "bk_biz_id": bk_biz_id,
+                "overview": True,
+                "group_by": group_by,
+                "node_ips": node_ips,
+            }
+            # 相同页面的查询合并执行
+            self.performance_data = coalesce_query(
+                get_query_cache_key("node_performance", query_params),
+                api.kubernetes.fetch_k8s_node_performance,
+                query_params,
             )
-            self.performance_data = performance_data
         return self.performance_data
 
     def render_overview_data(self, params, overview_data, columns):
@@ -22,3 +22,4 @@ class KubernetesListRequestSerializer(serializers.Serializer):
     sort = serializers.CharField(required=False, allow_null=True, label="排序", allow_blank=True)
     page = serializers.IntegerField(required=False, allow_null=True, label="页码")
     page_size = serializers.IntegerField(required=False, allow_null=True, label="每页条数")
+    cursor = serializers.CharField(required=False, allow_null=True, allow_blank=True, label="分页游标")
@@ -9,18 +9,21 @@ specific language governing permissions and limitations under the License.
 """
 
 import copy
+import hashlib
+import json
 import logging
 import re
 import time
 from collections import defaultdict
 from collections.abc import Generator
-from datetime import datetime
 from functools import reduce
 from typing import Any
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Max, Q
+from django.utils import timezone
 from django.utils.translation import gettext as _
 from django.utils.translation import gettext_lazy as _lazy
 
@@ -84,6 +87,7 @@ from monitor_web.strategies.metric_cache.built_in_metrics import (
     SYSTEM_HOST_METRICS,
     UPTIMECHECK_METRICS,
 )
+from monitor_web.strategies.metric_search import MetricSearchResult
 from monitor_web.tasks import run_metric_manager_async
 
 FILTER_DIMENSION_LIST = ["time", "bk_supplier_id", "bk_cmdb_level", "timestamp"]
@@ -191,8 +195,6 @@ UPTIMECHECK_MAP = {
     "ICMP": [],
 }
 
-METRIC_POOL_KEYS = ["id", "metric_md5", "bk_biz_id", "result_table_id", "metric_field", "related_id", "readable_name"]
-
 
 class BaseMetricCacheManager:
     """
@@ -200,6 +202,10 @@ class BaseMetricCacheManager:
     """
 
     data_sources = (("", ""),)
+    # 批量写入数据库的指标数量
+    BATCH_SIZE = 500
+    # 表指标指纹的缓存时间，过期后全量对比一次
+    TABLE_FINGERPRINT_CACHE_TIMEOUT = 60 * 60 * 24
 
     def __init__(self, bk_tenant_id: str, bk_biz_id: int | None = None):
         self.bk_biz_id = bk_biz_id
@@ -262,62 +268,49 @@ class BaseMetricCacheManager:
             .annotate(use_frequency=Count("metric_id"))
         }
 
-    def _run(self):
+    def format_metric(self, metric: dict) -> dict | None:
         """
-        对比数据库已有数据， 实现指标缓存的增量更新
+        补全指标数据，无需缓存的指标返回 None
         """
-        start_time = time.time()
-        logger.info(f"[start] update metric {self.__class__.__name__}({self.bk_biz_id})")
-
-        # 集中整理后进行差量更新
-        to_be_create = []
-        to_be_update = []
-        to_be_delete = []
-        self.refresh_metric_use_frequency()
-
-        metric_pool = self.get_metric_pool()
-        if self.bk_biz_id is not None:
-            metric_pool = metric_pool.filter(bk_biz_id=self.bk_biz_id)
-        metric_pool_values = metric_pool.only(*METRIC_POOL_KEYS)
-
-        # metric_hash_dict(当前数据库[缓存]中的指标)
-        metric_hash_dict = {}
-        for m in list(metric_pool_values):
-            metric_id = f"{m.bk_biz_id}.{m.result_table_id}.{m.metric_field}.{m.related_id}"
-            if metric_id in metric_hash_dict:
-                to_be_delete.append(m.pk)
-            else:
-                metric_hash_dict[metric_id] = m
+        # 处理result_table_id长度
+        if len(metric.get("result_table_id", "")) > 256:
+            metric["result_table_id"] = metric["result_table_id"][:256]
+
+        if metric.get("result_table_id", "") in ["bkunifylogbeat_task.base", "bkunifylogbeat_common.base"]:
+            return None
+
+        # 补全维度字段
+        dimensions = metric.get("dimensions", [])
+        for dimension in dimensions:
+            if "is_dimension" not in dimension:
+                dimension["is_dimension"] = True
+            if "type" not in dimension:
+                dimension["type"] = DimensionFieldType.String
+
+        # 更新metric使用频率
+        metric.update(
+            dict(
+                use_frequency=self.metric_use_frequency.get(
+                    f"{metric.get('data_source_label', '')}."
+                    f"{metric.get('result_table_id', '')}.{metric['metric_field']}",
+                    0,
+                )
+            )
+        )
+        return metric
 
-        # 遍历非缓存数据[最新数据]
+    def iter_table_metrics(self) -> Generator[dict[str, dict], None, None]:
+        """
+        逐表生成去重后的指标 {metric_id: metric}，同一时间只保留一张表的指标
+        """
         processed_metric_ids: set[str] = set()
         for table in self.get_tables():
+            metrics = {}
             for metric in self.get_metrics_by_table(table):
-                # 处理result_table_id长度
-                if len(metric.get("result_table_id", "")) > 256:
-                    metric["result_table_id"] = metric["result_table_id"][:256]
-
-                if metric.get("result_table_id", "") in ["bkunifylogbeat_task.base", "bkunifylogbeat_common.base"]:
+                metric = self.format_metric(metric)
+                if metric is None:
                     continue
 
-                # 补全维度字段
-                dimensions = metric.get("dimensions", [])
-                for dimension in dimensions:
-                    if "is_dimension" not in dimension:
-                        dimension["is_dimension"] = True
-                    if "type" not in dimension:
-                        dimension["type"] = DimensionFieldType.String
-
-                # 更新metric使用频率
-                metric.update(
-                    dict(
-                        use_frequency=self.metric_use_frequency.get(
-                            f"{metric.get('data_source_label', '')}."
-                            f"{metric.get('result_table_id', '')}.{metric['metric_field']}",
-                            0,
-                        )
-                    )
-                )
                 # 生成指标的唯一标识符
                 metric_id = "{}.{}.{}.{}".format(
                     metric["bk_biz_id"],
@@ -330,61 +323,165 @@ class BaseMetricCacheManager:
                 if metric_id in processed_metric_ids:
                     continue
                 processed_metric_ids.add(metric_id)
+                metrics[metric_id] = metric
 
-                metric_instance = metric_hash_dict.pop(metric_id, None)
-                # 处理新增指标
-                if metric_instance is None:
-                    _metric = MetricListCache(bk_tenant_id=self.bk_tenant_id, **metric)
-                    metric["readable_name"] = _metric.get_human_readable_name()
-                    _metric.readable_name = metric["readable_name"]
-                    _metric.metric_md5 = count_md5(metric)
+            if metrics:
+                yield metrics
 
-                    logger.info("Going to add %s to cache creating list", metric_id)
-                    to_be_create.append(_metric)
-                    continue
+    @staticmethod
+    def count_table_fingerprint(metrics: dict[str, dict]) -> str:
+        """
+        计算表下指标内容的指纹，整体序列化后计算，避免逐个指标递归计算 md5
+        """
+        content = json.dumps(metrics, sort_keys=True, default=str)
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+    @property
+    def table_fingerprint_cache_key(self) -> str:
+        return f"metric_list_cache.table_fingerprints.{self.bk_tenant_id}.{self.__class__.__name__}.{self.bk_biz_id}"
+
+    @classmethod
+    def bulk_update_metrics(cls, metrics: list[MetricListCache]):
+        """
+        对比数据库中的数据，仅更新有变化的字段
+        """
+        fields = [
+            field.name
+            for field in MetricListCache._meta.get_fields(include_parents=False)
+            if not field.auto_created and field.name not in ["last_update", "metric_md5"]
+        ]
+        origin_metrics = MetricListCache.objects.only(*fields).in_bulk([metric.id for metric in metrics])
+
+        # 按变更字段分组批量更新
+        metric_groups: dict[tuple, list[MetricListCache]] = defaultdict(list)
+        now = timezone.now()
+        for metric in metrics:
+            origin_metric = origin_metrics.get(metric.id)
+            if origin_metric is None:
+                continue
+            changed_fields = tuple(field for field in fields if getattr(origin_metric, field) != getattr(metric, field))
+            metric.last_update = now
+            metric_groups[changed_fields].append(metric)
+
+        for changed_fields, group_metrics in metric_groups.items():
+            MetricListCache.objects.bulk_update(
+                group_metrics, [*changed_fields, "metric_md5", "last_update"], batch_size=cls.BATCH_SIZE
+            )
+
+    def _run(self):
+        """
+        对比数据库已有数据， 实现指标缓存的增量更新
+        逐表对比，指标内容与上次同步一致的表直接跳过
+        """
+        start_time = time.time()
+        logger.info(f"[start] update metric {self.__class__.__name__}({self.bk_biz_id})")
+
+        create_count, update_count, skip_count = 0, 0, 0
+        to_be_create: list[MetricListCache] = []
+        to_be_update: list[MetricListCache] = []
+        to_be_delete = []
+        # 指标发生变更的业务，用于重建对应业务的指标检索索引
+        changed_biz_ids: set[int] = set()
+        self.refresh_metric_use_frequency()
+
+        metric_pool = self.get_metric_pool()
+        if self.bk_biz_id is not None:
+            metric_pool = metric_pool.filter(bk_biz_id=self.bk_biz_id)
+
+        # metric_index(当前数据库[缓存]中的指标)，仅加载指标标识及md5
+        metric_index: dict[str, tuple[int, str | None]] = {}
+        metric_pool_values = metric_pool.values_list(
+            "id", "bk_biz_id", "result_table_id", "metric_field", "related_id", "metric_md5"
+        )
+        for pk, bk_biz_id, result_table_id, metric_field, related_id, metric_md5 in metric_pool_values.iterator(
+            chunk_size=self.BATCH_SIZE * 10
+        ):
+            metric_id = f"{bk_biz_id}.{result_table_id}.{metric_field}.{related_id}"
+            if metric_id in metric_index:
+                to_be_delete.append(pk)
+                changed_biz_ids.add(bk_biz_id)
+            else:
+                metric_index[metric_id] = (pk, metric_md5)
 
+        # 遍历非缓存数据[最新数据]
+        last_fingerprints = set(cache.get(self.table_fingerprint_cache_key) or [])
+        fingerprints = []
+        for metrics in self.iter_table_metrics():
+            fingerprint = self.count_table_fingerprint(metrics)
+
+            # 表下指标与上次同步一致且均已入库，跳过对比
+            if fingerprint in last_fingerprints and all(
+                metric_index.get(metric_id, (None, None))[1] for metric_id in metrics
+            ):
+                for metric_id in metrics:
+                    metric_index.pop(metric_id)
+                fingerprints.append(fingerprint)
+                skip_count += len(metrics)
+                continue
+
+            for metric_id, metric in metrics.items():
+                pk, metric_md5 = metric_index.pop(metric_id, (None, None))
+                _metric = MetricListCache(bk_tenant_id=self.bk_tenant_id, **metric)
                 # readable_name 可能会因用户修改data_label而变更，因此跟随周期任务自动更新
-                metric["readable_name"] = metric_instance.get_human_readable_name()
+                metric["readable_name"] = _metric.get_human_readable_name()
+                _metric.readable_name = metric["readable_name"]
+                _metric.metric_md5 = count_md5(metric)
 
-                metric["metric_md5"] = count_md5(metric)
+                # 处理新增指标
+                if pk is None:
+                    logger.info("Going to add %s to cache creating list", metric_id)
+                    to_be_create.append(_metric)
+                    changed_biz_ids.add(_metric.bk_biz_id)
                 # 处理更新逻辑
-                if not metric_instance.metric_md5 or metric_instance.metric_md5 != metric["metric_md5"]:
-                    metric["last_update"] = datetime.now()
+                elif metric_md5 != _metric.metric_md5:
                     logger.info(f"Going to adding {metric_id} to cache updating list")
-                    metric["id"] = metric_instance.id
-                    to_be_update.append(metric)
-                    metric_instance.metric_md5 = metric["metric_md5"]
+                    _metric.id = pk
+                    to_be_update.append(_metric)
+                    changed_biz_ids.add(_metric.bk_biz_id)
+            fingerprints.append(fingerprint)
+
+            # 分批写入，避免在内存中积累全部指标
+            if len(to_be_create) >= self.BATCH_SIZE:
+                MetricListCache.objects.bulk_create(to_be_create, batch_size=self.BATCH_SIZE)
+                create_count += len(to_be_create)
+                to_be_create = []
+            if len(to_be_update) >= self.BATCH_SIZE:
+                self.bulk_update_metrics(to_be_update)
+                update_count += len(to_be_update)
+                to_be_update = []
 
         # create
         if to_be_create:
             logger.info("Going to bulk create %s metric caches", len(to_be_create))
-            MetricListCache.objects.bulk_create(to_be_create, batch_size=50)
+            MetricListCache.objects.bulk_create(to_be_create, batch_size=self.BATCH_SIZE)
+            create_count += len(to_be_create)
 
         # update
         if to_be_update:
             logger.info("Going to bulk update %s metric caches", len(to_be_update))
-            for metrics in chunks(to_be_update, 500):
-                init_md5_metrics = []
-                for metric in metrics:
-                    _metric = MetricListCache(**metric)
-                    init_md5_metrics.append(_metric)
-                fields = [
-                    field.name
-                    for field in MetricListCache._meta.get_fields(include_parents=False)
-                    if not field.auto_created
-                ]
-                MetricListCache.objects.bulk_update(init_md5_metrics, fields, batch_size=500)
+            self.bulk_update_metrics(to_be_update)
+            update_count += len(to_be_update)
 
         # clean (手动添加的自定义指标标记md5为0，不做删除处理）
-        to_be_delete.extend([m.id for m in list(metric_hash_dict.values()) if m.metric_md5 != "0"])
+        for metric_id, (pk, metric_md5) in metric_index.items():
+            if metric_md5 != "0":
+                to_be_delete.append(pk)
+                # metric_id 以业务ID开头
+                changed_biz_ids.add(int(metric_id.split(".", 1)[0]))
         if to_be_delete:
-            logger.info("Going to delete metric caches %s", list(metric_hash_dict.keys()))
-            MetricListCache.objects.filter(id__in=to_be_delete).delete()
+            logger.info("Going to delete metric caches %s", list(metric_index.keys()))
+            for ids in chunks(to_be_delete, self.BATCH_SIZE):
+                MetricListCache.objects.filter(id__in=ids).delete()
+
+        cache.set(self.table_fingerprint_cache_key, fingerprints, self.TABLE_FINGERPRINT_CACHE_TIMEOUT)
+        # 指标有变更时，重建对应业务的指标检索索引
+        if changed_biz_ids:
+            MetricSearchResult.refresh(self.bk_tenant_id, changed_biz_ids)
 
         logger.info(
             f"[end] update metric {self.__class__.__name__}({self.bk_biz_id}) "
-            f"create {len(to_be_create)} metric,update {len(to_be_update)} metric, delete {len(to_be_delete)} metric."
-            f"timestamp: {int(start_time)}, cost {time.time() - start_time}s"
+            f"create {create_count} metric,update {update_count} metric, delete {len(to_be_delete)} metric, "
+            f"skip {skip_count} metric. timestamp: {int(start_time)}, cost {time.time() - start_time}s"
         )
 
     def run(self, delay=False):
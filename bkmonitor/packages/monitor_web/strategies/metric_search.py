@@ -0,0 +1,381 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import heapq
+import pickle
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Callable, Iterable
+from functools import reduce
+from itertools import chain
+from operator import or_
+
+from django.core.cache import cache
+
+from bkmonitor.models.metric_list_cache import MetricListCache
+
+
+def to_bitmap(positions: Iterable[int]) -> int:
+    """
+    行号列表转换为位图
+    """
+    bits = bytearray()
+    for position in positions:
+        index = position >> 3
+        if index >= len(bits):
+            bits.extend(bytes(index - len(bits) + 1))
+        bits[index] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+def iter_bitmap(bitmap: int) -> Iterable[int]:
+    """
+    按行号升序遍历位图
+    """
+    bits = bin(bitmap)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def get_trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class MetricSearchIndex:
+    """
+    单个业务下指标缓存的内存检索索引
+    指标按使用频率降序排列，以行号标识，检索及过滤结果均以位图表示
+    - 模糊检索: 对检索字段的去重值建立 trigram 倒排索引，命中后校验子串，与 icontains 语义一致
+    - 分面过滤: 低基数字段预计算位图，高基数字段保存行号列表，使用时再转换为位图
+    """
+
+    SEARCH_FIELDS = ("data_label", "result_table_id", "metric_field", "metric_field_name")
+    BITMAP_FACET_FIELDS = ("data_source_label", "data_type_label", "result_table_label")
+    FACET_FIELDS = (*BITMAP_FACET_FIELDS, "result_table_id", "related_id")
+    ROW_FIELDS = (
+        "id",
+        "use_frequency",
+        "metric_field",
+        "metric_field_name",
+        "data_label",
+        "result_table_id",
+        "result_table_name",
+        "result_table_label",
+        "related_id",
+        "related_name",
+        "data_source_label",
+        "data_type_label",
+    )
+
+    def __init__(self, rows: list[dict], version=None):
+        rows = sorted(rows, key=lambda row: (-row["use_frequency"], row["id"]))
+        self.size = len(rows)
+        self.all = (1 << self.size) - 1
+        self.version = version
+
+        # 按列存储，重复的字段值共用同一个字符串
+        self.columns = {
+            field: [row[field] if field in ("id", "use_frequency") else sys.intern(row[field] or "") for row in rows]
+            for field in self.ROW_FIELDS
+        }
+
+        # 行已按使用频率降序排列，常用指标为连续的前缀
+        used_count = sum(1 for use_frequency in self.columns["use_frequency"] if use_frequency > 0)
+        self.common_used = (1 << used_count) - 1
+
+        self.value_ids: dict[str, dict[str, int]] = {}
+        self.values: dict[str, list[str]] = {}
+        self.value_rows: dict[str, list[array]] = {}
+        self.trigrams: dict[str, dict[str, array]] = {}
+        for field in self.SEARCH_FIELDS:
+            self.build_search_field(field)
+
+        self.facets: dict[str, dict] = {field: defaultdict(list) for field in self.FACET_FIELDS}
+        for position in range(self.size):
+            for field in self.FACET_FIELDS:
+                self.facets[field][self.columns[field][position]].append(position)
+        self.bitmaps: dict[str, dict] = {
+            field: {value: to_bitmap(positions) for value, positions in self.facets.pop(field).items()}
+            for field in self.BITMAP_FACET_FIELDS
+        }
+        self.bitmaps["data_source"] = {}
+        for data_source_label, source_bitmap in self.bitmaps["data_source_label"].items():
+            for data_type_label, type_bitmap in self.bitmaps["data_type_label"].items():
+                bitmap = source_bitmap & type_bitmap
+                if bitmap:
+                    self.bitmaps["data_source"][(data_source_label, data_type_label)] = bitmap
+
+    def build_search_field(self, field: str):
+        value_ids = {}
+        value_rows = []
+        for position, value in enumerate(self.columns[field]):
+            value = value.lower()
+            if value not in value_ids:
+                value_ids[value] = len(value_rows)
+                value_rows.append(array("I"))
+            value_rows[value_ids[value]].append(position)
+
+        trigrams = defaultdict(lambda: array("I"))
+        for value, value_id in value_ids.items():
+            for trigram in get_trigrams(value):
+                trigrams[trigram].append(value_id)
+
+        self.value_ids[field] = value_ids
+        self.values[field] = list(value_ids)
+        self.value_rows[field] = value_rows
+        self.trigrams[field] = dict(trigrams)
+
+    def contains(self, field: str, keyword: str) -> int:
+        """
+        字段包含关键字(不区分大小写)的指标
+        """
+        keyword = keyword.lower()
+        values = self.values[field]
+        if len(keyword) < 3:
+            candidates = range(len(values))
+        else:
+            postings = [self.trigrams[field].get(trigram) for trigram in get_trigrams(keyword)]
+            if not all(postings):
+                return 0
+            candidates = min(postings, key=len)
+
+        value_rows = self.value_rows[field]
+        return to_bitmap(
+            chain.from_iterable(value_rows[value_id] for value_id in candidates if keyword in values[value_id])
+        )
+
+    def exact(self, field: str, value: str) -> int:
+        """
+        字段等于指定值(不区分大小写)的指标
+        """
+        value_id = self.value_ids[field].get(value.lower())
+        if value_id is None:
+            return 0
+        return to_bitmap(self.value_rows[field][value_id])
+
+    def facet(self, field: str, value) -> int:
+        if field in self.bitmaps:
+            return self.bitmaps[field].get(value, 0)
+        return to_bitmap(self.facets[field].get(value, []))
+
+    def search(self, query: str) -> int:
+        """
+        模糊检索，与 GetMetricListV2Resource.filter_by_conditions 中 query 条件的匹配规则一致
+        """
+        bitmap = reduce(or_, (self.contains(field, query) for field in self.SEARCH_FIELDS), 0)
+
+        query = query.strip()
+        # promql格式的查询
+        if ":" in query:
+            fields = query.split(":")
+            if fields[0] in ["custom", "bkmonitor"]:
+                fields = fields[1:]
+            fields = [field.strip() for field in fields if field.strip()]
+
+            if len(fields) == 3:
+                bitmap |= self.exact("result_table_id", f"{fields[0]}.{fields[1]}") & self.contains(
+                    "metric_field", fields[2]
+                )
+            elif len(fields) == 2:
+                bitmap |= self.exact("data_label", fields[0]) & self.contains("metric_field", fields[1])
+            return bitmap
+
+        # metric_id格式的查询
+        fields = query.split(".")
+        if len(fields) == 2:
+            bitmap |= (self.exact("data_label", fields[0]) | self.exact("result_table_id", fields[0])) & self.contains(
+                "metric_field", fields[1]
+            )
+        elif len(fields) >= 3:
+            bitmap |= self.exact("result_table_id", ".".join(fields[:2])) & self.contains(
+                "metric_field", ".".join(fields[2:])
+            )
+        return bitmap
+
+    def rank(self, bitmap: int, queries: list[str]) -> Iterable[tuple]:
+        """
+        命中指标的排序键 (匹配程度, -使用频率, 指标ID)
+        指标名与查询完全一致的排在最前，其次为前缀匹配，同等匹配程度按使用频率排序
+        """
+        keywords = [query.strip().lower() for query in queries if query.strip()]
+        columns = self.columns
+        for position in iter_bitmap(bitmap):
+            score = 2
+            if keywords:
+                metric_field = columns["metric_field"][position].lower()
+                names = (
+                    metric_field,
+                    f"{columns['data_label'][position]}.{metric_field}".lower(),
+                    f"{columns['result_table_id'][position]}.{metric_field}".lower(),
+                )
+                for keyword in keywords:
+                    if keyword in names:
+                        score = 0
+                        break
+                    if any(name.startswith(keyword) for name in names):
+                        score = 1
+            yield score, -columns["use_frequency"][position], columns["id"][position]
+
+    def count_by(self, bitmap: int, field: str) -> dict:
+        return {
+            value: count
+            for value, value_bitmap in self.bitmaps[field].items()
+            if (count := (bitmap & value_bitmap).bit_count())
+        }
+
+    def group_by(self, bitmap: int, fields: list[str]) -> Counter:
+        columns = [self.columns[field] for field in fields]
+        return Counter(tuple(column[position] for column in columns) for position in iter_bitmap(bitmap))
+
+
+class MetricSearchResult:
+    """
+    指标检索结果，由全局(业务0)及当前业务的索引共同组成，以位图记录各索引中命中的指标
+    """
+
+    # 进程内缓存的索引数量
+    INDEX_CACHE_SIZE = 32
+    # 持久化索引的缓存时间(秒)，仅用于回收长期无变更业务的缓存，索引的有效性由版本号决定
+    INDEX_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+    _indexes: OrderedDict = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, bitmaps: list[tuple[MetricSearchIndex, int]]):
+        self.bitmaps = bitmaps
+
+    @staticmethod
+    def get_version_key(bk_tenant_id: str, bk_biz_id: int) -> str:
+        return f"metric_search_index.version.{bk_tenant_id}.{bk_biz_id}"
+
+    @staticmethod
+    def get_index_key(bk_tenant_id: str, bk_biz_id: int) -> str:
+        return f"metric_search_index.data.{bk_tenant_id}.{bk_biz_id}"
+
+    @staticmethod
+    def load_rows(bk_tenant_id: str, bk_biz_id: int) -> list[dict]:
+        rows = MetricListCache.objects.filter(bk_tenant_id=bk_tenant_id, bk_biz_id=bk_biz_id).values(
+            *MetricSearchIndex.ROW_FIELDS
+        )
+        return list(rows.iterator(chunk_size=5000))
+
+    @classmethod
+    def build_index(cls, bk_tenant_id: str, bk_biz_id: int, version) -> MetricSearchIndex:
+        """
+        从指标缓存构建索引并持久化，供各进程直接加载
+        """
+        index = MetricSearchIndex(cls.load_rows(bk_tenant_id, bk_biz_id), version=version)
+        cache.set(
+            cls.get_index_key(bk_tenant_id, bk_biz_id),
+            zlib.compress(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL)),
+            cls.INDEX_CACHE_TIMEOUT,
+        )
+        return index
+
+    @classmethod
+    def refresh(cls, bk_tenant_id: str, bk_biz_ids: Iterable[int]):
+        """
+        指标缓存变更后由刷新任务调用，重建变更业务的索引并更新版本号，各进程按版本号重新加载
+        """
+        for bk_biz_id in set(bk_biz_ids):
+            version = time.time()
+            cls.build_index(bk_tenant_id, bk_biz_id, version)
+            cache.set(cls.get_version_key(bk_tenant_id, bk_biz_id), version, None)
+
+    @classmethod
+    def load_index(cls, bk_tenant_id: str, bk_biz_id: int, version) -> MetricSearchIndex:
+        """
+        加载持久化的索引，不存在或版本不一致时(缓存被回收、尚未刷新过)才从指标缓存构建
+        """
+        data = cache.get(cls.get_index_key(bk_tenant_id, bk_biz_id))
+        if data:
+            index = pickle.loads(zlib.decompress(data))
+            if index.version == version:
+                return index
+
+        if version is None:
+            version = time.time()
+            if not cache.add(cls.get_version_key(bk_tenant_id, bk_biz_id), version, None):
+                version = cache.get(cls.get_version_key(bk_tenant_id, bk_biz_id))
+        return cls.build_index(bk_tenant_id, bk_biz_id, version)
+
+    @classmethod
+    def get_index(cls, bk_tenant_id: str, bk_biz_id: int) -> MetricSearchIndex:
+        version = cache.get(cls.get_version_key(bk_tenant_id, bk_biz_id))
+        scope = (bk_tenant_id, bk_biz_id)
+        with cls._lock:
+            index = cls._indexes.get(scope)
+            if index and version is not None and index.version == version:
+                cls._indexes.move_to_end(scope)
+                return index
+
+        index = cls.load_index(bk_tenant_id, bk_biz_id, version)
+
+        with cls._lock:
+            cls._indexes[scope] = index
+            cls._indexes.move_to_end(scope)
+            while len(cls._indexes) > cls.INDEX_CACHE_SIZE:
+                cls._indexes.popitem(last=False)
+        return index
+
+    @classmethod
+    def from_scope(cls, bk_tenant_id: str, bk_biz_ids: list[int]) -> "MetricSearchResult":
+        indexes = [cls.get_index(bk_tenant_id, bk_biz_id) for bk_biz_id in bk_biz_ids]
+        return cls([(index, index.all) for index in indexes])
+
+    def apply(self, func: Callable[[MetricSearchIndex], int]) -> "MetricSearchResult":
+        return MetricSearchResult([(index, bitmap & func(index)) for index, bitmap in self.bitmaps])
+
+    def __or__(self, other: "MetricSearchResult") -> "MetricSearchResult":
+        return MetricSearchResult(
+            [(index, bitmap | other_bitmap) for (index, bitmap), (_, other_bitmap) in zip(self.bitmaps, other.bitmaps)]
+        )
+
+    def search(self, queries: list[str]) -> "MetricSearchResult":
+        return self.apply(lambda index: reduce(or_, (index.search(query) for query in queries), 0))
+
+    def filter(self, field: str, values: Iterable) -> "MetricSearchResult":
+        """
+        按字段值过滤，data_source 字段的值为 (data_source_label, data_type_label)
+        """
+        values = [tuple(value) if isinstance(value, list) else value for value in values]
+        return self.apply(lambda index: reduce(or_, (index.facet(field, value) for value in values), 0))
+
+    def exclude_unused(self) -> "MetricSearchResult":
+        return self.apply(lambda index: index.common_used)
+
+    def count(self) -> int:
+        return sum(bitmap.bit_count() for _, bitmap in self.bitmaps)
+
+    def count_by(self, field: str) -> Counter:
+        counts = Counter()
+        for index, bitmap in self.bitmaps:
+            counts.update(index.count_by(bitmap, field))
+        return counts
+
+    def group_by(self, fields: list[str]) -> Counter:
+        counts = Counter()
+        for index, bitmap in self.bitmaps:
+            counts.update(index.group_by(bitmap, fields))
+        return counts
+
+    def get_ids(self, queries: list[str], offset: int = 0, limit: int = None) -> list[int]:
+        """
+        按匹配程度及使用频率排序后分页的指标ID
+        """
+        keys = chain.from_iterable(index.rank(bitmap, queries) for index, bitmap in self.bitmaps)
+        keys = sorted(keys) if limit is None else heapq.nsmallest(offset + limit, keys)
+        return [key[-1] for key in keys[offset:]]
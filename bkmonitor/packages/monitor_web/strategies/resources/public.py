@@ -22,6 +22,7 @@ from bk_dataview.api import get_grafana_panel_query
 from bkmonitor.documents import AlertDocument
 from bkmonitor.models import QueryConfigModel, StrategyLabel, StrategyModel
 from bkmonitor.strategy.new_strategy import grafana_panel_to_config
+from bkmonitor.strategy.summary import refresh_strategy_summary
 from bkmonitor.views.serializers import BusinessOnlySerializer
 from constants.aiops import SCENE_METRIC_MAP, SCENE_NAME_MAPPING
 from constants.alert import EventStatus
@@ -111,7 +112,10 @@ class StrategyLabelResource(Resource):
         label_name = validated_request_data["label_name"]
         strategy_id = validated_request_data["strategy_id"]
         bk_biz_id = validated_request_data["bk_biz_id"]
-        return self.edit_label(label_name, label_id, strategy_id=strategy_id, bk_biz_id=bk_biz_id)
+        label_id = self.edit_label(label_name, label_id, strategy_id=strategy_id, bk_biz_id=bk_biz_id)
+        if strategy_id:
+            refresh_strategy_summary([strategy_id])
+        return label_id
 
     @classmethod
     def gen_label_name(cls, label):
@@ -167,6 +171,7 @@ class DeleteStrategyLabelResource(Resource):
         elif strategy_id != 0:
             # 基于策略ID删除全部标签
             StrategyLabel.objects.filter(strategy_id=strategy_id).delete()
+            refresh_strategy_summary([strategy_id])
 
 
 class StrategyLabelList(Resource):
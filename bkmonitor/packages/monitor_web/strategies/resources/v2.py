@@ -4,7 +4,7 @@ import operator
 import re
 import time
 from collections import defaultdict
-from collections.abc import Callable
+from collections.abc import Callable, Iterable
 from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from functools import reduce
@@ -21,7 +21,6 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from api.cmdb.define import Host, Module, Set, TopoTree
 from bkm_ipchooser.handlers import template_handler
-from bkmonitor.action.utils import get_strategy_user_group_dict
 from bkmonitor.aiops.utils import AiSetting
 from bkmonitor.commons.tools import is_ipv6_biz
 from bkmonitor.data_source import Functions, UnifyQuery, load_data_source
@@ -30,7 +29,6 @@ from bkmonitor.dataflow.constant import (
     AccessStatus,
 )
 from bkmonitor.dataflow.flow import DataFlow
-from bkmonitor.documents import AlertDocument
 from bkmonitor.iam.action import ActionEnum
 from bkmonitor.iam.permission import Permission
 from bkmonitor.models import (
@@ -45,6 +43,8 @@ from bkmonitor.models import (
     StrategyHistoryModel,
     StrategyLabel,
     StrategyModel,
+    StrategySummary,
+    StrategySummaryFacet,
     UserGroup,
 )
 from bkmonitor.models.strategy import AlgorithmChoiceConfig, NoticeSubscribe
@@ -57,6 +57,7 @@ from bkmonitor.strategy.new_strategy import (
     get_metric_id,
     parse_metric_id,
 )
+from bkmonitor.strategy.summary import sync_strategy_summary
 from bkmonitor.utils.cache import CacheType
 from bkmonitor.utils.request import get_request_tenant_id, get_request_username, get_source_app
 from bkmonitor.utils.tenant import bk_biz_id_to_bk_tenant_id
@@ -64,7 +65,6 @@ from bkmonitor.utils.time_format import duration_string, parse_duration
 from bkmonitor.utils.user import get_global_user
 from constants.action import UserGroupType
 from constants.aiops import SDKDetectStatus
-from constants.alert import EventStatus
 from constants.cmdb import TargetNodeType, TargetObjectType
 from constants.common import SourceApp
 from constants.data_source import DATA_CATEGORY, DataSourceLabel, DataTypeLabel
@@ -86,6 +86,7 @@ from monitor_web.strategies.constant import (
     DEFAULT_TRIGGER_CONFIG_MAP,
     GLOBAL_TRIGGER_CONFIG,
 )
+from monitor_web.strategies.metric_search import MetricSearchResult
 from monitor_web.strategies.serializers import handle_target
 from monitor_web.tasks import update_metric_list_by_biz
 
@@ -743,11 +744,7 @@ class GetStrategyListV2Resource(Resource):
             strategy_ids.update(list(invalid_qs.values_list("id", flat=True).distinct()))
 
         elif status == "SHIELDED":
-            shield_manager = ShieldDetectManager(bk_biz_id, "strategy")
-            for shield_obj in shield_manager.shield_list:
-                match_info = {"strategy_id": shield_obj.dimension_config["strategy_id"], "level": [1, 2, 3]}
-                if shield_manager.is_shielded(shield_obj, match_info):
-                    strategy_ids.update(shield_obj.dimension_config["strategy_id"])
+            strategy_ids.update(cls.get_shield_config_strategy_ids(bk_biz_id))
             # 屏蔽中的策略
             strategy_ids.update(cls.get_strategies_by_shield_status(bk_biz_id, is_shielded=True))
         else:
@@ -760,27 +757,33 @@ class GetStrategyListV2Resource(Resource):
             return list(set(filter_strategy_ids) & strategy_ids)
         return list(strategy_ids)
 
+    @staticmethod
+    def get_shield_config_strategy_ids(bk_biz_id) -> set[int]:
+        """
+        获取屏蔽配置中处于屏蔽状态的策略
+        """
+        strategy_ids = set()
+        shield_manager = ShieldDetectManager(bk_biz_id, "strategy")
+        for shield_obj in shield_manager.shield_list:
+            match_info = {"strategy_id": shield_obj.dimension_config["strategy_id"], "level": [1, 2, 3]}
+            if shield_manager.is_shielded(shield_obj, match_info):
+                strategy_ids.update(shield_obj.dimension_config["strategy_id"])
+        return strategy_ids
+
     @staticmethod
     def get_strategies_by_shield_status(bk_biz_id, is_shielded=False):
-        # 告警中的策略
-        alert_qs = AlertDocument.search(all_indices=True).filter("term", status=EventStatus.ABNORMAL)
+        """
+        根据策略摘要中的告警数量获取告警中/屏蔽中的策略
+        """
+        summary_qs = StrategySummary.objects.all()
         if is_shielded:
-            alert_qs = alert_qs.filter("term", is_shielded=True)
+            summary_qs = summary_qs.filter(shield_alert_count__gt=0)
         else:
-            # 屏蔽状态告警生成时未写入值，可能为null，用排除法比较好
-            alert_qs = alert_qs.exclude("term", is_shielded=True)
+            summary_qs = summary_qs.filter(alert_count__gt=0)
 
         if bk_biz_id is not None:
-            alert_qs = alert_qs.filter("term", **{"event.bk_biz_id": bk_biz_id})
-
-        search_object = alert_qs[:0]
-        search_object.aggs.bucket("strategy_id", "terms", field="strategy_id", size=10000)
-        search_result = search_object.execute()
-        strategy_ids = []
-        if search_result.aggs:
-            for bucket in search_result.aggs.strategy_id.buckets:
-                strategy_ids.append(int(bucket.key))
-        return strategy_ids
+            summary_qs = summary_qs.filter(bk_biz_id=bk_biz_id)
+        return list(summary_qs.values_list("strategy_id", flat=True))
 
     @staticmethod
     def get_shield_info(filter_strategy_ids: list = None, bk_biz_id: int = None):
@@ -796,60 +799,47 @@ class GetStrategyListV2Resource(Resource):
         return strategy_shield_info
 
     @staticmethod
-    def get_user_group_list(strategy_ids: list[int], bk_biz_id: int):
+    def get_facet_counts(strategies: QuerySet, bk_biz_id: int) -> dict[str, dict[str, int]]:
+        """
+        基于策略摘要按分类统计策略数量
+        """
+        facet_counts = defaultdict(dict)
+        count_records = (
+            StrategySummaryFacet.objects.filter(bk_biz_id=bk_biz_id, strategy_id__in=strategies.values("id"))
+            .values("facet", "value")
+            .annotate(total=Count("strategy_id", distinct=True))
+            .order_by()
+        )
+        for record in count_records:
+            facet_counts[record["facet"]][record["value"]] = record["total"]
+        return facet_counts
+
+    @staticmethod
+    def get_user_group_list(user_group_counts: dict[str, int], bk_biz_id: int):
         """
         按告警处理组统计策略数量
         """
-        strategy_count_of_user_group = get_strategy_user_group_dict(strategy_ids)
         user_group_list = []
         for ug in UserGroup.objects.filter(bk_biz_id=bk_biz_id).only("id", "name"):
             user_group_list.append(
                 {
                     "user_group_id": ug.id,
                     "user_group_name": ug.name,
-                    "count": len(set(strategy_count_of_user_group.get(ug.id, []))),
+                    "count": user_group_counts.get(str(ug.id), 0),
                 }
             )
         return user_group_list
 
     @staticmethod
-    def get_alert_search_result(bk_biz_id, strategy_ids):
-        search_object = (
-            AlertDocument.search(all_indices=True)
-            .filter("term", **{"event.bk_biz_id": bk_biz_id})
-            .filter("term", status=EventStatus.ABNORMAL)
-            .filter("terms", strategy_id=strategy_ids)[:0]
-        )
-        # 构建ES聚合查询
-        # 按strategy_id分桶,size=10000表示最多返回10000个桶
-        # 每个strategy_id桶下再按is_shielded字段分桶,统计屏蔽和未屏蔽的告警数量
-        search_object.aggs.bucket("strategy_id", "terms", field="strategy_id", size=10000).bucket(
-            "shield_status", "terms", field="is_shielded", size=10000
-        )
-        search_result = search_object.execute()
-        return search_result
-
-    @staticmethod
-    def get_action_config_list(strategy_ids: list[int], bk_biz_id: int):
+    def get_action_config_list(action_config_counts: dict[str, int], bk_biz_id: int):
         """
-        按告警处理组统计策略数量
+        按处理套餐统计策略数量
         """
-        action_relations = StrategyActionConfigRelation.objects.filter(
-            strategy_id__in=strategy_ids,
-            relate_type=StrategyActionConfigRelation.RelateType.ACTION,
-        ).values("strategy_id", "config_id")
-
-        no_config_strategy = set(strategy_ids)
-        config_count = defaultdict(set)
-        for relation in action_relations:
-            config_count[relation["config_id"]].add(relation["strategy_id"])
-            no_config_strategy.discard(relation["strategy_id"])
-
         action_config_list = [
             {
                 "id": 0,
                 "name": _("- 未配置 -"),
-                "count": len(no_config_strategy),
+                "count": action_config_counts.get("0", 0),
             }
         ]
         for action_config in (
@@ -861,28 +851,17 @@ class GetStrategyListV2Resource(Resource):
                 {
                     "id": action_config["id"],
                     "name": action_config["name"],
-                    "count": len(config_count[action_config["id"]]),
+                    "count": action_config_counts.get(str(action_config["id"]), 0),
                 }
             )
 
         return action_config_list
 
-    def get_data_source_list(self, strategy_ids: list[int]):
+    def get_data_source_list(self, data_source_counts: dict[str, int]):
         """
         按数据源统计策略数量
         """
         data_source_list = []
-        count_records = (
-            QueryConfigModel.objects.filter(strategy_id__in=strategy_ids)
-            .values("data_source_label", "data_type_label")
-            .annotate(total=Count("strategy_id", distinct=True))
-            .order_by("data_source_label", "data_type_label")
-        )
-
-        data_source_counts = {
-            (record["data_source_label"], record["data_type_label"]): record["total"] for record in count_records
-        }
-
         for ds in DATA_CATEGORY:
             data_source_list.append(
                 {
@@ -890,27 +869,16 @@ class GetStrategyListV2Resource(Resource):
                     "name": str(ds["name"]),
                     "data_type_label": ds["data_type_label"],
                     "data_source_label": ds["data_source_label"],
-                    "count": data_source_counts.get((ds["data_source_label"], ds["data_type_label"]), 0),
+                    "count": data_source_counts.get(f"{ds['data_source_label']}|{ds['data_type_label']}", 0),
                 }
             )
 
         return data_source_list
 
-    def get_strategy_label_list(self, strategy_ids: list[int], bk_biz_id):
+    def get_strategy_label_list(self, label_counts: dict[str, int], bk_biz_id):
         """
         按策略标签统计策略数量
         """
-
-        # 按策略标签进行聚合统计
-        count_records = (
-            StrategyLabel.objects.filter(strategy_id__in=strategy_ids)
-            .values("label_name")
-            .annotate(total=Count("strategy_id", distinct=True))
-            .order_by("label_name")
-        )
-
-        label_counts = {record["label_name"]: record["total"] for record in count_records}
-
         # 查询业务下所有的策略标签
         labels = (
             StrategyLabel.objects.filter(bk_biz_id__in=[0, bk_biz_id]).values_list("label_name", flat=True).distinct()
@@ -943,10 +911,27 @@ class GetStrategyListV2Resource(Resource):
                 )
         return scenario_list
 
-    def get_strategy_status_list(self, strategy_ids: list[int], bk_biz_id: int):
+    def get_strategy_status_list(self, strategies: QuerySet, bk_biz_id: int):
         """
         按策略状态统计策略数量
         """
+        status_counts = strategies.order_by().aggregate(
+            INVALID=Count("id", filter=Q(is_invalid=True)),
+            OFF=Count("id", filter=Q(is_enabled=False)),
+            ON=Count("id", filter=Q(is_enabled=True)),
+        )
+        # 告警中及屏蔽中的策略从策略摘要中统计
+        status_counts.update(
+            StrategySummary.objects.filter(strategy_id__in=strategies.values("id")).aggregate(
+                ALERT=Count("id", filter=Q(alert_count__gt=0)),
+                SHIELDED=Count(
+                    "id",
+                    filter=Q(shield_alert_count__gt=0)
+                    | Q(strategy_id__in=self.get_shield_config_strategy_ids(bk_biz_id)),
+                ),
+            )
+        )
+
         status_list = [
             {
                 "id": "ALERT",
@@ -963,39 +948,25 @@ class GetStrategyListV2Resource(Resource):
             {"id": "SHIELDED", "name": _("屏蔽中"), "count": 0},
         ]
         for status in status_list:
-            data = self.filter_by_status(status["id"], strategy_ids, bk_biz_id)
-            status["count"] = len(data)
+            status["count"] = status_counts[status["id"]]
         return status_list
 
-    def get_alert_level_list(self, strategy_ids: list[int]):
+    def get_alert_level_list(self, level_counts: dict[str, int]):
         """
         按告警级别统计策略数量
         """
         alert_level_list = []
-        count_records = (
-            DetectModel.objects.filter(strategy_id__in=strategy_ids)
-            .values("level")
-            .annotate(total=Count("strategy_id", distinct=True))
-            .order_by("level")
-        )
-
-        level_counts = {record["level"]: record["total"] for record in count_records}
-
         all_level = {1: _("致命"), 2: _("预警"), 3: _("提醒")}
         for level_id, level_name in all_level.items():
-            alert_level_list.append({"id": level_id, "name": level_name, "count": level_counts.get(level_id, 0)})
+            alert_level_list.append({"id": level_id, "name": level_name, "count": level_counts.get(str(level_id), 0)})
         return alert_level_list
 
-    def get_invalid_type_list(self, strategy_ids: list[int]):
+    def get_invalid_type_list(self, strategies: QuerySet):
         """
         按策略失效类型统计策略数量
         """
         invalid_type_list = []
-        count_records = (
-            StrategyModel.objects.filter(is_invalid=True, id__in=strategy_ids)
-            .values("invalid_type")
-            .annotate(total=Count("id", distinct=True))
-        )
+        count_records = strategies.filter(is_invalid=True).values("invalid_type").annotate(total=Count("id")).order_by()
 
         invalid_type_counts = {record["invalid_type"]: record["total"] for record in count_records}
 
@@ -1007,19 +978,11 @@ class GetStrategyListV2Resource(Resource):
             )
         return invalid_type_list
 
-    def get_algorithm_type_list(self, strategy_ids: list[int]):
+    def get_algorithm_type_list(self, algorithm_type_counts: dict[str, int]):
         """
         按算法类型统计策略数量
         """
         algorithm_type_list = []
-        count_records = (
-            AlgorithmModel.objects.filter(strategy_id__in=strategy_ids)
-            .values("type")
-            .annotate(total=Count("strategy_id", distinct=True))
-        )
-
-        algorithm_type_counts = {record["type"]: record["total"] for record in count_records if record["type"]}
-
         for algorithm_type_id, algorithm_type_name in AlgorithmModel.ALGORITHM_CHOICES:
             algorithm_type_list.append(
                 {
@@ -1196,6 +1159,9 @@ class GetStrategyListV2Resource(Resource):
         bk_biz_id = params["bk_biz_id"]
         strategies = StrategyModel.objects.filter(bk_biz_id=bk_biz_id)
 
+        # 补齐缺失或过期的策略摘要
+        sync_strategy_summary(strategies)
+
         # 按条件过滤策略
         if params["conditions"]:
             strategies = self.filter_by_conditions(params["conditions"], strategies, bk_biz_id)
@@ -1218,23 +1184,19 @@ class GetStrategyListV2Resource(Resource):
             strategies = strategies.filter(scenario__in=scenarios)
 
         # 统计其他分类数量
-        strategy_ids = list(strategies.values_list("id", flat=True).distinct())
-
-        executor = ThreadPoolExecutor()
-        user_group_list_future = executor.submit(db_safe_wrapper(self.get_user_group_list), strategy_ids, bk_biz_id)
-        action_config_list_future = executor.submit(
-            db_safe_wrapper(self.get_action_config_list), strategy_ids, bk_biz_id
+        facet_counts = self.get_facet_counts(strategies, bk_biz_id)
+        user_group_list = self.get_user_group_list(facet_counts[StrategySummaryFacet.FacetType.USER_GROUP], bk_biz_id)
+        action_config_list = self.get_action_config_list(
+            facet_counts[StrategySummaryFacet.FacetType.ACTION_CONFIG], bk_biz_id
         )
-        data_source_list_future = executor.submit(db_safe_wrapper(self.get_data_source_list), strategy_ids)
-        strategy_label_list_future = executor.submit(
-            db_safe_wrapper(self.get_strategy_label_list), strategy_ids, bk_biz_id
+        data_source_list = self.get_data_source_list(facet_counts[StrategySummaryFacet.FacetType.DATA_SOURCE])
+        strategy_label_list = self.get_strategy_label_list(
+            facet_counts[StrategySummaryFacet.FacetType.LABEL], bk_biz_id
         )
-        strategy_status_list_future = executor.submit(
-            db_safe_wrapper(self.get_strategy_status_list), strategy_ids, bk_biz_id
-        )
-        alert_level_list_future = executor.submit(db_safe_wrapper(self.get_alert_level_list), strategy_ids)
-        invalid_type_list_future = executor.submit(db_safe_wrapper(self.get_invalid_type_list), strategy_ids)
-        algorithm_type_list_future = executor.submit(db_safe_wrapper(self.get_algorithm_type_list), strategy_ids)
+        alert_level_list = self.get_alert_level_list(facet_counts[StrategySummaryFacet.FacetType.LEVEL])
+        algorithm_type_list = self.get_algorithm_type_list(facet_counts[StrategySummaryFacet.FacetType.ALGORITHM_TYPE])
+        strategy_status_list = self.get_strategy_status_list(strategies, bk_biz_id)
+        invalid_type_list = self.get_invalid_type_list(strategies)
 
         # 统计总数
         total = strategies.count()
@@ -1265,22 +1227,20 @@ class GetStrategyListV2Resource(Resource):
 
         strategy_ids = [strategy_config["id"] for strategy_config in strategy_configs]
 
-        # 查询ES，统计策略告警数量
-        search_result_future = executor.submit(db_safe_wrapper(self.get_alert_search_result), bk_biz_id, strategy_ids)
+        executor = ThreadPoolExecutor()
         metric_info_future = executor.submit(db_safe_wrapper(self.get_metric_info), bk_biz_id, strategy_configs)
         target_strategy_mapping_future = executor.submit(
             db_safe_wrapper(self.get_target_strategy_mapping), strategy_configs
         )
         strategy_shield_info_future = executor.submit(db_safe_wrapper(self.get_shield_info), strategy_ids, bk_biz_id)
 
-        # 获取到ES查询结果
-        search_result = search_result_future.result()
-        strategy_alert_counts = defaultdict(dict)
-        if search_result.aggs:
-            for strategy_bucket in search_result.aggs.strategy_id.buckets:
-                strategy_alert_counts[strategy_bucket.key]["alert_count"] = strategy_bucket.doc_count
-                for shield_bucket in strategy_bucket.shield_status:
-                    strategy_alert_counts[strategy_bucket.key][shield_bucket.key_as_string] = shield_bucket.doc_count
+        # 策略告警数量从策略摘要中获取
+        strategy_alert_counts = {
+            summary["strategy_id"]: summary
+            for summary in StrategySummary.objects.filter(strategy_id__in=strategy_ids).values(
+                "strategy_id", "alert_count", "shield_alert_count"
+            )
+        }
         data_source_names = {
             (category["data_source_label"], category["data_type_label"]): category["name"] for category in DATA_CATEGORY
         }
@@ -1291,10 +1251,10 @@ class GetStrategyListV2Resource(Resource):
 
         for strategy_config in strategy_configs:
             # 补充告警数量
-            strategy_config["alert_count"] = strategy_alert_counts.get(str(strategy_config["id"]), {}).get("false", 0)
+            strategy_config["alert_count"] = strategy_alert_counts.get(strategy_config["id"], {}).get("alert_count", 0)
             # 补充屏蔽告警数量
-            strategy_config["shield_alert_count"] = strategy_alert_counts.get(str(strategy_config["id"]), {}).get(
-                "true", 0
+            strategy_config["shield_alert_count"] = strategy_alert_counts.get(strategy_config["id"], {}).get(
+                "shield_alert_count", 0
             )
             # 补充策略屏蔽状态
             strategy_config["shield_info"] = strategy_shield_info.get(strategy_config["id"])
@@ -1302,14 +1262,6 @@ class GetStrategyListV2Resource(Resource):
             self.fill_allow_target(strategy_config, target_strategy_mapping)
             self.fill_data_source_type(strategy_config, data_source_names)
 
-        user_group_list = user_group_list_future.result()
-        action_config_list = action_config_list_future.result()
-        data_source_list = data_source_list_future.result()
-        strategy_label_list = strategy_label_list_future.result()
-        strategy_status_list = strategy_status_list_future.result()
-        alert_level_list = alert_level_list_future.result()
-        invalid_type_list = invalid_type_list_future.result()
-        algorithm_type_list = algorithm_type_list_future.result()
         # 等待线程执行完成，并关闭线程池
         executor.shutdown(wait=True)
 
@@ -1467,9 +1419,9 @@ class GetMetricListV2Resource(Resource):
         return metrics.none()
 
     @classmethod
-    def filter_by_conditions(cls, metrics: QuerySet, params: dict) -> QuerySet:
+    def get_filter_dict(cls, params: dict) -> dict[str, list]:
         """
-        按查询条件过滤指标
+        整理查询条件
         """
         filter_dict = defaultdict(list)
         for condition in params.get("conditions", []):
@@ -1480,6 +1432,14 @@ class GetMetricListV2Resource(Resource):
             if not isinstance(value, list):
                 value = [value]
             filter_dict[key].extend(value)
+        return filter_dict
+
+    @classmethod
+    def filter_by_conditions(cls, metrics: QuerySet, params: dict) -> QuerySet:
+        """
+        按查询条件过滤指标
+        """
+        filter_dict = cls.get_filter_dict(params)
 
         search_fields = [
             "result_table_id",
@@ -1700,7 +1660,10 @@ class GetMetricListV2Resource(Resource):
             (source_count["data_source_label"], source_count["data_type_label"]): source_count["count"]
             for source_count in metrics.values("data_source_label", "data_type_label").annotate(count=Count("id"))
         }
+        return cls.format_data_source_list(source_counts)
 
+    @staticmethod
+    def format_data_source_list(source_counts: dict[tuple[str, str], int]) -> list[dict]:
         return [
             {
                 "count": source_counts.get((category["data_source_label"], category["data_type_label"]), 0),
@@ -1736,7 +1699,10 @@ class GetMetricListV2Resource(Resource):
             .annotate(count=Count("metric_field"))
             .order_by("related_id", "result_table_id")[:50]
         )
+        return cls.format_tag_list(result_tables)
 
+    @staticmethod
+    def format_tag_list(result_tables: Iterable[dict]) -> list[dict]:
         category_tags = defaultdict(dict)
         for result_table in result_tables:
             data_source = (result_table["data_source_label"], result_table["data_type_label"])
@@ -1766,23 +1732,19 @@ class GetMetricListV2Resource(Resource):
         """
         # 按监控对象统计数量
         scenarios = metrics.values("result_table_label").annotate(count=Count("result_table_label"))
+        return cls.format_scenario_list({scenario["result_table_label"]: scenario["count"] for scenario in scenarios})
 
+    @staticmethod
+    def format_scenario_list(scenario_counts: dict[str, int]) -> list[dict]:
         scenario_list = []
         try:
             labels = resource.commons.get_label()
         except Exception as e:
             logger.exception(e)
             # 如果拉取标签信息报错，则直接使用监控对象ID展示
-            for scenario in scenarios:
-                scenario_list.append(
-                    {
-                        "id": scenario["result_table_label"],
-                        "name": scenario["result_table_label"],
-                        "count": scenario["count"],
-                    }
-                )
+            for result_table_label, count in scenario_counts.items():
+                scenario_list.append({"id": result_table_label, "name": result_table_label, "count": count})
         else:
-            scenario_counts = {scenario["result_table_label"]: scenario["count"] for scenario in scenarios}
             for label in chain(*(_label["children"] for _label in labels)):
                 scenario_list.append(
                     {"id": label["id"], "name": label["name"], "count": scenario_counts.get(label["id"], 0)}
@@ -1979,7 +1941,108 @@ class GetMetricListV2Resource(Resource):
                     d["name"] = trans_dict.get(d["id"][len("tags.") :], d["name"])
         return metric_list
 
+    @classmethod
+    def search_by_index(cls, params) -> dict:
+        """
+        通过指标检索索引查询，过滤及统计逻辑与数据库查询一致
+        """
+        filter_dict = cls.get_filter_dict(params)
+        metrics = MetricSearchResult.from_scope(get_request_tenant_id(), [0, params["bk_biz_id"]])
+
+        if get_source_app() == SourceApp.FTA:
+            metrics = metrics.filter("data_type_label", [DataTypeLabel.ALERT]) | metrics.filter(
+                "data_source_label", [DataSourceLabel.BK_FTA]
+            )
+
+        metrics = metrics.search(filter_dict["query"])
+
+        # 区分指标/事件/日志关键字选择器或Grafana选择器
+        if params["data_type_label"] == "grafana":
+            metrics = metrics.filter("data_source", cls.GrafanaDataSource)
+        elif params["data_type_label"]:
+            metrics = metrics.filter("data_type_label", [params["data_type_label"]])
+
+        # 按场景和数据源统计
+        tag_metrics = cls.index_tag_filter(metrics, params)
+        scenario_list = cls.format_scenario_list(tag_metrics.count_by("result_table_label"))
+        if not params["data_type_label"] and params["data_source"]:
+            tag_metrics = tag_metrics.filter("data_source", params["data_source"])
+        data_source_list = cls.format_data_source_list(tag_metrics.count_by("data_source"))
+
+        if params["result_table_label"]:
+            metrics = metrics.filter("result_table_label", params["result_table_label"])
+        if params.get("data_source_label"):
+            metrics = metrics.filter("data_source_label", params["data_source_label"])
+        if params["data_source"]:
+            metrics = metrics.filter("data_source", params["data_source"])
+
+        # 按标签统计并过滤标签
+        tag_fields = [
+            "result_table_id",
+            "result_table_name",
+            "data_source_label",
+            "data_type_label",
+            "related_id",
+            "related_name",
+        ]
+        result_tables = [
+            dict(zip(tag_fields, values), count=count)
+            for values, count in metrics.group_by(tag_fields).items()
+            if not (
+                values[2] == DataSourceLabel.BK_MONITOR_COLLECTOR
+                and values[3] in [DataTypeLabel.EVENT, DataTypeLabel.LOG]
+            )
+            and values[2] not in [DataSourceLabel.BK_DATA, DataSourceLabel.BK_LOG_SEARCH]
+        ]
+        result_tables.sort(key=lambda result_table: (result_table["related_id"], result_table["result_table_id"]))
+        tag_list = cls.format_tag_list(result_tables[:50])
+        metrics = cls.index_tag_filter(metrics, params)
+
+        # 分页
+        count = metrics.count()
+        if params.get("page") and params.get("page_size"):
+            metric_ids = metrics.get_ids(
+                filter_dict["query"], (params["page"] - 1) * params["page_size"], params["page_size"]
+            )
+        else:
+            metric_ids = metrics.get_ids(filter_dict["query"])
+        metric_objs = MetricListCache.objects.in_bulk(metric_ids)
+
+        metric_list = cls.get_metric_list(
+            params["bk_biz_id"], [metric_objs[metric_id] for metric_id in metric_ids if metric_id in metric_objs]
+        )
+        metric_list = cls.translate_monitor_dimensions(metric_list, params)
+
+        return {
+            "metric_list": metric_list,
+            "tag_list": tag_list,
+            "data_source_list": data_source_list,
+            "scenario_list": scenario_list,
+            "count": count,
+        }
+
+    @classmethod
+    def index_tag_filter(cls, metrics: MetricSearchResult, params) -> MetricSearchResult:
+        """
+        标签过滤，与 tag_filter 一致
+        """
+        tag = params["tag"]
+
+        if tag == "__COMMON_USED__":
+            metrics = metrics.exclude_unused()
+        elif tag.startswith("system."):
+            metrics = metrics.filter("result_table_id", [tag])
+        elif tag:
+            metrics = metrics.filter("related_id", [tag])
+
+        return metrics
+
     def perform_request(self, params):
+        # 仅有模糊搜索条件时，使用检索索引，避免全表模糊匹配
+        filter_dict = self.get_filter_dict(params)
+        if filter_dict and set(filter_dict) == {"query"}:
+            return self.search_by_index(params)
+
         # 从指标选择器缓存表根据业务查询指标
         metrics = MetricListCache.objects.filter(
             bk_tenant_id=get_request_tenant_id(), bk_biz_id__in=[0, params["bk_biz_id"]]
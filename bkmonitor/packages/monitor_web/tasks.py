@@ -55,6 +55,7 @@ from bkmonitor.models import ActionConfig, AlgorithmChoiceConfig, AlgorithmModel
 from bkmonitor.models.external_iam import ExternalPermissionApplyRecord
 from bkmonitor.strategy.new_strategy import QueryConfig, Strategy, get_metric_id
 from bkmonitor.strategy.serializers import MultivariateAnomalyDetectionSerializer
+from bkmonitor.strategy.summary import refresh_strategy_alert_summary, sync_strategy_summary
 from bkmonitor.utils.common_utils import to_bk_data_rt_id
 from bkmonitor.utils.sql import sql_format_params
 from bkmonitor.utils.tenant import bk_biz_id_to_bk_tenant_id, set_local_tenant_id
@@ -186,6 +187,17 @@ def update_external_approval_status():
             resource.iam.callback(approve_result)
 
 
+@shared_task(ignore_result=True)
+def refresh_strategy_summary():
+    """
+    周期性补齐过期的策略列表摘要，并根据未恢复告警刷新策略告警数量
+    """
+    stale_strategy_ids = sync_strategy_summary()
+    if stale_strategy_ids:
+        logger.info("[refresh_strategy_summary] rebuild %s strategy summaries", len(stale_strategy_ids))
+    refresh_strategy_alert_summary()
+
+
 @shared_task(ignore_result=True, queue="celery_resource")
 def update_metric_list():
     """
@@ -372,10 +384,13 @@ def append_metric_list_cache(bk_tenant_id: str, result_table_id_list: list[str])
     """
     from bkmonitor.models.metric_list_cache import MetricListCache
     from monitor_web.strategies.metric_list_cache import BkmonitorMetricCacheManager
+    from monitor_web.strategies.metric_search import MetricSearchResult
 
     def update_or_create_metric_list_cache(metric_list):
         # 这里可以考虑 删除 + 创建逻辑
+        bk_biz_ids = set()
         for metric in metric_list:
+            bk_biz_ids.add(metric["bk_biz_id"])
             metric["metric_md5"] = count_md5(metric)
             MetricListCache.objects.update_or_create(
                 bk_tenant_id=bk_tenant_id,
@@ -386,6 +401,8 @@ def append_metric_list_cache(bk_tenant_id: str, result_table_id_list: list[str])
                 data_source_label=metric.get("data_source_label"),
                 defaults=metric,
             )
+        if bk_biz_ids:
+            MetricSearchResult.refresh(bk_tenant_id, bk_biz_ids)
 
     if settings.ROLE == "api":
         # api 调用不做指标实时更新。
@@ -542,6 +559,7 @@ def append_event_metric_list_cache(bk_biz_id: int, bk_event_group_id: int):
         BkMonitorLogCacheManager,
         CustomEventCacheManager,
     )
+    from monitor_web.strategies.metric_search import MetricSearchResult
 
     bk_tenant_id = bk_biz_id_to_bk_tenant_id(bk_biz_id)
 
@@ -565,6 +583,8 @@ def append_event_metric_list_cache(bk_biz_id: int, bk_event_group_id: int):
                 data_source_label=metric_msg.get("data_source_label"),
                 defaults=metric_msg,
             )
+        # 刷新业务的指标检索索引
+        MetricSearchResult.refresh(bk_tenant_id, [bk_biz_id])
     else:
         BkMonitorLogCacheManager(bk_tenant_id=bk_tenant_id).run()
 
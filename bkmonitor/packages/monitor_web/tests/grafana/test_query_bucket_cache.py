@@ -0,0 +1,139 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+
+from bkmonitor.utils.time_tools import time_interval_align
+from constants.data_source import DataSourceLabel
+from monitor_web.grafana.resources import unify_query
+from monitor_web.grafana.resources.unify_query import TimeBucketQueryCache
+
+NOW = 1700000000
+INTERVAL = 60
+
+
+class FakeQuery:
+    """
+    每个查询周期生成一个数据点的查询对象
+    """
+
+    def __init__(self, data_source_label=DataSourceLabel.BK_MONITOR_COLLECTOR, empty_before=0):
+        self.data_sources = [SimpleNamespace(interval=INTERVAL, data_source_label=data_source_label)]
+        self.is_partial = False
+        self.queries = []
+        # 早于该时间的数据为空
+        self.empty_before = empty_before
+
+    def use_unify_query(self):
+        return True
+
+    def process_data_sources(self, data_sources):
+        pass
+
+    def get_unify_query_params(self):
+        return {"query_list": [{"table_id": "system.cpu_summary", "field_name": "usage"}], "step": f"{INTERVAL}s"}
+
+    def query_data(self, start_time, end_time, **kwargs):
+        self.queries.append((start_time, end_time))
+        first_time = time_interval_align(start_time // 1000, INTERVAL) * 1000
+        return [
+            {"_time_": timestamp, "_result_": timestamp // 1000 % 97, "bk_target_ip": ip}
+            for ip in ["127.0.0.1", "127.0.0.2"]
+            for timestamp in range(max(first_time, self.empty_before), end_time, INTERVAL * 1000)
+        ]
+
+
+def query(fake_query, start_time, end_time, now=NOW, **kwargs):
+    with mock.patch.object(unify_query.time, "time", return_value=now):
+        return TimeBucketQueryCache(fake_query).query_data(start_time * 1000, end_time * 1000, **kwargs)
+
+
+def sort_records(records):
+    return sorted(records, key=lambda record: (record["bk_target_ip"], record["_time_"]))
+
+
+def test_bucket_cache():
+    start_time, end_time = NOW - 86400 + 17, NOW
+    expected = sort_records(FakeQuery().query_data(start_time * 1000, end_time * 1000))
+
+    fake_query = FakeQuery()
+    with mock.patch.object(unify_query, "cache", LocMemCache("test_query_bucket_cache", {})):
+        # 首次查询合并查询缺失的时间桶，尾部单独查询
+        assert sort_records(query(fake_query, start_time, end_time)) == expected
+        assert len(fake_query.queries) == 2
+
+        # 刷新时只查询尾部时间段
+        fake_query.queries.clear()
+        records = query(fake_query, start_time + 30, end_time + 30, now=NOW + 30)
+        assert sort_records(records) == sort_records(
+            FakeQuery().query_data((start_time + 30) * 1000, (end_time + 30) * 1000)
+        )
+        assert len(fake_query.queries) == 1
+        assert fake_query.queries[0][0] >= (NOW - TimeBucketQueryCache.SETTLE_SECONDS - 3600) * 1000
+
+        # 查询条件变化时不复用缓存
+        fake_query.queries.clear()
+        query(fake_query, start_time, end_time, limit=10)
+        assert len(fake_query.queries) == 2
+
+        # 降采样查询不使用缓存
+        fake_query.queries.clear()
+        query(fake_query, start_time, end_time, down_sample_range="5m")
+        assert fake_query.queries == [(start_time * 1000, end_time * 1000)]
+
+
+def test_partial_result_not_cached():
+    start_time, end_time = NOW - 86400, NOW
+
+    fake_query = FakeQuery()
+    fake_query.is_partial = True
+    with mock.patch.object(unify_query, "cache", LocMemCache("test_query_bucket_cache_partial", {})):
+        query(fake_query, start_time, end_time)
+        fake_query.is_partial = False
+        fake_query.queries.clear()
+        query(fake_query, start_time, end_time)
+        assert len(fake_query.queries) == 2
+
+
+def test_empty_bucket_not_cached():
+    start_time, end_time = NOW - 86400, NOW
+
+    # 前半段数据为空，空的时间桶不缓存，下次查询时重新查询
+    fake_query = FakeQuery(empty_before=(NOW - 43200) * 1000)
+    with mock.patch.object(unify_query, "cache", LocMemCache("test_query_bucket_cache_empty", {})):
+        query(fake_query, start_time, end_time)
+        fake_query.queries.clear()
+        query(fake_query, start_time, end_time)
+        assert len(fake_query.queries) == 2
+        bucket_size = INTERVAL * TimeBucketQueryCache.BUCKET_POINTS
+        assert fake_query.queries[0] == (
+            time_interval_align(start_time, bucket_size) * 1000,
+            time_interval_align(NOW - 43200, bucket_size) * 1000,
+        )
+
+
+def test_settle_and_cache_timeout():
+    bucket_cache = TimeBucketQueryCache(FakeQuery())
+    assert bucket_cache.settle_seconds == TimeBucketQueryCache.SETTLE_SECONDS
+
+    # 入库延迟较长的数据源等待更久才缓存
+    bucket_cache = TimeBucketQueryCache(FakeQuery(data_source_label=DataSourceLabel.BK_DATA))
+    assert bucket_cache.settle_seconds == TimeBucketQueryCache.DATA_SOURCE_SETTLE_SECONDS[DataSourceLabel.BK_DATA]
+    with mock.patch.object(unify_query.time, "time", return_value=NOW):
+        buckets = bucket_cache.get_closed_buckets((NOW - 86400) * 1000, NOW * 1000)
+    assert buckets[-1] // 1000 + INTERVAL * TimeBucketQueryCache.BUCKET_POINTS <= NOW - 30 * 60
+
+    # 最近的时间桶缩短缓存时长
+    with mock.patch.object(unify_query.time, "time", return_value=NOW):
+        assert bucket_cache.get_cache_timeout(buckets[-1]) == TimeBucketQueryCache.RECENT_CACHE_TIMEOUT
+        assert bucket_cache.get_cache_timeout(buckets[0]) == TimeBucketQueryCache.CACHE_TIMEOUT
@@ -0,0 +1,124 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from unittest import mock
+
+from bkmonitor.data_source.unify_query.query import UnifyQuery
+from monitor_web.grafana.resources import unify_query
+from monitor_web.grafana.resources.unify_query import RankProcessor
+
+START_TIME = 1700000000
+END_TIME = 1700086400
+
+
+class LocalDataSource:
+    """
+    本地数据源，替代按查询配置实例化的数据源
+    """
+
+    def __init__(self, bk_biz_id, **query_config):
+        self.interval = query_config["interval"]
+        self.metrics = query_config["metrics"]
+        self.functions = query_config["functions"]
+
+    def set_bk_tenant_id(self, bk_tenant_id):
+        self.bk_tenant_id = bk_tenant_id
+
+
+def make_params(functions):
+    return {
+        "bk_biz_id": 2,
+        "start_time": START_TIME,
+        "end_time": END_TIME,
+        "query_configs": [
+            {
+                "data_source_label": "bk_monitor",
+                "data_type_label": "time_series",
+                "interval": 60,
+                "metrics": [{"field": "usage", "method": "AVG", "alias": "a"}],
+                "functions": functions,
+                "filter_dict": {},
+            },
+            {
+                "data_source_label": "bk_monitor",
+                "data_type_label": "time_series",
+                "interval": 60,
+                "metrics": [{"field": "usage", "method": "AVG", "alias": "b"}],
+                "functions": [],
+                "filter_dict": {},
+            },
+        ],
+    }
+
+
+def process_params(params, points, use_unify_query=True):
+    """
+    执行排序参数处理，返回排序查询的调用参数
+    """
+    queries = []
+
+    def query_data(self, **kwargs):
+        queries.append((self, kwargs))
+        return points
+
+    with (
+        mock.patch.object(unify_query, "load_data_source", return_value=LocalDataSource),
+        mock.patch.object(UnifyQuery, "use_unify_query", return_value=use_unify_query),
+        mock.patch.object(UnifyQuery, "query_data", query_data),
+    ):
+        RankProcessor.process_params(params)
+    return queries
+
+
+def test_rank_pushdown():
+    params = make_params([{"id": "top", "params": [{"id": "n", "value": "2"}]}, {"id": "abs", "params": []}])
+    # 下推后每个维度只返回一个值
+    points = [
+        {"bk_target_ip": "127.0.0.2", "_result_": 100, "_time_": END_TIME * 1000},
+        {"bk_target_ip": "127.0.0.1", "_result_": 2000, "_time_": END_TIME * 1000},
+    ]
+    queries = process_params(params, points)
+
+    # 只发起一次排序查询，topk 及整个时间范围的窗口聚合由统一查询模块完成
+    assert len(queries) == 1
+    query, kwargs = queries[0]
+    assert query.functions == [{"id": "topk", "params": [{"id": "k", "value": 2}]}]
+    assert query.expression == "a"
+    assert query.data_sources[0].interval == END_TIME - START_TIME
+    assert query.data_sources[0].functions == [{"id": "abs", "params": []}]
+    assert kwargs["instant"] is True
+    assert kwargs["not_time_align"] is True
+
+    # 排序选出的维度作为过滤条件拼接回原查询，只查询这些维度的数据
+    assert params["query_configs"][0]["functions"] == [{"id": "abs", "params": []}]
+    assert params["query_configs"][0]["filter_dict"]["rank"] == [
+        {"bk_target_ip": "127.0.0.1"},
+        {"bk_target_ip": "127.0.0.2"},
+    ]
+    assert "rank" not in params["query_configs"][1]["filter_dict"]
+
+    data = [{"dimensions": {"bk_target_ip": "127.0.0.2"}}, {"dimensions": {"bk_target_ip": "127.0.0.1"}}]
+    assert RankProcessor.process_formatted_data(params, data)[0]["dimensions"]["bk_target_ip"] == "127.0.0.1"
+
+
+def test_rank_without_unify_query():
+    params = make_params([{"id": "bottom", "params": [{"id": "n", "value": "1"}]}])
+    points = [
+        {"bk_target_ip": "127.0.0.1", "_result_": 5, "_time_": START_TIME * 1000},
+        {"bk_target_ip": "127.0.0.1", "_result_": 5, "_time_": END_TIME * 1000},
+        {"bk_target_ip": "127.0.0.2", "_result_": 3, "_time_": START_TIME * 1000},
+        {"bk_target_ip": "127.0.0.3", "_result_": None, "_time_": START_TIME * 1000},
+        {"_result_": 1, "_time_": START_TIME * 1000},
+    ]
+    queries = process_params(params, points, use_unify_query=False)
+
+    # 不支持统一查询模块的数据源，按整个时间范围聚合后排序，维度为空的数据不参与排序
+    assert "instant" not in queries[0][1]
+    assert params["query_configs"][0]["filter_dict"]["rank"] == [{"bk_target_ip": "127.0.0.2"}]
@@ -10,6 +10,7 @@ specific language governing permissions and limitations under the License.
 """
 import pytest
 
+from bkmonitor.models import BCSPod
 from bkmonitor.utils.kubernetes import translate_timestamp_since
 from core.drf_resource import resource
 from monitor_web.constants import OVERVIEW_ICON
@@ -2629,3 +2630,46 @@ class TestGetKubernetesPodList:
             'total': 1,
         }
         assert actual == expect
+
+    def test_perform_request__cursor(
+        self,
+        add_bcs_cluster_item_for_update_and_delete,
+        add_bcs_pods,
+    ):
+        params = {
+            "page_size": 1,
+            "condition_list": [{"bcs_cluster_id": "BCS-K8S-00000"}],
+            "bk_biz_id": 2,
+            "sort": "-name",
+            "cursor": "",
+        }
+        names = []
+        while True:
+            actual = resource.scene_view.get_kubernetes_pod_list(params)
+            assert actual["total"] == 2
+            names.extend(row["name"]["value"] for row in actual["data"])
+            if not actual["next_cursor"]:
+                break
+            params["cursor"] = actual["next_cursor"]
+        assert names == ["api-gateway-1", "api-gateway-0"]
+
+        # 总数与状态过滤后的数量一致
+        actual = resource.scene_view.get_kubernetes_pod_list({**params, "cursor": "", "status": "failed"})
+        assert actual["total"] == 1
+        assert [row["name"]["value"] for row in actual["data"]] == ["api-gateway-1"]
+
+        # 未传入游标时不返回游标
+        params.pop("cursor")
+        assert "next_cursor" not in resource.scene_view.get_kubernetes_pod_list(params)
+
+    def test_label_index(
+        self,
+        add_bcs_cluster_item_for_update_and_delete,
+        add_bcs_pods,
+    ):
+        assert BCSPod.get_label_index(["BCS-K8S-00000"]) == {"key_1": {"value_1"}, "key_2": {"value_2"}}
+
+        # 标签同步后索引失效
+        pod = BCSPod.objects.get(bcs_cluster_id="BCS-K8S-00000", name="api-gateway-0")
+        BCSPod.bulk_save_labels([{"id": pod.id, "bcs_cluster_id": "BCS-K8S-00000", "api_labels": {"key_1": "value_3"}}])
+        assert BCSPod.get_label_index(["BCS-K8S-00000"]) == {"key_1": {"value_3"}}
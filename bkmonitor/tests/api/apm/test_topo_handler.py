@@ -1,4 +1,3 @@
-# -*- coding: utf-8 -*-
 """
 Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
 Copyright (C) 2017-2025 Tencent. All rights reserved.
@@ -8,41 +7,178 @@ Unless required by applicable law or agreed to in writing, software distributed
 an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 specific language governing permissions and limitations under the License.
 """
+
 import logging
+from unittest import mock
 
+from apm import constants
 from apm.core.discover.base import TopoHandler
-from apm.utils.base import divide_biscuit
 
 logger = logging.getLogger(__name__)
 
 
+class StubES:
+    """按请求的排序字段分页返回 Span 的 ES 桩"""
+
+    def __init__(self, spans, support_pit=True):
+        self.spans = spans
+        self.requests = []
+        if support_pit:
+            self.open_point_in_time = self._open_point_in_time
+            self.close_point_in_time = self._close_point_in_time
+
+    def _open_point_in_time(self, index, keep_alive):
+        self.requests.append("open_pit")
+        return {"id": "pit-1"}
+
+    def _close_point_in_time(self, body):
+        self.requests.append("close_pit")
+
+    def search(self, body, index=None, **kwargs):
+        self.requests.append("search")
+        assert ("pit" in body) != bool(index)
+        hits = self.spans
+        for condition in body["query"]["bool"]["filter"]:
+            if "range" in condition:
+                time_range = condition["range"]["time"]
+                hits = [s for s in hits if time_range["gt"] < s["time"] <= time_range["lte"]]
+            else:
+                hits = [s for s in hits if s["trace_id"] in condition["terms"]["trace_id"]]
+
+        sort_fields = [list(i)[0] for i in body["sort"]]
+        hits = sorted(hits, key=lambda s: [s[f] for f in sort_fields])
+        if "search_after" in body:
+            hits = [s for s in hits if [s[f] for f in sort_fields] > body["search_after"]]
+        hits = hits[: body["size"]]
+        return {
+            "hits": {
+                "hits": [
+                    {"_source": {} if body.get("_source") is False else s, "sort": [s[f] for f in sort_fields]}
+                    for s in hits
+                ]
+            }
+        }
+
+
+def make_spans(trace_count, span_per_trace, start_time=1000):
+    # 同一 Trace 的 Span 时间递增，与其他 Trace 的 Span 交错
+    return [
+        {"trace_id": f"trace-{t:04d}", "span_id": f"span-{s:04d}", "time": start_time + t + s}
+        for t in range(trace_count)
+        for s in range(span_per_trace)
+    ]
+
+
+def make_handler():
+    with mock.patch.object(TopoHandler, "__init__", return_value=None):
+        handler = TopoHandler()
+    handler.bk_biz_id, handler.app_name = 2, "app"
+    return handler
+
+
 class TestTopoHandler:
-    def test_calc_round_trace_count(self):
+    def test_iter_spans_consume_all(self):
+        spans = make_spans(trace_count=35, span_per_trace=3)
+        handler = make_handler()
+
+        for support_pit in [True, False]:
+            es = StubES(spans, support_pit=support_pit)
+            with mock.patch.object(constants, "DISCOVER_SEARCH_AFTER_SIZE", 10):
+                result = list(handler.iter_spans(es, "index", 999, 2000))
+
+            # 全量覆盖，按时间有序
+            assert result == sorted((s["time"], s["trace_id"]) for s in spans)
+            assert es.requests.count("search") == 11
+            if support_pit:
+                assert es.requests[0] == "open_pit" and es.requests[-1] == "close_pit"
+
+    def test_iter_spans_time_range(self):
+        spans = make_spans(trace_count=10, span_per_trace=1)
+        es = StubES(spans)
+
+        result = list(make_handler().iter_spans(es, "index", 1003, 1006))
+
+        assert {trace_id for _, trace_id in result} == {"trace-0004", "trace-0005", "trace-0006"}
+
+    def test_iter_trace_id_batches_split_on_time_boundary(self):
+        spans = sorted((s["time"], s["trace_id"]) for s in make_spans(trace_count=10, span_per_trace=3))
+
+        batches = list(TopoHandler.iter_trace_id_batches(iter(spans), batch_size=4))
+
+        # 同一时间点的 Span 不跨批次，已出现的 TraceId 不重复返回
+        assert batches == [
+            (["trace-0000", "trace-0001", "trace-0002", "trace-0003"], 1003),
+            (["trace-0004", "trace-0005", "trace-0006", "trace-0007"], 1007),
+            (["trace-0008", "trace-0009"], 1011),
+        ]
+
+        # Span 数量达到上限时同样切分
+        batches = list(TopoHandler.iter_trace_id_batches(iter(spans), batch_size=100, span_batch_size=6))
+        assert [trace_ids for trace_ids, _ in batches] == [
+            ["trace-0000", "trace-0001", "trace-0002"],
+            ["trace-0003", "trace-0004"],
+            ["trace-0005", "trace-0006"],
+            ["trace-0007", "trace-0008"],
+            ["trace-0009"],
+        ]
+
+    def test_list_span_by_trace_ids_fetch_whole_trace(self):
+        spans = make_spans(trace_count=5, span_per_trace=5)
+        es = StubES(spans)
+        handler = make_handler()
+
+        # 窗口 (1005, 1010] 只覆盖 Trace 的部分 Span，按 TraceId 拉取时补全窗口前的 Span
+        batches = list(handler.iter_trace_id_batches(handler.iter_spans(es, "index", 1005, 1010)))
+        assert batches == [(["trace-0002", "trace-0003", "trace-0004"], 1008)]
+        es.requests = []
+        with mock.patch.object(constants, "DISCOVER_SEARCH_AFTER_SIZE", 4):
+            result = handler.list_span_by_trace_ids(es, "index", batches[0][0], 1010)
+
+        assert result == sorted(
+            (s for s in spans if s["trace_id"] in batches[0][0]), key=lambda s: (s["trace_id"], s["span_id"])
+        )
+        assert es.requests == ["search"] * 4
+
+    def test_get_time_range_by_watermark(self):
+        handler = make_handler()
+        now = 100000
+        end_time = (now - constants.DISCOVER_WATERMARK_DELAY) * 1000
+        lookback_start = end_time - constants.DISCOVER_MAX_LOOKBACK * 1000
+
         test_cases = [
-            {"all_span_count": 5000, "initial_per_trace_size": 1, "expect": 20},
-            {"all_span_count": 12002, "initial_per_trace_size": 1, "expect": 8},
-            {"all_span_count": 100, "initial_per_trace_size": 1, "expect": 100},
-            {"all_span_count": 1000, "initial_per_trace_size": 1, "expect": 100},
-            {"all_span_count": 3102, "initial_per_trace_size": 1, "expect": 32},
-            {"all_span_count": 5000, "initial_per_trace_size": 10, "expect": 2},
-            {"all_span_count": 12002, "initial_per_trace_size": 10, "expect": 1},
-            {"all_span_count": 100, "initial_per_trace_size": 10, "expect": 100},
-            {"all_span_count": 1000, "initial_per_trace_size": 10, "expect": 10},
-            {"all_span_count": 3102, "initial_per_trace_size": 10, "expect": 3},
+            # 无水位 / 水位过旧时回溯固定时间
+            {"watermark": None, "expect": (lookback_start, end_time)},
+            {"watermark": lookback_start - 1, "expect": (lookback_start, end_time)},
+            # 从水位继续
+            {"watermark": end_time - 5000, "expect": (end_time - 5000, end_time)},
+            # 水位超前(时钟回拨)时本轮为空
+            {"watermark": end_time + 5000, "expect": (end_time, end_time)},
         ]
 
-        for i in test_cases:
-            get_spans_params = [
-                (i, 10000, "") for i in divide_biscuit([i for i in range(100)], i["initial_per_trace_size"])
-            ]
-            avg_group_span_count = i["all_span_count"] / len(get_spans_params)
-            per_trace_size = TopoHandler.calculate_round_count(avg_group_span_count)
-
-            logger.info(
-                f"initial_per_trace_size: {i['initial_per_trace_size']} "
-                f"all_span_count: {i['all_span_count']} "
-                f"avg_span_count: {avg_group_span_count} "
-                f"change per_trace_size to: {per_trace_size}"
-            )
-
-            assert per_trace_size == i["expect"]
+        for case in test_cases:
+            with (
+                mock.patch(
+                    "apm.core.discover.base.ApmCacheHandler.get_topo_discover_watermark", return_value=case["watermark"]
+                ),
+                mock.patch("apm.core.discover.base.ApmCacheHandler.get_redis_client"),
+            ):
+                assert handler.get_time_range(now=now) == case["expect"]
+
+    def test_discover_watermark(self):
+        spans = [{**s, "kind": 2} for s in make_spans(trace_count=10, span_per_trace=2)]
+
+        for max_duration, expect_watermark in [(600, 2000), (0, 1001)]:
+            handler = make_handler()
+            es = StubES(spans)
+            handler.datasource = mock.MagicMock(es_client=es, index_name="index")
+            handler.TRACE_ID_CHUNK_MAX_DURATION = max_duration
+            with (
+                mock.patch.object(TopoHandler, "PER_ROUND_TRACE_ID_MAX_SIZE", 2),
+                mock.patch.object(TopoHandler, "build_discovers", return_value=[]),
+                mock.patch.object(TopoHandler, "get_time_range", return_value=(999, 2000)),
+                mock.patch("apm.core.discover.base.ApmCacheHandler") as cache_handler,
+            ):
+                handler.discover()
+
+            # Span 流按时间排序，超时中断时水位推进到已处理批次的时间点，窗口内靠后的 Trace 下一轮继续处理
+            cache_handler.return_value.set_topo_discover_watermark.assert_called_once_with(2, "app", expect_watermark)
@@ -25,6 +25,8 @@ from bkmonitor.models import (
     UserGroup,
     NoticeGroup,
     ActionConfig,
+    StrategySummary,
+    StrategySummaryFacet,
 )
 
 
@@ -54,6 +56,8 @@ def _clean_all_model():
     UserGroup.objects.all().delete()
     NoticeGroup.objects.all().delete()
     ActionConfig.objects.all().delete()
+    StrategySummary.objects.all().delete()
+    StrategySummaryFacet.objects.all().delete()
 
 
 @pytest.fixture()
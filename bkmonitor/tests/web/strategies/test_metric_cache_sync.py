@@ -0,0 +1,142 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import copy
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+
+from bkmonitor.models.metric_list_cache import MetricListCache
+from monitor_web.strategies import metric_list_cache
+from monitor_web.strategies.metric_list_cache import BaseMetricCacheManager
+
+
+def make_metric(table_id, metric_field, **kwargs):
+    metric = {
+        "bk_biz_id": 2,
+        "result_table_id": table_id,
+        "result_table_name": table_id,
+        "metric_field": metric_field,
+        "metric_field_name": metric_field,
+        "unit": "",
+        "dimensions": [{"id": "bk_target_ip", "name": "目标IP"}],
+        "default_dimensions": [],
+        "default_condition": [],
+        "collect_config_ids": [],
+        "result_table_label": "os",
+        "data_source_label": "bk_monitor",
+        "data_type_label": "time_series",
+        "data_target": "host_target",
+        "data_label": "test",
+    }
+    metric.update(kwargs)
+    return metric
+
+
+class FakeMetricCacheManager(BaseMetricCacheManager):
+    data_sources = (("bk_monitor", "time_series"),)
+
+    def __init__(self, tables, bk_biz_id=2):
+        super().__init__(bk_tenant_id="system", bk_biz_id=bk_biz_id)
+        self.tables = tables
+
+    def get_tables(self):
+        yield from self.tables
+
+    def get_metrics_by_table(self, table):
+        return copy.deepcopy(self.tables[table])
+
+
+class TestMetricCacheSync(TestCase):
+    def setUp(self):  # NOCC:invalid-name(设计如此:)
+        MetricListCache.objects.all().delete()
+        self.cache_patch = mock.patch.object(metric_list_cache, "cache", LocMemCache("metric_cache_sync", {}))
+        self.cache_patch.start()
+        self.tables = {
+            "system.cpu": [make_metric("system.cpu", "usage"), make_metric("system.cpu", "idle")],
+            "system.mem": [make_metric("system.mem", "used")],
+        }
+
+    def tearDown(self):  # NOCC:invalid-name(设计如此:)
+        self.cache_patch.stop()
+        MetricListCache.objects.all().delete()
+
+    def run_manager(self):
+        with (
+            mock.patch.object(metric_list_cache, "count_md5", wraps=metric_list_cache.count_md5) as count_md5,
+            mock.patch.object(
+                MetricListCache.objects, "bulk_update", wraps=MetricListCache.objects.bulk_update
+            ) as bulk_update,
+            mock.patch.object(metric_list_cache.MetricSearchResult, "refresh") as self.refresh_index,
+        ):
+            FakeMetricCacheManager(self.tables).run()
+        return count_md5, bulk_update
+
+    def test_skip_unchanged_tables(self):
+        self.run_manager()
+        self.assertEqual(MetricListCache.objects.filter(bk_biz_id=2).count(), 3)
+        self.refresh_index.assert_called_once_with("system", {2})
+
+        # 指标未变化，不再逐个对比指标，也不重建检索索引
+        count_md5, bulk_update = self.run_manager()
+        self.assertEqual(count_md5.call_count, 0)
+        self.assertEqual(bulk_update.call_count, 0)
+        self.refresh_index.assert_not_called()
+
+        # 指标被删除后，对应的表重新对比
+        MetricListCache.objects.filter(metric_field="used").delete()
+        count_md5, _ = self.run_manager()
+        self.assertEqual(count_md5.call_count, 1)
+        self.assertEqual(MetricListCache.objects.filter(bk_biz_id=2).count(), 3)
+
+    def test_update_changed_fields(self):
+        self.run_manager()
+
+        self.tables["system.cpu"][0]["unit"] = "percent"
+        count_md5, bulk_update = self.run_manager()
+
+        # 只对比变化的表，只更新变化的字段
+        self.assertEqual(count_md5.call_count, 2)
+        bulk_update.assert_called_once()
+        self.assertEqual(bulk_update.call_args[0][1], ["unit", "metric_md5", "last_update"])
+        self.assertEqual(MetricListCache.objects.get(metric_field="usage").unit, "percent")
+        self.assertEqual(MetricListCache.objects.get(metric_field="idle").unit, "")
+
+    def test_delete_removed_metrics(self):
+        self.run_manager()
+
+        self.tables.pop("system.mem")
+        self.tables["system.cpu"].pop()
+        self.run_manager()
+        self.refresh_index.assert_called_once_with("system", {2})
+        self.assertEqual(list(MetricListCache.objects.values_list("metric_field", flat=True)), ["usage"])
+
+    def test_append_event_metric_refresh_index(self):
+        from monitor_web import tasks
+
+        metric = make_metric(
+            "2_bkmonitor_event_1001", "test_event", data_source_label="custom", data_type_label="event"
+        )
+        event_group = mock.MagicMock(type="custom_event")
+        with (
+            mock.patch.object(tasks, "bk_biz_id_to_bk_tenant_id", return_value="system"),
+            mock.patch.object(tasks, "set_local_username"),
+            mock.patch.object(tasks, "get_admin_username"),
+            mock.patch.object(tasks.CustomEventGroup.objects, "get", return_value=event_group),
+            mock.patch.object(tasks, "api", new=mock.MagicMock()),
+            mock.patch.object(metric_list_cache.CustomEventCacheManager, "get_metrics_by_table", return_value=[metric]),
+            mock.patch.object(metric_list_cache.MetricSearchResult, "refresh") as refresh_index,
+        ):
+            tasks.append_event_metric_list_cache(2, 1001)
+
+        # 直接写入指标缓存后刷新业务的检索索引
+        self.assertTrue(MetricListCache.objects.filter(metric_field="test_event").exists())
+        refresh_index.assert_called_once_with("system", [2])
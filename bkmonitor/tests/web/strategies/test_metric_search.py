@@ -0,0 +1,168 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from monitor_web.strategies.metric_search import (
+    MetricSearchIndex,
+    MetricSearchResult,
+    iter_bitmap,
+    to_bitmap,
+)
+
+
+def make_row(metric_id, result_table_id, metric_field, use_frequency=0, **kwargs):
+    row = {
+        "id": metric_id,
+        "use_frequency": use_frequency,
+        "metric_field": metric_field,
+        "metric_field_name": metric_field.upper(),
+        "data_label": "",
+        "result_table_id": result_table_id,
+        "result_table_name": result_table_id,
+        "result_table_label": "os",
+        "related_id": "",
+        "related_name": "",
+        "data_source_label": "bk_monitor",
+        "data_type_label": "time_series",
+    }
+    row.update(kwargs)
+    return row
+
+
+ROWS = [
+    make_row(1, "system.cpu_summary", "usage", use_frequency=10),
+    make_row(2, "system.cpu_summary", "idle", use_frequency=3),
+    make_row(3, "system.mem", "pct_used", use_frequency=5),
+    make_row(4, "script_nginx.group1", "nginx_requests", related_id="nginx", data_label="nginx"),
+    make_row(5, "script_nginx.group1", "usage", related_id="nginx", data_label="nginx"),
+    make_row(6, "2_bklog.app", "log", data_source_label="bk_log_search", data_type_label="log", related_id="10"),
+    make_row(7, "strategy", "1001", data_type_label="alert", metric_field_name="CPU告警", result_table_label="other"),
+]
+
+
+def naive_search(rows, query):
+    """
+    与数据库 icontains 查询一致的参照实现
+    """
+    fields = ["data_label", "result_table_id", "metric_field", "metric_field_name"]
+    ids = {row["id"] for row in rows if any(query.lower() in row[field].lower() for field in fields)}
+
+    query = query.strip()
+    if ":" in query:
+        parts = [part.strip() for part in query.split(":")]
+        if parts[0] in ["custom", "bkmonitor"]:
+            parts = parts[1:]
+        parts = [part for part in parts if part]
+        for row in rows:
+            metric_matched = parts and parts[-1].lower() in row["metric_field"].lower()
+            if len(parts) == 3 and row["result_table_id"] == f"{parts[0]}.{parts[1]}" and metric_matched:
+                ids.add(row["id"])
+            elif len(parts) == 2 and row["data_label"] == parts[0] and metric_matched:
+                ids.add(row["id"])
+        return ids
+
+    parts = query.split(".")
+    for row in rows:
+        if len(parts) == 2 and parts[1].lower() in row["metric_field"].lower():
+            if parts[0] in [row["data_label"], row["result_table_id"]]:
+                ids.add(row["id"])
+        elif len(parts) >= 3 and parts[2:] and ".".join(parts[2:]).lower() in row["metric_field"].lower():
+            if row["result_table_id"] == ".".join(parts[:2]):
+                ids.add(row["id"])
+    return ids
+
+
+def search_ids(index, query):
+    return {index.columns["id"][position] for position in iter_bitmap(index.search(query))}
+
+
+def test_bitmap():
+    positions = [0, 3, 8, 9, 100]
+    assert list(iter_bitmap(to_bitmap(positions))) == positions
+    assert to_bitmap([]) == 0
+
+
+def test_search():
+    index = MetricSearchIndex(ROWS)
+    for query in [
+        "usage",
+        "US",
+        "cpu",
+        "u",
+        "system.cpu_summary.usage",
+        "nginx.usage",
+        "nginx.req",
+        "bkmonitor:system:mem:pct",
+        "nginx:requests",
+        "CPU告警",
+        "not_exists",
+    ]:
+        assert search_ids(index, query) == naive_search(ROWS, query), query
+
+
+def test_search_result():
+    index = MetricSearchIndex(ROWS)
+    metrics = MetricSearchResult([(index, index.all)])
+
+    usage_metrics = metrics.search(["usage"])
+    assert usage_metrics.count() == 2
+    assert usage_metrics.filter("related_id", ["nginx"]).count() == 1
+    assert usage_metrics.exclude_unused().count() == 1
+
+    assert metrics.count_by("data_source") == {
+        ("bk_monitor", "time_series"): 5,
+        ("bk_log_search", "log"): 1,
+        ("bk_monitor", "alert"): 1,
+    }
+    assert metrics.filter("data_source", [["bk_monitor", "alert"]]).count_by("result_table_label") == {"other": 1}
+    assert metrics.group_by(["result_table_id", "related_id"])[("script_nginx.group1", "nginx")] == 2
+
+    # 完全匹配优先，其次为前缀匹配，同等匹配程度按使用频率排序
+    assert metrics.search(["usage"]).get_ids(["usage"]) == [1, 5]
+    assert metrics.search(["u"]).get_ids(["u"]) == [1, 5, 3, 2, 4, 7]
+    assert metrics.search(["u"]).get_ids(["u"], offset=2, limit=2) == [3, 2]
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+def test_index_refresh_by_biz():
+    cache.clear()
+    MetricSearchResult._indexes.clear()
+    biz_rows = {0: ROWS[:3], 2: ROWS[3:]}
+
+    with mock.patch.object(
+        MetricSearchResult, "load_rows", side_effect=lambda bk_tenant_id, bk_biz_id: biz_rows[bk_biz_id]
+    ) as load_rows:
+        # 刷新任务中构建并持久化索引，请求时直接加载，不再查询指标缓存
+        MetricSearchResult.refresh("system", [0, 2])
+        assert load_rows.call_count == 2
+        metrics = MetricSearchResult.from_scope("system", [0, 2])
+        assert metrics.count() == len(ROWS)
+        assert load_rows.call_count == 2
+
+        # 版本号未变化时复用进程内索引
+        index = MetricSearchResult.get_index("system", 0)
+        assert MetricSearchResult.get_index("system", 0) is index
+
+        # 仅变更业务的索引失效，其他业务不受影响
+        biz_rows[2] = ROWS[3:5]
+        MetricSearchResult.refresh("system", [2])
+        assert MetricSearchResult.get_index("system", 0) is index
+        assert MetricSearchResult.from_scope("system", [0, 2]).count() == 5
+        assert load_rows.call_count == 3
+
+        # 持久化索引被回收时，从指标缓存重建
+        cache.delete(MetricSearchResult.get_index_key("system", 2))
+        MetricSearchResult._indexes.clear()
+        assert MetricSearchResult.get_index("system", 2).size == 2
+        assert load_rows.call_count == 4
@@ -0,0 +1,185 @@
+"""
+Tencent is pleased to support the open source community by making 蓝鲸智云 - 监控平台 (BlueKing - Monitor) available.
+Copyright (C) 2017-2025 Tencent. All rights reserved.
+Licensed under the MIT License (the "License"); you may not use this file except in compliance with the License.
+You may obtain a copy of the License at http://opensource.org/licenses/MIT
+Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on
+an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+specific language governing permissions and limitations under the License.
+"""
+
+import copy
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+from bkmonitor.models import StrategyModel, StrategySummary, StrategySummaryFacet
+from bkmonitor.strategy import summary
+from bkmonitor.strategy.new_strategy import Strategy
+from monitor_web.strategies.resources import GetStrategyListV2Resource
+
+pytestmark = pytest.mark.django_db
+
+CONFIG = {
+    "id": 0,
+    "bk_biz_id": 2,
+    "name": "测试策略",
+    "source": "bk_monitor",
+    "scenario": "os",
+    "type": "monitor",
+    "is_enabled": True,
+    "items": [
+        {
+            "name": "name",
+            "expression": "a",
+            "origin_sql": "",
+            "no_data_config": {},
+            "target": [[]],
+            "algorithms": [{"type": "Threshold", "level": 1, "config": [[{"method": "gte", "threshold": 1}]]}],
+            "query_configs": [
+                {
+                    "data_source_label": "bk_monitor",
+                    "data_type_label": "time_series",
+                    "alias": "a",
+                    "metric_id": "bk_monitor.system.cpu_summary.usage",
+                    "result_table_id": "system.cpu_summary",
+                    "metric_field": "usage",
+                    "unit": "percent",
+                    "agg_method": "avg",
+                    "agg_condition": [],
+                    "agg_dimension": [],
+                    "agg_interval": 60,
+                    "functions": [],
+                }
+            ],
+        }
+    ],
+    "actions": [],
+    "detects": [
+        {
+            "level": 1,
+            "expression": "",
+            "trigger_config": {"count": 1, "check_window": 2},
+            "recovery_config": {"check_window": 2},
+            "connector": "and",
+        }
+    ],
+    "labels": ["/test/"],
+}
+
+
+def create_strategy(name, **kwargs):
+    config = copy.deepcopy(CONFIG)
+    config.update(name=name, **kwargs)
+    strategy = Strategy(**config)
+    strategy.save()
+    return strategy
+
+
+def mock_alert_aggs(alert_counts, page_size=summary.ALERT_AGG_PAGE_SIZE):
+    """
+    构造按策略分页聚合的告警查询结果，alert_counts: {strategy_id: (告警数量, 屏蔽告警数量)}
+    """
+    buckets = [
+        SimpleNamespace(
+            key=SimpleNamespace(strategy_id=strategy_id), doc_count=total, shielded=SimpleNamespace(doc_count=shielded)
+        )
+        for strategy_id, (total, shielded) in alert_counts.items()
+    ]
+    pages = [buckets[index : index + page_size] for index in range(0, len(buckets), page_size)] or [[]]
+    document = mock.MagicMock()
+    search_object = document.search.return_value.filter.return_value.__getitem__.return_value
+    search_object.execute.side_effect = [
+        SimpleNamespace(
+            aggs=SimpleNamespace(
+                strategy_id=SimpleNamespace(
+                    buckets=page, after_key=SimpleNamespace(strategy_id=page[-1].key.strategy_id) if page else None
+                )
+            )
+        )
+        for page in pages
+    ]
+    return mock.patch.object(summary, "AlertDocument", document)
+
+
+class TestStrategySummary:
+    def test_save_and_delete(self, clean_model):
+        strategy = create_strategy("cpu")
+
+        strategy_summary = StrategySummary.objects.get(strategy_id=strategy.id)
+        assert strategy_summary.bk_biz_id == 2
+        assert strategy_summary.strategy_update_time == StrategyModel.objects.get(id=strategy.id).update_time
+        assert set(StrategySummaryFacet.objects.filter(strategy_id=strategy.id).values_list("facet", "value")) == {
+            ("data_source", "bk_monitor|time_series"),
+            ("label", "/test/"),
+            ("level", "1"),
+            ("algorithm_type", "Threshold"),
+            ("action_config", "0"),
+        }
+
+        Strategy.delete_by_strategy_ids([strategy.id])
+        assert not StrategySummary.objects.filter(strategy_id=strategy.id).exists()
+        assert not StrategySummaryFacet.objects.filter(strategy_id=strategy.id).exists()
+
+    def test_sync_stale_summary(self, clean_model):
+        strategy = create_strategy("cpu")
+        StrategySummary.objects.all().delete()
+        StrategySummaryFacet.objects.all().delete()
+
+        assert summary.sync_strategy_summary() == [strategy.id]
+        assert StrategySummaryFacet.objects.filter(strategy_id=strategy.id).exists()
+
+        # 摘要未过期时不再重建
+        assert summary.sync_strategy_summary() == []
+
+    def test_refresh_alert_summary(self, clean_model):
+        strategy = create_strategy("cpu")
+        other_strategy = create_strategy("mem", labels=[])
+
+        with mock_alert_aggs({strategy.id: (3, 1)}):
+            summary.refresh_strategy_alert_summary()
+        assert StrategySummary.objects.get(strategy_id=strategy.id).alert_count == 2
+        assert StrategySummary.objects.get(strategy_id=strategy.id).shield_alert_count == 1
+
+        with (
+            mock.patch.object(GetStrategyListV2Resource, "get_shield_config_strategy_ids", return_value=set()),
+            mock.patch.object(GetStrategyListV2Resource, "get_shield_info", return_value={}),
+        ):
+            response_data = GetStrategyListV2Resource().request(dict(bk_biz_id=2))
+
+        assert response_data["total"] == 2
+        status_counts = {status["id"]: status["count"] for status in response_data["strategy_status_list"]}
+        assert status_counts == {"ALERT": 1, "INVALID": 0, "OFF": 0, "ON": 2, "SHIELDED": 1}
+        label_counts = {label["id"]: label["count"] for label in response_data["strategy_label_list"]}
+        assert label_counts["/test/"] == 1
+        alert_counts = {
+            strategy_config["id"]: (strategy_config["alert_count"], strategy_config["shield_alert_count"])
+            for strategy_config in response_data["strategy_config_list"]
+        }
+        assert alert_counts == {strategy.id: (2, 1), other_strategy.id: (0, 0)}
+
+        # 告警恢复后清零
+        with (
+            mock_alert_aggs({}),
+            mock.patch.object(
+                StrategySummary.objects, "bulk_update", wraps=StrategySummary.objects.bulk_update
+            ) as bulk_update,
+        ):
+            summary.refresh_strategy_alert_summary()
+        assert len(bulk_update.call_args[0][0]) == 1
+        assert StrategySummary.objects.get(strategy_id=strategy.id).alert_count == 0
+
+    def test_refresh_alert_summary_by_pages(self, clean_model):
+        strategies = [create_strategy(f"cpu{index}") for index in range(3)]
+
+        # 策略数量超过单页桶数量时，翻页获取全部策略的告警数量
+        with (
+            mock.patch.object(summary, "ALERT_AGG_PAGE_SIZE", 2),
+            mock_alert_aggs({strategy.id: (2, 0) for strategy in strategies}, page_size=2),
+        ):
+            summary.refresh_strategy_alert_summary()
+        assert {
+            summary_obj.strategy_id: summary_obj.alert_count
+            for summary_obj in StrategySummary.objects.filter(strategy_id__in=[strategy.id for strategy in strategies])
+        } == {strategy.id: 2 for strategy in strategies}